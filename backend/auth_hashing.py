@@ -0,0 +1,134 @@
+"""
+Password Hashing Executor
+=========================
+
+Runs bcrypt hashing/verification off the event loop:
+- A dedicated, bounded thread pool per worker (PASSWORD_HASH_WORKERS,
+  default min(4, cpu count)); the bcrypt C extension releases the GIL, so
+  hashes run truly in parallel while the loop keeps serving orders
+- At most `max_pending` calls may wait for a thread; beyond that callers
+  get PasswordHasherBusy (mapped to 503 + Retry-After) instead of piling
+  up behind a login storm
+- Queue depth, in-flight count and wait/run times exposed via get_stats()
+  (reported by /health)
+
+PERFORMANCE TARGETS:
+- Event loop blocked by bcrypt: 0ms (was 100-300ms per login)
+- Order-creation p99 unaffected by concurrent logins (see
+  benchmarks/bench_auth_hashing.py)
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_MAX_PENDING = 64
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password operations are already queued on this worker"""
+
+
+class PasswordHasher:
+    """Async wrappers around a passlib CryptContext backed by a bounded pool"""
+
+    def __init__(self, context, max_workers: int = DEFAULT_MAX_WORKERS,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        self.context = context
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pwhash")
+        # Submitted but not finished; anything beyond max_workers is queued
+        self._pending = 0
+        self._stats = {
+            "hashes": 0,
+            "verifies": 0,
+            "completed": 0,
+            "rejected_busy": 0,
+            "max_queue_depth": 0,
+            "total_wait_ms": 0.0,
+            "total_run_ms": 0.0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self._pending - self.max_workers, 0)
+
+    async def _submit(self, func: Callable, *args) -> Any:
+        if self.queue_depth >= self.max_pending:
+            self._stats["rejected_busy"] += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        submitted = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            try:
+                return func(*args), None, started, time.perf_counter()
+            except Exception as e:
+                return None, e, started, time.perf_counter()
+
+        # Counters are only touched on the loop thread
+        self._pending += 1
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self.queue_depth)
+        try:
+            result, error, started, finished = await asyncio.get_running_loop().run_in_executor(
+                self._executor, run
+            )
+        finally:
+            self._pending -= 1
+        self._stats["completed"] += 1
+        self._stats["total_wait_ms"] += (started - submitted) * 1000
+        self._stats["total_run_ms"] += (finished - started) * 1000
+        if error is not None:
+            raise error
+        return result
+
+    async def hash(self, password: str) -> str:
+        self._stats["hashes"] += 1
+        return await self._submit(self.context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        self._stats["verifies"] += 1
+        return await self._submit(self.context.verify, plain_password, hashed_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        completed = max(self._stats["completed"], 1)
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": min(self._pending, self.max_workers),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self._stats["max_queue_depth"],
+            "hashes": self._stats["hashes"],
+            "verifies": self._stats["verifies"],
+            "rejected_busy": self._stats["rejected_busy"],
+            "avg_wait_ms": round(self._stats["total_wait_ms"] / completed, 2),
+            "avg_run_ms": round(self._stats["total_run_ms"] / completed, 2),
+        }
+
+
+# Global instance
+_password_hasher: Optional[PasswordHasher] = None
+
+
+def init_password_hasher(context, max_workers: Optional[int] = None) -> PasswordHasher:
+    """Initialize the password hashing executor for this worker"""
+    global _password_hasher
+    if _password_hasher:
+        _password_hasher.shutdown()
+    workers = max_workers or int(os.getenv("PASSWORD_HASH_WORKERS", DEFAULT_MAX_WORKERS))
+    pending = int(os.getenv("PASSWORD_HASH_MAX_PENDING", DEFAULT_MAX_PENDING))
+    _password_hasher = PasswordHasher(context, max_workers=workers, max_pending=pending)
+    return _password_hasher
+
+
+def get_password_hasher() -> Optional[PasswordHasher]:
+    """Get the global password hasher instance"""
+    return _password_hasher
@@ -0,0 +1,125 @@
+"""
+Password Hashing Benchmark
+==========================
+
+Order-creation latency on one worker's event loop during a login storm
+(shift change: --logins arriving over --spread-ms):
+- before: bcrypt verify called inline in the async login handler
+- after:  verify on the PasswordHasher thread pool
+
+Order creation is simulated as a Mongo round-trip (--rtt-ms) issued every
+--order-interval-ms until the last login finishes. With bcrypt
+installed the real passlib/bcrypt cost is used (--rounds); otherwise
+PBKDF2-SHA256 calibrated to --hash-ms stands in (it also releases the GIL).
+
+Usage:
+    python benchmarks/bench_auth_hashing.py
+    python benchmarks/bench_auth_hashing.py --logins 50 --workers 4 --rounds 12
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth_hashing import PasswordHasher  # noqa: E402
+
+
+class Pbkdf2Context:
+    """Stand-in for passlib's CryptContext when bcrypt is not installed"""
+
+    def __init__(self, hash_ms: float):
+        self.iterations = 10000
+        start = time.perf_counter()
+        self._derive("calibrate")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.iterations = max(1000, int(self.iterations * hash_ms / max(elapsed_ms, 0.01)))
+
+    def _derive(self, password: str) -> str:
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), b"bench-salt", self.iterations).hex()
+
+    def hash(self, password: str) -> str:
+        return self._derive(password)
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._derive(password) == hashed
+
+
+def make_context(rounds: int, hash_ms: float):
+    try:
+        from passlib.context import CryptContext
+        return CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds), f"bcrypt rounds={rounds}"
+    except ImportError:
+        context = Pbkdf2Context(hash_ms)
+        return context, f"pbkdf2 {context.iterations} iterations (~{hash_ms}ms)"
+
+
+async def run_storm(verify, hashed: str, logins: int, spread_ms: float,
+                    rtt_ms: float, interval_ms: float):
+    """Order p50/p99/max while `logins` arrive over `spread_ms`"""
+    samples = []
+    storm_done = asyncio.Event()
+
+    async def orders():
+        while not storm_done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(rtt_ms / 1000)
+            samples.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(interval_ms / 1000)
+
+    async def login(index: int):
+        await asyncio.sleep(spread_ms * index / logins / 1000)
+        return await verify("correct horse", hashed)
+
+    started = time.perf_counter()
+    order_task = asyncio.create_task(orders())
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    storm_ms = (time.perf_counter() - started) * 1000
+    storm_done.set()
+    await order_task
+
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1], max(samples), storm_ms
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=4, help="PasswordHasher threads")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost (passlib default)")
+    parser.add_argument("--hash-ms", type=float, default=150, help="fallback hash cost")
+    parser.add_argument("--spread-ms", type=float, default=1000, help="logins arrive over this window")
+    parser.add_argument("--rtt-ms", type=float, default=2.0)
+    parser.add_argument("--order-interval-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    context, label = make_context(args.rounds, args.hash_ms)
+    hashed = context.hash("correct horse")
+    print(f"Hash: {label}, {args.logins} logins over {args.spread_ms:.0f}ms, {args.workers} hasher threads\n")
+
+    async def inline_verify(password, hashed_password):
+        return context.verify(password, hashed_password)
+
+    hasher = PasswordHasher(context, max_workers=args.workers, max_pending=args.logins)
+
+    results = {}
+    for name, verify in (("before (inline)", inline_verify), ("after (executor)", hasher.verify)):
+        p50, p99, worst, storm_ms = await run_storm(
+            verify, hashed, args.logins, args.spread_ms, args.rtt_ms, args.order_interval_ms
+        )
+        results[name] = p99
+        print(f"{name:<18} order p50={p50:8.2f}ms  p99={p99:8.2f}ms  max={worst:8.2f}ms  "
+              f"logins done in {storm_ms:8.1f}ms")
+
+    hasher.shutdown()
+    print(f"\nHasher stats: {hasher.get_stats()}")
+    print(f"Order p99 during the storm: {results['before (inline)']:.1f}ms -> {results['after (executor)']:.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
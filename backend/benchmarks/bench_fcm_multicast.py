@@ -0,0 +1,201 @@
+"""
+FCM Multicast Benchmark
+=======================
+
+Broadcast of one notification to --devices FCM tokens against a local fake
+FCM server (OAuth token endpoint + HTTP v1 messages:send, --latency-ms of
+server time per request; every --dead-every'th token is UNREGISTERED):
+- before: the old send_fcm_to_multiple - one device at a time, each send
+  signing a fresh RS256 JWT, exchanging it for an access token and opening
+  a new client (2 HTTPS round-trips per device)
+- after:  firebase_push.send_fcm_to_multiple - cached access token,
+  --concurrency sends in flight over the pooled client, UNREGISTERED tokens
+  pruned per batch
+
+Needs PyJWT + cryptography (both in requirements.txt); the service-account
+key is generated on the fly.
+
+Usage:
+    python benchmarks/bench_fcm_multicast.py
+    python benchmarks/bench_fcm_multicast.py --devices 10000 --skip-before
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeFCMServer:
+    """HTTP/1.1 keep-alive server answering the OAuth token and messages:send endpoints"""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.token_requests = 0
+        self.send_requests = 0
+        self.connections = 0
+        self._server = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _respond(self, path: str, body: bytes):
+        if path == "/token":
+            self.token_requests += 1
+            return 200, {"access_token": f"ya29.bench{self.token_requests}", "expires_in": 3599}
+        self.send_requests += 1
+        token = json.loads(body)["message"]["token"]
+        if token.startswith("dead-"):
+            return 404, {"error": {"code": 404, "status": "NOT_FOUND", "details": [
+                {"@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError", "errorCode": "UNREGISTERED"}
+            ]}}
+        return 200, {"name": f"projects/bench/messages/{self.send_requests}"}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                path = lines[0].split(" ")[1]
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+
+                await asyncio.sleep(self.latency)
+                status, payload = self._respond(path, body)
+                data = json.dumps(payload).encode()
+                reason = b"OK" if status == 200 else b"Not Found"
+                writer.write(
+                    b"HTTP/1.1 " + str(status).encode() + b" " + reason + b"\r\n"
+                    b"Content-Type: application/json\r\nContent-Length: " + str(len(data)).encode() + b"\r\n\r\n" + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def service_account(port: int) -> dict:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    return {
+        "type": "service_account",
+        "project_id": "bench",
+        "private_key": pem,
+        "client_email": "bench@bench.iam.gserviceaccount.com",
+        "token_uri": f"http://127.0.0.1:{port}/token",
+    }
+
+
+async def legacy_send_to_multiple(tokens, credentials, base_url, title, body):
+    """The pre-cache implementation: token exchange + fresh client per device, sequential"""
+    import httpx
+    import jwt
+
+    results = {"success": 0, "failed": 0}
+    for token in tokens:
+        now = int(time.time())
+        assertion = jwt.encode({
+            "iss": credentials["client_email"], "sub": credentials["client_email"],
+            "aud": credentials["token_uri"], "iat": now, "exp": now + 3600,
+            "scope": "https://www.googleapis.com/auth/firebase.messaging",
+        }, credentials["private_key"], algorithm="RS256")
+        async with httpx.AsyncClient() as client:
+            response = await client.post(credentials["token_uri"], data={
+                "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer", "assertion": assertion,
+            })
+            access_token = response.json().get("access_token")
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"{base_url}/v1/projects/{credentials['project_id']}/messages:send",
+                headers={"Authorization": f"Bearer {access_token}"},
+                json={"message": {"token": token, "notification": {"title": title, "body": body}}},
+            )
+        results["success" if response.status_code == 200 else "failed"] += 1
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake FCM server time per request")
+    parser.add_argument("--dead-every", type=int, default=10, help="every Nth token is UNREGISTERED")
+    parser.add_argument("--skip-before", action="store_true", help="skip the sequential baseline")
+    args = parser.parse_args()
+
+    server = FakeFCMServer(args.latency_ms)
+    port = await server.start()
+    base_url = f"http://127.0.0.1:{port}"
+    credentials = service_account(port)
+
+    # firebase_push reads its configuration at import
+    os.environ["FIREBASE_CREDENTIALS_JSON"] = json.dumps(credentials)
+    os.environ["FCM_API_BASE"] = base_url
+    import firebase_push
+    from http_clients import get_http_clients
+
+    tokens = [
+        f"dead-{i}" if args.dead_every and i % args.dead_every == 0 else f"device-{i}"
+        for i in range(args.devices)
+    ]
+    print(f"{args.devices} devices, {args.latency_ms:.0f}ms server time, "
+          f"{sum(t.startswith('dead-') for t in tokens)} UNREGISTERED\n")
+
+    elapsed = {}
+    if not args.skip_before:
+        before = (server.token_requests, server.send_requests, server.connections)
+        started = time.perf_counter()
+        result = await legacy_send_to_multiple(tokens, credentials, base_url, "Bench", "Hello")
+        elapsed["before"] = time.perf_counter() - started
+        print(f"before (sequential)  {elapsed['before']:8.2f}s  {args.devices / elapsed['before']:8.1f} devices/s  "
+              f"token requests={server.token_requests - before[0]}  connections={server.connections - before[2]}  "
+              f"sent={result['success']} failed={result['failed']}")
+
+    pruned = []
+
+    async def prune(dead_tokens):
+        pruned.extend(dead_tokens)
+
+    before = (server.token_requests, server.send_requests, server.connections)
+    started = time.perf_counter()
+    result = await firebase_push.send_fcm_to_multiple(
+        tokens, "Bench", "Hello", on_unregistered=prune, concurrency=args.concurrency
+    )
+    elapsed["after"] = time.perf_counter() - started
+    print(f"after (multicast)    {elapsed['after']:8.2f}s  {args.devices / elapsed['after']:8.1f} devices/s  "
+          f"token requests={server.token_requests - before[0]}  connections={server.connections - before[2]}  "
+          f"sent={result['success']} unregistered={result['unregistered']} failed={result['failed']}")
+    print(f"\nBatches: {[(b['batch'], b['success'], b['unregistered'], b['ms']) for b in result['batches']]}")
+    print(f"Pruned tokens handed back: {len(pruned)}  FCM stats: {firebase_push.get_fcm_sender_stats()}")
+    if "before" in elapsed:
+        print(f"Broadcast time: {elapsed['before']:.1f}s -> {elapsed['after']:.2f}s "
+              f"({elapsed['before'] / elapsed['after']:.0f}x)")
+
+    await get_http_clients().close()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+"""
+Outbound HTTP Client Benchmark
+==============================
+
+Throughput of --sends WhatsApp receipt sends (Cloud API `/messages` POSTs)
+against a local mock Graph API server with --latency-ms of server time:
+- before: a fresh httpx.AsyncClient per send (the old `_post` pattern - new
+  SSL context, new TCP connection, torn down after one request)
+- after:  the shared pooled "whatsapp" client from http_clients.py
+  (keep-alive connections reused across sends)
+
+--concurrency sends are in flight at once (a dinner-rush burst of
+completed orders). The mock server counts TCP connections so the
+connection reuse is visible alongside throughput and p50/p99.
+
+Usage:
+    python benchmarks/bench_http_clients.py
+    python benchmarks/bench_http_clients.py --sends 1000 --concurrency 50 --latency-ms 40
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from http_clients import HttpClientRegistry  # noqa: E402
+
+
+class MockGraphServer:
+    """Minimal HTTP/1.1 keep-alive server answering like POST /{phone_id}/messages"""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                headers = {}
+                for line in head.decode("latin-1").split("\r\n")[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers.get("content-length", "0")))
+                self.requests += 1
+
+                await asyncio.sleep(self.latency)
+                body = json.dumps({
+                    "messaging_product": "whatsapp",
+                    "contacts": [{"input": "919000000000", "wa_id": "919000000000"}],
+                    "messages": [{"id": f"wamid.bench{self.requests}"}],
+                }).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def receipt_payload(index: int) -> dict:
+    return {
+        "messaging_product": "whatsapp",
+        "to": "919000000000",
+        "type": "template",
+        "template": {
+            "name": "order_receipt",
+            "language": {"code": "en"},
+            "components": [{"type": "body", "parameters": [
+                {"type": "text", "text": f"INV-{index:05d}"},
+                {"type": "text", "text": "₹1,240.00"},
+            ]}],
+        },
+    }
+
+
+async def run_sends(send, sends: int, concurrency: int):
+    """Wall time and per-send latencies for `sends` sends, `concurrency` at a time"""
+    slots = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(index: int):
+        async with slots:
+            start = time.perf_counter()
+            await send(receipt_payload(index))
+            samples.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(sends)))
+    elapsed = time.perf_counter() - started
+
+    samples.sort()
+    return elapsed, statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sends", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="mock Graph API server time")
+    args = parser.parse_args()
+
+    server = MockGraphServer(args.latency_ms)
+    port = await server.start()
+    url = f"http://127.0.0.1:{port}/v18.0/1234567890/messages"
+    headers = {"Authorization": "Bearer bench-token", "Content-Type": "application/json"}
+    print(f"{args.sends} receipt sends, {args.concurrency} concurrent, {args.latency_ms:.0f}ms server time\n")
+
+    async def fresh_client_send(payload):
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            resp = await client.post(url, headers=headers, json=payload)
+            resp.raise_for_status()
+            return resp.json()
+
+    registry = HttpClientRegistry()
+
+    async def pooled_send(payload):
+        resp = await registry.get("whatsapp").post(url, headers=headers, json=payload)
+        resp.raise_for_status()
+        return resp.json()
+
+    results = {}
+    for name, send in (("before (per send)", fresh_client_send), ("after (pooled)", pooled_send)):
+        connections_before = server.connections
+        elapsed, p50, p99 = await run_sends(send, args.sends, args.concurrency)
+        results[name] = args.sends / elapsed
+        print(f"{name:<18} {results[name]:8.1f} sends/s  p50={p50:7.2f}ms  p99={p99:7.2f}ms  "
+              f"connections={server.connections - connections_before}")
+
+    await registry.close()
+    await server.stop()
+    print(f"\nRegistry stats: {registry.get_stats()}")
+    print(f"Throughput: {results['before (per send)']:.0f} -> {results['after (pooled)']:.0f} sends/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+TTL Structures Micro-Benchmark
+==============================
+
+Per-operation cost as the structure grows:
+- cache set at capacity: old dict + sorted(ttl.items()) eviction vs TTLLRUCache
+- rate-limit check: old per-key timestamp list vs SlidingWindowCounter
+
+The new structures should stay flat across sizes; the old ones grow with
+cache size (O(n log n) sort per eviction) and with requests per window
+(O(n) list rebuild per check).
+
+Usage:
+    python benchmarks/bench_ttl_structures.py
+    python benchmarks/bench_ttl_structures.py --sizes 100 1000 10000 50000 --ops 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ttl_structures import SlidingWindowCounter, TTLLRUCache  # noqa: E402
+
+
+class OldSortedCache:
+    """The previous response/user cache: two dicts, evict by sorting expiries"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache = {}
+        self.cache_ttl = {}
+
+    def set(self, key, value):
+        if len(self.cache) >= self.max_size:
+            oldest = sorted(self.cache_ttl.items(), key=lambda x: x[1])[:10]
+            for old_key, _ in oldest:
+                self.cache.pop(old_key, None)
+                self.cache_ttl.pop(old_key, None)
+        self.cache[key] = value
+        self.cache_ttl[key] = time.time() + self.ttl
+
+
+def old_rate_limit(store: dict, key: str, max_requests: int, window_seconds: int) -> bool:
+    now = time.time()
+    timestamps = store.get(key, [])
+    timestamps = [t for t in timestamps if now - t < window_seconds]
+    if len(timestamps) >= max_requests:
+        return False
+    timestamps.append(now)
+    store[key] = timestamps
+    return True
+
+
+def per_op_us(func, ops: int) -> float:
+    start = time.perf_counter()
+    for i in range(ops):
+        func(i)
+    return (time.perf_counter() - start) / ops * 1_000_000
+
+
+def bench_cache(sizes, ops):
+    print("cache set at capacity (µs/op)")
+    print(f"{'size':>8}  {'old sorted':>12}  {'TTLLRUCache':>12}")
+    for size in sizes:
+        old = OldSortedCache(size, ttl=60)
+        new = TTLLRUCache(max_size=size, ttl=60)
+        for i in range(size):
+            old.set(f"warm:{i}", i)
+            new.set(f"warm:{i}", i)
+        old_us = per_op_us(lambda i: old.set(f"k:{i}", i), ops)
+        new_us = per_op_us(lambda i: new.set(f"k:{i}", i), ops)
+        print(f"{size:>8}  {old_us:>12.3f}  {new_us:>12.3f}")
+
+
+def bench_rate_limit(sizes, ops):
+    print("\nrate-limit check with N requests already in the window (µs/op)")
+    print(f"{'in window':>9}  {'old list':>12}  {'sliding':>12}")
+    for size in sizes:
+        old_store = {"ip": [time.time()] * size}
+        counter = SlidingWindowCounter(60, buckets=12)
+        counter.hit("ip", size)
+        limit = size + ops + 1
+        old_us = per_op_us(lambda i: old_rate_limit(old_store, "ip", limit, 60), ops)
+        new_us = per_op_us(lambda i: counter.allow("ip", limit), ops)
+        print(f"{size:>9}  {old_us:>12.3f}  {new_us:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+
+    bench_cache(args.sizes, args.ops)
+    bench_rate_limit(args.sizes, args.ops)
+
+
+if __name__ == "__main__":
+    main()
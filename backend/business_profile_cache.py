@@ -3,8 +3,8 @@ Business Profile Fast Access Caching System
 ============================================
 
 Provides ultra-fast caching for business profiles with:
-- Multi-level caching (Redis + local cache)
-- Intelligent cache invalidation
+- Multi-level caching via the shared tiered cache (local L1 + Redis L2)
+- Intelligent cache invalidation, broadcast to every worker
 - Real-time profile updates
 - Automatic cache warming
 - Zero-latency access patterns
@@ -20,16 +20,18 @@ import asyncio
 import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
-from functools import lru_cache
-import hashlib
-import pickle
+
+from tiered_cache import get_tiered_cache
+
+PROFILE_NAMESPACE = "business_profile"
+
 
 class BusinessProfileCache:
     """High-performance business profile caching with multi-level storage"""
     
     def __init__(self):
-        # Local in-memory cache (tier 1 - fastest)
-        self._local_cache: Dict[str, tuple] = {}  # {org_id: (profile_dict, expiry_time)}
+        # Tiered cache namespace: L1 per worker (LFU - a few orgs are hot) + Redis L2
+        self.tiered = get_tiered_cache()
         self._cache_stats = {
             "hits": 0,
             "misses": 0,
@@ -41,16 +43,17 @@ class BusinessProfileCache:
         # Cache configuration
         self.LOCAL_TTL = 300  # 5 minutes for local cache
         self.REDIS_TTL = 3600  # 1 hour for Redis cache
-        
-        # Redis client (will be injected)
-        self.redis_client = None
+        self.tiered.register(
+            PROFILE_NAMESPACE, l1_max=1000, ttl=self.LOCAL_TTL, l2_ttl=self.REDIS_TTL, policy="lfu"
+        )
         
         # Cache warming list
         self._warm_cache_orgs: List[str] = []
         
     async def set_redis_client(self, redis_client):
-        """Set the Redis client for distributed caching"""
-        self.redis_client = redis_client
+        """Use a Redis client as the tiered cache L2 (if none is attached yet)"""
+        if self.tiered.redis is None:
+            await self.tiered.attach_redis(redis_client)
         
     async def get_profile(self, org_id: str, db=None) -> Optional[Dict[str, Any]]:
         """
@@ -64,35 +67,14 @@ class BusinessProfileCache:
         """
         start_time = time.time()
         
-        # Tier 1: Check local cache
-        if org_id in self._local_cache:
-            profile, expiry = self._local_cache[org_id]
-            if time.time() < expiry:
-                access_time = (time.time() - start_time) * 1000
-                self._cache_stats["hits"] += 1
-                self._cache_stats["total_access_time"] += access_time
-                print(f"✅ Profile HIT (local): {org_id} in {access_time:.2f}ms")
-                return profile
-            else:
-                # Expired, remove
-                del self._local_cache[org_id]
-        
-        # Tier 2: Check Redis cache
-        if self.redis_client:
-            try:
-                cache_key = f"profile:{org_id}"
-                redis_data = await self.redis_client.get(cache_key)
-                if redis_data:
-                    profile = json.loads(redis_data)
-                    # Promote to local cache
-                    self._local_cache[org_id] = (profile, time.time() + self.LOCAL_TTL)
-                    access_time = (time.time() - start_time) * 1000
-                    self._cache_stats["hits"] += 1
-                    self._cache_stats["total_access_time"] += access_time
-                    print(f"✅ Profile HIT (Redis): {org_id} in {access_time:.2f}ms")
-                    return profile
-            except Exception as e:
-                print(f"⚠️ Redis read failed: {e}")
+        # Tier 1 + 2: local L1, then Redis L2 (promoted to L1 on hit)
+        profile = await self.tiered.get(PROFILE_NAMESPACE, org_id)
+        if profile is not None:
+            access_time = (time.time() - start_time) * 1000
+            self._cache_stats["hits"] += 1
+            self._cache_stats["total_access_time"] += access_time
+            print(f"✅ Profile HIT: {org_id} in {access_time:.2f}ms")
+            return profile
         
         # Tier 3: Query MongoDB
         if not db:
@@ -131,14 +113,8 @@ class BusinessProfileCache:
                 self._cache_stats["misses"] += 1
                 self._cache_stats["total_access_time"] += access_time
                 
-                # Store in both caches
-                self._local_cache[org_id] = (profile, time.time() + self.LOCAL_TTL)
-                if self.redis_client:
-                    try:
-                        cache_key = f"profile:{org_id}"
-                        await self.redis_client.setex(cache_key, self.REDIS_TTL, json.dumps(profile, default=str))
-                    except Exception as e:
-                        print(f"⚠️ Redis write failed: {e}")
+                # Store in both tiers
+                await self.tiered.set(PROFILE_NAMESPACE, org_id, profile)
                 
                 print(f"📊 Profile FETCH (MongoDB): {org_id} in {access_time:.2f}ms")
                 return profile
@@ -208,17 +184,8 @@ class BusinessProfileCache:
         try:
             self._cache_stats["invalidations"] += 1
             
-            # Clear local cache
-            if org_id in self._local_cache:
-                del self._local_cache[org_id]
-            
-            # Clear Redis cache
-            if self.redis_client:
-                try:
-                    cache_key = f"profile:{org_id}"
-                    await self.redis_client.delete(cache_key)
-                except Exception as e:
-                    print(f"⚠️ Redis invalidation failed: {e}")
+            # Clear both tiers here and L1 on every other worker
+            await self.tiered.delete(PROFILE_NAMESPACE, org_id)
             
             print(f"🗑️ Profile cache invalidated: {org_id}")
             return True
@@ -250,13 +217,9 @@ class BusinessProfileCache:
         
         # Try local cache first
         for org_id in org_ids:
-            if org_id in self._local_cache:
-                profile, expiry = self._local_cache[org_id]
-                if time.time() < expiry:
-                    profiles[org_id] = profile
-                else:
-                    del self._local_cache[org_id]
-                    missing_ids.append(org_id)
+            profile = self.tiered.local_get(PROFILE_NAMESPACE, org_id)
+            if profile is not None:
+                profiles[org_id] = profile
             else:
                 missing_ids.append(org_id)
         
@@ -272,7 +235,7 @@ class BusinessProfileCache:
                     org_id = profile.get("id")
                     profiles[org_id] = profile
                     # Cache each one
-                    self._local_cache[org_id] = (profile, time.time() + self.LOCAL_TTL)
+                    self.tiered.local_set(PROFILE_NAMESPACE, org_id, profile)
             except Exception as e:
                 print(f"❌ Batch fetch error: {e}")
         
@@ -292,15 +255,16 @@ class BusinessProfileCache:
             "profile_updates": self._cache_stats["updates"],
             "cache_invalidations": self._cache_stats["invalidations"],
             "avg_access_time_ms": f"{avg_access_time:.2f}ms",
-            "local_cache_size": len(self._local_cache),
-            "memory_usage": self._estimate_memory_usage()
+            "local_cache_size": len(self.tiered.namespace(PROFILE_NAMESPACE).store),
+            "memory_usage": self._estimate_memory_usage(),
+            "tiered": self.tiered.namespace(PROFILE_NAMESPACE).get_stats()
         }
     
     def _estimate_memory_usage(self) -> str:
         """Estimate memory usage of cache"""
         total_size = 0
-        for profile, _ in self._local_cache.values():
-            total_size += len(json.dumps(profile))
+        for entry in self.tiered.namespace(PROFILE_NAMESPACE).store.values():
+            total_size += len(json.dumps(entry[0], default=str))
         
         if total_size < 1024:
             return f"{total_size}B"
@@ -311,7 +275,7 @@ class BusinessProfileCache:
     
     def clear_all_caches(self):
         """Clear all local caches (for maintenance/testing)"""
-        self._local_cache.clear()
+        self.tiered.clear(PROFILE_NAMESPACE)
         self._cache_stats = {
             "hits": 0,
             "misses": 0,
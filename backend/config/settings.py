@@ -34,5 +34,14 @@ class Settings:
     request_queue_max_size: int = int(os.getenv("REQUEST_QUEUE_MAX_SIZE", "1000"))
     request_timeout_seconds: float = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "30.0"))
 
+    # Order side-effects pipeline
+    side_effect_workers: int = int(os.getenv("SIDE_EFFECT_WORKERS", "4"))
+    side_effect_queue_max_size: int = int(os.getenv("SIDE_EFFECT_QUEUE_MAX_SIZE", "1000"))
+    side_effect_flush_ms: int = int(os.getenv("SIDE_EFFECT_FLUSH_MS", "50"))
+
+    # Invoice numbering (block size 1 or gap-free = one counter round-trip per order)
+    invoice_block_size: int = int(os.getenv("INVOICE_BLOCK_SIZE", "10"))
+    invoice_gap_free: bool = os.getenv("INVOICE_GAP_FREE", "false").lower() == "true"
+
 
 settings = Settings()
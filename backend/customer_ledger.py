@@ -0,0 +1,756 @@
+"""
+Customer Ledger
+===============
+
+Running per-customer totals for the customer balances report and the
+customer detail page:
+- One `customer_ledger` document per org per customer (keyed by phone):
+  outstanding balance, total ordered, total paid, order count, credit order
+  count and last order date
+- Incremental $inc updates whenever a closed order is completed, paid,
+  edited, re-opened, cancelled or deleted (same hook as the sales rollups)
+- Idempotent: each order records the contribution it applied, so repeated
+  or concurrent syncs never double count
+- Lazy one-time backfill per org, plus a reconciliation job that rebuilds
+  an org's ledger from its orders into fresh documents and swaps them in
+  per customer. The rebuild holds a lease on `customer_ledger_state`;
+  syncs and retractions on any worker that see the lease are queued on the
+  state document and applied by the rebuild after the swap
+- A sync that read "no lease" but lands more than SYNC_SETTLE_SECONDS later
+  can still drift the ledger; the next reconciliation repairs it
+- Backfill state carries a generation that reset_organization bumps; every
+  worker re-reads it at most STATE_CHECK_INTERVAL seconds after trusting it
+
+Walk-in orders without a phone only get a ledger entry (per order, as in
+the original report) while they carry an outstanding balance.
+
+PERFORMANCE TARGETS:
+- Balances report: O(customers with a balance), no order scans
+- Correct totals for any order history (no to_list(2000) caps)
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from sales_rollups import ROLLUP_STATUSES
+
+# Only the fields needed to compute a contribution are read from orders
+ORDER_LEDGER_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "status": 1,
+    "total": 1,
+    "payment_received": 1,
+    "balance_amount": 1,
+    "customer_name": 1,
+    "customer_phone": 1,
+    "created_at": 1,
+    "ledger_sig": 1,
+    "ledger_applied": 1,
+}
+
+# Open credit orders listed per customer in the balances report
+CREDIT_ORDER_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "created_at": 1,
+    "total": 1,
+    "payment_received": 1,
+    "balance_amount": 1,
+    "table_number": 1,
+    "customer_phone": 1,
+}
+
+BACKFILL_BATCH_SIZE = 500
+
+# Reconciliation lease on the org's customer_ledger_state document (renewed per batch)
+REBUILD_LEASE_SECONDS = 120
+# A rebuild waits this long after taking the lease so syncs already past the check land first
+SYNC_SETTLE_SECONDS = 2
+# Pending deletions: tickets outlive any retraction by far, then expire
+RETRACTION_TTL_SECONDS = 86400
+
+
+def _to_number(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _rebuild_running(state: Optional[Dict]) -> bool:
+    until = (state or {}).get("rebuild_lease_until")
+    if until is None:
+        return False
+    if until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+    return until > datetime.now(timezone.utc)
+
+
+def _generation(state: Optional[Dict]) -> int:
+    return (state or {}).get("generation", 0)
+
+
+def _is_backfilled(state: Optional[Dict]) -> bool:
+    """Backfilled for the current generation (documents from before generations count as 0)"""
+    if not state or not state.get("backfilled_at"):
+        return False
+    return state.get("backfilled_generation", 0) == _generation(state)
+
+
+def customer_key(phone: Any, order_id: Optional[str] = None) -> str:
+    """Ledger key for an order's customer ("unknown_<order_id>" for walk-ins)"""
+    phone = str(phone).strip() if phone is not None else ""
+    if phone:
+        return phone
+    return f"unknown_{order_id or 'no_id'}"
+
+
+def build_contribution(order: Dict) -> Optional[Dict]:
+    """What an order adds to its customer's ledger (None when it does not count)"""
+    if order.get("status") not in ROLLUP_STATUSES:
+        return None
+    balance = max(0.0, _to_number(order.get("balance_amount")))
+    phone = str(order.get("customer_phone") or "").strip()
+    if not phone and balance <= 0:
+        return None
+    created_at = order.get("created_at")
+    return {
+        "key": customer_key(phone, order.get("id")),
+        "customer_phone": phone or "No Phone",
+        "customer_name": order.get("customer_name") or "Unknown Customer",
+        "total": _to_number(order.get("total")),
+        "paid": _to_number(order.get("payment_received")),
+        "balance": balance,
+        "last_order_date": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+    }
+
+
+def contribution_signature(contribution: Optional[Dict]) -> Optional[str]:
+    if contribution is None:
+        return None
+    payload = json.dumps(contribution, sort_keys=True, default=str)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+class _LedgerAccumulator:
+    """Merges many contributions into one update per customer"""
+
+    def __init__(self):
+        self._customers: Dict[str, Dict[str, Dict]] = {}
+
+    def add(self, contribution: Dict, sign: int = 1):
+        update = self._customers.setdefault(contribution["key"], {"$inc": {}, "$set": {}, "$max": {}})
+        inc = update["$inc"]
+
+        def _inc(field, amount):
+            inc[field] = inc.get(field, 0) + amount
+
+        _inc("total_orders", sign)
+        _inc("total_amount_ordered", sign * contribution["total"])
+        _inc("total_paid", sign * contribution["paid"])
+        _inc("balance_amount", sign * contribution["balance"])
+        _inc("credit_orders_count", sign if contribution["balance"] > 0 else 0)
+        if sign > 0:
+            update["$set"]["customer_name"] = contribution["customer_name"]
+            update["$set"]["customer_phone"] = contribution["customer_phone"]
+            if contribution.get("last_order_date"):
+                update["$max"]["last_order_date"] = contribution["last_order_date"]
+
+    def keys(self) -> List[str]:
+        return list(self._customers)
+
+    def operations(self, organization_id: str) -> List[UpdateOne]:
+        now = datetime.now(timezone.utc).isoformat()
+        ops = []
+        for key, update in self._customers.items():
+            update["$set"]["updated_at"] = now
+            ops.append(UpdateOne(
+                {"_id": f"{organization_id}:{key}"},
+                {
+                    **{op: fields for op, fields in update.items() if fields},
+                    "$setOnInsert": {"organization_id": organization_id, "customer_key": key},
+                },
+                upsert=True,
+            ))
+        return ops
+
+
+class CustomerLedgerService:
+    """Maintains and queries the per-customer `customer_ledger` collection"""
+
+    def __init__(self, db):
+        self.db = db
+        # org -> when this worker last confirmed the backfill state document
+        self._backfilled_orgs: Dict[str, float] = {}
+        # Serializes ledger writes per org: syncs, backfill and reconciliation
+        self._org_locks: Dict[str, asyncio.Lock] = {}
+        self._stats = {
+            "syncs": 0,
+            "applied": 0,
+            "skipped": 0,
+            "backfilled_orders": 0,
+            "deferred": 0,
+            "reconciliations": 0,
+            "reconciled_orders": 0,
+            "rebuild_conflicts": 0,
+        }
+
+        # How long a worker trusts "backfilled" before re-reading the shared generation
+        self.STATE_CHECK_INTERVAL = 5
+
+    async def ensure_indexes(self):
+        await self.db.customer_ledger.create_index([("organization_id", 1), ("balance_amount", -1)])
+        await self.db.customer_ledger.create_index([("organization_id", 1), ("customer_key", 1)])
+        await self.db.customer_ledger_state.create_index("organization_id")
+        await self.db.customer_ledger_retractions.create_index("organization_id")
+        await self.db.customer_ledger_retractions.create_index("created_at", expireAfterSeconds=RETRACTION_TTL_SECONDS)
+        # Open credit orders for the report, order history for the customer page
+        await self.db.orders.create_index([("organization_id", 1), ("balance_amount", 1)])
+        await self.db.orders.create_index([("organization_id", 1), ("customer_phone", 1), ("created_at", -1)])
+
+    def _org_lock(self, organization_id: str) -> asyncio.Lock:
+        return self._org_locks.setdefault(organization_id, asyncio.Lock())
+
+    async def _apply(self, organization_id: str, accumulator: _LedgerAccumulator):
+        ops = accumulator.operations(organization_id)
+        if not ops:
+            return
+        await self.db.customer_ledger.bulk_write(ops, ordered=False)
+        # Drop entries whose last order left the ledger (mostly walk-in credit orders)
+        await self.db.customer_ledger.delete_many({
+            "_id": {"$in": [f"{organization_id}:{key}" for key in accumulator.keys()]},
+            "total_orders": {"$lte": 0},
+        })
+
+    # ============ INCREMENTAL MAINTENANCE ============
+
+    async def sync_order(self, order_id: str, organization_id: str) -> bool:
+        """
+        Bring the ledger in line with an order's current state.
+
+        Safe to call after any order write: the previously applied contribution
+        is reversed and the new one applied only if it changed.
+        """
+        self._stats["syncs"] += 1
+        try:
+            if await self._defer(organization_id, "deferred_syncs", order_id):
+                return False
+            async with self._org_lock(organization_id):
+                return await self._sync_order(order_id, organization_id)
+        except Exception as e:
+            print(f"❌ Customer ledger sync error for order {order_id}: {e}")
+            return False
+
+    async def _sync_order(self, order_id: str, organization_id: str) -> bool:
+        order = await self.db.orders.find_one(
+            {"id": order_id, "organization_id": organization_id},
+            ORDER_LEDGER_PROJECTION,
+        )
+        if not order:
+            return False
+
+        contribution = build_contribution(order)
+        new_sig = contribution_signature(contribution)
+        old_sig = order.get("ledger_sig")
+        if new_sig == old_sig:
+            self._stats["skipped"] += 1
+            return False
+
+        # Compare-and-swap on the signature so concurrent syncs apply exactly once
+        if contribution:
+            swap = {"$set": {"ledger_sig": new_sig, "ledger_applied": contribution}}
+        else:
+            swap = {"$unset": {"ledger_sig": "", "ledger_applied": ""}}
+        result = await self.db.orders.update_one(
+            {"id": order_id, "organization_id": organization_id, "ledger_sig": old_sig},
+            swap,
+        )
+        if result.modified_count == 0:
+            self._stats["skipped"] += 1
+            return False
+
+        accumulator = _LedgerAccumulator()
+        if order.get("ledger_applied"):
+            accumulator.add(order["ledger_applied"], -1)
+        if contribution:
+            accumulator.add(contribution, 1)
+        await self._apply(organization_id, accumulator)
+        self._stats["applied"] += 1
+        return True
+
+    async def _defer(self, organization_id: str, field: str, item: str) -> bool:
+        """Queue a write on the state document while a rebuild holds the lease; True if queued"""
+        result = await self.db.customer_ledger_state.update_one(
+            {"_id": organization_id, "rebuild_lease_until": {"$gt": datetime.now(timezone.utc)}},
+            {"$addToSet": {field: item}},
+        )
+        if result.matched_count:
+            self._stats["deferred"] += 1
+            return True
+        return False
+
+    async def begin_retraction(self, order: Dict) -> Optional[str]:
+        """
+        Call before deleting an order, then pass the ticket to retract_order.
+
+        The ticket is stored in `customer_ledger_retractions`; a reconciliation
+        on any worker that runs between the delete and the retraction marks it
+        with whether it counted the order, so it is subtracted once.
+        """
+        applied = (order or {}).get("ledger_applied")
+        organization_id = (order or {}).get("organization_id")
+        if not applied or not organization_id:
+            return None
+        ticket_id = str(uuid.uuid4())
+        try:
+            await self.db.customer_ledger_retractions.insert_one({
+                "_id": ticket_id,
+                "organization_id": organization_id,
+                "order_id": order.get("id"),
+                "applied": applied,
+                "rebuilt": False,
+                "counted": False,
+                "created_at": datetime.now(timezone.utc),
+            })
+        except Exception as e:
+            print(f"⚠️ Customer ledger retraction ticket error for order {order.get('id')}: {e}")
+            return None
+        return ticket_id
+
+    async def retract_order(self, order: Dict, retraction: Optional[str] = None) -> bool:
+        """Reverse a deleted order's contribution (pass the document read before deletion)"""
+        organization_id = (order or {}).get("organization_id")
+        try:
+            ticket_id = retraction or await self.begin_retraction(order)
+            if not ticket_id:
+                return False
+            if await self._defer(organization_id, "deferred_retractions", ticket_id):
+                return False
+            async with self._org_lock(organization_id):
+                return await self._retract(organization_id, ticket_id)
+        except Exception as e:
+            print(f"❌ Customer ledger retract error for order {order.get('id')}: {e}")
+            return False
+
+    async def _retract(self, organization_id: str, ticket_id: str) -> bool:
+        ticket = await self.db.customer_ledger_retractions.find_one_and_delete({"_id": ticket_id})
+        if not ticket:
+            return False
+        if ticket.get("rebuilt") and not ticket.get("counted"):
+            # Rebuilt from orders after the delete - never counted
+            self._stats["skipped"] += 1
+            return False
+        accumulator = _LedgerAccumulator()
+        accumulator.add(ticket["applied"], -1)
+        await self._apply(organization_id, accumulator)
+        return True
+
+    # ============ BACKFILL / RECONCILIATION ============
+
+    async def ensure_backfilled(self, organization_id: str):
+        """Fold pre-existing history into the ledger once per organization (and after each reset)"""
+        if time.time() - self._backfilled_orgs.get(organization_id, 0) < self.STATE_CHECK_INTERVAL:
+            return
+        async with self._org_lock(organization_id):
+            if time.time() - self._backfilled_orgs.get(organization_id, 0) < self.STATE_CHECK_INTERVAL:
+                return
+            state = await self.db.customer_ledger_state.find_one({"_id": organization_id})
+            if _rebuild_running(state):
+                return  # The rebuild counts every order; serve the current ledger meanwhile
+            if _is_backfilled(state):
+                self._backfilled_orgs[organization_id] = time.time()
+                return
+            self._backfilled_orgs.pop(organization_id, None)
+            await self.backfill_organization(organization_id)
+            await self._mark_backfilled(organization_id, _generation(state))
+
+    async def _mark_backfilled(self, organization_id: str, generation: int):
+        """Record the backfill unless the org was reset (generation bumped) since it started"""
+        try:
+            result = await self.db.customer_ledger_state.update_one(
+                {"_id": organization_id, "generation": generation if generation else {"$in": [0, None]}},
+                {"$set": {
+                    "organization_id": organization_id,
+                    "backfilled_at": datetime.now(timezone.utc).isoformat(),
+                    "backfilled_generation": generation,
+                }},
+                upsert=not generation,
+            )
+        except DuplicateKeyError:
+            return  # Reset between our read and this write
+        if result.matched_count or result.upserted_id is not None:
+            self._backfilled_orgs[organization_id] = time.time()
+
+    async def backfill_organization(self, organization_id: str) -> int:
+        """
+        Apply every closed order that has no ledger signature yet.
+
+        Orders are claimed with a per-run token before being counted, so an
+        order synced concurrently by a request is never counted twice.
+        """
+        token = str(uuid.uuid4())
+        cursor = self.db.orders.find(
+            {
+                "organization_id": organization_id,
+                "status": {"$in": list(ROLLUP_STATUSES)},
+                "ledger_sig": {"$exists": False},
+            },
+            ORDER_LEDGER_PROJECTION,
+        ).batch_size(BACKFILL_BATCH_SIZE)
+
+        applied = 0
+        batch: List[Dict] = []
+        async for order in cursor:
+            batch.append(order)
+            if len(batch) >= BACKFILL_BATCH_SIZE:
+                applied += await self._backfill_batch(organization_id, batch, token)
+                batch = []
+        if batch:
+            applied += await self._backfill_batch(organization_id, batch, token)
+
+        self._stats["backfilled_orders"] += applied
+        print(f"📒 Customer ledger backfilled for {organization_id}: {applied} orders")
+        return applied
+
+    async def _backfill_batch(self, organization_id: str, orders: List[Dict], token: str) -> int:
+        contributions = {}
+        claims = []
+        for order in orders:
+            contribution = build_contribution(order)
+            if not contribution:
+                continue
+            contributions[order["id"]] = contribution
+            claims.append(UpdateOne(
+                {"id": order["id"], "organization_id": organization_id, "ledger_sig": {"$exists": False}},
+                {"$set": {
+                    "ledger_sig": contribution_signature(contribution),
+                    "ledger_applied": contribution,
+                    "ledger_backfill": token,
+                }},
+            ))
+        if not claims:
+            return 0
+
+        result = await self.db.orders.bulk_write(claims, ordered=False)
+        claimed_ids = list(contributions.keys())
+        if result.modified_count < len(claims):
+            claimed = await self.db.orders.find(
+                {"id": {"$in": claimed_ids}, "ledger_backfill": token}, {"_id": 0, "id": 1}
+            ).to_list(None)
+            claimed_ids = [o["id"] for o in claimed]
+
+        accumulator = _LedgerAccumulator()
+        for order_id in claimed_ids:
+            accumulator.add(contributions[order_id], 1)
+        await self._apply(organization_id, accumulator)
+        return len(claimed_ids)
+
+    async def reset_organization(self, organization_id: str):
+        """
+        Drop an org's ledger and signatures so the next read rebuilds it from orders.
+
+        The generation is bumped last, once the org is clean, so other workers
+        pick up the reset within STATE_CHECK_INTERVAL and backfill from scratch.
+        """
+        await self.db.customer_ledger.delete_many({"organization_id": organization_id})
+        await self.db.orders.update_many(
+            {"organization_id": organization_id, "ledger_sig": {"$exists": True}},
+            {"$unset": {"ledger_sig": "", "ledger_applied": "", "ledger_backfill": ""}},
+        )
+        await self.db.customer_ledger_state.update_one(
+            {"_id": organization_id},
+            {"$inc": {"generation": 1}, "$set": {"organization_id": organization_id}},
+            upsert=True,
+        )
+        self._backfilled_orgs.pop(organization_id, None)
+
+    async def reconcile_organization(self, organization_id: str) -> int:
+        """
+        Rebuild an org's ledger from its orders (repairs drift; run off-peak).
+
+        Nothing is reset in place: totals are computed into fresh documents and
+        replaced per customer while this worker holds the org's rebuild lease.
+        Syncs and retractions that arrive meanwhile (on any worker) are queued
+        on the state document and applied here after the swap. Returns the
+        number of customers, or 0 if another worker is already rebuilding.
+        """
+        lease = await self._acquire_rebuild_lease(organization_id)
+        if lease is None:
+            print(f"⚠️ Customer ledger reconcile for {organization_id} already running elsewhere")
+            return 0
+
+        self._stats["reconciliations"] += 1
+        counted: set = set()
+        customers = 0
+        async with self._org_lock(organization_id):
+            try:
+                await asyncio.sleep(SYNC_SETTLE_SECONDS)
+                generation = _generation(await self.db.customer_ledger_state.find_one({"_id": organization_id}))
+                # A claim that lost its compare-and-swap means a write slipped past the lease: scan again
+                for _attempt in range(3):
+                    counted.clear()
+                    fresh, conflicts = await self._rebuild_totals(organization_id, lease, counted)
+                    if not conflicts:
+                        break
+                    self._stats["rebuild_conflicts"] += conflicts
+                await self._mark_retractions(organization_id, counted)
+                customers = await self._swap_in(organization_id, fresh)
+                await self._mark_backfilled(organization_id, generation)
+            finally:
+                await self._release_rebuild_lease(organization_id, lease)
+
+        self._stats["reconciled_orders"] += len(counted)
+        print(f"📒 Customer ledger reconciled for {organization_id}: "
+              f"{len(counted)} orders, {customers} customers")
+        return customers
+
+    async def _acquire_rebuild_lease(self, organization_id: str) -> Optional[str]:
+        now = datetime.now(timezone.utc)
+        await self.db.customer_ledger_state.update_one(
+            {"_id": organization_id},
+            {"$setOnInsert": {"organization_id": organization_id}},
+            upsert=True,
+        )
+        lease = str(uuid.uuid4())
+        taken = await self.db.customer_ledger_state.find_one_and_update(
+            {"_id": organization_id, "$or": [
+                {"rebuild_lease_until": {"$exists": False}},
+                {"rebuild_lease_until": {"$lte": now}},
+            ]},
+            {"$set": {
+                "rebuild_lease": lease,
+                "rebuild_lease_until": now + timedelta(seconds=REBUILD_LEASE_SECONDS),
+                "deferred_syncs": [],
+                "deferred_retractions": [],
+            }},
+        )
+        return lease if taken else None
+
+    async def _renew_rebuild_lease(self, organization_id: str, lease: str):
+        result = await self.db.customer_ledger_state.update_one(
+            {"_id": organization_id, "rebuild_lease": lease},
+            {"$set": {"rebuild_lease_until": datetime.now(timezone.utc) + timedelta(seconds=REBUILD_LEASE_SECONDS)}},
+        )
+        if result.matched_count == 0:
+            raise RuntimeError(f"customer ledger rebuild lease lost for {organization_id}")
+
+    async def _release_rebuild_lease(self, organization_id: str, lease: str):
+        """Apply the queued syncs/retractions, then drop the lease once nothing is queued"""
+        state = self.db.customer_ledger_state
+        while True:
+            queued = await state.find_one_and_update(
+                {"_id": organization_id, "rebuild_lease": lease},
+                {"$set": {"deferred_syncs": [], "deferred_retractions": []}},
+                {"deferred_syncs": 1, "deferred_retractions": 1},
+            )
+            if queued is None:
+                return  # Lease expired and was taken over; the new holder drains the queue
+            order_ids = queued.get("deferred_syncs") or []
+            ticket_ids = queued.get("deferred_retractions") or []
+            if not order_ids and not ticket_ids:
+                released = await state.update_one(
+                    {"_id": organization_id, "rebuild_lease": lease,
+                     "deferred_syncs": {"$size": 0}, "deferred_retractions": {"$size": 0}},
+                    {"$unset": {"rebuild_lease": "", "rebuild_lease_until": ""}},
+                )
+                if released.modified_count:
+                    return
+                continue
+            for order_id in order_ids:
+                await self._sync_order(order_id, organization_id)
+            for ticket_id in ticket_ids:
+                await self._retract(organization_id, ticket_id)
+
+    async def _rebuild_totals(self, organization_id: str, lease: str, counted: set):
+        """Recompute every order's contribution; returns (fresh per-customer totals, lost claims)"""
+        fresh: Dict[str, Dict[str, Any]] = {}
+        claims: List[UpdateOne] = []
+        conflicts = 0
+
+        async def _flush():
+            nonlocal claims, conflicts
+            if claims:
+                result = await self.db.orders.bulk_write(claims, ordered=False)
+                conflicts += len(claims) - result.modified_count
+                claims = []
+            await self._renew_rebuild_lease(organization_id, lease)
+
+        cursor = self.db.orders.find(
+            {
+                "organization_id": organization_id,
+                "$or": [{"status": {"$in": list(ROLLUP_STATUSES)}}, {"ledger_sig": {"$exists": True}}],
+            },
+            ORDER_LEDGER_PROJECTION,
+        ).batch_size(BACKFILL_BATCH_SIZE)
+
+        scanned = 0
+        async for order in cursor:
+            scanned += 1
+            contribution = build_contribution(order)
+            sig = contribution_signature(contribution)
+            if sig != order.get("ledger_sig"):
+                # Re-point the order's applied contribution so later syncs diff against it;
+                # compare-and-swap on the signature read, so a concurrent sync is detected
+                if contribution:
+                    swap = {"$set": {"ledger_sig": sig, "ledger_applied": contribution}}
+                else:
+                    swap = {"$unset": {"ledger_sig": "", "ledger_applied": "", "ledger_backfill": ""}}
+                claims.append(UpdateOne(
+                    {"id": order["id"], "organization_id": organization_id, "ledger_sig": order.get("ledger_sig")},
+                    swap,
+                ))
+            if len(claims) >= BACKFILL_BATCH_SIZE or scanned % BACKFILL_BATCH_SIZE == 0:
+                await _flush()
+            if not contribution:
+                continue
+            counted.add(order["id"])
+
+            entry = fresh.setdefault(contribution["key"], {
+                "total_orders": 0,
+                "total_amount_ordered": 0.0,
+                "total_paid": 0.0,
+                "balance_amount": 0.0,
+                "credit_orders_count": 0,
+                "last_order_date": None,
+            })
+            entry["total_orders"] += 1
+            entry["total_amount_ordered"] += contribution["total"]
+            entry["total_paid"] += contribution["paid"]
+            entry["balance_amount"] += contribution["balance"]
+            entry["credit_orders_count"] += 1 if contribution["balance"] > 0 else 0
+            latest = contribution.get("last_order_date")
+            if "customer_name" not in entry or (latest and (not entry["last_order_date"] or latest >= entry["last_order_date"])):
+                entry["customer_name"] = contribution["customer_name"]
+                entry["customer_phone"] = contribution["customer_phone"]
+            if latest and (not entry["last_order_date"] or latest > entry["last_order_date"]):
+                entry["last_order_date"] = latest
+        await _flush()
+        return fresh, conflicts
+
+    async def _mark_retractions(self, organization_id: str, counted: set):
+        """Tell pending retraction tickets whether this rebuild counted their (deleted) order"""
+        pending = [
+            ticket["order_id"]
+            async for ticket in self.db.customer_ledger_retractions.find(
+                {"organization_id": organization_id}, {"order_id": 1}
+            )
+        ]
+        if not pending:
+            return
+        was_counted = [order_id for order_id in pending if order_id in counted]
+        await self.db.customer_ledger_retractions.update_many(
+            {"organization_id": organization_id, "order_id": {"$in": was_counted}},
+            {"$set": {"rebuilt": True, "counted": True}},
+        )
+        await self.db.customer_ledger_retractions.update_many(
+            {"organization_id": organization_id, "order_id": {"$nin": was_counted}},
+            {"$set": {"rebuilt": True, "counted": False}},
+        )
+
+    async def _swap_in(self, organization_id: str, fresh: Dict[str, Dict[str, Any]]) -> int:
+        """Replace each customer document with its rebuilt totals; drop customers with none"""
+        rebuilt_at = datetime.now(timezone.utc).isoformat()
+        replacements = [
+            ReplaceOne(
+                {"_id": f"{organization_id}:{key}"},
+                {
+                    **entry,
+                    "organization_id": organization_id,
+                    "customer_key": key,
+                    "updated_at": rebuilt_at,
+                    "rebuilt_at": rebuilt_at,
+                },
+                upsert=True,
+            )
+            for key, entry in fresh.items()
+        ]
+        for start in range(0, len(replacements), BACKFILL_BATCH_SIZE):
+            await self.db.customer_ledger.bulk_write(replacements[start:start + BACKFILL_BATCH_SIZE], ordered=False)
+        await self.db.customer_ledger.delete_many({
+            "organization_id": organization_id,
+            "rebuilt_at": {"$ne": rebuilt_at},
+        })
+        return len(fresh)
+
+    # ============ QUERYING ============
+
+    async def get_balances(self, organization_id: str, recent_credit_orders: int = 5) -> List[Dict[str, Any]]:
+        """Customers with an outstanding balance, highest first, with their latest credit orders"""
+        await self.ensure_backfilled(organization_id)
+        entries = await self.db.customer_ledger.find(
+            {"organization_id": organization_id, "balance_amount": {"$gt": 0.005}},
+            {"_id": 0},
+        ).sort("balance_amount", -1).to_list(None)
+        if not entries:
+            return []
+
+        credit_orders: Dict[str, List[Dict]] = {}
+        async for order in self.db.orders.find(
+            {
+                "organization_id": organization_id,
+                "status": {"$in": list(ROLLUP_STATUSES)},
+                "balance_amount": {"$gt": 0},
+            },
+            CREDIT_ORDER_PROJECTION,
+        ).sort("created_at", 1):
+            credit_orders.setdefault(customer_key(order.get("customer_phone"), order.get("id")), []).append({
+                "order_id": order.get("id"),
+                "date": order.get("created_at"),
+                "total": _to_number(order.get("total")),
+                "paid": _to_number(order.get("payment_received")),
+                "balance": _to_number(order.get("balance_amount")),
+                "table_number": order.get("table_number", "N/A"),
+            })
+
+        return [
+            {
+                "customer_name": entry.get("customer_name"),
+                "customer_phone": entry.get("customer_phone"),
+                "balance_amount": round(entry.get("balance_amount", 0), 2),
+                "total_orders": entry.get("total_orders", 0),
+                "total_amount_ordered": round(entry.get("total_amount_ordered", 0), 2),
+                "total_paid": round(entry.get("total_paid", 0), 2),
+                "last_order_date": entry.get("last_order_date"),
+                "credit_orders_count": entry.get("credit_orders_count", 0),
+                "credit_orders": credit_orders.get(entry.get("customer_key"), [])[-recent_credit_orders:],
+            }
+            for entry in entries
+        ]
+
+    async def get_customer(self, organization_id: str, phone: Any) -> Optional[Dict[str, Any]]:
+        """Ledger entry for one customer phone"""
+        await self.ensure_backfilled(organization_id)
+        key = str(phone).strip() if phone is not None else ""
+        if not key:
+            return None
+        return await self.db.customer_ledger.find_one(
+            {"_id": f"{organization_id}:{key}"}, {"_id": 0}
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "backfilled_orgs": len(self._backfilled_orgs)}
+
+
+# Global instance
+_customer_ledger_service: Optional[CustomerLedgerService] = None
+
+
+def init_customer_ledger_service(db) -> CustomerLedgerService:
+    """Initialize the customer ledger service against the active database"""
+    global _customer_ledger_service
+    _customer_ledger_service = CustomerLedgerService(db)
+    return _customer_ledger_service
+
+
+def get_customer_ledger_service() -> Optional[CustomerLedgerService]:
+    """Get the global customer ledger service instance"""
+    return _customer_ledger_service
@@ -0,0 +1,382 @@
+"""
+Day Book Snapshots
+==================
+
+Immutable per-day close snapshots for the Day Book (cash flow) report and
+its PDF/Excel/CSV exports:
+- One `daybook_snapshots` document per org per closed (UTC) day: inflows by
+  payment method, outflows by category, closing balance, counts and the
+  day's transaction entries
+- Written lazily on first access after the day ends, or by the daily close
+  job for every org that traded that day
+- Back-dated edits (closing/editing/deleting an older order, expense changes
+  on a past date) mark the day stale; a version counter guards against a
+  snapshot computed from pre-edit data overwriting the invalidation
+- Ranges read closed days from snapshots and compute only today live;
+  a range is capped at MAX_RANGE_DAYS so one request can't upsert years
+  of empty-day documents
+
+PERFORMANCE TARGETS:
+- 90-day Day Book range: one indexed snapshot read (milliseconds)
+- Exports: no order/expense scans for closed days
+- Correct totals for any number of orders per day (no to_list(1000) caps)
+"""
+
+import asyncio
+from datetime import date as date_cls, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from sales_rollups import ROLLUP_STATUSES, parse_order_datetime
+
+# Only the fields the Day Book needs are read from orders / expenses
+DAYBOOK_ORDER_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "created_at": 1,
+    "total": 1,
+    "payment_received": 1,
+    "payment_method": 1,
+    "cash_amount": 1,
+    "card_amount": 1,
+    "upi_amount": 1,
+    "invoice_number": 1,
+    "table_number": 1,
+}
+DAYBOOK_EXPENSE_PROJECTION = {"_id": 0, "id": 1, "date": 1, "amount": 1, "category": 1, "description": 1}
+
+# Day-close job: how long after UTC midnight the previous day is snapshotted
+CLOSE_DELAY_SECONDS = 600
+
+# Longest range one request may read; every closed day in it gets a snapshot document
+MAX_RANGE_DAYS = 366
+
+
+def _amount(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _utc_today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _day_range(start: str, end: str) -> List[str]:
+    first, last = date_cls.fromisoformat(start), date_cls.fromisoformat(end)
+    return [(first + timedelta(days=offset)).isoformat() for offset in range((last - first).days + 1)]
+
+
+def _next_day(day: str) -> str:
+    return (date_cls.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+def empty_day(day: str) -> Dict[str, Any]:
+    return {
+        "date": day,
+        "inflow_breakdown": {"cash": 0, "card": 0, "upi": 0, "other": 0},
+        "outflow_breakdown": {},
+        "total_inflows": 0,
+        "total_outflows": 0,
+        "order_count": 0,
+        "expense_count": 0,
+        "entries": [],
+    }
+
+
+def apply_order(day: Dict[str, Any], order: Dict):
+    """Add a closed order's payment to a day's inflows"""
+    amount = _amount(order.get("payment_received", order.get("total", 0)))
+    payment_method = order.get("payment_method") or "cash"
+    breakdown = day["inflow_breakdown"]
+
+    # Handle split payments
+    if payment_method == "split":
+        cash = _amount(order.get("cash_amount"))
+        card = _amount(order.get("card_amount"))
+        upi = _amount(order.get("upi_amount"))
+        breakdown["cash"] += cash
+        breakdown["card"] += card
+        breakdown["upi"] += upi
+        day["total_inflows"] += cash + card + upi
+    else:
+        breakdown[payment_method if payment_method in breakdown else "other"] += amount
+        day["total_inflows"] += amount
+
+    day["order_count"] += 1
+    day["entries"].append({
+        "timestamp": order.get("created_at"),
+        "type": "inflow",
+        "category": f"Sales-{payment_method.upper()}",
+        "description": f"Order #{order.get('invoice_number', (order.get('id') or '')[:8])} - Table {order.get('table_number', 'Counter')}",
+        "amount": amount,
+        "reference_id": order.get("id"),
+    })
+
+
+def apply_expense(day: Dict[str, Any], expense: Dict):
+    """Add an expense to a day's outflows"""
+    amount = _amount(expense.get("amount"))
+    category = expense.get("category", "Other")
+    day["outflow_breakdown"][category] = day["outflow_breakdown"].get(category, 0) + amount
+    day["total_outflows"] += amount
+    day["expense_count"] += 1
+    day["entries"].append({
+        "timestamp": f"{expense.get('date')}T12:00:00",
+        "type": "outflow",
+        "category": category,
+        "description": expense.get("description", ""),
+        "amount": amount,
+        "reference_id": expense.get("id"),
+    })
+
+
+class DaybookSnapshotService:
+    """Maintains and queries the per-day `daybook_snapshots` collection"""
+
+    def __init__(self, db):
+        self.db = db
+        self._close_task: Optional[asyncio.Task] = None
+        self._stats = {
+            "snapshot_hits": 0,
+            "snapshots_written": 0,
+            "snapshot_races": 0,
+            "live_days": 0,
+            "invalidations": 0,
+        }
+
+    async def ensure_indexes(self):
+        await self.db.daybook_snapshots.create_index([("organization_id", 1), ("date", 1)])
+
+    # ============ COMPUTE ============
+
+    async def compute_days(self, organization_id: str, first: str, last: str) -> Dict[str, Dict]:
+        """Day Book figures for every day in [first, last] straight from orders and expenses"""
+        days = {day: empty_day(day) for day in _day_range(first, last)}
+
+        async for order in self.db.orders.find(
+            {
+                "organization_id": organization_id,
+                "status": {"$in": list(ROLLUP_STATUSES)},
+                "created_at": {"$gte": f"{first}T00:00:00", "$lt": f"{_next_day(last)}T00:00:00"},
+            },
+            DAYBOOK_ORDER_PROJECTION,
+        ):
+            created_at = parse_order_datetime(order.get("created_at"))
+            day = days.get(created_at.strftime("%Y-%m-%d")) if created_at else None
+            if day is not None:
+                apply_order(day, order)
+
+        async for expense in self.db.expenses.find(
+            {"organization_id": organization_id, "date": {"$gte": first, "$lte": last}},
+            DAYBOOK_EXPENSE_PROJECTION,
+        ):
+            day = days.get(expense.get("date"))
+            if day is not None:
+                apply_expense(day, expense)
+
+        for day in days.values():
+            day["entries"].sort(key=lambda x: x.get("timestamp") or "")
+            day["net_cash_flow"] = day["total_inflows"] - day["total_outflows"]
+            day["closing_balance"] = day["net_cash_flow"]
+        return days
+
+    # ============ SNAPSHOTS ============
+
+    async def get_days(self, organization_id: str, start: str, end: str,
+                       include_entries: bool = True) -> List[Dict[str, Any]]:
+        """Per-day figures for a range: snapshots for closed days, live for today"""
+        if (date_cls.fromisoformat(end) - date_cls.fromisoformat(start)).days + 1 > MAX_RANGE_DAYS:
+            raise ValueError(f"Day Book range is limited to {MAX_RANGE_DAYS} days")
+        today = _utc_today()
+        closed_end = min(end, (date_cls.fromisoformat(today) - timedelta(days=1)).isoformat())
+        days: Dict[str, Dict] = {}
+
+        if start <= closed_end:
+            projection = {"_id": 0} if include_entries else {"_id": 0, "entries": 0}
+            async for snapshot in self.db.daybook_snapshots.find(
+                {"organization_id": organization_id, "date": {"$gte": start, "$lte": closed_end}, "stale": False},
+                projection,
+            ):
+                days[snapshot["date"]] = snapshot
+            self._stats["snapshot_hits"] += len(days)
+
+            missing = [day for day in _day_range(start, closed_end) if day not in days]
+            if missing:
+                computed = await self._snapshot_days(organization_id, missing)
+                for day in missing:
+                    days[day] = computed[day]
+
+        if end >= today:
+            live_start = max(start, today)
+            days.update(await self.compute_days(organization_id, live_start, end))
+            self._stats["live_days"] += len(_day_range(live_start, end))
+
+        ordered = [days[day] for day in sorted(days)]
+        if not include_entries:
+            for day in ordered:
+                day.pop("entries", None)
+        return ordered
+
+    async def _snapshot_days(self, organization_id: str, missing: List[str]) -> Dict[str, Dict]:
+        """Compute and store closed days; a day invalidated meanwhile is not stored"""
+        ids = [f"{organization_id}:{day}" for day in missing]
+        versions = {
+            doc["_id"]: doc.get("version", 0)
+            async for doc in self.db.daybook_snapshots.find({"_id": {"$in": ids}}, {"version": 1})
+        }
+        computed = await self.compute_days(organization_id, missing[0], missing[-1])
+        now = datetime.now(timezone.utc).isoformat()
+
+        for day in missing:
+            snapshot_id = f"{organization_id}:{day}"
+            version = versions.get(snapshot_id)
+            guard = {"_id": snapshot_id, "version": version} if version is not None \
+                else {"_id": snapshot_id, "version": {"$exists": False}}
+            try:
+                await self.db.daybook_snapshots.update_one(
+                    guard,
+                    {
+                        "$set": {**computed[day], "stale": False, "closed_at": now},
+                        "$setOnInsert": {"organization_id": organization_id},
+                    },
+                    upsert=True,
+                )
+                self._stats["snapshots_written"] += 1
+            except DuplicateKeyError:
+                # A back-dated edit bumped the version while we were computing
+                self._stats["snapshot_races"] += 1
+        return computed
+
+    async def invalidate_days(self, organization_id: str, days: Iterable[Optional[str]]):
+        """Mark closed days stale after a back-dated edit (today/future days are never stored)"""
+        today = _utc_today()
+        closed = sorted({day for day in days if day and day < today})
+        if not closed:
+            return
+        self._stats["invalidations"] += len(closed)
+        await self.db.daybook_snapshots.bulk_write([
+            UpdateOne(
+                {"_id": f"{organization_id}:{day}"},
+                {
+                    "$set": {"stale": True},
+                    "$inc": {"version": 1},
+                    "$setOnInsert": {"organization_id": organization_id, "date": day},
+                },
+                upsert=True,
+            )
+            for day in closed
+        ], ordered=False)
+
+    async def invalidate_order(self, organization_id: str, created_at: Any):
+        """Mark an order's day stale (called after any write that affects closed orders)"""
+        created = parse_order_datetime(created_at)
+        if created is not None:
+            await self.invalidate_days(organization_id, [created.strftime("%Y-%m-%d")])
+
+    async def reset_organization(self, organization_id: str):
+        """Drop an org's snapshots so every day is recomputed on next access"""
+        await self.db.daybook_snapshots.delete_many({"organization_id": organization_id})
+
+    # ============ REPORT ============
+
+    async def get_range(self, organization_id: str, start: str, end: str,
+                        include_entries: bool = True) -> Dict[str, Any]:
+        """Day Book report for a date range, summed from per-day figures"""
+        days = await self.get_days(organization_id, start, end, include_entries)
+
+        inflow_breakdown = {"cash": 0, "card": 0, "upi": 0, "other": 0}
+        outflow_breakdown: Dict[str, float] = {}
+        entries: List[Dict] = []
+        for day in days:
+            for method, amount in day["inflow_breakdown"].items():
+                inflow_breakdown[method] = inflow_breakdown.get(method, 0) + amount
+            for category, amount in day["outflow_breakdown"].items():
+                outflow_breakdown[category] = outflow_breakdown.get(category, 0) + amount
+            if include_entries:
+                entries.extend(dict(entry) for entry in day.get("entries", []))
+
+        # Running balance over the whole range
+        running_balance = 0
+        for entry in entries:
+            running_balance += entry["amount"] if entry["type"] == "inflow" else -entry["amount"]
+            entry["running_balance"] = running_balance
+
+        total_inflows = sum(day["total_inflows"] for day in days)
+        total_outflows = sum(day["total_outflows"] for day in days)
+        # Opening balance is not carried across days (matches the original report)
+        opening_balance = 0
+        return {
+            "opening_balance": opening_balance,
+            "total_inflows": total_inflows,
+            "total_outflows": total_outflows,
+            "closing_balance": opening_balance + total_inflows - total_outflows,
+            "net_cash_flow": total_inflows - total_outflows,
+            "inflow_breakdown": inflow_breakdown,
+            "outflow_breakdown": outflow_breakdown,
+            "entries": entries,
+            "order_count": sum(day["order_count"] for day in days),
+            "expense_count": sum(day["expense_count"] for day in days),
+        }
+
+    # ============ DAY-CLOSE JOB ============
+
+    async def close_day(self, day: str) -> int:
+        """Snapshot a finished day for every org that had orders or expenses on it"""
+        orgs = set(await self.db.orders.distinct(
+            "organization_id",
+            {"created_at": {"$gte": f"{day}T00:00:00", "$lt": f"{_next_day(day)}T00:00:00"}},
+        ))
+        orgs.update(await self.db.expenses.distinct("organization_id", {"date": day}))
+        for organization_id in orgs:
+            if not organization_id:
+                continue
+            try:
+                await self.get_days(organization_id, day, day, include_entries=False)
+            except Exception as e:
+                print(f"⚠️ Day Book close failed for {organization_id} on {day}: {e}")
+        print(f"📒 Day Book closed {day} for {len(orgs)} organizations")
+        return len(orgs)
+
+    def start_close_job(self):
+        if self._close_task is None or self._close_task.done():
+            self._close_task = asyncio.create_task(self._close_loop())
+
+    async def stop_close_job(self):
+        if self._close_task:
+            self._close_task.cancel()
+            await asyncio.gather(self._close_task, return_exceptions=True)
+            self._close_task = None
+
+    async def _close_loop(self):
+        while True:
+            now = datetime.now(timezone.utc)
+            next_midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            await asyncio.sleep((next_midnight - now).total_seconds() + CLOSE_DELAY_SECONDS)
+            try:
+                yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%d")
+                await self.close_day(yesterday)
+            except Exception as e:
+                print(f"⚠️ Day Book close job error: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
+
+
+# Global instance
+_daybook_snapshot_service: Optional[DaybookSnapshotService] = None
+
+
+def init_daybook_snapshot_service(db) -> DaybookSnapshotService:
+    """Initialize the Day Book snapshot service against the active database"""
+    global _daybook_snapshot_service
+    _daybook_snapshot_service = DaybookSnapshotService(db)
+    return _daybook_snapshot_service
+
+
+def get_daybook_snapshot_service() -> Optional[DaybookSnapshotService]:
+    """Get the global Day Book snapshot service instance"""
+    return _daybook_snapshot_service
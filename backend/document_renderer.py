@@ -0,0 +1,233 @@
+"""
+Document Rendering Service
+==========================
+
+Runs reportlab/openpyxl/sqlite3 document generation off the event loop:
+- A small ProcessPoolExecutor (DOCUMENT_RENDER_WORKERS, default 2) whose
+  workers import reportlab/openpyxl once at start-up (warm imports) and are
+  spawned at application start, before request traffic
+- Job timeout (DOCUMENT_RENDER_TIMEOUT, default 60s): a stuck render gets
+  its pool recycled so the worker slot is not lost; renders the recycle
+  breaks for other tenants are retried once on the fresh pool
+- Per-tenant concurrency limit (DOCUMENT_RENDER_PER_TENANT, default 2) so
+  one organization exporting a year of Day Books can't occupy every worker
+- Result cache keyed by a hash of the renderer name + input content
+  (tiered cache L1), so re-downloading the same receipt or Day Book is free
+- DOCUMENT_RENDER_WORKERS=0 falls back to a thread pool (hosts without
+  working multiprocessing)
+
+Renderers live in document_templates.py (pure functions of their inputs).
+
+PERFORMANCE TARGETS:
+- Event loop blocked by document rendering: 0ms
+- Repeat download of an unchanged document: no render, cache hit
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from document_templates import RENDERERS, warm_imports
+from tiered_cache import get_tiered_cache
+
+RENDERED_DOCUMENTS_NAMESPACE = "rendered_documents"
+
+
+class DocumentRenderUnavailable(Exception):
+    """The render pool could not run the job (worker crashed twice)"""
+
+
+class DocumentRenderTimeout(DocumentRenderUnavailable):
+    """A render did not finish within the job timeout"""
+
+
+def _render_job(kind: str, args: tuple) -> bytes:
+    """Entry point inside the worker process"""
+    return RENDERERS[kind](*args)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def content_key(kind: str, args: tuple) -> str:
+    payload = json.dumps([kind, args], sort_keys=True, default=str, separators=(",", ":"))
+    return f"{kind}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class DocumentRenderer:
+    """Bounded process pool + per-tenant limits + content-hash result cache"""
+
+    def __init__(self, max_workers: int = 2, timeout: float = 60.0, per_tenant: int = 2,
+                 cache_ttl: int = 300, cache_max: int = 64):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.per_tenant = max(1, per_tenant)
+        self.tiered = get_tiered_cache()
+        self.tiered.register(RENDERED_DOCUMENTS_NAMESPACE, l1_max=cache_max, ttl=cache_ttl, use_l2=False)
+        self._executor = None
+        # Jobs only enter the pool when a worker is free, so the timeout
+        # measures render time and only a genuinely stuck render recycles
+        self._pool_slots = asyncio.Semaphore(self._pool_size())
+        self._tenant_slots: Dict[str, asyncio.Semaphore] = {}
+        self._tenant_users: Dict[str, int] = {}
+        self._stats = {
+            "renders": 0,
+            "cache_hits": 0,
+            "timeouts": 0,
+            "failures": 0,
+            "pool_recycles": 0,
+            "tenant_waits": 0,
+            "total_render_ms": 0.0,
+        }
+
+    def _pool_size(self) -> int:
+        return self.max_workers if self.max_workers > 0 else 2
+
+    def _create_executor(self):
+        if self.max_workers <= 0:
+            return ThreadPoolExecutor(max_workers=self._pool_size(), thread_name_prefix="render")
+        return ProcessPoolExecutor(max_workers=self.max_workers, initializer=warm_imports)
+
+    async def start(self):
+        """Create the pool and spawn its workers before serving requests"""
+        self._executor = self._create_executor()
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*(
+                loop.run_in_executor(self._executor, _ping) for _ in range(max(self.max_workers, 1))
+            ))
+            mode = f"{self.max_workers} worker processes" if self.max_workers > 0 else "thread pool"
+            print(f"🖨️ Document renderer ready ({mode})")
+        except Exception as e:
+            # Multiprocessing unavailable on this host - render on threads instead
+            print(f"⚠️ Document render processes unavailable ({e}), using threads")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self.max_workers = 0
+            self._pool_slots = asyncio.Semaphore(self._pool_size())
+            self._executor = self._create_executor()
+
+    def _recycle_pool(self, executor):
+        """Replace the pool, killing workers stuck on a timed-out render"""
+        if executor is not self._executor:
+            # Already replaced by another job's timeout/crash - don't kill the new pool
+            return
+        self._executor = self._create_executor()
+        self._stats["pool_recycles"] += 1
+        if executor is None:
+            return
+        # ProcessPoolExecutor can't cancel a running job; terminate its workers
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            try:
+                process.terminate()
+            except Exception:
+                pass
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, kind: str, args: tuple) -> bytes:
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            try:
+                async with self._pool_slots:
+                    if self._executor is None:
+                        self._executor = self._create_executor()
+                    executor = self._executor
+                    future = loop.run_in_executor(executor, _render_job, kind, args)
+                    return await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                self._stats["timeouts"] += 1
+                self._recycle_pool(executor)
+                raise DocumentRenderTimeout(f"{kind} render exceeded {self.timeout:.0f}s")
+            except BrokenProcessPool as e:
+                # A worker died (OOM, killed) or another job's timeout recycled
+                # the pool under us; retry once on the fresh pool
+                self._recycle_pool(executor)
+                if attempt:
+                    raise DocumentRenderUnavailable(f"{kind} render failed: worker pool broken") from e
+
+    async def _render_limited(self, kind: str, org_id: str, args: tuple) -> bytes:
+        slot = self._tenant_slots.get(org_id)
+        if slot is None:
+            slot = self._tenant_slots[org_id] = asyncio.Semaphore(self.per_tenant)
+        self._tenant_users[org_id] = self._tenant_users.get(org_id, 0) + 1
+        try:
+            if slot.locked():
+                self._stats["tenant_waits"] += 1
+            async with slot:
+                started = time.perf_counter()
+                try:
+                    result = await self._run(kind, args)
+                except Exception:
+                    self._stats["failures"] += 1
+                    raise
+                self._stats["renders"] += 1
+                self._stats["total_render_ms"] += (time.perf_counter() - started) * 1000
+                return result
+        finally:
+            self._tenant_users[org_id] -= 1
+            if not self._tenant_users[org_id]:
+                self._tenant_users.pop(org_id, None)
+                self._tenant_slots.pop(org_id, None)
+
+    async def render(self, kind: str, org_id: Optional[str], *args, cache: bool = True) -> bytes:
+        """
+        Render a document registered in document_templates.RENDERERS
+
+        Raises DocumentRenderTimeout / DocumentRenderUnavailable (both map
+        to 503), or the renderer's own exception
+        (e.g. ImportError when reportlab/openpyxl is not installed).
+        """
+        tenant = org_id or "_"
+        if not cache:
+            return await self._render_limited(kind, tenant, args)
+
+        key = content_key(kind, args)
+        if self.tiered.local_get(RENDERED_DOCUMENTS_NAMESPACE, key) is not None:
+            self._stats["cache_hits"] += 1
+        # get_or_load also collapses concurrent identical renders into one
+        return await self.tiered.get_or_load(
+            RENDERED_DOCUMENTS_NAMESPACE, key, lambda: self._render_limited(kind, tenant, args)
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        renders = max(self._stats["renders"], 1)
+        return {
+            **{k: v for k, v in self._stats.items() if k != "total_render_ms"},
+            "mode": "process" if self.max_workers > 0 else "thread",
+            "max_workers": self.max_workers,
+            "active_tenants": len(self._tenant_users),
+            "avg_render_ms": round(self._stats["total_render_ms"] / renders, 2),
+            "cached": len(self.tiered.namespace(RENDERED_DOCUMENTS_NAMESPACE).store),
+        }
+
+
+# Global instance
+_document_renderer: Optional[DocumentRenderer] = None
+
+
+def init_document_renderer() -> DocumentRenderer:
+    """Initialize the document renderer from DOCUMENT_RENDER_* settings"""
+    global _document_renderer
+    if _document_renderer:
+        _document_renderer.shutdown()
+    _document_renderer = DocumentRenderer(
+        max_workers=int(os.getenv("DOCUMENT_RENDER_WORKERS", "2")),
+        timeout=float(os.getenv("DOCUMENT_RENDER_TIMEOUT", "60")),
+        per_tenant=int(os.getenv("DOCUMENT_RENDER_PER_TENANT", "2")),
+    )
+    return _document_renderer
+
+
+def get_document_renderer() -> Optional[DocumentRenderer]:
+    """Get the global document renderer instance"""
+    return _document_renderer
@@ -0,0 +1,789 @@
+"""
+Document Templates
+==================
+
+Pure, synchronous renderers for downloadable documents:
+- render_receipt_pdf: public order receipt (reportlab)
+- render_daybook_pdf / render_daybook_excel: Day Book export (reportlab / openpyxl)
+- render_sqlite_backup: super-admin SQLite backup of one organization
+
+Every function takes plain dicts/lists and returns the file bytes, so it
+can run inside a DocumentRenderer worker process (see document_renderer.py).
+Nothing here touches the database, the event loop or FastAPI.
+"""
+
+import io
+import html
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+
+
+def warm_imports():
+    """Import the heavy rendering libraries once per worker process"""
+    for module in ("reportlab.platypus", "reportlab.lib.styles", "openpyxl"):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+
+def render_receipt_pdf(order: dict, business: dict, currency_symbol: str) -> bytes:
+    """Printable A4 receipt PDF for a public order receipt"""
+    # ImportError propagates: the caller reports PDF generation as unavailable
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=16 * mm,
+        leftMargin=16 * mm,
+        topMargin=16 * mm,
+        bottomMargin=16 * mm
+    )
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'ReceiptTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#18181b'),
+        spaceAfter=6
+    )
+    meta_style = ParagraphStyle(
+        'ReceiptMeta',
+        parent=styles['Normal'],
+        fontSize=10,
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#52525b'),
+        spaceAfter=10
+    )
+    section_style = ParagraphStyle(
+        'ReceiptSection',
+        parent=styles['Heading2'],
+        fontSize=11,
+        alignment=TA_LEFT,
+        textColor=colors.HexColor('#27272a'),
+        spaceBefore=8,
+        spaceAfter=6
+    )
+    normal_style = ParagraphStyle(
+        'ReceiptNormal',
+        parent=styles['Normal'],
+        fontSize=10,
+        leading=14,
+        textColor=colors.HexColor('#18181b')
+    )
+
+    restaurant_name = business.get("restaurant_name", "Restaurant")
+    invoice_label = order.get("invoice_number") or str(order.get("id", ""))[:8].upper()
+    created_at = order.get("created_at")
+    if isinstance(created_at, str):
+        try:
+            created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+        except Exception:
+            created_at = None
+
+    elements = []
+    elements.append(Paragraph(restaurant_name, title_style))
+    elements.append(Paragraph(f"Receipt #{invoice_label}", meta_style))
+
+    contact_lines = []
+    if business.get("address"):
+        contact_lines.append(html.escape(str(business["address"])))
+    if business.get("phone"):
+        contact_lines.append(f"Phone: {html.escape(str(business['phone']))}")
+    if business.get("gstin"):
+        contact_lines.append(f"GSTIN: {html.escape(str(business['gstin']))}")
+    if contact_lines:
+        elements.append(Paragraph("<br/>".join(contact_lines), meta_style))
+
+    details = [
+        ["Invoice", str(invoice_label)],
+        ["Table", str(order.get("table_number") or "Counter")],
+        ["Customer", str(order.get("customer_name") or "Guest")],
+        ["Server", str(order.get("waiter_name") or "Staff")],
+        ["Status", str(order.get("status") or "pending").title()],
+    ]
+    if created_at:
+        details.append(["Date", created_at.astimezone().strftime("%d-%m-%Y %I:%M %p")])
+
+    details_table = Table(details, colWidths=[40 * mm, 120 * mm])
+    details_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#18181b')),
+        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor('#fafafa')]),
+        ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#d4d4d8')),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e4e4e7')),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    elements.append(details_table)
+    elements.append(Spacer(1, 10))
+
+    elements.append(Paragraph("Items", section_style))
+    item_rows = [["Item", "Qty", "Price", "Amount"]]
+    for item in order.get("items", []):
+        qty = float(item.get("quantity", 0) or 0)
+        price = float(item.get("price", 0) or 0)
+        item_rows.append([
+            str(item.get("name") or ""),
+            f"{qty:g}",
+            f"{currency_symbol}{price:.2f}",
+            f"{currency_symbol}{qty * price:.2f}"
+        ])
+
+    item_table = Table(item_rows, colWidths=[95 * mm, 20 * mm, 30 * mm, 35 * mm])
+    item_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#18181b')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#fafafa')]),
+        ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#d4d4d8')),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e4e4e7')),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    elements.append(item_table)
+    elements.append(Spacer(1, 10))
+
+    summary_rows = [
+        ["Subtotal", f"{currency_symbol}{float(order.get('subtotal', 0) or 0):.2f}"],
+        [f"Tax ({float(order.get('tax_rate', business.get('tax_rate', 5)) or 0):g}%)", f"{currency_symbol}{float(order.get('tax', 0) or 0):.2f}"],
+        ["Discount", f"{currency_symbol}{float(order.get('discount', 0) or 0):.2f}"],
+        ["Total", f"{currency_symbol}{float(order.get('total', 0) or 0):.2f}"],
+    ]
+    summary_table = Table(summary_rows, colWidths=[120 * mm, 40 * mm])
+    summary_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -2), 'Helvetica'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('LINEABOVE', (0, -1), (-1, -1), 1, colors.HexColor('#18181b')),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    elements.append(summary_table)
+    elements.append(Spacer(1, 12))
+
+    footer_message = business.get("footer_message") or "Thank you for dining with us."
+    elements.append(Paragraph(html.escape(str(footer_message)), meta_style))
+    elements.append(Paragraph("This is a computer generated receipt.", normal_style))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def render_daybook_pdf(daybook_data: dict, date: str, end_date: str) -> bytes:
+    """Day Book PDF report using reportlab (ImportError when not installed)"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.enums import TA_CENTER
+    
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=20*mm, leftMargin=20*mm, topMargin=20*mm, bottomMargin=20*mm)
+    
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, alignment=TA_CENTER, spaceAfter=12, textColor=colors.HexColor('#7c3aed'))
+    subtitle_style = ParagraphStyle('Subtitle', parent=styles['Normal'], fontSize=10, alignment=TA_CENTER, spaceAfter=20, textColor=colors.gray)
+    section_style = ParagraphStyle('Section', parent=styles['Heading2'], fontSize=12, spaceBefore=15, spaceAfter=8, textColor=colors.HexColor('#7c3aed'))
+    
+    elements = []
+    
+    # Title
+    date_range_str = f"{date}" if date == end_date else f"{date} to {end_date}"
+    elements.append(Paragraph("📒 Day Book Report", title_style))
+    elements.append(Paragraph(f"Date: {date_range_str} | Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", subtitle_style))
+    
+    # Summary Table
+    elements.append(Paragraph("Summary", section_style))
+    summary_data = [
+        ['Opening Balance', 'Total Inflows', 'Total Outflows', 'Net Cash Flow', 'Closing Balance'],
+        [
+            f"₹{daybook_data['opening_balance']:.2f}",
+            f"₹{daybook_data['total_inflows']:.2f}",
+            f"₹{daybook_data['total_outflows']:.2f}",
+            f"{'+'if daybook_data['net_cash_flow'] >= 0 else ''}₹{daybook_data['net_cash_flow']:.2f}",
+            f"₹{daybook_data['closing_balance']:.2f}"
+        ]
+    ]
+    summary_table = Table(summary_data, colWidths=[90, 90, 90, 90, 90])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#7c3aed')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('TOPPADDING', (0, 0), (-1, 0), 10),
+        ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#f3e8ff')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.gray),
+        ('TEXTCOLOR', (1, 1), (1, 1), colors.green),
+        ('TEXTCOLOR', (2, 1), (2, 1), colors.red),
+    ]))
+    elements.append(summary_table)
+    elements.append(Spacer(1, 15))
+    
+    # Inflow Breakdown
+    if daybook_data['inflow_breakdown']:
+        elements.append(Paragraph("💰 Inflow Breakdown", section_style))
+        inflow_data = [['Payment Method', 'Amount']]
+        for method, amount in daybook_data['inflow_breakdown'].items():
+            if amount > 0:
+                inflow_data.append([method.capitalize(), f"₹{amount:.2f}"])
+        inflow_data.append(['Total Inflows', f"₹{daybook_data['total_inflows']:.2f}"])
+        
+        inflow_table = Table(inflow_data, colWidths=[200, 100])
+        inflow_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#15803d')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#dcfce7')),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#bbf7d0')),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.gray),
+        ]))
+        elements.append(inflow_table)
+        elements.append(Spacer(1, 10))
+    
+    # Outflow Breakdown
+    if daybook_data['outflow_breakdown']:
+        elements.append(Paragraph("📤 Outflow Breakdown", section_style))
+        outflow_data = [['Category', 'Amount']]
+        for category, amount in daybook_data['outflow_breakdown'].items():
+            if amount > 0:
+                outflow_data.append([category, f"₹{amount:.2f}"])
+        outflow_data.append(['Total Outflows', f"₹{daybook_data['total_outflows']:.2f}"])
+        
+        outflow_table = Table(outflow_data, colWidths=[200, 100])
+        outflow_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#dc2626')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#fee2e2')),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#fecaca')),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.gray),
+        ]))
+        elements.append(outflow_table)
+        elements.append(Spacer(1, 10))
+    
+    # Transaction Details
+    if daybook_data['entries']:
+        elements.append(Paragraph(f"📋 Transaction Details ({len(daybook_data['entries'])} transactions)", section_style))
+        trans_data = [['Time', 'Type', 'Category', 'Description', 'Amount', 'Balance']]
+        for entry in daybook_data['entries']:
+            try:
+                time_str = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00')).strftime('%H:%M') if entry.get('timestamp') else '-'
+            except:
+                time_str = '-'
+            
+            amount_str = f"{'+'if entry['type'] == 'inflow' else '-'}₹{entry['amount']:.2f}"
+            trans_data.append([
+                time_str,
+                '↑ Inflow' if entry['type'] == 'inflow' else '↓ Outflow',
+                entry.get('category', '')[:20],
+                entry.get('description', '')[:30],
+                amount_str,
+                f"₹{entry.get('running_balance', 0):.2f}"
+            ])
+        
+        trans_table = Table(trans_data, colWidths=[40, 55, 80, 130, 70, 70])
+        trans_style = [
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#7c3aed')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('ALIGN', (4, 1), (5, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.gray),
+        ]
+        # Add row colors based on type
+        for i, entry in enumerate(daybook_data['entries'], 1):
+            if entry['type'] == 'inflow':
+                trans_style.append(('BACKGROUND', (0, i), (-1, i), colors.HexColor('#f0fdf4')))
+            else:
+                trans_style.append(('BACKGROUND', (0, i), (-1, i), colors.HexColor('#fef2f2')))
+        
+        trans_table.setStyle(TableStyle(trans_style))
+        elements.append(trans_table)
+    
+    # Footer
+    elements.append(Spacer(1, 20))
+    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, alignment=TA_CENTER, textColor=colors.gray)
+    elements.append(Paragraph("Generated by BillByteKOT - Restaurant Management System", footer_style))
+    
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def render_daybook_excel(daybook_data: dict, date: str, end_date: str) -> bytes:
+    """Day Book Excel report using openpyxl (ImportError when not installed)"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+    from openpyxl.utils import get_column_letter
+    
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Day Book"
+    
+    # Styles
+    header_font = Font(bold=True, color="FFFFFF", size=11)
+    header_fill = PatternFill(start_color="7c3aed", end_color="7c3aed", fill_type="solid")
+    inflow_fill = PatternFill(start_color="dcfce7", end_color="dcfce7", fill_type="solid")
+    outflow_fill = PatternFill(start_color="fee2e2", end_color="fee2e2", fill_type="solid")
+    summary_fill = PatternFill(start_color="f3e8ff", end_color="f3e8ff", fill_type="solid")
+    thin_border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    
+    row = 1
+    
+    # Title
+    date_range_str = f"{date}" if date == end_date else f"{date} to {end_date}"
+    ws.merge_cells(f'A{row}:F{row}')
+    ws[f'A{row}'] = f"Day Book Report - {date_range_str}"
+    ws[f'A{row}'].font = Font(bold=True, size=16, color="7c3aed")
+    ws[f'A{row}'].alignment = Alignment(horizontal='center')
+    row += 1
+    
+    ws.merge_cells(f'A{row}:F{row}')
+    ws[f'A{row}'] = f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    ws[f'A{row}'].alignment = Alignment(horizontal='center')
+    row += 2
+    
+    # Summary Section
+    ws[f'A{row}'] = "SUMMARY"
+    ws[f'A{row}'].font = Font(bold=True, size=12, color="7c3aed")
+    row += 1
+    
+    summary_headers = ['Opening Balance', 'Total Inflows', 'Total Outflows', 'Net Cash Flow', 'Closing Balance']
+    for col, header in enumerate(summary_headers, 1):
+        cell = ws.cell(row=row, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal='center')
+        cell.border = thin_border
+    row += 1
+    
+    summary_values = [
+        daybook_data['opening_balance'],
+        daybook_data['total_inflows'],
+        daybook_data['total_outflows'],
+        daybook_data['net_cash_flow'],
+        daybook_data['closing_balance']
+    ]
+    for col, value in enumerate(summary_values, 1):
+        cell = ws.cell(row=row, column=col, value=f"₹{value:.2f}")
+        cell.fill = summary_fill
+        cell.alignment = Alignment(horizontal='center')
+        cell.border = thin_border
+        if col == 2:  # Inflows - green
+            cell.font = Font(color="15803d", bold=True)
+        elif col == 3:  # Outflows - red
+            cell.font = Font(color="dc2626", bold=True)
+        elif col == 4:  # Net - based on value
+            cell.font = Font(color="15803d" if value >= 0 else "dc2626", bold=True)
+    row += 2
+    
+    # Inflow Breakdown
+    ws[f'A{row}'] = "INFLOW BREAKDOWN"
+    ws[f'A{row}'].font = Font(bold=True, size=12, color="15803d")
+    row += 1
+    
+    for col, header in enumerate(['Payment Method', 'Amount'], 1):
+        cell = ws.cell(row=row, column=col, value=header)
+        cell.font = header_font
+        cell.fill = PatternFill(start_color="15803d", end_color="15803d", fill_type="solid")
+        cell.alignment = Alignment(horizontal='center')
+        cell.border = thin_border
+    row += 1
+    
+    for method, amount in daybook_data['inflow_breakdown'].items():
+        if amount > 0:
+            ws.cell(row=row, column=1, value=method.capitalize()).border = thin_border
+            ws.cell(row=row, column=1).fill = inflow_fill
+            cell = ws.cell(row=row, column=2, value=f"₹{amount:.2f}")
+            cell.border = thin_border
+            cell.fill = inflow_fill
+            cell.alignment = Alignment(horizontal='right')
+            row += 1
+    
+    # Total row
+    ws.cell(row=row, column=1, value="Total Inflows").font = Font(bold=True)
+    ws.cell(row=row, column=1).border = thin_border
+    cell = ws.cell(row=row, column=2, value=f"₹{daybook_data['total_inflows']:.2f}")
+    cell.font = Font(bold=True, color="15803d")
+    cell.border = thin_border
+    cell.alignment = Alignment(horizontal='right')
+    row += 2
+    
+    # Outflow Breakdown
+    ws[f'A{row}'] = "OUTFLOW BREAKDOWN"
+    ws[f'A{row}'].font = Font(bold=True, size=12, color="dc2626")
+    row += 1
+    
+    for col, header in enumerate(['Category', 'Amount'], 1):
+        cell = ws.cell(row=row, column=col, value=header)
+        cell.font = header_font
+        cell.fill = PatternFill(start_color="dc2626", end_color="dc2626", fill_type="solid")
+        cell.alignment = Alignment(horizontal='center')
+        cell.border = thin_border
+    row += 1
+    
+    for category, amount in daybook_data['outflow_breakdown'].items():
+        if amount > 0:
+            ws.cell(row=row, column=1, value=category).border = thin_border
+            ws.cell(row=row, column=1).fill = outflow_fill
+            cell = ws.cell(row=row, column=2, value=f"₹{amount:.2f}")
+            cell.border = thin_border
+            cell.fill = outflow_fill
+            cell.alignment = Alignment(horizontal='right')
+            row += 1
+    
+    # Total row
+    ws.cell(row=row, column=1, value="Total Outflows").font = Font(bold=True)
+    ws.cell(row=row, column=1).border = thin_border
+    cell = ws.cell(row=row, column=2, value=f"₹{daybook_data['total_outflows']:.2f}")
+    cell.font = Font(bold=True, color="dc2626")
+    cell.border = thin_border
+    cell.alignment = Alignment(horizontal='right')
+    row += 2
+    
+    # Transaction Details
+    ws[f'A{row}'] = f"TRANSACTION DETAILS ({len(daybook_data['entries'])} transactions)"
+    ws[f'A{row}'].font = Font(bold=True, size=12, color="7c3aed")
+    row += 1
+    
+    trans_headers = ['Time', 'Type', 'Category', 'Description', 'Amount', 'Running Balance']
+    for col, header in enumerate(trans_headers, 1):
+        cell = ws.cell(row=row, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal='center')
+        cell.border = thin_border
+    row += 1
+    
+    for entry in daybook_data['entries']:
+        try:
+            time_str = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00')).strftime('%H:%M') if entry.get('timestamp') else '-'
+        except:
+            time_str = '-'
+        
+        fill = inflow_fill if entry['type'] == 'inflow' else outflow_fill
+        amount_prefix = '+' if entry['type'] == 'inflow' else '-'
+        
+        values = [
+            time_str,
+            '↑ Inflow' if entry['type'] == 'inflow' else '↓ Outflow',
+            entry.get('category', ''),
+            entry.get('description', ''),
+            f"{amount_prefix}₹{entry['amount']:.2f}",
+            f"₹{entry.get('running_balance', 0):.2f}"
+        ]
+        
+        for col, value in enumerate(values, 1):
+            cell = ws.cell(row=row, column=col, value=value)
+            cell.fill = fill
+            cell.border = thin_border
+            if col >= 5:
+                cell.alignment = Alignment(horizontal='right')
+        row += 1
+    
+    # Adjust column widths
+    column_widths = [12, 12, 20, 40, 15, 18]
+    for i, width in enumerate(column_widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    
+    # Save to buffer
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def render_sqlite_backup(user_data: dict, staff: list, orders: list, menu_items: list,
+                         tables: list, inventory: list, payments: list) -> bytes:
+    """Create SQLite database backup file"""
+    # Create in-memory database
+    conn = sqlite3.connect(':memory:')
+    cursor = conn.cursor()
+    
+    # Create tables
+    cursor.execute('''
+        CREATE TABLE users (
+            id TEXT PRIMARY KEY,
+            username TEXT,
+            email TEXT,
+            role TEXT,
+            phone TEXT,
+            organization_id TEXT,
+            subscription_active INTEGER,
+            subscription_expires_at TEXT,
+            trial_extension_days INTEGER,
+            bill_count INTEGER,
+            setup_completed INTEGER,
+            onboarding_completed INTEGER,
+            business_settings TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE orders (
+            id TEXT PRIMARY KEY,
+            invoice_number INTEGER,
+            table_id TEXT,
+            table_number INTEGER,
+            items TEXT,
+            subtotal REAL,
+            tax REAL,
+            discount REAL,
+            total REAL,
+            status TEXT,
+            waiter_id TEXT,
+            waiter_name TEXT,
+            customer_name TEXT,
+            customer_phone TEXT,
+            order_type TEXT,
+            organization_id TEXT,
+            payment_method TEXT,
+            is_credit INTEGER,
+            payment_received REAL,
+            balance_amount REAL,
+            cash_amount REAL,
+            card_amount REAL,
+            upi_amount REAL,
+            credit_amount REAL,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE menu_items (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            category TEXT,
+            price REAL,
+            description TEXT,
+            image_url TEXT,
+            available INTEGER,
+            ingredients TEXT,
+            preparation_time INTEGER,
+            organization_id TEXT,
+            created_at TEXT
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE tables (
+            id TEXT PRIMARY KEY,
+            table_number INTEGER,
+            capacity INTEGER,
+            status TEXT,
+            current_order_id TEXT,
+            organization_id TEXT,
+            created_at TEXT
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE inventory (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            category TEXT,
+            quantity REAL,
+            unit TEXT,
+            min_stock REAL,
+            cost_per_unit REAL,
+            supplier TEXT,
+            organization_id TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE payments (
+            id TEXT PRIMARY KEY,
+            order_id TEXT,
+            amount REAL,
+            payment_method TEXT,
+            razorpay_order_id TEXT,
+            razorpay_payment_id TEXT,
+            status TEXT,
+            organization_id TEXT,
+            created_at TEXT
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE backup_info (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT,
+            username TEXT,
+            exported_at TEXT,
+            version TEXT
+        )
+    ''')
+    
+    # Insert user data
+    cursor.execute('''
+        INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        user_data.get('id'), user_data.get('username'), user_data.get('email'),
+        user_data.get('role'), user_data.get('phone'), user_data.get('organization_id'),
+        1 if user_data.get('subscription_active') else 0,
+        user_data.get('subscription_expires_at'),
+        user_data.get('trial_extension_days', 0),
+        user_data.get('bill_count', 0),
+        1 if user_data.get('setup_completed') else 0,
+        1 if user_data.get('onboarding_completed') else 0,
+        json.dumps(user_data.get('business_settings', {})),
+        str(user_data.get('created_at', '')),
+        str(user_data.get('updated_at', ''))
+    ))
+    
+    # Insert staff
+    for s in staff:
+        cursor.execute('''
+            INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            s.get('id'), s.get('username'), s.get('email'),
+            s.get('role'), s.get('phone'), s.get('organization_id'),
+            1 if s.get('subscription_active') else 0,
+            s.get('subscription_expires_at'),
+            s.get('trial_extension_days', 0),
+            s.get('bill_count', 0),
+            1 if s.get('setup_completed') else 0,
+            1 if s.get('onboarding_completed') else 0,
+            json.dumps(s.get('business_settings', {})),
+            str(s.get('created_at', '')),
+            str(s.get('updated_at', ''))
+        ))
+    
+    # Insert orders
+    for o in orders:
+        cursor.execute('''
+            INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            o.get('id'), o.get('invoice_number'), o.get('table_id'), o.get('table_number'),
+            json.dumps(o.get('items', [])), o.get('subtotal', 0), o.get('tax', 0),
+            o.get('discount', 0), o.get('total', 0), o.get('status'),
+            o.get('waiter_id'), o.get('waiter_name'), o.get('customer_name'),
+            o.get('customer_phone'), o.get('order_type'), o.get('organization_id'),
+            o.get('payment_method'), 1 if o.get('is_credit') else 0,
+            o.get('payment_received', 0), o.get('balance_amount', 0),
+            o.get('cash_amount', 0), o.get('card_amount', 0),
+            o.get('upi_amount', 0), o.get('credit_amount', 0),
+            str(o.get('created_at', '')), str(o.get('updated_at', ''))
+        ))
+    
+    # Insert menu items
+    for m in menu_items:
+        cursor.execute('''
+            INSERT INTO menu_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            m.get('id'), m.get('name'), m.get('category'), m.get('price'),
+            m.get('description'), m.get('image_url'),
+            1 if m.get('available', True) else 0,
+            json.dumps(m.get('ingredients', [])), m.get('preparation_time'),
+            m.get('organization_id'), str(m.get('created_at', ''))
+        ))
+    
+    # Insert tables
+    for t in tables:
+        cursor.execute('''
+            INSERT INTO tables VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            t.get('id'), t.get('table_number'), t.get('capacity'),
+            t.get('status'), t.get('current_order_id'),
+            t.get('organization_id'), str(t.get('created_at', ''))
+        ))
+    
+    # Insert inventory
+    for i in inventory:
+        cursor.execute('''
+            INSERT INTO inventory VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            i.get('id'), i.get('name'), i.get('category'), i.get('quantity'),
+            i.get('unit'), i.get('min_stock'), i.get('cost_per_unit'),
+            i.get('supplier'), i.get('organization_id'),
+            str(i.get('created_at', '')), str(i.get('updated_at', ''))
+        ))
+    
+    # Insert payments
+    for p in payments:
+        cursor.execute('''
+            INSERT INTO payments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            p.get('id'), p.get('order_id'), p.get('amount'),
+            p.get('payment_method'), p.get('razorpay_order_id'),
+            p.get('razorpay_payment_id'), p.get('status'),
+            p.get('organization_id'), str(p.get('created_at', ''))
+        ))
+    
+    # Insert backup info
+    cursor.execute('''
+        INSERT INTO backup_info VALUES (?, ?, ?, ?, ?)
+    ''', (
+        1, user_data.get('id'), user_data.get('username'),
+        datetime.now(timezone.utc).isoformat(), '1.0'
+    ))
+    
+    conn.commit()
+    
+    # Export to bytes
+    buffer = io.BytesIO()
+    for line in conn.iterdump():
+        buffer.write(f'{line}\n'.encode('utf-8'))
+    
+    # Also create actual binary SQLite file
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+    temp_conn = sqlite3.connect(temp_file.name)
+    conn.backup(temp_conn)
+    temp_conn.close()
+    conn.close()
+    
+    with open(temp_file.name, 'rb') as f:
+        db_bytes = f.read()
+    
+    os.unlink(temp_file.name)
+    return db_bytes
+
+
+RENDERERS = {
+    "receipt_pdf": render_receipt_pdf,
+    "daybook_pdf": render_daybook_pdf,
+    "daybook_excel": render_daybook_excel,
+    "sqlite_backup": render_sqlite_backup,
+}
@@ -7,6 +7,7 @@ import os
 import ssl
 import smtplib
 import httpx
+from http_clients import http_client
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
@@ -54,7 +55,7 @@ async def send_via_resend(
     # Use custom from_email if provided, otherwise default to support@billbytekot.in
     sender = from_email or "BillByteKOT <support@billbytekot.in>"
     
-    async with httpx.AsyncClient() as client:
+    async with http_client("resend") as client:
         url = "https://api.resend.com/emails"
         
         payload = {
@@ -13,13 +13,26 @@ Setup:
    FIREBASE_CLIENT_EMAIL=your-client-email
    
    OR set FIREBASE_CREDENTIALS_JSON with the full JSON content
+
+Sending:
+- The OAuth2 access token is cached and refreshed TOKEN_REFRESH_MARGIN
+  seconds before its 1h expiry (one JWT signature + token exchange per hour
+  instead of per device); concurrent refreshes collapse into one
+- Multi-device sends fan out with bounded concurrency (FCM_SEND_CONCURRENCY)
+  over the pooled HTTP/2 "fcm" client, in batches of FCM_BATCH_SIZE with a
+  per-batch success/failure report (FCM HTTP v1 has no multicast endpoint)
+- UNREGISTERED tokens are handed back per batch so the caller can
+  deactivate them in one bulk write
 """
 
+import asyncio
 import os
 import json
-import httpx
+import random
+import time
+from http_clients import http_client
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any
+from typing import Awaitable, Callable, Optional, List, Dict, Any
 
 # Firebase credentials from environment
 FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID")
@@ -27,6 +40,22 @@ FIREBASE_PRIVATE_KEY = os.getenv("FIREBASE_PRIVATE_KEY", "").replace("\\n", "\n"
 FIREBASE_CLIENT_EMAIL = os.getenv("FIREBASE_CLIENT_EMAIL")
 FIREBASE_CREDENTIALS_JSON = os.getenv("FIREBASE_CREDENTIALS_JSON")
 
+FCM_API_BASE = os.getenv("FCM_API_BASE", "https://fcm.googleapis.com")
+FCM_SEND_CONCURRENCY = int(os.getenv("FCM_SEND_CONCURRENCY", "20"))
+FCM_BATCH_SIZE = 500
+FCM_MAX_RETRIES = 2
+TOKEN_REFRESH_MARGIN = 300
+MAX_REPORTED_ERRORS = 50
+
+_fcm_stats = {
+    "token_refreshes": 0,
+    "token_cache_hits": 0,
+    "sent": 0,
+    "failed": 0,
+    "unregistered": 0,
+    "retries": 0,
+}
+
 
 def get_firebase_credentials():
     """Get Firebase credentials from environment"""
@@ -53,46 +82,142 @@ def is_firebase_configured():
     return get_firebase_credentials() is not None
 
 
-async def get_access_token():
-    """Get OAuth2 access token for FCM API"""
-    credentials = get_firebase_credentials()
-    if not credentials:
-        return None
+async def _fetch_access_token(credentials: Dict[str, Any]):
+    """Sign a service-account JWT and exchange it for an access token"""
+    import jwt
     
-    try:
-        import jwt
-        import time
-        
-        now = int(time.time())
-        payload = {
-            "iss": credentials["client_email"],
-            "sub": credentials["client_email"],
-            "aud": "https://oauth2.googleapis.com/token",
-            "iat": now,
-            "exp": now + 3600,
-            "scope": "https://www.googleapis.com/auth/firebase.messaging"
-        }
-        
-        token = jwt.encode(payload, credentials["private_key"], algorithm="RS256")
+    now = int(time.time())
+    token_uri = credentials.get("token_uri") or "https://oauth2.googleapis.com/token"
+    payload = {
+        "iss": credentials["client_email"],
+        "sub": credentials["client_email"],
+        "aud": token_uri,
+        "iat": now,
+        "exp": now + 3600,
+        "scope": "https://www.googleapis.com/auth/firebase.messaging"
+    }
+    
+    token = jwt.encode(payload, credentials["private_key"], algorithm="RS256")
+    
+    async with http_client("fcm") as client:
+        response = await client.post(
+            token_uri,
+            data={
+                "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
+                "assertion": token
+            }
+        )
         
-        async with httpx.AsyncClient() as client:
+        if response.status_code == 200:
+            body = response.json()
+            return body.get("access_token"), int(body.get("expires_in", 3600))
+    return None, 0
+
+
+class _AccessTokenCache:
+    """Process-wide FCM access token, refreshed shortly before it expires"""
+
+    def __init__(self):
+        self.token: Optional[str] = None
+        self.expires_at = 0.0
+        self._refreshing: Optional[asyncio.Future] = None
+
+    def invalidate(self):
+        self.token = None
+        self.expires_at = 0.0
+
+    async def get(self) -> Optional[str]:
+        if self.token and time.time() < self.expires_at - TOKEN_REFRESH_MARGIN:
+            _fcm_stats["token_cache_hits"] += 1
+            return self.token
+        if self._refreshing is not None:
+            return await asyncio.shield(self._refreshing)
+
+        refreshing = self._refreshing = asyncio.get_running_loop().create_future()
+        try:
+            credentials = get_firebase_credentials()
+            token, expires_in = await _fetch_access_token(credentials) if credentials else (None, 0)
+            if token:
+                _fcm_stats["token_refreshes"] += 1
+                self.token, self.expires_at = token, time.time() + expires_in
+            refreshing.set_result(token)
+            return token
+        except Exception as e:
+            print(f"FCM token error: {e}")
+            refreshing.set_result(None)
+            return None
+        finally:
+            # Cancelled mid-refresh: release the waiters (the cancellation still propagates)
+            if not refreshing.done():
+                refreshing.set_result(None)
+            self._refreshing = None
+
+
+_access_token_cache = _AccessTokenCache()
+
+
+async def get_access_token():
+    """Get OAuth2 access token for FCM API (cached until shortly before expiry)"""
+    return await _access_token_cache.get()
+
+
+async def _post_message(project_id: str, message: Dict[str, Any]):
+    """
+    POST one message to FCM HTTP v1.
+
+    A 401 refreshes the access token once; 429/5xx are retried with
+    backoff (honouring Retry-After). Returns the final response.
+    """
+    url = f"{FCM_API_BASE}/v1/projects/{project_id}/messages:send"
+    refreshed = False
+    attempt = 0
+    while True:
+        access_token = await get_access_token()
+        if not access_token:
+            return None
+        async with http_client("fcm") as client:
             response = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data={
-                    "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
-                    "assertion": token
-                }
+                url,
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "Content-Type": "application/json"
+                },
+                json=message
             )
-            
-            if response.status_code == 200:
-                return response.json().get("access_token")
-    except Exception as e:
-        print(f"FCM token error: {e}")
-    
-    return None
+        if response.status_code == 401 and not refreshed:
+            refreshed = True
+            _access_token_cache.invalidate()
+            continue
+        if (response.status_code == 429 or response.status_code >= 500) and attempt < FCM_MAX_RETRIES:
+            attempt += 1
+            _fcm_stats["retries"] += 1
+            try:
+                delay = float(response.headers.get("retry-after", ""))
+            except ValueError:
+                delay = (2 ** attempt) * (0.5 + random.random() / 2)
+            await asyncio.sleep(min(delay, 30))
+            continue
+        return response
 
 
-async def send_fcm_notification(
+def _is_unregistered(response) -> bool:
+    """
+    FCM says the token is gone for good (app uninstalled / token expired)
+
+    Only the explicit UNREGISTERED error code counts: a bare 404 is also what
+    a wrong project id or API base returns, and pruning on that would
+    deactivate every token of the organization.
+    """
+    if response.status_code not in (400, 404):
+        return False
+    try:
+        details = response.json().get("error", {}).get("details", []) or []
+    except Exception:
+        return False
+    return any(isinstance(detail, dict) and detail.get("errorCode") == "UNREGISTERED" for detail in details)
+
+
+def _device_message(
     token: str,
     title: str,
     body: str,
@@ -100,28 +225,7 @@ async def send_fcm_notification(
     data: Optional[Dict[str, str]] = None,
     click_action: Optional[str] = None
 ) -> Dict[str, Any]:
-    """
-    Send push notification to a single device via FCM
-    
-    Args:
-        token: FCM device token
-        title: Notification title
-        body: Notification body/message
-        image: Optional image URL
-        data: Optional custom data payload
-        click_action: URL to open when notification is clicked
-    """
-    credentials = get_firebase_credentials()
-    if not credentials:
-        return {"success": False, "error": "Firebase not configured"}
-    
-    access_token = await get_access_token()
-    if not access_token:
-        return {"success": False, "error": "Failed to get access token"}
-    
-    project_id = credentials.get("project_id")
-    
-    # Build notification payload
+    """FCM v1 payload for a single device token"""
     message = {
         "message": {
             "token": token,
@@ -158,21 +262,49 @@ async def send_fcm_notification(
     if data:
         message["message"]["data"] = {k: str(v) for k, v in data.items()}
     
+    return message
+
+
+async def send_fcm_notification(
+    token: str,
+    title: str,
+    body: str,
+    image: Optional[str] = None,
+    data: Optional[Dict[str, str]] = None,
+    click_action: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Send push notification to a single device via FCM
+    
+    Args:
+        token: FCM device token
+        title: Notification title
+        body: Notification body/message
+        image: Optional image URL
+        data: Optional custom data payload
+        click_action: URL to open when notification is clicked
+    """
+    credentials = get_firebase_credentials()
+    if not credentials:
+        return {"success": False, "error": "Firebase not configured"}
+    
+    project_id = credentials.get("project_id")
+    message = _device_message(token, title, body, image, data, click_action)
+    
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://fcm.googleapis.com/v1/projects/{project_id}/messages:send",
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    "Content-Type": "application/json"
-                },
-                json=message
-            )
-            
-            if response.status_code == 200:
-                return {"success": True, "response": response.json()}
-            else:
-                return {"success": False, "error": response.text, "status": response.status_code}
+        response = await _post_message(project_id, message)
+        if response is None:
+            return {"success": False, "error": "Failed to get access token"}
+        
+        if response.status_code == 200:
+            return {"success": True, "response": response.json()}
+        else:
+            return {
+                "success": False,
+                "error": response.text,
+                "status": response.status_code,
+                "unregistered": _is_unregistered(response)
+            }
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -197,10 +329,6 @@ async def send_fcm_to_topic(
     if not credentials:
         return {"success": False, "error": "Firebase not configured"}
     
-    access_token = await get_access_token()
-    if not access_token:
-        return {"success": False, "error": "Failed to get access token"}
-    
     project_id = credentials.get("project_id")
     
     message = {
@@ -237,20 +365,14 @@ async def send_fcm_to_topic(
         message["message"]["data"] = {k: str(v) for k, v in data.items()}
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://fcm.googleapis.com/v1/projects/{project_id}/messages:send",
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    "Content-Type": "application/json"
-                },
-                json=message
-            )
-            
-            if response.status_code == 200:
-                return {"success": True, "response": response.json()}
-            else:
-                return {"success": False, "error": response.text, "status": response.status_code}
+        response = await _post_message(project_id, message)
+        if response is None:
+            return {"success": False, "error": "Failed to get access token"}
+        
+        if response.status_code == 200:
+            return {"success": True, "response": response.json()}
+        else:
+            return {"success": False, "error": response.text, "status": response.status_code}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -260,17 +382,80 @@ async def send_fcm_to_multiple(
     title: str,
     body: str,
     image: Optional[str] = None,
-    data: Optional[Dict[str, str]] = None
+    data: Optional[Dict[str, str]] = None,
+    click_action: Optional[str] = None,
+    on_unregistered: Optional[Callable[[List[str]], Awaitable[Any]]] = None,
+    concurrency: int = FCM_SEND_CONCURRENCY,
+    batch_size: int = FCM_BATCH_SIZE
 ) -> Dict[str, Any]:
-    """Send notification to multiple devices"""
-    results = {"success": 0, "failed": 0, "errors": []}
+    """
+    Send notification to multiple devices
     
-    for token in tokens:
-        result = await send_fcm_notification(token, title, body, image, data)
-        if result.get("success"):
-            results["success"] += 1
-        else:
-            results["failed"] += 1
-            results["errors"].append(result.get("error"))
+    Fans out with at most `concurrency` requests in flight over the pooled
+    client, one cached access token for the whole run. After each batch the
+    UNREGISTERED tokens are passed to `on_unregistered` (one bulk prune).
+    """
+    results = {"success": 0, "failed": 0, "unregistered": 0, "errors": [], "batches": []}
+    credentials = get_firebase_credentials()
+    if not credentials:
+        results["failed"] = len(tokens)
+        results["errors"].append("Firebase not configured")
+        return results
+    
+    project_id = credentials.get("project_id")
+    slots = asyncio.Semaphore(max(concurrency, 1))
+    
+    async def send_one(token: str):
+        async with slots:
+            message = _device_message(token, title, body, image, data, click_action)
+            try:
+                response = await _post_message(project_id, message)
+            except Exception as e:
+                return "failed", str(e)
+            if response is None:
+                return "failed", "Failed to get access token"
+            if response.status_code == 200:
+                return "success", None
+            if _is_unregistered(response):
+                return "unregistered", None
+            return "failed", f"{response.status_code}: {response.text[:200]}"
+    
+    for start in range(0, len(tokens), batch_size):
+        batch = tokens[start:start + batch_size]
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(send_one(token) for token in batch))
+        
+        report = {"batch": start // batch_size, "size": len(batch), "success": 0, "failed": 0, "unregistered": 0}
+        dead = []
+        for token, (outcome, error) in zip(batch, outcomes):
+            report[outcome] += 1
+            if outcome == "unregistered":
+                dead.append(token)
+            elif error and len(results["errors"]) < MAX_REPORTED_ERRORS:
+                results["errors"].append(error)
+        report["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        
+        if dead and on_unregistered:
+            try:
+                await on_unregistered(dead)
+            except Exception as e:
+                print(f"⚠️ FCM token prune failed ({len(dead)} tokens): {e}")
+        
+        for key in ("success", "failed", "unregistered"):
+            results[key] += report[key]
+        results["batches"].append(report)
+        print(f"📲 FCM batch {report['batch']}: {report['success']} sent, {report['failed']} failed, "
+              f"{report['unregistered']} unregistered ({report['ms']}ms)")
     
+    _fcm_stats["sent"] += results["success"]
+    _fcm_stats["failed"] += results["failed"]
+    _fcm_stats["unregistered"] += results["unregistered"]
     return results
+
+
+def get_fcm_sender_stats() -> Dict[str, Any]:
+    """Token cache and delivery counters (for /health)"""
+    return {
+        **_fcm_stats,
+        "token_valid_for_s": max(0, int(_access_token_cache.expires_at - time.time())) if _access_token_cache.token else 0,
+    }
@@ -0,0 +1,125 @@
+"""
+Outbound HTTP Clients
+=====================
+
+Process-wide pooled httpx clients for third-party integrations
+(WhatsApp Cloud API, FCM, SMS gateways, Resend):
+- One long-lived AsyncClient per integration profile, created at startup
+  and closed on shutdown - connections are kept alive and reused instead of
+  a new TCP + TLS handshake per message
+- HTTP/2 for hosts that support it (Meta Graph, Google APIs, Resend) when
+  the `h2` package is installed, so concurrent sends multiplex over one
+  connection
+- Per-profile connection limits and timeouts (each profile talks to one
+  provider, so these are effectively per-host limits)
+- Integrations borrow a client with `async with http_client("whatsapp") as client:`;
+  the block never closes the shared client
+
+PERFORMANCE TARGETS:
+- Steady-state send: 0 new connections (keep-alive / HTTP/2 reuse)
+- Throughput for 1,000 receipt sends: see benchmarks/bench_http_clients.py
+"""
+
+import asyncio
+import importlib.util
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# name -> timeout (s), pool size, idle keep-alive connections, HTTP/2
+HTTP_CLIENT_PROFILES: Dict[str, Dict[str, Any]] = {
+    "whatsapp": {"timeout": 10.0, "max_connections": 50, "max_keepalive": 50, "http2": True},
+    "fcm": {"timeout": 10.0, "max_connections": 50, "max_keepalive": 50, "http2": True},
+    "sms": {"timeout": 15.0, "max_connections": 10, "max_keepalive": 5, "http2": False},
+    "resend": {"timeout": 30.0, "max_connections": 10, "max_keepalive": 5, "http2": True},
+    "default": {"timeout": 15.0, "max_connections": 20, "max_keepalive": 10, "http2": False},
+}
+
+KEEPALIVE_EXPIRY_SECONDS = 60.0
+
+
+class HttpClientRegistry:
+    """Shared AsyncClients keyed by integration profile"""
+
+    def __init__(self, profiles: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.profiles = profiles or HTTP_CLIENT_PROFILES
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._loops: Dict[str, asyncio.AbstractEventLoop] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        profile = self.profiles.get(name) or self.profiles["default"]
+        stats = self._stats.setdefault(name, {"requests": 0, "errors": 0, "clients_created": 0})
+        stats["clients_created"] += 1
+
+        async def on_response(response: httpx.Response):
+            stats["requests"] += 1
+            if response.status_code >= 500:
+                stats["errors"] += 1
+
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(profile["timeout"], connect=min(5.0, profile["timeout"])),
+            limits=httpx.Limits(
+                max_connections=profile["max_connections"],
+                max_keepalive_connections=profile["max_keepalive"],
+                keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            http2=profile["http2"] and HTTP2_AVAILABLE,
+            event_hooks={"response": [on_response]},
+        )
+
+    def start(self):
+        """Create every profile's client up front (called from app startup)"""
+        for name in self.profiles:
+            self.get(name)
+        print(f"🌐 Outbound HTTP clients ready ({', '.join(self.profiles)}; http2={HTTP2_AVAILABLE})")
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Shared client for a profile, bound to the running event loop"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        client = self._clients.get(name)
+        # A client's pool belongs to one loop; standalone scripts get their own
+        if client is None or client.is_closed or (loop is not None and self._loops.get(name) not in (None, loop)):
+            client = self._clients[name] = self._create(name)
+            self._loops[name] = loop
+        return client
+
+    async def close(self):
+        clients, self._clients = list(self._clients.values()), {}
+        self._loops.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                print(f"⚠️ HTTP client close error: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"http2_available": HTTP2_AVAILABLE, "clients": {name: dict(s) for name, s in self._stats.items()}}
+
+
+# Global instance
+_http_clients: Optional[HttpClientRegistry] = None
+
+
+def init_http_clients() -> HttpClientRegistry:
+    """Initialize the outbound HTTP client registry"""
+    global _http_clients
+    _http_clients = HttpClientRegistry()
+    return _http_clients
+
+
+def get_http_clients() -> HttpClientRegistry:
+    """Get the global registry (created lazily for scripts that skip app startup)"""
+    return _http_clients or init_http_clients()
+
+
+@asynccontextmanager
+async def http_client(name: str) -> AsyncIterator[httpx.AsyncClient]:
+    """Borrow the shared client for an integration (never closed by the caller)"""
+    yield get_http_clients().get(name)
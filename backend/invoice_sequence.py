@@ -0,0 +1,122 @@
+"""
+Invoice Sequence Allocator
+==========================
+
+Hands out per-organization invoice numbers from leased blocks:
+- Each worker leases N numbers at a time with one `$inc seq N` on the org's
+  `counters` document (`invoice_{org}`), then issues them from memory
+- The counter's `seq` is the persisted high-water mark; a lease never reuses
+  numbers, so workers cannot collide
+- On shutdown unused numbers are handed back when no other worker leased since
+- Gap-free mode (block size 1 or per call) keeps the original one-`$inc`-per-order
+  behaviour for tenants that need strictly consecutive numbers
+
+PERFORMANCE TARGETS:
+- Invoice number: O(1) in memory for N-1 of every N orders
+- Hot counter document writes: 1 per block instead of 1 per order
+"""
+
+import asyncio
+from typing import Any, Dict, Optional
+
+
+class InvoiceSequenceAllocator:
+    """Block-leasing invoice number allocator (one instance per worker)"""
+
+    def __init__(self, db, block_size: int = 10, gap_free: bool = False):
+        self.db = db
+        self.BLOCK_SIZE = max(1, block_size)
+        self.GAP_FREE = gap_free or self.BLOCK_SIZE == 1
+
+        # org -> {"next": next number to hand out, "end": last number in the lease}
+        self._leases: Dict[str, Dict[str, int]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._stats = {
+            "issued_from_lease": 0,
+            "issued_gap_free": 0,
+            "leases": 0,
+            "numbers_released": 0,
+        }
+
+    @staticmethod
+    def _counter_id(organization_id: str) -> str:
+        return f"invoice_{organization_id}"
+
+    async def _increment(self, organization_id: str, amount: int) -> int:
+        counter = await self.db.counters.find_one_and_update(
+            {"_id": self._counter_id(organization_id)},
+            {"$inc": {"seq": amount}},
+            upsert=True,
+            return_document=True,
+        )
+        return counter["seq"]
+
+    async def next(self, organization_id: str, gap_free: Optional[bool] = None) -> int:
+        """Next invoice number for the org"""
+        if self.GAP_FREE if gap_free is None else gap_free:
+            self._stats["issued_gap_free"] += 1
+            return await self._increment(organization_id, 1)
+
+        lease = self._leases.get(organization_id)
+        if lease and lease["next"] <= lease["end"]:
+            number = lease["next"]
+            lease["next"] += 1
+            self._stats["issued_from_lease"] += 1
+            return number
+
+        lock = self._locks.setdefault(organization_id, asyncio.Lock())
+        async with lock:
+            lease = self._leases.get(organization_id)
+            if not lease or lease["next"] > lease["end"]:
+                end = await self._increment(organization_id, self.BLOCK_SIZE)
+                lease = {"next": end - self.BLOCK_SIZE + 1, "end": end}
+                self._leases[organization_id] = lease
+                self._stats["leases"] += 1
+            number = lease["next"]
+            lease["next"] += 1
+            self._stats["issued_from_lease"] += 1
+            return number
+
+    async def release(self, organization_id: Optional[str] = None):
+        """
+        Hand unused leased numbers back to the counter. Only succeeds while our
+        lease is still the high-water mark, otherwise the gap is left as is.
+        """
+        orgs = [organization_id] if organization_id else list(self._leases)
+        for org in orgs:
+            lease = self._leases.pop(org, None)
+            if not lease or lease["next"] > lease["end"]:
+                continue
+            try:
+                result = await self.db.counters.update_one(
+                    {"_id": self._counter_id(org), "seq": lease["end"]},
+                    {"$set": {"seq": lease["next"] - 1}},
+                )
+                if result.modified_count:
+                    self._stats["numbers_released"] += lease["end"] - lease["next"] + 1
+            except Exception as e:
+                print(f"⚠️ Invoice lease release failed for {org}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "block_size": self.BLOCK_SIZE,
+            "gap_free": self.GAP_FREE,
+            "active_leases": len(self._leases),
+        }
+
+
+# Global instance
+_invoice_allocator: Optional[InvoiceSequenceAllocator] = None
+
+
+def init_invoice_allocator(db, block_size: int = 10, gap_free: bool = False) -> InvoiceSequenceAllocator:
+    """Initialize the invoice allocator against the active database"""
+    global _invoice_allocator
+    _invoice_allocator = InvoiceSequenceAllocator(db, block_size=block_size, gap_free=gap_free)
+    return _invoice_allocator
+
+
+def get_invoice_allocator() -> Optional[InvoiceSequenceAllocator]:
+    """Get the global invoice allocator instance"""
+    return _invoice_allocator
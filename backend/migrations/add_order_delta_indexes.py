@@ -0,0 +1,60 @@
+"""
+Database Migration: Delta-sync indexes for active orders
+
+GET /api/orders?since=<cursor> returns only orders whose updated_at is newer
+than the client's cursor, plus tombstones for hard-deleted orders.
+
+This migration:
+1. Backfills updated_at (from created_at) on orders that never had one
+2. Creates the (organization_id, updated_at) index on orders
+3. Creates the order_tombstones indexes (org lookup + 7-day TTL expiry)
+
+Expected performance improvement:
+- Order screen polls: full active list (up to 500 orders) → changed orders only
+- Delta query: collection scan → index range scan
+"""
+
+import asyncio
+import os
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_delta import ensure_delta_indexes  # noqa: E402
+
+load_dotenv()
+
+
+async def add_order_delta_indexes():
+    """Backfill updated_at and add the delta-sync indexes"""
+    
+    # Connect to MongoDB
+    mongo_url = os.getenv("MONGO_URL")
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.getenv("DB_NAME", "restrobill")]
+    
+    print("🔧 Adding delta-sync indexes to orders / order_tombstones...")
+    
+    try:
+        result = await db.orders.update_many(
+            {"updated_at": {"$exists": False}, "created_at": {"$exists": True}},
+            [{"$set": {"updated_at": "$created_at"}}],
+        )
+        print(f"📊 Orders backfilled with updated_at: {result.modified_count}")
+        
+        await ensure_delta_indexes(db)
+        print("✅ Created index: organization_id_1_updated_at_1")
+        print("✅ Created indexes: order_tombstones (organization_id, deleted_at) + TTL")
+        
+        print("\n✅ Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(add_order_delta_indexes())
@@ -0,0 +1,59 @@
+"""
+Database Migration: Normalized restaurant slugs for the public menu URL
+
+/r/{restaurant_slug}/menu used to fall back to loading every restaurant and
+slugifying names in Python. Lookups now go through two normalized fields on
+admin user documents (see restaurant_slugs.py).
+
+This migration:
+1. Backfills menu_slug / menu_name_slug from business_settings (the server
+   also does this at startup for documents missing the current SLUG_VERSION)
+2. Reports custom slugs shared by more than one restaurant and keeps the
+   slug on the oldest one (the newer ones fall back to their name slug)
+3. Creates the partial unique menu_slug index and the menu_name_slug index
+
+Expected performance improvement:
+- /r/{slug}/menu miss path: full users scan → single index lookup
+"""
+
+import asyncio
+import os
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from restaurant_slugs import ensure_slug_indexes, backfill_slug_fields  # noqa: E402
+
+load_dotenv()
+
+
+async def add_restaurant_slug_index():
+    """Backfill normalized slugs and add the slug indexes"""
+    
+    # Connect to MongoDB
+    mongo_url = os.getenv("MONGO_URL")
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.getenv("DB_NAME", "restrobill")]
+    
+    print("🔧 Adding normalized menu slugs to users collection...")
+    
+    try:
+        result = await backfill_slug_fields(db, stale_only=False)
+        print(f"📊 Users backfilled: {result['updated']} ({result['custom_slugs']} custom slugs, "
+              f"{result['duplicates']} duplicates dropped)")
+        
+        await ensure_slug_indexes(db)
+        print("✅ Created indexes: menu_slug (unique, partial), menu_name_slug_1_created_at_1")
+        
+        print("\n✅ Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(add_restaurant_slug_index())
@@ -0,0 +1,84 @@
+"""
+Database Migration: Unique index on orders.tracking_token
+
+Order creation no longer reads the orders collection to check a new tracking
+token for collisions; uniqueness is enforced by this index and the insert is
+retried with a fresh token on a duplicate key error.
+
+This migration:
+1. Reports tracking tokens already shared by more than one order
+2. Re-issues tokens for the newer duplicates
+3. Drops a non-unique tracking_token index (the old startup fallback), which
+   would otherwise block the unique one
+4. Creates the partial unique index (string tokens only, legacy nulls ignored)
+
+Until the unique index exists, the server checks every new token with a
+lookup (see ensure_tracking_token_index in server.py).
+
+Expected performance improvement:
+- create_order critical path: 1+ fewer round-trips per order
+- /api/public/track and /api/public/receipt: collection scan → index lookup
+"""
+
+import asyncio
+import os
+import secrets
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACKING_TOKEN_ALPHABET = "23456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+async def add_tracking_token_index():
+    """Deduplicate tracking tokens and add the unique index"""
+    
+    # Connect to MongoDB
+    mongo_url = os.getenv("MONGO_URL")
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.getenv("DB_NAME", "restrobill")]
+    
+    print("🔧 Adding unique tracking_token index to orders collection...")
+    
+    try:
+        duplicates = await db.orders.aggregate([
+            {"$match": {"tracking_token": {"$type": "string"}}},
+            {"$group": {"_id": "$tracking_token", "ids": {"$push": "$id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+        ], allowDiskUse=True).to_list(None)
+        print(f"📊 Duplicate tracking tokens: {len(duplicates)}")
+        
+        for dup in duplicates:
+            # Keep the token on the oldest order, re-issue for the rest
+            orders = await db.orders.find(
+                {"tracking_token": dup["_id"]}, {"_id": 0, "id": 1}
+            ).sort("created_at", 1).to_list(None)
+            for order in orders[1:]:
+                new_token = "".join(secrets.choice(TRACKING_TOKEN_ALPHABET) for _ in range(8))
+                await db.orders.update_one({"id": order["id"]}, {"$set": {"tracking_token": new_token}})
+                print(f"  - Order {order['id']}: {dup['_id']} → {new_token}")
+        
+        indexes = await db.orders.index_information()
+        for name, spec in indexes.items():
+            if spec.get("key") == [("tracking_token", 1)] and not spec.get("unique"):
+                await db.orders.drop_index(name)
+                print(f"🗑️  Dropped non-unique index: {name}")
+        
+        index = await db.orders.create_index(
+            "tracking_token",
+            unique=True,
+            partialFilterExpression={"tracking_token": {"$type": "string"}},
+        )
+        print(f"✅ Created index: {index}")
+        
+        print("\n✅ Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(add_tracking_token_index())
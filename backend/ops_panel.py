@@ -469,12 +469,10 @@ async def clear_system_cache(
         
         cache = get_cache()
         if cache and cache.is_connected():
-            # Clear all cache keys (be careful in production)
-            if hasattr(cache, 'keys'):
-                keys = await cache.keys("*")
-                if keys:
-                    await cache.delete(*keys)
-                    print(f"🗑️ Cleared {len(keys)} cache keys")
+            # Clear all cache keys (be careful in production) - SCAN-based, in batches
+            if hasattr(cache, 'delete_pattern'):
+                cleared = await cache.delete_pattern("*")
+                print(f"🗑️ Cleared {cleared} cache keys")
             
         # Background task for additional cleanup
         background_tasks.add_task(perform_background_cleanup)
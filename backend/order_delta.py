@@ -0,0 +1,127 @@
+"""
+Active Orders Delta Sync
+========================
+
+Incremental sync for order screens (`GET /api/orders?since=<cursor>`)
+instead of re-downloading every active order on each poll:
+- The cursor is the newest `updated_at` the client has applied; only
+  orders created or changed after it are returned, served by the
+  (organization_id, updated_at) index
+- Orders that left the active list (completed / cancelled / paid ...) come
+  back as small `closed` stubs, hard-deleted orders as tombstones from the
+  `order_tombstones` collection (TTL-expired after TOMBSTONE_TTL_DAYS)
+- The returned cursor trails "now" by CLOCK_SKEW_SECONDS, so writes from
+  workers with a slightly late clock are re-sent rather than missed
+  (clients upsert by id, duplicates are harmless)
+- Cursors older than tombstone retention (or unparseable) get a full list
+  with `full_resync: true`
+
+PERFORMANCE TARGETS:
+- Steady-state poll: 0-5 changed orders per response (vs up to 500)
+- Payload bytes: >90% smaller than the full active list
+- Query: index range scan on (organization_id, updated_at)
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+# Statuses that remove an order from the active list (same as GET /orders)
+CLOSED_STATUSES = ["completed", "cancelled", "paid", "billed", "settled"]
+
+TOMBSTONE_TTL_DAYS = 7
+CLOCK_SKEW_SECONDS = 2
+MAX_DELTA_ORDERS = 500
+
+# Fields kept for orders that left the active list
+CLOSED_STUB_FIELDS = ("id", "status", "table_id", "updated_at")
+
+
+def _parse_cursor(since: Optional[str]) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(since.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    # updated_at is stored as a UTC ISO string, compare in the same form
+    return parsed.astimezone(timezone.utc)
+
+
+async def ensure_delta_indexes(db):
+    """Indexes for delta queries and tombstone lookups/expiry"""
+    await db.orders.create_index([("organization_id", 1), ("updated_at", 1)])
+    await db.order_tombstones.create_index([("organization_id", 1), ("deleted_at", 1)])
+    await db.order_tombstones.create_index(
+        "deleted_at", expireAfterSeconds=TOMBSTONE_TTL_DAYS * 86400
+    )
+
+
+async def record_tombstone(db, org_id: str, order_id: str):
+    """Remember a hard-deleted order so delta clients can drop it"""
+    try:
+        await db.order_tombstones.insert_one({
+            "organization_id": org_id,
+            "order_id": order_id,
+            "deleted_at": datetime.now(timezone.utc),
+        })
+    except Exception as e:
+        print(f"⚠️ Order tombstone write failed for {order_id}: {e}")
+
+
+async def get_active_orders_delta(db, org_id: str, since: Optional[str]) -> Dict[str, Any]:
+    """
+    Changes to the org's active orders after the cursor
+
+    Returns {"orders", "closed", "deleted", "cursor", "has_more", "full_resync"};
+    with has_more the client should call again straight away with the new cursor.
+    """
+    now = datetime.now(timezone.utc)
+    cursor = _parse_cursor(since)
+
+    if cursor is None or cursor < now - timedelta(days=TOMBSTONE_TTL_DAYS):
+        orders = await db.orders.find(
+            {"organization_id": org_id, "status": {"$nin": CLOSED_STATUSES}}, {"_id": 0}
+        ).sort("created_at", -1).limit(MAX_DELTA_ORDERS).to_list(MAX_DELTA_ORDERS)
+        return {
+            "orders": orders,
+            "closed": [],
+            "deleted": [],
+            "cursor": (now - timedelta(seconds=CLOCK_SKEW_SECONDS)).isoformat(),
+            "has_more": False,
+            "full_resync": True,
+        }
+
+    since_iso = cursor.isoformat()
+    changed = await db.orders.find(
+        {"organization_id": org_id, "updated_at": {"$gt": since_iso}}, {"_id": 0}
+    ).sort("updated_at", 1).limit(MAX_DELTA_ORDERS + 1).to_list(MAX_DELTA_ORDERS + 1)
+    has_more = len(changed) > MAX_DELTA_ORDERS
+    changed = changed[:MAX_DELTA_ORDERS]
+
+    tombstones = await db.order_tombstones.find(
+        {"organization_id": org_id, "deleted_at": {"$gt": cursor}},
+        {"_id": 0, "order_id": 1},
+    ).to_list(None)
+
+    orders: List[Dict[str, Any]] = []
+    closed: List[Dict[str, Any]] = []
+    for order in changed:
+        if order.get("status") in CLOSED_STATUSES:
+            closed.append({field: order.get(field) for field in CLOSED_STUB_FIELDS})
+        else:
+            orders.append(order)
+
+    if has_more:
+        next_cursor = changed[-1].get("updated_at") or since_iso
+    else:
+        # Trail "now" so late-clocked writes are picked up by the next poll
+        next_cursor = max(since_iso, (now - timedelta(seconds=CLOCK_SKEW_SECONDS)).isoformat())
+
+    return {
+        "orders": orders,
+        "closed": closed,
+        "deleted": [tombstone["order_id"] for tombstone in tombstones],
+        "cursor": next_cursor,
+        "has_more": has_more,
+        "full_resync": False,
+    }
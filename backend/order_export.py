@@ -0,0 +1,320 @@
+"""
+Order Export Streaming
+======================
+
+Constant-memory order exports for /orders/export/excel:
+- CSV streamed straight from a Motor cursor in batches (no 10k cap, no giant string)
+- Async XLSX export jobs written with openpyxl write-only mode to a temp file
+- Job state kept in Mongo (`export_jobs`) so any Gunicorn worker can report
+  progress and serve the download; files live in a shared temp directory
+
+PERFORMANCE TARGETS:
+- Memory: one batch of orders at a time, regardless of date range
+- First byte of a CSV export in one batch round-trip
+"""
+
+import asyncio
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_JOB_TTL_HOURS = 1
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "billbytekot_exports")))
+
+# Only the fields the export writes are read from Mongo
+EXPORT_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "invoice_number": 1,
+    "created_at": 1,
+    "table_number": 1,
+    "customer_name": 1,
+    "customer_phone": 1,
+    "waiter_name": 1,
+    "items.name": 1,
+    "items.quantity": 1,
+    "items.price": 1,
+    "subtotal": 1,
+    "tax": 1,
+    "discount": 1,
+    "total": 1,
+    "payment_method": 1,
+    "status": 1,
+}
+
+EXPORT_COLUMNS = [
+    "Invoice #", "Order ID", "Date", "Time", "Table", "Customer Name", "Phone", "Waiter",
+    "Item Name", "Quantity", "Unit Price", "Item Total", "Subtotal", "Tax", "Discount", "Total",
+    "Payment Method", "Status",
+]
+CSV_HEADER = ",".join(EXPORT_COLUMNS) + "\n"
+_QUANTITY_COLUMN = 9
+_MONEY_COLUMNS = {10, 11, 12, 13, 14, 15}
+_BLANK_ROW = [""] * len(EXPORT_COLUMNS)
+
+
+def build_export_query(organization_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict:
+    query: Dict[str, Any] = {"organization_id": organization_id}
+    if start_date or end_date:
+        query["created_at"] = {}
+        if start_date:
+            query["created_at"]["$gte"] = start_date
+        if end_date:
+            query["created_at"]["$lte"] = end_date
+    return query
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def order_export_rows(order: Dict) -> List[List[Any]]:
+    """
+    Rows for one order: details on the first item row, one row per further
+    item, a totals row and a blank separator row.
+    """
+    created_at = order.get("created_at", "") or ""
+    try:
+        dt = datetime.fromisoformat(str(created_at).replace("Z", "+00:00"))
+        date_str = dt.strftime("%Y-%m-%d")
+        time_str = dt.strftime("%H:%M:%S")
+    except ValueError:
+        date_str = str(created_at)
+        time_str = ""
+
+    order_details = [
+        order.get("invoice_number", "") or "",
+        (order.get("id") or "")[:8],
+        date_str,
+        time_str,
+        order.get("table_number", ""),
+        order.get("customer_name", "") or "",
+        order.get("customer_phone", "") or "",
+        order.get("waiter_name", "") or "",
+    ]
+
+    rows = []
+    items = order.get("items") or []
+    for index, item in enumerate(items):
+        quantity = item.get("quantity", 0) or 0
+        price = _number(item.get("price"))
+        details = order_details if index == 0 else [""] * len(order_details)
+        rows.append(details + [item.get("name", "") or "", quantity, price, quantity * price, "", "", "", "", "", ""])
+
+    if items:
+        rows.append([""] * 12 + [
+            _number(order.get("subtotal")),
+            _number(order.get("tax")),
+            _number(order.get("discount")),
+            _number(order.get("total")),
+            order.get("payment_method", "") or "",
+            order.get("status", "") or "",
+        ])
+    rows.append(list(_BLANK_ROW))
+    return rows
+
+
+def format_csv_row(row: List[Any]) -> str:
+    cells = []
+    for index, value in enumerate(row):
+        if value == "" or value is None:
+            cells.append('""')
+        elif index in _MONEY_COLUMNS and isinstance(value, (int, float)):
+            cells.append(f"{value:.2f}")
+        elif index == _QUANTITY_COLUMN and isinstance(value, (int, float)):
+            cells.append(str(value))
+        else:
+            cells.append('"' + str(value).replace('"', '""') + '"')
+    return ",".join(cells) + "\n"
+
+
+def export_cursor(db, query: Dict, batch_size: int = EXPORT_BATCH_SIZE):
+    """Newest-first cursor over the projected export fields"""
+    return db.orders.find(query, EXPORT_PROJECTION).sort("created_at", -1).batch_size(batch_size)
+
+
+async def stream_orders_csv(db, query: Dict, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Yield the CSV export one batch of orders at a time"""
+    yield CSV_HEADER.encode("utf-8")
+    chunk: List[str] = []
+    pending = 0
+    async for order in export_cursor(db, query, batch_size):
+        for row in order_export_rows(order):
+            chunk.append(format_csv_row(row))
+        pending += 1
+        if pending >= batch_size:
+            yield "".join(chunk).encode("utf-8")
+            chunk = []
+            pending = 0
+    if chunk:
+        yield "".join(chunk).encode("utf-8")
+
+
+class OrderExportJobs:
+    """Background XLSX export jobs with Mongo-tracked state"""
+
+    def __init__(self, db):
+        self.db = db
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def ensure_indexes(self):
+        await self.db.export_jobs.create_index("id", unique=True)
+        await self.db.export_jobs.create_index([("organization_id", 1), ("created_at", -1)])
+
+    async def start(self, organization_id: str, query: Dict) -> Dict:
+        await self.purge_expired()
+        job_id = str(uuid.uuid4())
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": job_id,
+            "organization_id": organization_id,
+            "status": "queued",
+            "format": "xlsx",
+            "orders_exported": 0,
+            "file_path": None,
+            "file_name": None,
+            "error": None,
+            "created_at": now.isoformat(),
+            "completed_at": None,
+            "expires_at": (now + timedelta(hours=EXPORT_JOB_TTL_HOURS)).isoformat(),
+        }
+        await self.db.export_jobs.insert_one(dict(job))
+        task = asyncio.create_task(self._run(job_id, query))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _t: self._tasks.pop(job_id, None))
+        return job
+
+    async def get(self, job_id: str, organization_id: str) -> Optional[Dict]:
+        return await self.db.export_jobs.find_one(
+            {"id": job_id, "organization_id": organization_id}, {"_id": 0}
+        )
+
+    async def _run(self, job_id: str, query: Dict):
+        EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        loop = asyncio.get_running_loop()
+        file_path = None
+        try:
+            await self.db.export_jobs.update_one({"id": job_id}, {"$set": {"status": "running"}})
+            try:
+                from openpyxl import Workbook
+                file_format = "xlsx"
+            except ImportError:
+                # Same fallback as the daybook export: plain CSV
+                Workbook = None
+                file_format = "csv"
+
+            file_name = f"invoices_export_{stamp}.{file_format}"
+            file_path = EXPORT_DIR / f"{job_id}.{file_format}"
+            exported = 0
+
+            if Workbook is not None:
+                workbook = Workbook(write_only=True)
+                sheet = workbook.create_sheet("Orders")
+                sheet.append(EXPORT_COLUMNS)
+                batch: List[List[Any]] = []
+                async for order in export_cursor(self.db, query):
+                    batch.extend(order_export_rows(order))
+                    exported += 1
+                    if exported % EXPORT_BATCH_SIZE == 0:
+                        await loop.run_in_executor(None, _append_rows, sheet, batch)
+                        batch = []
+                        await self._progress(job_id, exported)
+                if batch:
+                    await loop.run_in_executor(None, _append_rows, sheet, batch)
+                await loop.run_in_executor(None, workbook.save, str(file_path))
+            else:
+                with open(file_path, "w", encoding="utf-8", newline="") as handle:
+                    handle.write(CSV_HEADER)
+                    async for order in export_cursor(self.db, query):
+                        handle.write("".join(format_csv_row(row) for row in order_export_rows(order)))
+                        exported += 1
+                        if exported % EXPORT_BATCH_SIZE == 0:
+                            await self._progress(job_id, exported)
+
+            await self.db.export_jobs.update_one({"id": job_id}, {"$set": {
+                "status": "completed",
+                "format": file_format,
+                "orders_exported": exported,
+                "file_path": str(file_path),
+                "file_name": file_name,
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+            }})
+            print(f"✅ Export job {job_id} completed: {exported} orders")
+        except asyncio.CancelledError:
+            # Shutdown / worker recycle: don't leave clients polling a "running" job forever
+            print(f"⚠️ Export job {job_id} interrupted")
+            if file_path is not None:
+                try:
+                    os.unlink(file_path)
+                except OSError:
+                    pass
+            await self.db.export_jobs.update_one({"id": job_id}, {"$set": {
+                "status": "failed",
+                "error": "Export interrupted by a server restart, please start it again",
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+            }})
+            raise
+        except Exception as e:
+            print(f"❌ Export job {job_id} failed: {e}")
+            await self.db.export_jobs.update_one({"id": job_id}, {"$set": {
+                "status": "failed",
+                "error": str(e),
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+            }})
+
+    async def _progress(self, job_id: str, exported: int):
+        await self.db.export_jobs.update_one({"id": job_id}, {"$set": {"orders_exported": exported}})
+
+    async def purge_expired(self):
+        """Delete export files and job records past their expiry"""
+        now = datetime.now(timezone.utc).isoformat()
+        try:
+            expired = await self.db.export_jobs.find(
+                {"expires_at": {"$lt": now}}, {"_id": 0, "id": 1, "file_path": 1}
+            ).to_list(100)
+            for job in expired:
+                if job.get("file_path"):
+                    try:
+                        os.unlink(job["file_path"])
+                    except OSError:
+                        pass
+            if expired:
+                await self.db.export_jobs.delete_many({"id": {"$in": [job["id"] for job in expired]}})
+        except Exception as e:
+            print(f"⚠️ Export job cleanup error: {e}")
+
+    async def shutdown(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        # Let each job record its interrupted status before Mongo closes
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _append_rows(sheet, rows: List[List[Any]]):
+    for row in rows:
+        sheet.append(row)
+
+
+# Global instance
+_order_export_jobs: Optional[OrderExportJobs] = None
+
+
+def init_order_export_jobs(db) -> OrderExportJobs:
+    """Initialize the export job manager against the active database"""
+    global _order_export_jobs
+    _order_export_jobs = OrderExportJobs(db)
+    return _order_export_jobs
+
+
+def get_order_export_jobs() -> Optional[OrderExportJobs]:
+    """Get the global export job manager instance"""
+    return _order_export_jobs
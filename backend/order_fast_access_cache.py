@@ -7,8 +7,8 @@ Provides ultra-fast order and billing data access with:
 - Customer balance fast access
 - Billing calculation caching
 - Order filtering and pagination caching
-- Automatic invalidation on state changes
-- Memory-efficient storage
+- Automatic invalidation on state changes, broadcast to every worker
+- Memory-efficient storage (bounded L1 + Redis L2 via the shared tiered cache)
 
 PERFORMANCE TARGETS:
 - Order fetch: <50ms (vs MongoDB: 100-300ms)
@@ -17,14 +17,13 @@ PERFORMANCE TARGETS:
 - Cache hit rate: 85%+ for typical operations
 """
 
-import json
 import time
 import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
-from collections import defaultdict
 from enum import Enum
-import hashlib
+
+from tiered_cache import get_tiered_cache
 
 class OrderState(Enum):
     """Order state enumeration for caching logic"""
@@ -36,30 +35,24 @@ class OrderState(Enum):
 
 
 class OrderFastAccessCache:
-    """High-performance order and billing data cache"""
+    """High-performance order and billing data cache (backed by the shared tiered cache)"""
+    
+    ORDERS_NAMESPACE = "fast_orders"    # scope = org: active/status/page lists, single orders, bill totals
+    BILLING_NAMESPACE = "fast_billing"  # scope = org: customer balances, billing summary
     
     def __init__(self):
-        # Order state caching
-        self._orders_by_org: Dict[str, List[Dict]] = {}  # org_id -> list of orders
-        self._order_by_id: Dict[str, Dict] = {}  # order_id -> order details
-        self._orders_by_status: Dict[str, Dict[str, List[Dict]]] = {}  # org_id -> {status -> orders}
-        
-        # Billing cache
-        self._customer_balances: Dict[str, Dict[str, float]] = {}  # org_id -> {phone -> balance}
-        self._billing_summaries: Dict[str, Dict] = {}  # org_id -> summary data
-        self._payment_cache: Dict[str, Dict] = {}  # org_id -> payment info
-        
-        # Table-based caching
-        self._table_orders: Dict[str, Dict[str, str]] = {}  # org_id -> {table_id -> order_id}
-        
-        # Cache expiry tracking
-        self._cache_expiry: Dict[str, float] = {}  # cache_key -> expiry_timestamp
+        self.tiered = get_tiered_cache()
         
         # Configuration
         self.ORDER_CACHE_TTL = 120  # 2 minutes for order lists
         self.BILLING_CACHE_TTL = 300  # 5 minutes for billing data
         self.CUSTOMER_BALANCE_TTL = 600  # 10 minutes for customer balance
         
+        self.tiered.register(self.ORDERS_NAMESPACE, l1_max=2000, ttl=self.ORDER_CACHE_TTL,
+                             l1_serialized=True, require_l2=True)
+        self.tiered.register(self.BILLING_NAMESPACE, l1_max=5000, ttl=self.BILLING_CACHE_TTL,
+                             l1_serialized=True, require_l2=True)
+        
         # Statistics
         self._stats = {
             "order_hits": 0,
@@ -69,12 +62,17 @@ class OrderFastAccessCache:
             "invalidations": 0,
             "total_access_time": 0.0
         }
-        
-        self.redis_client = None
     
     async def set_redis_client(self, redis_client):
-        """Set Redis client for distributed caching"""
-        self.redis_client = redis_client
+        """Use a Redis client as the tiered cache L2 (if none is attached yet)"""
+        if self.tiered.redis is None:
+            await self.tiered.attach_redis(redis_client)
+    
+    async def _cached(self, namespace: str, org_id: str, key: str):
+        return await self.tiered.get(namespace, key, scope=org_id)
+    
+    async def _store(self, namespace: str, org_id: str, key: str, value: Any, ttl: int):
+        await self.tiered.set(namespace, key, value, scope=org_id, ttl=ttl)
     
     # ============ ORDER CACHING ============
     
@@ -86,31 +84,14 @@ class OrderFastAccessCache:
         """
         start_time = time.time()
         
-        cache_key = f"active_orders:{org_id}"
-        
-        # Check if cache is still valid
-        if use_cache and self._is_cache_valid(cache_key):
-            orders = self._orders_by_org.get(org_id, [])
-            access_time = (time.time() - start_time) * 1000
-            self._stats["order_hits"] += 1
-            self._stats["total_access_time"] += access_time
-            print(f"✅ Active orders HIT: {org_id} ({len(orders)} orders) in {access_time:.2f}ms")
-            return orders
-        
-        # Try Redis first
-        if self.redis_client and use_cache:
-            try:
-                redis_data = await self.redis_client.get(cache_key)
-                if redis_data:
-                    orders = json.loads(redis_data)
-                    self._orders_by_org[org_id] = orders
-                    self._cache_expiry[cache_key] = time.time() + self.ORDER_CACHE_TTL
-                    access_time = (time.time() - start_time) * 1000
-                    self._stats["order_hits"] += 1
-                    print(f"✅ Active orders HIT (Redis): {org_id} ({len(orders)} orders) in {access_time:.2f}ms")
-                    return orders
-            except Exception as e:
-                print(f"⚠️ Redis read failed: {e}")
+        if use_cache:
+            orders = await self._cached(self.ORDERS_NAMESPACE, org_id, "active")
+            if orders is not None:
+                access_time = (time.time() - start_time) * 1000
+                self._stats["order_hits"] += 1
+                self._stats["total_access_time"] += access_time
+                print(f"✅ Active orders HIT: {org_id} ({len(orders)} orders) in {access_time:.2f}ms")
+                return orders
         
         # Query MongoDB
         if not db:
@@ -127,19 +108,7 @@ class OrderFastAccessCache:
             ).sort("created_at", -1).to_list(None)
             
             # Cache the results
-            self._orders_by_org[org_id] = orders
-            self._cache_expiry[cache_key] = time.time() + self.ORDER_CACHE_TTL
-            
-            # Store in Redis
-            if self.redis_client:
-                try:
-                    await self.redis_client.setex(
-                        cache_key,
-                        self.ORDER_CACHE_TTL,
-                        json.dumps(orders, default=str)
-                    )
-                except Exception as e:
-                    print(f"⚠️ Redis write failed: {e}")
+            await self._store(self.ORDERS_NAMESPACE, org_id, "active", orders, self.ORDER_CACHE_TTL)
             
             access_time = (time.time() - start_time) * 1000
             self._stats["order_misses"] += 1
@@ -153,10 +122,10 @@ class OrderFastAccessCache:
     
     async def get_orders_by_status(self, org_id: str, status: str, db=None) -> List[Dict]:
         """Get orders filtered by status with caching"""
-        cache_key = f"orders:{org_id}:status:{status}"
+        cache_key = f"status:{status}"
         
-        if self._is_cache_valid(cache_key):
-            orders = self._orders_by_status.get(org_id, {}).get(status, [])
+        orders = await self._cached(self.ORDERS_NAMESPACE, org_id, cache_key)
+        if orders is not None:
             self._stats["order_hits"] += 1
             print(f"✅ Orders by status HIT: {org_id}/{status} ({len(orders)} orders)")
             return orders
@@ -167,12 +136,9 @@ class OrderFastAccessCache:
                 {"_id": 0}
             ).sort("created_at", -1).to_list(None)
             
-            # Cache
-            if org_id not in self._orders_by_status:
-                self._orders_by_status[org_id] = {}
-            self._orders_by_status[org_id][status] = orders
-            self._cache_expiry[cache_key] = time.time() + self.ORDER_CACHE_TTL
+            await self._store(self.ORDERS_NAMESPACE, org_id, cache_key, orders, self.ORDER_CACHE_TTL)
             
+            self._stats["order_misses"] += 1
             print(f"📊 Orders by status FETCH: {org_id}/{status} ({len(orders)} orders)")
             return orders
             
@@ -185,14 +151,11 @@ class OrderFastAccessCache:
         """Get single order with caching"""
         cache_key = f"order:{order_id}"
         
-        if cache_key in self._order_by_id:
-            order = self._order_by_id[cache_key]
-            if self._is_cache_valid(cache_key):
-                self._stats["order_hits"] += 1
-                print(f"✅ Order HIT: {order_id}")
-                return order
-            else:
-                del self._order_by_id[cache_key]
+        order = await self._cached(self.ORDERS_NAMESPACE, org_id, cache_key)
+        if order is not None:
+            self._stats["order_hits"] += 1
+            print(f"✅ Order HIT: {order_id}")
+            return order
         
         try:
             order = await db.orders.find_one(
@@ -201,10 +164,10 @@ class OrderFastAccessCache:
             )
             
             if order:
-                self._order_by_id[cache_key] = order
-                self._cache_expiry[cache_key] = time.time() + self.ORDER_CACHE_TTL
+                await self._store(self.ORDERS_NAMESPACE, org_id, cache_key, order, self.ORDER_CACHE_TTL)
                 print(f"📊 Order FETCH: {order_id}")
             
+            self._stats["order_misses"] += 1
             return order
             
         except Exception as e:
@@ -216,14 +179,13 @@ class OrderFastAccessCache:
         """
         Get paginated orders with caching
         """
-        cache_key = f"orders:{org_id}:page:{page}:size:{page_size}"
+        cache_key = f"page:{page}:size:{page_size}"
         
-        if self._is_cache_valid(cache_key):
-            orders = self._orders_by_org.get(f"paginated:{org_id}:{page}:{page_size}", [])
-            if orders:
-                self._stats["order_hits"] += 1
-                print(f"✅ Paginated orders HIT: page {page}")
-                return orders, len(orders)
+        orders = await self._cached(self.ORDERS_NAMESPACE, org_id, cache_key)
+        if orders:
+            self._stats["order_hits"] += 1
+            print(f"✅ Paginated orders HIT: page {page}")
+            return orders, len(orders)
         
         try:
             skip = (page - 1) * page_size
@@ -232,10 +194,7 @@ class OrderFastAccessCache:
                 {"_id": 0}
             ).sort("created_at", -1).skip(skip).limit(page_size).to_list(page_size)
             
-            # Cache
-            cache_id = f"paginated:{org_id}:{page}:{page_size}"
-            self._orders_by_org[cache_id] = orders
-            self._cache_expiry[cache_key] = time.time() + self.ORDER_CACHE_TTL
+            await self._store(self.ORDERS_NAMESPACE, org_id, cache_key, orders, self.ORDER_CACHE_TTL)
             
             return orders, len(orders)
             
@@ -251,33 +210,14 @@ class OrderFastAccessCache:
         Perfect for billing page display
         """
         start_time = time.time()
-        cache_key = f"balance:{org_id}:{phone}"
-        
-        # Check local cache
-        if org_id in self._customer_balances and phone in self._customer_balances[org_id]:
-            if self._is_cache_valid(cache_key):
-                balance = self._customer_balances[org_id][phone]
-                access_time = (time.time() - start_time) * 1000
-                self._stats["billing_hits"] += 1
-                print(f"✅ Balance HIT: {phone} = {balance} in {access_time:.2f}ms")
-                return balance
+        cache_key = f"balance:{phone}"
         
-        # Try Redis
-        if self.redis_client:
-            try:
-                redis_data = await self.redis_client.get(cache_key)
-                if redis_data:
-                    balance = float(redis_data)
-                    if org_id not in self._customer_balances:
-                        self._customer_balances[org_id] = {}
-                    self._customer_balances[org_id][phone] = balance
-                    self._cache_expiry[cache_key] = time.time() + self.CUSTOMER_BALANCE_TTL
-                    access_time = (time.time() - start_time) * 1000
-                    self._stats["billing_hits"] += 1
-                    print(f"✅ Balance HIT (Redis): {phone} = {balance} in {access_time:.2f}ms")
-                    return balance
-            except Exception as e:
-                print(f"⚠️ Redis error: {e}")
+        balance = await self._cached(self.BILLING_NAMESPACE, org_id, cache_key)
+        if balance is not None:
+            access_time = (time.time() - start_time) * 1000
+            self._stats["billing_hits"] += 1
+            print(f"✅ Balance HIT: {phone} = {balance} in {access_time:.2f}ms")
+            return float(balance)
         
         # Query database
         if not db:
@@ -291,17 +231,7 @@ class OrderFastAccessCache:
             
             balance = customer.get("wallet_balance", 0.0) if customer else 0.0
             
-            # Cache
-            if org_id not in self._customer_balances:
-                self._customer_balances[org_id] = {}
-            self._customer_balances[org_id][phone] = balance
-            self._cache_expiry[cache_key] = time.time() + self.CUSTOMER_BALANCE_TTL
-            
-            if self.redis_client:
-                try:
-                    await self.redis_client.setex(cache_key, self.CUSTOMER_BALANCE_TTL, str(balance))
-                except:
-                    pass
+            await self._store(self.BILLING_NAMESPACE, org_id, cache_key, balance, self.CUSTOMER_BALANCE_TTL)
             
             access_time = (time.time() - start_time) * 1000
             self._stats["billing_misses"] += 1
@@ -318,14 +248,11 @@ class OrderFastAccessCache:
         Get billing summary (totals, statistics) with caching
         Used for dashboard display
         """
-        cache_key = f"billing_summary:{org_id}"
-        
-        if self._is_cache_valid(cache_key):
-            summary = self._billing_summaries.get(org_id)
-            if summary:
-                self._stats["billing_hits"] += 1
-                print(f"✅ Billing summary HIT")
-                return summary
+        summary = await self._cached(self.BILLING_NAMESPACE, org_id, "summary")
+        if summary:
+            self._stats["billing_hits"] += 1
+            print(f"✅ Billing summary HIT")
+            return summary
         
         try:
             # Get today's totals
@@ -350,9 +277,7 @@ class OrderFastAccessCache:
                 "last_updated": datetime.now().isoformat()
             }
             
-            # Cache
-            self._billing_summaries[org_id] = summary
-            self._cache_expiry[cache_key] = time.time() + self.BILLING_CACHE_TTL
+            await self._store(self.BILLING_NAMESPACE, org_id, "summary", summary, self.BILLING_CACHE_TTL)
             
             self._stats["billing_misses"] += 1
             print(f"📊 Billing summary computed: {total_revenue} from {orders_count} orders")
@@ -369,10 +294,10 @@ class OrderFastAccessCache:
         """
         cache_key = f"bill_total:{order_id}"
         
-        if self._is_cache_valid(cache_key):
-            if cache_key in self._billing_summaries:
-                self._stats["billing_hits"] += 1
-                return self._billing_summaries[cache_key]
+        bill_data = await self._cached(self.ORDERS_NAMESPACE, org_id, cache_key)
+        if bill_data:
+            self._stats["billing_hits"] += 1
+            return bill_data
         
         try:
             order = await db.orders.find_one(
@@ -397,8 +322,7 @@ class OrderFastAccessCache:
                 "total": round(total, 2)
             }
             
-            self._billing_summaries[cache_key] = bill_data
-            self._cache_expiry[cache_key] = time.time() + self.BILLING_CACHE_TTL
+            await self._store(self.ORDERS_NAMESPACE, org_id, cache_key, bill_data, self.BILLING_CACHE_TTL)
             
             self._stats["billing_misses"] += 1
             print(f"📊 Bill total computed: {bill_data}")
@@ -411,94 +335,55 @@ class OrderFastAccessCache:
     # ============ CACHE INVALIDATION ============
     
     async def invalidate_order_cache(self, org_id: str, order_id: str = None):
-        """Invalidate order cache when state changes"""
-        # Invalidate specific order
-        if order_id:
-            cache_key = f"order:{order_id}"
-            if cache_key in self._order_by_id:
-                del self._order_by_id[cache_key]
-            if cache_key in self._cache_expiry:
-                del self._cache_expiry[cache_key]
-            
-            # Also invalidate billing cache for this order
-            bill_cache_key = f"bill_total:{order_id}"
-            if bill_cache_key in self._billing_summaries:
-                del self._billing_summaries[bill_cache_key]
-        
-        # Invalidate organization's active orders
-        cache_key = f"active_orders:{org_id}"
-        if org_id in self._orders_by_org:
-            del self._orders_by_org[org_id]
-        if cache_key in self._cache_expiry:
-            del self._cache_expiry[cache_key]
-        
-        # Invalidate all status caches for org
-        if org_id in self._orders_by_status:
-            del self._orders_by_status[org_id]
+        """Invalidate order cache when state changes (one version bump covers the whole org, all workers)"""
+        await self.tiered.invalidate(self.ORDERS_NAMESPACE, org_id)
         
         self._stats["invalidations"] += 1
         print(f"🗑️ Order cache invalidated for {org_id}/{order_id if order_id else 'all'}")
     
     async def invalidate_billing_cache(self, org_id: str):
         """Invalidate billing caches"""
-        if org_id in self._billing_summaries:
-            del self._billing_summaries[org_id]
-        if org_id in self._customer_balances:
-            del self._customer_balances[org_id]
+        await self.tiered.invalidate(self.BILLING_NAMESPACE, org_id)
         
         self._stats["invalidations"] += 1
         print(f"🗑️ Billing cache invalidated for {org_id}")
     
     async def invalidate_customer_balance(self, org_id: str, phone: str):
         """Invalidate customer balance cache after transaction"""
-        cache_key = f"balance:{org_id}:{phone}"
-        if org_id in self._customer_balances and phone in self._customer_balances[org_id]:
-            del self._customer_balances[org_id][phone]
-        if cache_key in self._cache_expiry:
-            del self._cache_expiry[cache_key]
+        await self.tiered.delete(self.BILLING_NAMESPACE, f"balance:{phone}", scope=org_id)
         
         print(f"🗑️ Balance cache invalidated for {phone}")
     
     # ============ UTILITIES ============
     
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """Check if cache entry is still valid (not expired)"""
-        if cache_key not in self._cache_expiry:
-            return False
-        return time.time() < self._cache_expiry[cache_key]
-    
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
         total_order_ops = self._stats["order_hits"] + self._stats["order_misses"]
         total_billing_ops = self._stats["billing_hits"] + self._stats["billing_misses"]
+        orders_ns = self.tiered.namespace(self.ORDERS_NAMESPACE)
+        billing_ns = self.tiered.namespace(self.BILLING_NAMESPACE)
         
         return {
             "order_cache": {
                 "hits": self._stats["order_hits"],
                 "misses": self._stats["order_misses"],
                 "hit_rate": f"{(self._stats['order_hits'] / total_order_ops * 100) if total_order_ops > 0 else 0:.2f}%",
-                "cached_org_orders": len(self._orders_by_org),
-                "cached_individual_orders": len(self._order_by_id)
+                "tiered": orders_ns.get_stats()
             },
             "billing_cache": {
                 "hits": self._stats["billing_hits"],
                 "misses": self._stats["billing_misses"],
                 "hit_rate": f"{(self._stats['billing_hits'] / total_billing_ops * 100) if total_billing_ops > 0 else 0:.2f}%",
-                "cached_balances": sum(len(balances) for balances in self._customer_balances.values()),
-                "cached_summaries": len(self._billing_summaries)
+                "tiered": billing_ns.get_stats()
             },
             "invalidations": self._stats["invalidations"],
-            "total_cache_entries": len(self._cache_expiry)
+            "total_cache_entries": len(orders_ns.store) + len(billing_ns.store)
         }
     
     def clear_all(self):
         """Clear all caches"""
-        self._orders_by_org.clear()
-        self._order_by_id.clear()
-        self._orders_by_status.clear()
-        self._customer_balances.clear()
-        self._billing_summaries.clear()
-        self._cache_expiry.clear()
+        self.tiered.clear(self.ORDERS_NAMESPACE)
+        self.tiered.clear(self.BILLING_NAMESPACE)
         print("🗑️ All caches cleared")
 
 
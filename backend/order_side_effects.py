@@ -0,0 +1,232 @@
+"""
+Order Side-Effects Pipeline
+===========================
+
+Per-worker pipeline for the follow-up work fired after an order is created:
+- Bounded task queue drained by a small worker pool (no unbounded create_task fan-out)
+- Simple writes are buffered and coalesced into one bulk_write per collection
+  every FLUSH_INTERVAL (e.g. all `$inc bill_count` for an org within 50ms
+  become a single UpdateOne)
+- Queue depth / lag / coalescing metrics for /health
+- Graceful drain on shutdown: queued tasks finish and buffered writes flush
+
+PERFORMANCE TARGETS:
+- Mongo round-trips per order burst: 1 bulk_write per collection per 50ms
+- Enqueue cost on the request path: O(1), never awaits the database
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+
+class OrderSideEffectPipeline:
+    """Bounded worker pool + coalescing bulk writer for post-order side-effects"""
+
+    def __init__(self, db, workers: int = 4, max_queue: int = 1000,
+                 flush_interval: float = 0.05, max_batch: int = 500):
+        self.db = db
+        self.WORKERS = workers
+        self.FLUSH_INTERVAL = flush_interval
+        self.MAX_BATCH = max_batch
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._workers: list = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._overflow: Set[asyncio.Task] = set()
+        self._running = False
+
+        # (collection, filter key) -> {"filter", "inc", "set", "upsert"}
+        self._pending_writes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._pending_ops = 0
+        self._first_pending_at: Optional[float] = None
+        self._write_ready = asyncio.Event()
+
+        self._stats = {
+            "tasks_enqueued": 0,
+            "tasks_completed": 0,
+            "tasks_failed": 0,
+            "tasks_overflowed": 0,
+            "writes_enqueued": 0,
+            "writes_flushed": 0,
+            "bulk_writes": 0,
+            "bulk_write_errors": 0,
+            "max_lag_ms": 0.0,
+            "last_lag_ms": 0.0,
+        }
+
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.WORKERS)]
+        self._flusher = asyncio.create_task(self._flush_loop())
+        print(f"✅ Order side-effects pipeline started ({self.WORKERS} workers, {self.FLUSH_INTERVAL * 1000:.0f}ms flush)")
+
+    # ---------------------------------------------------------------- tasks
+
+    def submit(self, name: str, func: Callable[..., Awaitable[Any]], *args, **kwargs):
+        """Queue a side-effect coroutine; never blocks the caller"""
+        item = (name, func, args, kwargs, time.monotonic())
+        if self._running:
+            try:
+                self._queue.put_nowait(item)
+                self._stats["tasks_enqueued"] += 1
+                return
+            except asyncio.QueueFull:
+                pass
+        # Queue full or pipeline stopped: run detached but keep it tracked for drain
+        self._stats["tasks_overflowed"] += 1
+        task = asyncio.create_task(self._run_item(item))
+        self._overflow.add(task)
+        task.add_done_callback(self._overflow.discard)
+
+    async def _worker(self, index: int):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._run_item(item)
+            finally:
+                self._queue.task_done()
+
+    async def _run_item(self, item):
+        name, func, args, kwargs, enqueued_at = item
+        lag_ms = (time.monotonic() - enqueued_at) * 1000
+        self._stats["last_lag_ms"] = round(lag_ms, 2)
+        if lag_ms > self._stats["max_lag_ms"]:
+            self._stats["max_lag_ms"] = round(lag_ms, 2)
+        try:
+            await func(*args, **kwargs)
+            self._stats["tasks_completed"] += 1
+        except Exception as e:
+            self._stats["tasks_failed"] += 1
+            print(f"❌ Side-effect {name} failed: {e}")
+
+    # ---------------------------------------------------------------- writes
+
+    def _pending_entry(self, collection: str, filter_doc: Dict, upsert: bool) -> Dict[str, Any]:
+        key = (collection, json.dumps(filter_doc, sort_keys=True, default=str))
+        entry = self._pending_writes.get(key)
+        if entry is None:
+            entry = {"filter": filter_doc, "inc": {}, "set": {}, "upsert": upsert}
+            self._pending_writes[key] = entry
+        entry["upsert"] = entry["upsert"] or upsert
+        self._stats["writes_enqueued"] += 1
+        self._pending_ops += 1
+        if self._first_pending_at is None:
+            self._first_pending_at = time.monotonic()
+        self._write_ready.set()
+        return entry
+
+    def increment(self, collection: str, filter_doc: Dict, field: str, amount: float = 1, upsert: bool = False):
+        """Buffer a `$inc`; increments on the same document are summed before flushing"""
+        entry = self._pending_entry(collection, filter_doc, upsert)
+        entry["inc"][field] = entry["inc"].get(field, 0) + amount
+
+    def set_fields(self, collection: str, filter_doc: Dict, fields: Dict[str, Any], upsert: bool = False):
+        """Buffer a `$set`; later values for the same document and field win"""
+        entry = self._pending_entry(collection, filter_doc, upsert)
+        entry["set"].update(fields)
+
+    async def _flush_loop(self):
+        while True:
+            await self._write_ready.wait()
+            # Hold the window open so a burst lands in one bulk_write
+            if self._pending_ops < self.MAX_BATCH and self._first_pending_at is not None:
+                remaining = self.FLUSH_INTERVAL - (time.monotonic() - self._first_pending_at)
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+            await self.flush()
+
+    async def flush(self):
+        """Write all buffered operations, one bulk_write per collection"""
+        if not self._pending_writes:
+            self._write_ready.clear()
+            return
+        pending, self._pending_writes = self._pending_writes, {}
+        flushed_ops, self._pending_ops = self._pending_ops, 0
+        self._first_pending_at = None
+        self._write_ready.clear()
+
+        by_collection: Dict[str, list] = {}
+        for (collection, _), entry in pending.items():
+            update: Dict[str, Any] = {}
+            if entry["inc"]:
+                update["$inc"] = entry["inc"]
+            if entry["set"]:
+                update["$set"] = entry["set"]
+            if update:
+                by_collection.setdefault(collection, []).append(
+                    UpdateOne(entry["filter"], update, upsert=entry["upsert"])
+                )
+
+        for collection, operations in by_collection.items():
+            try:
+                await self.db[collection].bulk_write(operations, ordered=False)
+                self._stats["bulk_writes"] += 1
+            except Exception as e:
+                self._stats["bulk_write_errors"] += 1
+                print(f"❌ Side-effect bulk write to {collection} failed ({len(operations)} ops): {e}")
+        self._stats["writes_flushed"] += flushed_ops
+
+    # ---------------------------------------------------------------- lifecycle
+
+    async def drain(self, timeout: float = 10.0):
+        """Stop accepting queued work, finish what is queued and flush buffered writes"""
+        if not self._running:
+            await self.flush()
+            return
+        self._running = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Side-effects drain timed out with {self._queue.qsize()} tasks queued")
+        if self._overflow:
+            await asyncio.wait(list(self._overflow), timeout=timeout)
+
+        for task in self._workers:
+            task.cancel()
+        if self._flusher:
+            self._flusher.cancel()
+        await asyncio.gather(*self._workers, *([self._flusher] if self._flusher else []), return_exceptions=True)
+        self._workers = []
+        self._flusher = None
+
+        await self.flush()
+        print(f"✅ Order side-effects pipeline drained ({self._stats['tasks_completed']} tasks, {self._stats['writes_flushed']} writes)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        coalesced = self._stats["writes_flushed"] - self._stats["bulk_writes"]
+        oldest_write_ms = (
+            round((time.monotonic() - self._first_pending_at) * 1000, 2)
+            if self._first_pending_at is not None else 0.0
+        )
+        return {
+            **self._stats,
+            "running": self._running,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "overflow_in_flight": len(self._overflow),
+            "pending_writes": self._pending_ops,
+            "oldest_pending_write_ms": oldest_write_ms,
+            "round_trips_saved": max(coalesced, 0),
+        }
+
+
+# Global instance
+_order_side_effects: Optional[OrderSideEffectPipeline] = None
+
+
+def init_order_side_effects(db, **kwargs) -> OrderSideEffectPipeline:
+    """Initialize the side-effects pipeline against the active database"""
+    global _order_side_effects
+    _order_side_effects = OrderSideEffectPipeline(db, **kwargs)
+    return _order_side_effects
+
+
+def get_order_side_effects() -> Optional[OrderSideEffectPipeline]:
+    """Get the global side-effects pipeline instance"""
+    return _order_side_effects
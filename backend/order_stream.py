@@ -0,0 +1,370 @@
+"""
+Real-Time Order Stream
+======================
+
+Per-org push channel for POS terminals and kitchen screens (WebSocket `/ws`
+and SSE `/api/orders/stream`) instead of polling `GET /api/orders`:
+- Events (created / updated / status_changed / deleted / payment_completed)
+  are published on `orders:{org_id}` by RedisCache.publish_order_update and
+  fanned out to every worker via Redis pub/sub (PSUBSCRIBE orders:*)
+- Upstash REST has no SUBSCRIBE: events are also pushed to a short per-org
+  log (`orders:log:{org_id}`) that workers with connected clients poll; a
+  client of an org this worker isn't polling yet is held until the first
+  poll, then replayed from its cursor (first polls are never re-delivered)
+- In-process fallback bus: events are always delivered to local subscribers
+  first, so a single worker keeps streaming when Redis is down
+- Resume cursor: every event has an id; clients reconnect with `since`
+  (or SSE Last-Event-ID) and get the missed events from a bounded per-org
+  buffer, or a `resync` event whenever the buffer can't prove it holds
+  every event after the cursor (coverage starts when this worker began
+  receiving the org's events: listener (re)subscribe, or first log poll)
+
+PERFORMANCE TARGETS:
+- Order screens: 0 list queries while connected (1 refetch per resync)
+- Fan-out: O(subscribers) per event, no database reads on the hot path
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+ORDER_CHANNEL_PREFIX = "orders:"
+ORDER_LOG_PREFIX = "orders:log:"
+# Expiry of the Upstash event log, refreshed on every push
+ORDER_LOG_TTL = 3600
+
+# Stream message "type" per action (matches the frontend websocketManager)
+EVENT_TYPES = {
+    "created": "order_created",
+    "updated": "order_updated",
+    "status_changed": "order_status_changed",
+    "deleted": "order_deleted",
+    "payment_completed": "payment_completed",
+}
+
+
+def _cursor(event_id: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Sort key of an event id ("{ms}-{seq}-{origin}")"""
+    try:
+        ms, seq = event_id.split("-")[:2]
+        return int(ms), int(seq)
+    except (AttributeError, ValueError):
+        return None
+
+
+def to_client_message(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Wire format shared by the WebSocket and SSE endpoints"""
+    if event.get("action") == "resync":
+        return {"type": "resync", "event_id": event.get("id")}
+    order = {"id": event.get("order_id"), **(event.get("data") or {})}
+    return {
+        "type": EVENT_TYPES.get(event.get("action"), f"order_{event.get('action')}"),
+        "event_id": event.get("id"),
+        "order_id": event.get("order_id"),
+        "order": order,
+        "timestamp": event.get("timestamp"),
+    }
+
+
+class OrderEventHub:
+    """Per-worker fan-out of order events to connected clients"""
+
+    def __init__(self, buffer_size: int = 200, queue_size: int = 100, poll_interval: float = 1.0):
+        self.BUFFER_SIZE = buffer_size
+        self.QUEUE_SIZE = queue_size
+        self.POLL_INTERVAL = poll_interval
+
+        self.redis = None
+        self.instance_id = uuid.uuid4().hex[:8]
+        self.mode = "local_only"
+        self._seq = 0
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # org -> event id -> event (bounded replay buffer, also used for de-duplication)
+        self._buffers: Dict[str, "OrderedDict[str, Dict[str, Any]]"] = {}
+        # Oldest cursor the buffers are complete from: all orgs (pub/sub, local) ...
+        self._covered_from: Tuple[int, int] = (int(time.time() * 1000), 0)
+        # ... or per org, from its first log poll (Upstash)
+        self._org_coverage: Dict[str, Tuple[int, int]] = {}
+        # org -> queue -> since cursor, waiting for the org's first log poll
+        self._awaiting: Dict[str, Dict[asyncio.Queue, str]] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+        self._stats = {
+            "events_published": 0,
+            "events_received": 0,
+            "events_delivered": 0,
+            "events_replayed": 0,
+            "resyncs": 0,
+            "slow_consumers": 0,
+        }
+
+    # ------------------------------------------------------------ setup
+
+    async def attach_redis(self, redis_cache):
+        """Start the cross-worker listener (pub/sub, or log polling on Upstash)"""
+        self.redis = redis_cache
+        if self._listener is not None or not redis_cache or not redis_cache.is_connected():
+            return
+        client = getattr(redis_cache, "redis", None)
+        if not getattr(redis_cache, "use_upstash", False) and client is not None and hasattr(client, "pubsub"):
+            self.mode = "pubsub"
+            self._listener = asyncio.create_task(self._listen(client.pubsub()))
+            print("📡 Order stream listening on Redis pub/sub")
+        else:
+            self.mode = "log_poll"
+            self._listener = asyncio.create_task(self._poll_logs())
+            print(f"📡 Order stream polling Upstash event logs every {self.POLL_INTERVAL}s")
+
+    async def close(self):
+        tasks = [task for task in [self._listener, *self._background] if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._listener = None
+        self._background.clear()
+        self._resync_all()
+        for waiting in self._awaiting.values():
+            for queue in waiting:
+                self._offer(queue, {"action": "resync", "id": None})
+        self._awaiting.clear()
+
+    def _resync_all(self):
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._offer(queue, {"action": "resync", "id": None})
+
+    def spawn(self, coro):
+        """Run a publish off the request path, keeping a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    # ------------------------------------------------------------ publishing
+
+    def new_event(self, org_id: str, order_id: str, action: str, data: Optional[Dict] = None) -> Dict[str, Any]:
+        self._seq += 1
+        return {
+            "id": f"{int(time.time() * 1000)}-{self._seq}-{self.instance_id}",
+            "org_id": org_id,
+            "order_id": order_id,
+            "action": action,
+            "data": data,
+            "timestamp": time.time(),
+            "origin": self.instance_id,
+        }
+
+    def publish_local(self, org_id: str, order_id: str, action: str, data: Optional[Dict] = None) -> Dict[str, Any]:
+        """Create an event and deliver it to this worker's subscribers"""
+        event = self.new_event(org_id, order_id, action, data)
+        self._stats["events_published"] += 1
+        self._deliver(org_id, event)
+        return event
+
+    def receive(self, org_id: str, event: Dict[str, Any]):
+        """Deliver an event that arrived from another worker"""
+        if event.get("origin") == self.instance_id:
+            return
+        self._stats["events_received"] += 1
+        self._deliver(org_id, event)
+
+    def _deliver(self, org_id: str, event: Dict[str, Any]):
+        event_id = event.get("id")
+        buffer = self._buffers.setdefault(org_id, OrderedDict())
+        if event_id in buffer:
+            return
+        buffer[event_id] = event
+        while len(buffer) > self.BUFFER_SIZE:
+            buffer.popitem(last=False)
+        for queue in list(self._subscribers.get(org_id, ())):
+            self._offer(queue, event)
+
+    def _offer(self, queue: asyncio.Queue, event: Dict[str, Any]):
+        try:
+            queue.put_nowait(event)
+            self._stats["events_delivered"] += 1
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog and make it refetch once
+            self._stats["slow_consumers"] += 1
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({"action": "resync", "id": None})
+
+    # ------------------------------------------------------------ subscribing
+
+    def subscribe(self, org_id: str, since: Optional[str] = None) -> asyncio.Queue:
+        """Register a client queue, pre-filled with the events it missed since the cursor"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        if self.mode == "log_poll" and org_id not in self._org_coverage:
+            # Nothing read from this org's log yet: replay once it has been polled
+            # (a fresh client's cursor is "now", so events racing the connect aren't lost)
+            self._awaiting.setdefault(org_id, {})[queue] = since or f"{int(time.time() * 1000)}-0"
+            return queue
+        if since:
+            for event in self._replay(org_id, since):
+                self._offer(queue, event)
+        self._subscribers.setdefault(org_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, org_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(org_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[org_id]
+        waiting = self._awaiting.get(org_id)
+        if waiting:
+            waiting.pop(queue, None)
+            if not waiting:
+                del self._awaiting[org_id]
+        if self.mode == "log_poll" and org_id not in self._subscribers and org_id not in self._awaiting:
+            # Polling stops for this org, so its buffer stops being complete
+            self._org_coverage.pop(org_id, None)
+            self._buffers.pop(org_id, None)
+
+    def _coverage(self, org_id: str) -> Optional[Tuple[int, int]]:
+        if self.mode == "log_poll":
+            return self._org_coverage.get(org_id)
+        return self._covered_from
+
+    def _replay(self, org_id: str, since: str) -> List[Dict[str, Any]]:
+        cursor = _cursor(since)
+        coverage = self._coverage(org_id)
+        buffer = self._buffers.get(org_id) or OrderedDict()
+        oldest = _cursor(next(iter(buffer))) if buffer else None
+        truncated = len(buffer) >= self.BUFFER_SIZE and oldest is not None and cursor is not None and cursor < oldest
+        if cursor is None or coverage is None or cursor < coverage or truncated:
+            # The gap may hold events this worker never saw
+            self._stats["resyncs"] += 1
+            return [{"action": "resync", "id": None}]
+        if since in buffer:
+            events = list(buffer.values())
+            missed = events[events.index(buffer[since]) + 1:]
+        else:
+            missed = [event for event in buffer.values() if (_cursor(event["id"]) or (0, 0)) > cursor]
+        self._stats["events_replayed"] += len(missed)
+        return missed
+
+    # ------------------------------------------------------------ cross-worker
+
+    async def _listen(self, pubsub):
+        reconnect = False
+        while True:
+            try:
+                await pubsub.psubscribe(f"{ORDER_CHANNEL_PREFIX}*")
+                if reconnect:
+                    # Events published while disconnected never reached this worker
+                    self._covered_from = (int(time.time() * 1000), 0)
+                    self._resync_all()
+                reconnect = True
+                async for raw in pubsub.listen():
+                    if raw.get("type") != "pmessage":
+                        continue
+                    channel = raw.get("channel") or ""
+                    if channel.startswith(ORDER_LOG_PREFIX):
+                        continue
+                    try:
+                        event = json.loads(raw["data"])
+                    except (ValueError, TypeError):
+                        continue
+                    self.receive(channel[len(ORDER_CHANNEL_PREFIX):], event)
+            except asyncio.CancelledError:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+                raise
+            except Exception as e:
+                print(f"⚠️ Order stream listener error, resubscribing: {e}")
+                await asyncio.sleep(5)
+
+    async def _poll_logs(self):
+        while True:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            orgs = list(self._subscribers.keys() | self._awaiting.keys())
+            if not orgs or not self.redis or not self.redis.is_connected():
+                continue
+            try:
+                pipe = self.redis.pipeline()
+                for org_id in orgs:
+                    pipe.command("LRANGE", f"{ORDER_LOG_PREFIX}{org_id}", 0, self.BUFFER_SIZE - 1)
+                results = await pipe.execute()
+                polled_ms = int(time.time() * 1000)
+            except Exception as e:
+                print(f"⚠️ Order stream log poll failed: {e}")
+                continue
+            for org_id, entries in zip(orgs, results):
+                events = []
+                for raw in reversed(entries or []):
+                    try:
+                        event = json.loads(raw)
+                    except (ValueError, TypeError):
+                        continue
+                    if isinstance(event, dict) and _cursor(event.get("id")):
+                        events.append(event)
+                full = len(entries or []) >= self.BUFFER_SIZE
+                buffer = self._buffers.get(org_id) or {}
+                # A full log sharing no entry with the buffer: events were missed in between
+                gap = full and events and not any(event["id"] in buffer for event in events)
+                if org_id in self._org_coverage and not gap:
+                    for event in events:
+                        self.receive(org_id, event)
+                else:
+                    # First poll, or the log moved past everything buffered (a gap)
+                    self._start_coverage(org_id, events, full, polled_ms)
+
+    def _start_coverage(self, org_id: str, events: List[Dict[str, Any]], full: bool, polled_ms: int):
+        """Load an org's log into its buffer without re-delivering it, then serve waiting clients"""
+        gap = org_id in self._org_coverage
+        # A full log is complete from its oldest entry; a shorter one was never
+        # trimmed, so it holds every event since it last expired
+        coverage = _cursor(events[0]["id"]) if full and events else (polled_ms - ORDER_LOG_TTL * 1000, 0)
+        merged: "OrderedDict[str, Dict[str, Any]]" = OrderedDict((event["id"], event) for event in events)
+        for event_id, event in (self._buffers.get(org_id) or {}).items():
+            # Published on this worker after the log was read
+            if event_id not in merged and _cursor(event_id) >= coverage:
+                merged[event_id] = event
+        while len(merged) > self.BUFFER_SIZE:
+            merged.popitem(last=False)
+        self._buffers[org_id] = merged
+        self._org_coverage[org_id] = coverage
+        if gap:
+            self._stats["resyncs"] += 1
+            for queue in list(self._subscribers.get(org_id, ())):
+                self._offer(queue, {"action": "resync", "id": None})
+        for queue, since in self._awaiting.pop(org_id, {}).items():
+            for event in self._replay(org_id, since):
+                self._offer(queue, event)
+            self._subscribers.setdefault(org_id, set()).add(queue)
+
+    # ------------------------------------------------------------ stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "connected_clients": sum(len(queues) for queues in self._subscribers.values()),
+            "orgs_streaming": len(self._subscribers),
+            "buffered_orgs": len(self._buffers),
+            "awaiting_first_poll": sum(len(waiting) for waiting in self._awaiting.values()),
+            "cross_worker": self.mode if self._listener else "local_only",
+        }
+
+
+# Global instance (in-process bus works before Redis is attached)
+_order_event_hub = OrderEventHub()
+
+
+async def init_order_event_hub(redis_cache=None) -> OrderEventHub:
+    """Attach the shared Redis client to the global order event hub"""
+    if redis_cache is not None:
+        await _order_event_hub.attach_redis(redis_cache)
+    print("✅ Order event stream initialized")
+    return _order_event_hub
+
+
+def get_order_event_hub() -> OrderEventHub:
+    """Get the global order event hub"""
+    return _order_event_hub
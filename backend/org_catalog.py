@@ -0,0 +1,151 @@
+"""
+Org Catalog Snapshot
+====================
+
+Bulk-loaded, per-organization lookup tables for reports and exports:
+- Menu: id -> item, name -> item, name -> category
+- Staff roster: id -> user (username, role, email)
+
+Each snapshot is loaded with one menu query and one users query and memoized
+per org. A per-org version counter (`catalog_versions` collection) is bumped by
+the menu/staff write endpoints; other workers notice the bump on their next
+version check and reload, so edits propagate without waiting for a TTL.
+
+PERFORMANCE TARGETS:
+- Category/item/staff lookups: O(1) in memory
+- Report lookups: 2 queries per snapshot load instead of one per line item
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+# Fields kept per menu item / staff member (images and descriptions are not needed)
+MENU_PROJECTION = {"_id": 0, "id": 1, "name": 1, "category": 1, "price": 1, "available": 1}
+STAFF_PROJECTION = {"_id": 0, "id": 1, "username": 1, "role": 1, "email": 1}
+
+
+class OrgCatalog:
+    """Immutable snapshot of an organization's menu and staff roster"""
+
+    def __init__(self, organization_id: str, version: int, menu_items: list, staff: list):
+        self.organization_id = organization_id
+        self.version = version
+        self.loaded_at = time.time()
+        self.items_by_id: Dict[str, Dict] = {}
+        self.items_by_name: Dict[str, Dict] = {}
+        for item in menu_items:
+            if item.get("id"):
+                self.items_by_id[item["id"]] = item
+            if item.get("name") is not None:
+                self.items_by_name[item["name"]] = item
+        self.staff_by_id: Dict[str, Dict] = {s["id"]: s for s in staff if s.get("id")}
+
+    def item(self, menu_item_id: Optional[str] = None, name: Optional[str] = None) -> Optional[Dict]:
+        """Resolve a menu item by id, falling back to name"""
+        if menu_item_id and menu_item_id in self.items_by_id:
+            return self.items_by_id[menu_item_id]
+        if name is not None:
+            return self.items_by_name.get(name)
+        return None
+
+    def category_for(self, name: str, default: str = "Uncategorized") -> str:
+        item = self.items_by_name.get(name)
+        return (item or {}).get("category") or default
+
+    def staff(self, user_id: str) -> Optional[Dict]:
+        return self.staff_by_id.get(user_id)
+
+
+class OrgCatalogCache:
+    """Per-org memoized catalog snapshots with version-based invalidation"""
+
+    def __init__(self, db):
+        self.db = db
+        self._snapshots: Dict[str, OrgCatalog] = {}
+        self._version_checked_at: Dict[str, float] = {}
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        self._stats = {
+            "hits": 0,
+            "loads": 0,
+            "version_checks": 0,
+            "invalidations": 0,
+        }
+
+        # How long a snapshot is trusted before re-checking the shared version
+        self.VERSION_CHECK_INTERVAL = 5
+        self.MAX_SNAPSHOTS = 500
+
+    async def _current_version(self, organization_id: str) -> int:
+        self._stats["version_checks"] += 1
+        doc = await self.db.catalog_versions.find_one({"_id": organization_id}, {"version": 1})
+        return (doc or {}).get("version", 0)
+
+    async def get(self, organization_id: str) -> OrgCatalog:
+        """Get the org's catalog snapshot, reloading only if its version changed"""
+        snapshot = self._snapshots.get(organization_id)
+        now = time.time()
+        if snapshot and now - self._version_checked_at.get(organization_id, 0) < self.VERSION_CHECK_INTERVAL:
+            self._stats["hits"] += 1
+            return snapshot
+
+        lock = self._load_locks.setdefault(organization_id, asyncio.Lock())
+        async with lock:
+            snapshot = self._snapshots.get(organization_id)
+            if snapshot and time.time() - self._version_checked_at.get(organization_id, 0) < self.VERSION_CHECK_INTERVAL:
+                self._stats["hits"] += 1
+                return snapshot
+
+            version = await self._current_version(organization_id)
+            self._version_checked_at[organization_id] = time.time()
+            if snapshot and snapshot.version == version:
+                self._stats["hits"] += 1
+                return snapshot
+
+            menu_items, staff = await asyncio.gather(
+                self.db.menu_items.find({"organization_id": organization_id}, MENU_PROJECTION).to_list(None),
+                self.db.users.find(
+                    {"$or": [{"organization_id": organization_id}, {"id": organization_id}]},
+                    STAFF_PROJECTION,
+                ).to_list(None),
+            )
+            snapshot = OrgCatalog(organization_id, version, menu_items, staff)
+            if organization_id not in self._snapshots and len(self._snapshots) >= self.MAX_SNAPSHOTS:
+                oldest = min(self._snapshots, key=lambda org: self._snapshots[org].loaded_at)
+                self._snapshots.pop(oldest, None)
+                self._version_checked_at.pop(oldest, None)
+            self._snapshots[organization_id] = snapshot
+            self._stats["loads"] += 1
+            print(f"📚 Catalog loaded for {organization_id}: {len(menu_items)} items, {len(staff)} staff (v{version})")
+            return snapshot
+
+    async def invalidate(self, organization_id: str):
+        """Bump the org's catalog version (call after any menu or staff write)"""
+        self._stats["invalidations"] += 1
+        self._snapshots.pop(organization_id, None)
+        self._version_checked_at.pop(organization_id, None)
+        try:
+            await self.db.catalog_versions.update_one(
+                {"_id": organization_id}, {"$inc": {"version": 1}}, upsert=True
+            )
+        except Exception as e:
+            print(f"⚠️ Catalog version bump failed for {organization_id}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "cached_orgs": len(self._snapshots)}
+
+
+# Global instance
+_org_catalog_cache: Optional[OrgCatalogCache] = None
+
+
+def init_org_catalog_cache(db) -> OrgCatalogCache:
+    """Initialize the org catalog cache against the active database"""
+    global _org_catalog_cache
+    _org_catalog_cache = OrgCatalogCache(db)
+    return _org_catalog_cache
+
+
+def get_org_catalog_cache() -> Optional[OrgCatalogCache]:
+    """Get the global org catalog cache instance"""
+    return _org_catalog_cache
@@ -0,0 +1,112 @@
+"""
+Public Menu Cache
+=================
+
+Rendered payload cache for the QR-scan menu endpoints
+(`/api/public/menu/{org_id}`, `/api/public/view-menu/{org_id}`,
+`/r/{slug}/menu`):
+- Each variant is rendered once per menu version: serialized JSON bytes
+  plus a pre-compressed gzip copy, kept in the tiered cache L1
+- The per-org version bumps (on every worker) on menu item and business
+  settings writes - invalidate_public_menu(org_id); lookups go through the
+  versioned tiered get, so without pub/sub (Upstash) an edit shows up on
+  other workers within VERSION_CHECK_INTERVAL instead of the L1 TTL
+- Strong ETag = hash of the body bytes, identical on every worker;
+  `If-None-Match` hits are answered with 304 and no body
+- `Cache-Control` lets nginx/CDNs microcache the response and
+  `Surrogate-Key: menu menu-{org_id}` allows per-org CDN purges
+
+PERFORMANCE TARGETS:
+- Warm QR scan: 0 database queries, no JSON encoding or compression
+- Repeat scan from the same phone: 304 with empty body
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from tiered_cache import get_tiered_cache
+
+PUBLIC_MENU_NAMESPACE = "public_menu"
+
+# Browsers revalidate every scan (cheap 304s); shared caches may hold 30s
+PUBLIC_MENU_CACHE_CONTROL = "public, max-age=0, s-maxage=30, stale-while-revalidate=30"
+
+get_tiered_cache().register(PUBLIC_MENU_NAMESPACE, l1_max=2000, ttl=120, use_l2=False)
+
+_stats = {
+    "renders": 0,
+    "hits": 0,
+    "not_modified": 0,
+    "gzip_responses": 0,
+}
+
+
+def render_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Serialize once: body bytes, gzip bytes and the strong ETag"""
+    body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return {
+        "body": body,
+        "gzip": gzip.compress(body, compresslevel=6),
+        "etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+    }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Compare opaque tags; a weak W/ prefix added by a proxy still matches
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates
+
+
+async def serve_public_menu(request: Request, org_id: str, variant: str,
+                            loader: Callable[[], Awaitable[Dict[str, Any]]]) -> Response:
+    """Cached rendered menu for an org variant, honouring If-None-Match and gzip"""
+    rendered_now = False
+
+    async def _render():
+        nonlocal rendered_now
+        rendered_now = True
+        _stats["renders"] += 1
+        return render_payload(await loader())
+
+    # Not local_get: the scope version must be re-checked or other workers' edits stay invisible
+    rendered = await get_tiered_cache().get_or_load(PUBLIC_MENU_NAMESPACE, variant, _render, scope=org_id)
+    if not rendered_now:
+        _stats["hits"] += 1
+
+    headers = {
+        "ETag": rendered["etag"],
+        "Cache-Control": PUBLIC_MENU_CACHE_CONTROL,
+        "Surrogate-Key": f"menu menu-{org_id}",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), rendered["etag"]):
+        _stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+
+    if "gzip" in request.headers.get("accept-encoding", "").lower():
+        _stats["gzip_responses"] += 1
+        return Response(
+            content=rendered["gzip"],
+            media_type="application/json",
+            headers={**headers, "Content-Encoding": "gzip"},
+        )
+    return Response(content=rendered["body"], media_type="application/json", headers=headers)
+
+
+async def invalidate_public_menu(org_id: Optional[str]):
+    """Bump the org's menu version so every worker re-renders on the next scan"""
+    if org_id:
+        await get_tiered_cache().invalidate(PUBLIC_MENU_NAMESPACE, org_id)
+
+
+def get_public_menu_stats() -> Dict[str, Any]:
+    return {**_stats, **get_tiered_cache().namespace(PUBLIC_MENU_NAMESPACE).get_stats()}
@@ -0,0 +1,252 @@
+"""
+Web Push Broadcast Jobs
+=======================
+
+Background fan-out for `/push/send` (VAPID Web Push via pywebpush):
+- The admin request inserts the `sent_notifications` record and returns its
+  id immediately; the broadcast runs as a background job on this worker
+- Subscriptions are streamed from a Motor cursor (no 10k cap, constant
+  memory) and sent on a dedicated thread pool (pywebpush is synchronous),
+  with at most WEBPUSH_CONCURRENCY sends queued or running at once
+- Each send thread keeps a requests.Session, so pushes to the same push
+  service (FCM, Mozilla, Apple) reuse keep-alive connections
+- 404/410 (subscription gone) endpoints are collected and marked inactive
+  with one bulk_write per PROGRESS_EVERY sends
+- Progress (sent / failed / pruned / processed) is written to the
+  `sent_notifications` document, which `GET /push/send/{job_id}` reads;
+  a broadcast cut short by shutdown ends as "interrupted" with its counts
+
+PERFORMANCE TARGETS:
+- Admin request: one insert + count, returns before the first push
+- Event loop blocked by pywebpush: 0ms
+- Mongo writes for pruning: 1 bulk_write per PROGRESS_EVERY sends
+"""
+
+import asyncio
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+PROGRESS_EVERY = 500
+SEND_TIMEOUT_SECONDS = 10
+GONE_STATUSES = (404, 410)
+
+_thread_state = threading.local()
+
+
+def _session():
+    session = getattr(_thread_state, "session", None)
+    if session is None:
+        import requests
+        session = _thread_state.session = requests.Session()
+    return session
+
+
+def _send_one(subscription_info: Dict, payload: str, vapid_private_key: str,
+              vapid_claims: Dict) -> Tuple[str, Optional[str]]:
+    """Runs on a send thread: ("sent" | "gone" | "failed", error)"""
+    from pywebpush import webpush, WebPushException
+
+    try:
+        webpush(
+            subscription_info=subscription_info,
+            data=payload,
+            vapid_private_key=vapid_private_key,
+            # webpush fills in `aud` for the endpoint's push service - never share the dict
+            vapid_claims=dict(vapid_claims),
+            timeout=SEND_TIMEOUT_SECONDS,
+            requests_session=_session(),
+        )
+        return "sent", None
+    except WebPushException as e:
+        if e.response is not None and e.response.status_code in GONE_STATUSES:
+            return "gone", str(e)[:300]
+        return "failed", str(e)[:300]
+    except Exception as e:
+        return "failed", str(e)[:300]
+
+
+class PushBroadcastJobs:
+    """Web Push broadcasts as background jobs tracked on sent_notifications"""
+
+    def __init__(self, db, max_workers: int = 8, concurrency: int = 32):
+        self.db = db
+        self.max_workers = max(max_workers, 1)
+        self.concurrency = max(concurrency, self.max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._stats = {
+            "jobs_started": 0,
+            "jobs_completed": 0,
+            "jobs_failed": 0,
+            "sent": 0,
+            "failed": 0,
+            "pruned": 0,
+        }
+
+    async def ensure_indexes(self):
+        await self.db.push_subscriptions.create_index("endpoint")
+        await self.db.push_subscriptions.create_index("active")
+        await self.db.sent_notifications.create_index("id", sparse=True)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="webpush")
+        return self._executor
+
+    async def start(self, record: Dict[str, Any], payload: str, vapid_private_key: str,
+                    vapid_claims: Dict) -> Dict:
+        """Insert the notification record and start broadcasting it"""
+        job_id = str(uuid.uuid4())
+        total = await self.db.push_subscriptions.count_documents({"active": True})
+        job = {
+            **record,
+            "id": job_id,
+            "status": "queued",
+            "total_subscribers": total,
+            "processed": 0,
+            "sent_count": 0,
+            "failed_count": 0,
+            "pruned_count": 0,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "completed_at": None,
+        }
+        await self.db.sent_notifications.insert_one(dict(job))
+        self._stats["jobs_started"] += 1
+        task = asyncio.create_task(self._run(job_id, payload, vapid_private_key, vapid_claims))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _t: self._tasks.pop(job_id, None))
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await self.db.sent_notifications.find_one({"id": job_id}, {"_id": 0})
+
+    async def _run(self, job_id: str, payload: str, vapid_private_key: str, vapid_claims: Dict):
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.concurrency)
+        counts = {"sent": 0, "failed": 0, "gone": 0, "processed": 0}
+        gone: List[Tuple[str, str]] = []
+        pending: set = set()
+        checkpoint = asyncio.Lock()
+
+        async def send(endpoint: str, subscription_info: Dict):
+            try:
+                outcome, error = await loop.run_in_executor(
+                    self._pool(), _send_one, subscription_info, payload, vapid_private_key, vapid_claims
+                )
+            finally:
+                slots.release()
+            counts[outcome] += 1
+            counts["processed"] += 1
+            if outcome == "gone":
+                gone.append((endpoint, error))
+            if counts["processed"] % PROGRESS_EVERY == 0:
+                async with checkpoint:
+                    await self._checkpoint(job_id, counts, gone)
+
+        try:
+            await self.db.sent_notifications.update_one({"id": job_id}, {"$set": {"status": "running"}})
+            cursor = self.db.push_subscriptions.find(
+                {"active": True}, {"_id": 0, "endpoint": 1, "subscription": 1}
+            ).batch_size(PROGRESS_EVERY)
+            async for sub in cursor:
+                await slots.acquire()
+                task = asyncio.create_task(send(sub.get("endpoint"), sub.get("subscription") or {}))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+
+            async with checkpoint:
+                await self._checkpoint(job_id, counts, gone, final={
+                    "status": "sent",
+                    "completed_at": datetime.now(timezone.utc).isoformat(),
+                })
+            self._stats["jobs_completed"] += 1
+            print(f"✅ Push broadcast {job_id}: {counts['sent']} sent, {counts['failed']} failed, "
+                  f"{counts['gone']} subscriptions pruned")
+        except asyncio.CancelledError:
+            # Shutdown mid-broadcast: keep the counts so far instead of a stuck "running" job
+            self._stats["jobs_failed"] += 1
+            print(f"⚠️ Push broadcast {job_id} interrupted after {counts['processed']} sends")
+            for task in pending:
+                task.cancel()
+            await self._checkpoint(job_id, counts, gone, final={
+                "status": "interrupted",
+                "error": "Broadcast interrupted by a server restart",
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+            })
+            raise
+        except Exception as e:
+            self._stats["jobs_failed"] += 1
+            print(f"❌ Push broadcast {job_id} failed: {e}")
+            await self._checkpoint(job_id, counts, gone, final={
+                "status": "failed",
+                "error": str(e),
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+            })
+        finally:
+            # Failed or cancelled at shutdown: drop sends not yet handed to a thread
+            for task in pending:
+                task.cancel()
+            self._stats["sent"] += counts["sent"]
+            self._stats["failed"] += counts["failed"]
+            self._stats["pruned"] += counts["gone"]
+
+    async def _checkpoint(self, job_id: str, counts: Dict[str, int], gone: List[Tuple[str, str]],
+                          final: Optional[Dict] = None):
+        """Deactivate gone subscriptions in one bulk_write and record progress"""
+        if gone:
+            batch, gone[:] = list(gone), []
+            now = datetime.now(timezone.utc).isoformat()
+            try:
+                await self.db.push_subscriptions.bulk_write([
+                    UpdateOne({"endpoint": endpoint}, {"$set": {"active": False, "error": error, "deactivated_at": now}})
+                    for endpoint, error in batch
+                ], ordered=False)
+            except Exception as e:
+                print(f"⚠️ Push subscription prune failed ({len(batch)} endpoints): {e}")
+        await self.db.sent_notifications.update_one({"id": job_id}, {"$set": {
+            "processed": counts["processed"],
+            "sent_count": counts["sent"],
+            # Gone subscriptions count as failed deliveries, as before
+            "failed_count": counts["failed"] + counts["gone"],
+            "pruned_count": counts["gone"],
+            **(final or {}),
+        }})
+
+    async def shutdown(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "running_jobs": len(self._tasks), "max_workers": self.max_workers}
+
+
+# Global instance
+_push_broadcast_jobs: Optional[PushBroadcastJobs] = None
+
+
+def init_push_broadcast_jobs(db) -> PushBroadcastJobs:
+    """Initialize the Web Push broadcaster from WEBPUSH_* settings"""
+    global _push_broadcast_jobs
+    _push_broadcast_jobs = PushBroadcastJobs(
+        db,
+        max_workers=int(os.getenv("WEBPUSH_WORKERS", "8")),
+        concurrency=int(os.getenv("WEBPUSH_CONCURRENCY", "32")),
+    )
+    return _push_broadcast_jobs
+
+
+def get_push_broadcast_jobs() -> Optional[PushBroadcastJobs]:
+    """Get the global Web Push broadcaster instance"""
+    return _push_broadcast_jobs
@@ -0,0 +1,183 @@
+"""
+Receipt Artifact Cache
+======================
+
+Rendered receipts for completed orders, which are effectively immutable:
+- Artifact key = hash of (order_id, order version, business settings
+  version, theme); order version is `updated_at` + status, business version
+  a hash of the settings, so any edit produces a new key - no invalidation
+- Artifacts per key: "html" (public receipt page), "text" (thermal print
+  text from get_receipt_template), "pdf" (downloadable receipt)
+- L1: per-worker TTLLRUCache bounded by total bytes (RECEIPT_CACHE_MAX_MB,
+  default 32), LRU eviction
+- L2: `receipt_artifacts` collection (one document per key, shared by all
+  workers, TTL-expired after ARTIFACT_TTL_DAYS)
+- Rendered eagerly when an order completes (order side-effects), so the
+  first customer / WhatsApp preview view is already a hit
+- ETag = artifact key + kind, so repeat views answer 304 before any render
+
+PERFORMANCE TARGETS:
+- Repeat receipt view: 0 renders (L1 or one indexed read), 304 when cached
+  by the client
+- Memory: bounded by RECEIPT_CACHE_MAX_MB per worker
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from ttl_structures import TTLLRUCache
+
+ARTIFACT_KINDS = ("html", "text", "pdf")
+ARTIFACT_TTL_DAYS = 30
+
+# Fields needed to compute an order's artifact key without loading items
+ORDER_VERSION_PROJECTION = {
+    "_id": 0, "id": 1, "organization_id": 1, "waiter_id": 1, "status": 1,
+    "updated_at": 1, "created_at": 1, "tracking_token": 1,
+}
+
+
+def _sizeof(value: Any) -> int:
+    return len(value.encode("utf-8")) if isinstance(value, str) else len(value)
+
+
+def business_version(business: Optional[Dict]) -> str:
+    """Content hash of the business settings (changes on any settings edit)"""
+    payload = json.dumps(business or {}, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def order_version(order: Dict) -> str:
+    updated = order.get("updated_at") or order.get("created_at") or ""
+    if isinstance(updated, datetime):
+        updated = updated.isoformat()
+    return f"{updated}|{order.get('status') or ''}"
+
+
+def artifact_key(order: Dict, business: Optional[Dict], theme: str) -> str:
+    payload = json.dumps([order.get("id"), order_version(order), business_version(business), theme or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def artifact_etag(key: str, kind: str) -> str:
+    return f'"{key}-{kind}"'
+
+
+class ReceiptArtifactCache:
+    """Two-level cache of rendered receipt artifacts keyed by artifact_key()"""
+
+    def __init__(self, db, max_bytes: int = 32 * 1024 * 1024, l1_ttl: int = 3600):
+        self.db = db
+        self._l1 = TTLLRUCache(max_size=5000, ttl=l1_ttl, max_bytes=max_bytes, sizeof=_sizeof)
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._stats = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "renders": 0,
+            "prerendered": 0,
+        }
+
+    async def ensure_indexes(self):
+        await self.db.receipt_artifacts.create_index(
+            "created_at", expireAfterSeconds=ARTIFACT_TTL_DAYS * 86400
+        )
+
+    async def get_or_render(self, key: str, kind: str, render: Callable[[], Awaitable[Any]],
+                            order: Optional[Dict] = None) -> Any:
+        """Cached artifact, rendering (once, even under concurrent views) on a miss"""
+        value = self._l1.get((key, kind))
+        if value is not None:
+            self._stats["l1_hits"] += 1
+            return value
+
+        inflight = self._inflight.get((key, kind))
+        while inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+            # The rendering request was cancelled, not this one: render (or join) again
+            inflight = self._inflight.get((key, kind))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[(key, kind)] = future
+        try:
+            value = await self._load_or_render(key, kind, render, order)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; avoid "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            # Cancelled mid-render: wake the waiters so they retry instead of hanging
+            if not future.done():
+                future.cancel()
+            self._inflight.pop((key, kind), None)
+
+    async def _load_or_render(self, key: str, kind: str, render, order: Optional[Dict]) -> Any:
+        try:
+            doc = await self.db.receipt_artifacts.find_one({"_id": key}, {kind: 1})
+        except Exception as e:
+            print(f"⚠️ Receipt artifact read failed: {e}")
+            doc = None
+        if doc and doc.get(kind) is not None:
+            self._stats["l2_hits"] += 1
+            value = bytes(doc[kind]) if kind == "pdf" else doc[kind]
+            self._l1.set((key, kind), value)
+            return value
+
+        self._stats["renders"] += 1
+        value = await render()
+        await self.store(key, {kind: value}, order)
+        return value
+
+    async def store(self, key: str, artifacts: Dict[str, Any], order: Optional[Dict] = None):
+        """Keep freshly rendered artifacts in L1 and share them through Mongo"""
+        for kind, value in artifacts.items():
+            self._l1.set((key, kind), value)
+        order = order or {}
+        try:
+            await self.db.receipt_artifacts.update_one(
+                {"_id": key},
+                {
+                    "$set": artifacts,
+                    "$setOnInsert": {
+                        "order_id": order.get("id"),
+                        "organization_id": order.get("organization_id"),
+                        "created_at": datetime.now(timezone.utc),
+                    },
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"⚠️ Receipt artifact write failed: {e}")
+
+    def mark_prerendered(self):
+        self._stats["prerendered"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, **self._l1.get_stats()}
+
+
+# Global instance
+_receipt_artifacts: Optional[ReceiptArtifactCache] = None
+
+
+def init_receipt_artifact_cache(db) -> ReceiptArtifactCache:
+    """Initialize the receipt artifact cache against the active database"""
+    global _receipt_artifacts
+    max_mb = float(os.getenv("RECEIPT_CACHE_MAX_MB", "32"))
+    _receipt_artifacts = ReceiptArtifactCache(db, max_bytes=int(max_mb * 1024 * 1024))
+    return _receipt_artifacts
+
+
+def get_receipt_artifact_cache() -> Optional[ReceiptArtifactCache]:
+    """Get the global receipt artifact cache instance"""
+    return _receipt_artifacts
@@ -8,10 +8,12 @@ import json
 import os
 import asyncio
 import aiohttp
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime, timedelta, timezone
 import redis.asyncio as redis
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from tiered_cache import get_tiered_cache
+from order_stream import get_order_event_hub, ORDER_LOG_TTL
 
 class UpstashRedisCache:
     """Upstash Redis REST API client for serverless Redis"""
@@ -123,10 +125,22 @@ class UpstashRedisCache:
         result = await self._execute_command(["DEL"] + list(keys))
         return result or 0
     
+    async def scan(self, cursor: int, pattern: str, count: int = 500) -> Tuple[int, List[str]]:
+        """One SCAN step: (next cursor, keys)"""
+        result = await self._execute_command(["SCAN", str(cursor), "MATCH", pattern, "COUNT", str(count)])
+        if not result:
+            return 0, []
+        return int(result[0]), result[1] or []
+    
     async def keys(self, pattern: str) -> List[str]:
-        """Get keys matching pattern"""
-        result = await self._execute_command(["KEYS", pattern])
-        return result or []
+        """Get keys matching pattern (cursor-based SCAN, never a blocking KEYS)"""
+        found: List[str] = []
+        cursor = 0
+        while True:
+            cursor, batch = await self.scan(cursor, pattern)
+            found.extend(batch)
+            if cursor == 0:
+                return found
     
     async def incr(self, key: str) -> int:
         """Increment key value"""
@@ -142,6 +156,99 @@ class UpstashRedisCache:
         """Publish message to channel"""
         result = await self._execute_command(["PUBLISH", channel, message])
         return result or 0
+    
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """Get several values in one request"""
+        if not keys:
+            return []
+        result = await self._execute_command(["MGET"] + list(keys))
+        return result or [None] * len(keys)
+    
+    async def execute_pipeline(self, commands: List[List[str]], transaction: bool = False) -> List[Any]:
+        """
+        Send several commands in one HTTP request via the /pipeline endpoint
+        (or /multi-exec for an atomic transaction). Failed commands yield None.
+        """
+        if not commands:
+            return []
+        if not self.is_connected():
+            return [None] * len(commands)
+        
+        endpoint = f"{self.rest_url.rstrip('/')}/{'multi-exec' if transaction else 'pipeline'}"
+        try:
+            async with self.session.post(endpoint, json=commands) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    if isinstance(data, list) and len(data) == len(commands):
+                        return [
+                            item.get("result") if isinstance(item, dict) and "error" not in item else None
+                            for item in data
+                        ]
+                    print(f"❌ Upstash pipeline failed: {data}")
+                else:
+                    error_text = await response.text()
+                    print(f"❌ Upstash pipeline failed: {response.status} - {error_text}")
+        except Exception as e:
+            print(f"❌ Upstash pipeline error: {e}")
+        return [None] * len(commands)
+
+
+class RedisPipeline:
+    """
+    Commands queued locally and sent in one round-trip: a native redis-py
+    pipeline, or Upstash's /pipeline (/multi-exec when transaction=True).
+    Builder methods return the pipeline so calls can be chained.
+    """
+    
+    def __init__(self, cache: "RedisCache", transaction: bool = False):
+        self.cache = cache
+        self.transaction = transaction
+        self.commands: List[List[str]] = []
+    
+    def __len__(self) -> int:
+        return len(self.commands)
+    
+    def command(self, *args) -> "RedisPipeline":
+        self.commands.append([arg if isinstance(arg, str) else str(arg) for arg in args])
+        return self
+    
+    def get(self, key: str) -> "RedisPipeline":
+        return self.command("GET", key)
+    
+    def set(self, key: str, value: str, ex: Optional[int] = None, nx: bool = False) -> "RedisPipeline":
+        args = ["SET", key, value]
+        if ex:
+            args += ["EX", ex]
+        if nx:
+            args.append("NX")
+        return self.command(*args)
+    
+    def setex(self, key: str, time: int, value: str) -> "RedisPipeline":
+        return self.command("SETEX", key, time, value)
+    
+    def delete(self, *keys: str) -> "RedisPipeline":
+        return self.command("DEL", *keys) if keys else self
+    
+    def incr(self, key: str) -> "RedisPipeline":
+        return self.command("INCR", key)
+    
+    def expire(self, key: str, time: int) -> "RedisPipeline":
+        return self.command("EXPIRE", key, time)
+    
+    def publish(self, channel: str, message: str) -> "RedisPipeline":
+        return self.command("PUBLISH", channel, message)
+    
+    def sadd(self, key: str, *members: str) -> "RedisPipeline":
+        return self.command("SADD", key, *members) if members else self
+    
+    def smembers(self, key: str) -> "RedisPipeline":
+        return self.command("SMEMBERS", key)
+    
+    async def execute(self) -> List[Any]:
+        """Send all queued commands; one result per command (None on failure)"""
+        commands, self.commands = self.commands, []
+        return await self.cache.execute_pipeline(commands, transaction=self.transaction)
+
 
 class RedisCache:
     def __init__(self):
@@ -154,6 +261,7 @@ class RedisCache:
         self.last_failure_time = None
         self.backoff_duration = 300  # 5 minutes backoff after failures
         self.use_upstash = False
+        self.TAG_TTL = 86400  # tag sets outlive every member they index
         
     async def connect(self):
         """Connect to Redis with Upstash priority and fallback handling"""
@@ -323,20 +431,100 @@ class RedisCache:
             print(f"❌ Redis delete error: {e}")
         return False
     
+    async def scan_batches(self, pattern: str, batch_size: int = 500):
+        """Yield keys matching pattern one SCAN batch at a time (never the whole keyspace at once)"""
+        if self.use_upstash and self.upstash:
+            cursor = 0
+            while True:
+                cursor, batch = await self.upstash.scan(cursor, pattern, batch_size)
+                if batch:
+                    yield batch
+                if cursor == 0:
+                    return
+        elif self.redis:
+            batch = []
+            async for key in self.redis.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+    
     async def keys(self, pattern: str) -> List[str]:
-        """Get keys matching pattern"""
+        """
+        Get keys matching pattern. ADMIN MAINTENANCE ONLY: walks the keyspace
+        with cursor-based SCAN (non-blocking, but O(total keys)); request paths
+        invalidate through tags instead.
+        """
         if not self.is_connected():
             return []
         
         try:
-            if self.use_upstash and self.upstash:
-                return await self.upstash.keys(pattern)
-            elif self.redis:
-                return await self.redis.keys(pattern)
+            return [key async for batch in self.scan_batches(pattern) for key in batch]
         except Exception as e:
             print(f"❌ Redis keys error: {e}")
         return []
     
+    async def delete_pattern(self, pattern: str, batch_size: int = 500) -> int:
+        """Delete keys matching pattern batch by batch as SCAN finds them. ADMIN MAINTENANCE ONLY."""
+        if not self.is_connected():
+            return 0
+        
+        deleted = 0
+        try:
+            async for batch in self.scan_batches(pattern, batch_size):
+                if await self.delete(*batch):
+                    deleted += len(batch)
+        except Exception as e:
+            print(f"❌ Redis delete_pattern error: {e}")
+        if deleted:
+            print(f"🗑️ Admin pattern delete removed {deleted} keys matching {pattern}")
+        return deleted
+    
+    # ============ TAG-BASED INVALIDATION ============
+    
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"tag:{tag}"
+    
+    async def set_tagged(self, key: str, value: str, ttl: int, tags: List[str]) -> bool:
+        """
+        SETEX a key and register it in each tag's SET (e.g. "org:{id}",
+        "super_admin:users") in one round-trip, so it can later be
+        invalidated without scanning the keyspace
+        """
+        if not self.is_connected():
+            return False
+        
+        pipe = self.pipeline().setex(key, ttl, value)
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            pipe.sadd(tag_key, key).expire(tag_key, max(ttl, self.TAG_TTL))
+        results = await pipe.execute()
+        return results[0] in ("OK", True)
+    
+    async def invalidate_tags(self, *tags: str) -> int:
+        """
+        Delete every key registered under the tags, plus the tag sets
+        themselves. Two round-trips; cost scales with the tagged keys only.
+        """
+        if not self.is_connected() or not tags:
+            return 0
+        
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        pipe = self.pipeline()
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        members = set()
+        for result in await pipe.execute():
+            members.update(result or [])
+        
+        await self.delete(*members, *tag_keys)
+        if members:
+            print(f"🗑️ Invalidated {len(members)} cache keys for tags {', '.join(tags)}")
+        return len(members)
+    
     async def publish(self, channel: str, message: str) -> bool:
         """Publish message to channel"""
         if not self.is_connected():
@@ -353,24 +541,89 @@ class RedisCache:
             print(f"❌ Redis publish error: {e}")
         return False
     
-    async def check_rate_limit(self, key: str, limit: int, window: int) -> bool:
-        """Check if request is within rate limit"""
+    async def incr(self, key: str) -> int:
+        """Increment a counter key"""
         if not self.is_connected():
-            return True  # Allow if Redis is not available
+            return 0
+        
+        try:
+            if self.use_upstash and self.upstash:
+                return await self.upstash.incr(key)
+            elif self.redis:
+                return await self.redis.incr(key)
+        except Exception as e:
+            print(f"❌ Redis incr error: {e}")
+        return 0
+    
+    # ============ BATCHING ============
+    
+    def pipeline(self, transaction: bool = False) -> RedisPipeline:
+        """Queue commands and send them in a single round-trip"""
+        return RedisPipeline(self, transaction=transaction)
+    
+    async def execute_pipeline(self, commands: List[List[str]], transaction: bool = False) -> List[Any]:
+        """Run queued commands in one round-trip; failed commands yield None"""
+        if not commands:
+            return []
+        if not self.is_connected():
+            return [None] * len(commands)
+        
+        try:
+            if self.use_upstash and self.upstash:
+                return await self.upstash.execute_pipeline(commands, transaction=transaction)
+            elif self.redis:
+                pipe = self.redis.pipeline(transaction=transaction)
+                for command in commands:
+                    pipe.execute_command(*command)
+                results = await pipe.execute(raise_on_error=False)
+                return [None if isinstance(result, Exception) else result for result in results]
+        except Exception as e:
+            print(f"❌ Redis pipeline error: {e}")
+        return [None] * len(commands)
+    
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """Get several values in one round-trip"""
+        if not keys:
+            return []
+        if not self.is_connected():
+            return [None] * len(keys)
         
         try:
             if self.use_upstash and self.upstash:
-                # Use Upstash Redis for rate limiting
-                current = await self.upstash.incr(key)
-                if current == 1:
-                    await self.upstash.expire(key, window)
-                return current <= limit
+                return await self.upstash.mget(keys)
             elif self.redis:
-                # Use traditional Redis for rate limiting
-                current = await self.redis.incr(key)
-                if current == 1:
-                    await self.redis.expire(key, window)
-                return current <= limit
+                return await self.redis.mget(keys)
+        except Exception as e:
+            print(f"❌ Redis mget error: {e}")
+        return [None] * len(keys)
+    
+    async def mset(self, mapping: Dict[str, str], ex: Optional[int] = None) -> bool:
+        """Set several values in one round-trip (MSET, or pipelined SETEX when ex is given)"""
+        if not mapping or not self.is_connected():
+            return False
+        
+        pipe = self.pipeline()
+        if ex:
+            for key, value in mapping.items():
+                pipe.setex(key, ex, value)
+        else:
+            pipe.command("MSET", *[part for item in mapping.items() for part in item])
+        results = await pipe.execute()
+        return all(result in ("OK", True) for result in results)
+    
+    async def check_rate_limit(self, key: str, limit: int, window: int) -> bool:
+        """Check if request is within rate limit (one round-trip)"""
+        if not self.is_connected():
+            return True  # Allow if Redis is not available
+        
+        try:
+            # SET NX EX starts the window with its TTL; INCR keeps that TTL.
+            # Sent as one MULTI/EXEC so a key can never be left without expiry.
+            results = await self.pipeline(transaction=True).set(key, 0, ex=window, nx=True).incr(key).execute()
+            current = results[1]
+            if current is None:
+                return True  # Allow if error occurs
+            return int(current) <= limit
         except Exception as e:
             print(f"❌ Redis rate limit error: {e}")
         return True  # Allow if error occurs
@@ -416,7 +669,7 @@ class RedisCache:
                     order_copy['updated_at'] = order_copy['updated_at'].isoformat()
                 serializable_orders.append(order_copy)
             
-            success = await self.setex(cache_key, ttl, json.dumps(serializable_orders))
+            success = await self.set_tagged(cache_key, json.dumps(serializable_orders), ttl, [f"org:{org_id}"])
             if success:
                 print(f"💾 Cached {len(orders)} active orders for org {org_id} (TTL: {ttl}s)")
             return success
@@ -451,23 +704,17 @@ class RedisCache:
             if not date_key:
                 date_key = datetime.now().strftime("%Y-%m-%d")
             
-            # Invalidate date-aware cache keys
+            # Invalidate date-aware cache keys (single multi-key DEL)
             cache_keys = [
                 f"active_orders:{org_id}:{date_key}",
                 f"todays_bills:{org_id}:{date_key}",
                 f"active_orders:{org_id}",  # Legacy key for backward compatibility
             ]
             
-            success_count = 0
-            for key in cache_keys:
-                try:
-                    if await self.delete(key):
-                        success_count += 1
-                        print(f"🗑️ Invalidated date-aware cache: {key}")
-                except Exception as key_error:
-                    print(f"⚠️ Failed to invalidate cache key {key}: {key_error}")
-            
-            return success_count > 0
+            success = await self.delete(*cache_keys)
+            if success:
+                print(f"🗑️ Invalidated date-aware caches for org {org_id}")
+            return success
             
         except Exception as e:
             print(f"❌ Redis date-aware invalidation error: {e}")
@@ -511,7 +758,7 @@ class RedisCache:
             if isinstance(order_copy.get('updated_at'), datetime):
                 order_copy['updated_at'] = order_copy['updated_at'].isoformat()
             
-            success = await self.setex(cache_key, ttl, json.dumps(order_copy))
+            success = await self.set_tagged(cache_key, json.dumps(order_copy), ttl, [f"org:{org_id}"])
             if success:
                 print(f"💾 Cached order {order_id}")
             return success
@@ -539,28 +786,39 @@ class RedisCache:
     # ============ REAL-TIME UPDATES ============
     
     async def publish_order_update(self, org_id: str, order_id: str, action: str, order_data: Dict = None):
-        """Publish real-time order updates"""
+        """
+        Publish real-time order updates: delivered to this worker's stream
+        clients first (works without Redis), then to every other worker
+        """
+        hub = get_order_event_hub()
+        event = hub.publish_local(org_id, order_id, action, order_data)  # "created", "updated", "status_changed", "deleted"
         if not self.is_connected():
             return False
             
         try:
             channel = f"orders:{org_id}"
-            message = {
-                "action": action,  # "created", "updated", "status_changed", "deleted"
-                "order_id": order_id,
-                "timestamp": datetime.now().isoformat(),
-                "data": order_data
-            }
+            message = json.dumps(event, default=str)
             
-            success = await self.publish(channel, json.dumps(message))
-            if success:
+            pipe = self.pipeline().publish(channel, message)
+            if self.use_upstash:
+                # No SUBSCRIBE over REST: keep a short log that workers poll
+                log_key = f"orders:log:{org_id}"
+                pipe.command("LPUSH", log_key, message).command("LTRIM", log_key, 0, hub.BUFFER_SIZE - 1).expire(log_key, ORDER_LOG_TTL)
+            results = await pipe.execute()
+            
+            if results and results[0] is not None:
                 print(f"📡 Published order update: {action} for order {order_id}")
-            return success
+                return True
+            return False
             
         except Exception as e:
             print(f"❌ Redis publish error: {e}")
             return False
     
+    async def invalidate_org(self, org_id: str) -> int:
+        """Drop every org-tagged key (active orders, cached orders) for one org"""
+        return await self.invalidate_tags(f"org:{org_id}")
+    
     # ============ SUPER ADMIN CACHE ============
     
     async def get_super_admin_users(self, skip: int = 0, limit: int = 50) -> Optional[Dict]:
@@ -601,7 +859,7 @@ class RedisCache:
                     if isinstance(user.get('subscription_expires_at'), datetime):
                         user['subscription_expires_at'] = user['subscription_expires_at'].isoformat()
             
-            success = await self.setex(cache_key, ttl, json.dumps(serializable_data))
+            success = await self.set_tagged(cache_key, json.dumps(serializable_data), ttl, ["super_admin:users"])
             if success:
                 print(f"💾 Cached super admin users (skip={skip}, limit={limit}, TTL: {ttl}s)")
             return success
@@ -616,15 +874,9 @@ class RedisCache:
             return False
             
         try:
-            # Get all super admin users cache keys
-            pattern = "super_admin:users:*"
-            keys = await self.keys(pattern)
-            
-            if keys:
-                success = await self.delete(*keys)
-                if success:
-                    print(f"🗑️ Invalidated {len(keys)} super admin users cache entries")
-                return success > 0
+            # Every cached page is registered under the tag - no keyspace scan
+            invalidated = await self.invalidate_tags("super_admin:users")
+            print(f"🗑️ Invalidated {invalidated} super admin users cache entries")
             return True
             
         except Exception as e:
@@ -676,25 +928,41 @@ class RedisCache:
 
 # ============ CACHE-ENHANCED ORDER SERVICE ============
 
+# Tiered cache namespaces (L1 per worker + Redis L2). Order state must never be
+# served stale across workers, so those namespaces (require_l2) skip L1 unless
+# pub/sub invalidation is running, and the cache entirely when Redis is down.
+_tiered = get_tiered_cache()
+_tiered.register("active_orders", l1_max=500, ttl=10, l2_ttl=60, l1_serialized=True, require_l2=True)
+_tiered.register("order", l1_max=2000, ttl=60, l2_ttl=600, l1_serialized=True, require_l2=True)
+_tiered.register("tables", l1_max=500, ttl=60, l2_ttl=600, l1_serialized=True, require_l2=True)
+_tiered.register("menu_items", l1_max=500, ttl=600, l1_serialized=True, policy="lfu")
+_tiered.register("inventory", l1_max=500, ttl=300, l1_serialized=True)
+
+
 class CachedOrderService:
     def __init__(self, db: AsyncIOMotorDatabase, cache: RedisCache):
         self.db = db
         self.cache = cache
+        self.tiered = get_tiered_cache()
+    
+    async def cache_active_orders(self, org_id: str, orders: List[Dict], ttl: int = 60):
+        """Store an org's active orders list in the tiered cache"""
+        await self.tiered.set("active_orders", "list", orders, scope=org_id, ttl=ttl)
     
     async def get_active_orders(self, org_id: str, use_cache: bool = True) -> List[Dict]:
-        """Get active orders with Redis caching and robust fallback"""
+        """Get active orders with tiered caching and robust fallback"""
         
-        # Try cache first if enabled and Redis is connected
-        if use_cache and self.cache.is_connected():
+        # Try cache first if enabled
+        if use_cache:
             try:
-                cached_orders = await self.cache.get_active_orders(org_id)
+                cached_orders = await self.tiered.get("active_orders", "list", scope=org_id)
                 if cached_orders is not None:
                     print(f"🚀 Cache HIT: {len(cached_orders)} active orders for org {org_id}")
                     return cached_orders
                 else:
                     print(f"💾 Cache MISS: active orders for org {org_id}")
             except Exception as cache_error:
-                print(f"❌ Redis cache error: {cache_error}, falling back to MongoDB")
+                print(f"❌ Cache error: {cache_error}, falling back to MongoDB")
         
         # Fallback to MongoDB
         print(f"📊 Fetching active orders from MongoDB for org {org_id}")
@@ -757,10 +1025,10 @@ class CachedOrderService:
                 for order in yesterday_orders[:3]:  # Show first 3
                     print(f"      - Order {order.get('id', 'unknown')}: {order.get('status')} from {order.get('created_at')}")
             
-            # Try to cache the results if Redis is available
-            if use_cache and self.cache.is_connected():
+            # Try to cache the results
+            if use_cache:
                 try:
-                    await self.cache.set_active_orders(org_id, orders, ttl=60)  # 1 min cache
+                    await self.cache_active_orders(org_id, orders, ttl=60)  # 1 min cache
                 except Exception as cache_set_error:
                     print(f"⚠️ Failed to cache orders: {cache_set_error}")
             
@@ -777,8 +1045,9 @@ class CachedOrderService:
         
         # Try cache first
         if use_cache:
-            cached_order = await self.cache.get_order(order_id, org_id)
+            cached_order = await self.tiered.get("order", order_id, scope=org_id)
             if cached_order is not None:
+                print(f"🚀 Cache HIT: order {order_id}")
                 return cached_order
         
         # Fallback to MongoDB
@@ -796,98 +1065,63 @@ class CachedOrderService:
             
             # Cache the result
             if use_cache:
-                await self.cache.set_order(order_id, org_id, order, ttl=600)  # 10 min cache
+                await self.tiered.set("order", order_id, order, scope=org_id)  # 10 min L2 cache
         
         return order
     
-    async def invalidate_order_caches(self, org_id: str, order_id: str = None):
-        """Invalidate caches when orders change"""
+    async def invalidate_order_caches(self, org_id: str, order_id: str = None,
+                                      action: str = "updated", order_data: Dict = None):
+        """Invalidate caches when orders change (all workers) and push the change to order streams"""
         
         # Always invalidate active orders list
-        await self.cache.invalidate_active_orders(org_id)
+        await self.tiered.invalidate("active_orders", org_id)
         
         # Invalidate specific order if provided
         if order_id:
-            await self.cache.invalidate_order(order_id, org_id)
+            await self.tiered.delete("order", order_id, scope=org_id)
         
-        # Publish real-time update
+        # Publish real-time update (off the request path)
         if order_id:
-            await self.cache.publish_order_update(org_id, order_id, "cache_invalidated")
+            get_order_event_hub().spawn(self._publish_order_event(org_id, order_id, action, order_data))
+    
+    async def _publish_order_event(self, org_id: str, order_id: str, action: str, order_data: Dict = None):
+        if order_data is None and action != "deleted":
+            # Callers without the new state at hand: ship the stored order
+            order_data = await self.db.orders.find_one(
+                {"id": order_id, "organization_id": org_id}, {"_id": 0}
+            )
+        await self.cache.publish_order_update(org_id, order_id, action, order_data)
     
     async def get_tables(self, org_id: str, use_cache: bool = True) -> List[Dict]:
-        """Get tables with Redis caching and robust fallback"""
+        """Get tables with tiered caching and robust fallback"""
         
-        # Try cache first if enabled and Redis is connected
-        if use_cache and self.cache.is_connected():
-            try:
-                cache_key = f"tables:{org_id}"
-                cached_data = await self.cache.get(cache_key)
-                
-                if cached_data:
-                    tables = json.loads(cached_data)
-                    print(f"🚀 Cache HIT: {len(tables)} tables for org {org_id}")
-                    return tables
-                else:
-                    print(f"💾 Cache MISS: tables for org {org_id}")
-            except Exception as cache_error:
-                print(f"❌ Redis cache error: {cache_error}, falling back to MongoDB")
-        
-        # Fallback to MongoDB
-        print(f"📊 Fetching tables from MongoDB for org {org_id}")
-        
-        try:
-            # Query tables for the organization
-            query = {"organization_id": org_id}
-            
+        async def load_tables():
+            # Fallback to MongoDB
+            print(f"📊 Fetching tables from MongoDB for org {org_id}")
             tables = await self.db.tables.find(
-                query, 
+                {"organization_id": org_id},
                 {"_id": 0}
             ).sort("table_number", 1).to_list(100)
-            
-            # Try to cache the results if Redis is available
-            if use_cache and self.cache.is_connected():
-                try:
-                    cache_key = f"tables:{org_id}"
-                    await self.cache.setex(cache_key, 600, json.dumps(tables))  # 10 min cache
-                    print(f"💾 Cached {len(tables)} tables for org {org_id}")
-                except Exception as cache_set_error:
-                    print(f"⚠️ Failed to cache tables: {cache_set_error}")
-            
             print(f"📊 Found {len(tables)} tables for org {org_id}")
             return tables
-            
+        
+        try:
+            if not use_cache:
+                return await load_tables()
+            return await self.tiered.get_or_load("tables", "list", load_tables, scope=org_id)
         except Exception as db_error:
             print(f"❌ MongoDB error in get_tables: {db_error}")
             # Return empty list rather than crash
             return []
     
     async def get_menu_items(self, org_id: str, use_cache: bool = True) -> List[Dict]:
-        """Get menu items with Redis caching and robust fallback"""
-        
-        # Try cache first if enabled and Redis is connected
-        if use_cache and self.cache.is_connected():
-            try:
-                cache_key = f"menu_items:{org_id}"
-                cached_data = await self.cache.get(cache_key)
-                
-                if cached_data:
-                    menu_items = json.loads(cached_data)
-                    print(f"🚀 Cache HIT: {len(menu_items)} menu items for org {org_id}")
-                    return menu_items
-                else:
-                    print(f"💾 Cache MISS: menu items for org {org_id}")
-            except Exception as cache_error:
-                print(f"❌ Redis cache error: {cache_error}, falling back to MongoDB")
-        
-        # Fallback to MongoDB
-        print(f"📊 Fetching menu items from MongoDB for org {org_id}")
+        """Get menu items with tiered caching and robust fallback"""
         
-        try:
-            # Query menu items for the organization
-            query = {"organization_id": org_id}
-            
+        async def load_menu_items():
+            # Fallback to MongoDB
+            print(f"📊 Fetching menu items from MongoDB for org {org_id}")
             menu_items = await self.db.menu_items.find(
-                query, 
+                {"organization_id": org_id},
                 {"_id": 0}
             ).sort("name", 1).to_list(1000)
             
@@ -901,71 +1135,34 @@ class CachedOrderService:
                     print(f"⚠️ Datetime conversion error for menu item {item.get('id', 'unknown')}: {dt_error}")
                     pass
             
-            # Try to cache the results if Redis is available
-            if use_cache and self.cache.is_connected():
-                try:
-                    cache_key = f"menu_items:{org_id}"
-                    # Convert datetime objects to strings for JSON serialization
-                    cache_items = []
-                    for item in menu_items:
-                        cache_item = item.copy()
-                        if isinstance(cache_item.get("created_at"), datetime):
-                            cache_item["created_at"] = cache_item["created_at"].isoformat()
-                        cache_items.append(cache_item)
-                    
-                    await self.cache.setex(cache_key, 600, json.dumps(cache_items))  # 10 min cache
-                    print(f"💾 Cached {len(menu_items)} menu items for org {org_id}")
-                except Exception as cache_set_error:
-                    print(f"⚠️ Failed to cache menu items: {cache_set_error}")
-            
             print(f"📊 Found {len(menu_items)} menu items for org {org_id}")
             return menu_items
-            
+        
+        try:
+            if not use_cache:
+                return await load_menu_items()
+            return await self.tiered.get_or_load("menu_items", "list", load_menu_items, scope=org_id)
         except Exception as db_error:
             print(f"❌ MongoDB error in get_menu_items: {db_error}")
             # Return empty list rather than crash
             return []
     
     async def invalidate_menu_caches(self, org_id: str):
-        """Invalidate menu item caches when menu changes"""
-        
-        if self.cache.is_connected():
-            try:
-                cache_key = f"menu_items:{org_id}"
-                await self.cache.delete(cache_key)
-                print(f"🗑️ Menu cache invalidated for org {org_id}")
-            except Exception as cache_error:
-                print(f"⚠️ Failed to invalidate menu cache: {cache_error}")
-        else:
-            print(f"⚠️ Redis not connected, skipping menu cache invalidation for org {org_id}")
+        """Invalidate menu item caches when menu changes (all workers)"""
+        try:
+            await self.tiered.invalidate("menu_items", org_id)
+            print(f"🗑️ Menu cache invalidated for org {org_id}")
+        except Exception as cache_error:
+            print(f"⚠️ Failed to invalidate menu cache: {cache_error}")
     
     async def get_inventory_items(self, org_id: str, use_cache: bool = True) -> List[Dict]:
-        """Get inventory items with Redis caching and robust fallback"""
-        
-        # Try cache first if enabled and Redis is connected
-        if use_cache and self.cache.is_connected():
-            try:
-                cache_key = f"inventory:{org_id}"
-                cached_data = await self.cache.get(cache_key)
-                
-                if cached_data:
-                    inventory_items = json.loads(cached_data)
-                    print(f"🚀 Cache HIT: {len(inventory_items)} inventory items for org {org_id}")
-                    return inventory_items
-                else:
-                    print(f"💾 Cache MISS: inventory items for org {org_id}")
-            except Exception as cache_error:
-                print(f"❌ Redis cache error: {cache_error}, falling back to MongoDB")
-        
-        # Fallback to MongoDB
-        print(f"📊 Fetching inventory items from MongoDB for org {org_id}")
+        """Get inventory items with tiered caching and robust fallback"""
         
-        try:
-            # Query inventory items for the organization
-            query = {"organization_id": org_id}
-            
+        async def load_inventory_items():
+            # Fallback to MongoDB
+            print(f"📊 Fetching inventory items from MongoDB for org {org_id}")
             inventory_items = await self.db.inventory.find(
-                query, 
+                {"organization_id": org_id},
                 {"_id": 0}
             ).sort("name", 1).to_list(1000)
             
@@ -979,56 +1176,43 @@ class CachedOrderService:
                     print(f"⚠️ Datetime conversion error for inventory item {item.get('id', 'unknown')}: {dt_error}")
                     pass
             
-            # Try to cache the results if Redis is available
-            if use_cache and self.cache.is_connected():
-                try:
-                    cache_key = f"inventory:{org_id}"
-                    # Convert datetime objects to strings for JSON serialization
-                    cache_items = []
-                    for item in inventory_items:
-                        cache_item = item.copy()
-                        if isinstance(cache_item.get("last_updated"), datetime):
-                            cache_item["last_updated"] = cache_item["last_updated"].isoformat()
-                        cache_items.append(cache_item)
-                    
-                    await self.cache.setex(cache_key, 300, json.dumps(cache_items))  # 5 min cache
-                    print(f"💾 Cached {len(inventory_items)} inventory items for org {org_id}")
-                except Exception as cache_set_error:
-                    print(f"⚠️ Failed to cache inventory items: {cache_set_error}")
-            
             print(f"📊 Found {len(inventory_items)} inventory items for org {org_id}")
             return inventory_items
-            
+        
+        try:
+            if not use_cache:
+                return await load_inventory_items()
+            return await self.tiered.get_or_load("inventory", "list", load_inventory_items, scope=org_id)
         except Exception as db_error:
             print(f"❌ MongoDB error in get_inventory_items: {db_error}")
             # Return empty list rather than crash
             return []
     
     async def invalidate_inventory_caches(self, org_id: str):
-        """Invalidate inventory caches when inventory changes"""
-        
-        if self.cache.is_connected():
-            try:
-                cache_key = f"inventory:{org_id}"
-                await self.cache.delete(cache_key)
-                print(f"🗑️ Inventory cache invalidated for org {org_id}")
-            except Exception as cache_error:
-                print(f"⚠️ Failed to invalidate inventory cache: {cache_error}")
-        else:
-            print(f"⚠️ Redis not connected, skipping inventory cache invalidation for org {org_id}")
+        """Invalidate inventory caches when inventory changes (all workers)"""
+        try:
+            await self.tiered.invalidate("inventory", org_id)
+            print(f"🗑️ Inventory cache invalidated for org {org_id}")
+        except Exception as cache_error:
+            print(f"⚠️ Failed to invalidate inventory cache: {cache_error}")
     
     async def invalidate_table_caches(self, org_id: str):
-        """Invalidate table caches when table status changes"""
-        
-        if self.cache.is_connected():
-            try:
-                cache_key = f"tables:{org_id}"
-                await self.cache.delete(cache_key)
-                print(f"🗑️ Table cache invalidated for org {org_id}")
-            except Exception as cache_error:
-                print(f"⚠️ Failed to invalidate table cache: {cache_error}")
-        else:
-            print(f"⚠️ Redis not connected, skipping table cache invalidation for org {org_id}")
+        """Invalidate table caches when table status changes (all workers)"""
+        try:
+            await self.tiered.invalidate("tables", org_id)
+            print(f"🗑️ Table cache invalidated for org {org_id}")
+        except Exception as cache_error:
+            print(f"⚠️ Failed to invalidate table cache: {cache_error}")
+    
+    async def invalidate_org_caches(self, org_id: str):
+        """Org-wide writes (import, delete): drop every cached view of the org on all workers"""
+        try:
+            for namespace in ("active_orders", "order", "tables", "menu_items", "inventory"):
+                await self.tiered.invalidate(namespace, org_id)
+            await self.cache.invalidate_org(org_id)
+            print(f"🗑️ All caches invalidated for org {org_id}")
+        except Exception as cache_error:
+            print(f"⚠️ Failed to invalidate org caches: {cache_error}")
 
 
 # ============ TABLE STATUS MANAGER ============
@@ -1158,13 +1342,11 @@ class TableStatusManager:
     
     async def _invalidate_table_cache(self, org_id: str):
         """Internal method to invalidate table cache"""
-        if self.cache.is_connected():
-            try:
-                cache_key = f"tables:{org_id}"
-                await self.cache.delete(cache_key)
-                print(f"🗑️ Table cache invalidated for org {org_id}")
-            except Exception as e:
-                print(f"⚠️ Failed to invalidate table cache: {e}")
+        try:
+            await get_tiered_cache().invalidate("tables", org_id)
+            print(f"🗑️ Table cache invalidated for org {org_id}")
+        except Exception as e:
+            print(f"⚠️ Failed to invalidate table cache: {e}")
 
 
 # Global cache instance
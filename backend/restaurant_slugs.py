@@ -0,0 +1,183 @@
+"""
+Restaurant Slug Resolution
+==========================
+
+O(1) lookup of the public menu URL `/r/{restaurant_slug}/menu`:
+- Admin user documents carry two normalized fields, maintained on every
+  business-settings write:
+  - `menu_slug`: the custom `business_settings.restaurant_slug` (unique index)
+  - `menu_name_slug`: derived from the restaurant name (the legacy fallback
+    links, not unique - the oldest restaurant wins on a clash)
+- Documents written before the fields existed (or by an older
+  normalization, see SLUG_VERSION) are backfilled at startup; until then a
+  custom slug still resolves through the indexed
+  `business_settings.restaurant_slug` fallback
+- Normalization: NFKC, lowercase, "&" -> "and", Unicode letters, marks and
+  digits only, so "Joe's Pizza", "joes-pizza" and "JOES_PIZZA" resolve to
+  the same slug and non-Latin names (e.g. Devanagari) keep theirs
+- Slug -> org_id map cached per worker (tiered cache L1) under one scope
+  version, bumped when a restaurant's slug or name changes - reaches every
+  worker via pub/sub, or the version check on Upstash (key deletes would
+  only travel over pub/sub)
+
+PERFORMANCE TARGETS:
+- Slug lookup: one indexed query on a cold cache, 0 queries when warm
+- Independent of tenant count (no more users-collection scans)
+"""
+
+import unicodedata
+from typing import Any, Dict, Iterable, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from tiered_cache import get_tiered_cache
+
+SLUG_NAMESPACE = "menu_slug"
+
+# Bump when normalize_slug changes so stored slugs are re-derived at startup
+SLUG_VERSION = 2
+
+# Unicode letters, combining marks (Devanagari vowel signs) and digits
+_SLUG_CATEGORIES = ("L", "M", "N")
+
+
+def normalize_slug(value: Any) -> str:
+    """Canonical form used for storage and lookups ("" when nothing is left)"""
+    if not isinstance(value, str):
+        return ""
+    text = unicodedata.normalize("NFKC", value).lower().replace("&", "and")
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] in _SLUG_CATEGORIES)
+
+
+def slug_fields(business_settings: Optional[Dict]) -> Dict[str, Optional[str]]:
+    """Normalized slug fields for an admin's business settings"""
+    business = business_settings or {}
+    return {
+        "menu_slug": normalize_slug(business.get("restaurant_slug")) or None,
+        "menu_name_slug": normalize_slug(business.get("restaurant_name")) or None,
+    }
+
+
+async def ensure_slug_indexes(db):
+    """Unique custom slugs (string values only) + name-slug fallback index"""
+    await db.users.create_index(
+        "menu_slug",
+        unique=True,
+        partialFilterExpression={"menu_slug": {"$type": "string"}},
+    )
+    await db.users.create_index([("menu_name_slug", 1), ("created_at", 1)])
+    # Serves the resolver's fallback for custom slugs not yet backfilled
+    await db.users.create_index("business_settings.restaurant_slug", sparse=True)
+
+
+async def backfill_slug_fields(db, stale_only: bool = True) -> Dict[str, int]:
+    """
+    Derive menu_slug / menu_name_slug for admin documents, oldest first
+
+    stale_only limits the pass to documents without the current
+    SLUG_VERSION (cheap enough to run on every startup). A custom slug
+    already owned by another restaurant is dropped from the newer one,
+    which then resolves through its name slug.
+    """
+    query: Dict[str, Any] = {"business_settings": {"$type": "object"}}
+    if stale_only:
+        query["menu_slug_version"] = {"$ne": SLUG_VERSION}
+    owners: Dict[str, str] = {}
+    rows = []
+    duplicates = 0
+    cursor = db.users.find(
+        query, {"_id": 0, "id": 1, "business_settings": 1, "created_at": 1}
+    ).sort("created_at", 1)
+    async for user in cursor:
+        fields = slug_fields(user.get("business_settings"))
+        slug = fields["menu_slug"]
+        if slug:
+            if slug in owners:
+                print(f"  - Duplicate slug '{slug}': kept on {owners[slug]}, removed from {user['id']}")
+                fields["menu_slug"] = None
+                duplicates += 1
+            else:
+                owners[slug] = user["id"]
+        rows.append((user["id"], {**fields, "menu_slug_version": SLUG_VERSION}))
+
+    if rows:
+        try:
+            await db.users.bulk_write([UpdateOne({"id": uid}, {"$set": fields}) for uid, fields in rows], ordered=False)
+        except BulkWriteError as e:
+            # Slug already held by a restaurant outside this pass: keep the name slug only
+            retries = []
+            for error in e.details.get("writeErrors", []):
+                if error.get("code") != 11000:
+                    raise
+                uid, fields = rows[error["index"]]
+                retries.append(UpdateOne({"id": uid}, {"$set": {**fields, "menu_slug": None}}))
+            duplicates += len(retries)
+            await db.users.bulk_write(retries, ordered=False)
+    return {"updated": len(rows), "custom_slugs": len(owners), "duplicates": duplicates}
+
+
+class RestaurantSlugResolver:
+    """Resolves public menu slugs to organization ids"""
+
+    def __init__(self, db, ttl: int = 600, max_size: int = 5000):
+        self.db = db
+        self.tiered = get_tiered_cache()
+        self.tiered.register(SLUG_NAMESPACE, l1_max=max_size, ttl=ttl, use_l2=False)
+        self._stats = {
+            "lookups": 0,
+            "db_lookups": 0,
+            "fallback_lookups": 0,
+            "not_found": 0,
+        }
+
+    async def resolve(self, slug: str) -> Optional[str]:
+        """Organization id for a menu slug, or None"""
+        self._stats["lookups"] += 1
+        key = normalize_slug(slug)
+        if not key:
+            return None
+        org_id = await self.tiered.get_or_load(SLUG_NAMESPACE, key, lambda: self._load(key, slug))
+        if org_id is None:
+            self._stats["not_found"] += 1
+        return org_id
+
+    async def _load(self, key: str, raw_slug: str) -> Optional[str]:
+        self._stats["db_lookups"] += 1
+        user = await self.db.users.find_one({"menu_slug": key}, {"_id": 0, "id": 1})
+        if not user:
+            user = await self.db.users.find_one(
+                {"menu_name_slug": key}, {"_id": 0, "id": 1}, sort=[("created_at", 1)]
+            )
+        if not user:
+            # Settings saved by paths that don't maintain the normalized fields
+            self._stats["fallback_lookups"] += 1
+            user = await self.db.users.find_one(
+                {"business_settings.restaurant_slug": {"$in": list({raw_slug, key})}},
+                {"_id": 0, "id": 1}, sort=[("created_at", 1)],
+            )
+        return user.get("id") if user else None
+
+    async def invalidate(self, slugs: Iterable[Optional[str]]):
+        """Drop cached mappings on every worker (slug changes are rare: the whole map)"""
+        if any(normalize_slug(slug) for slug in slugs if slug):
+            await self.tiered.invalidate(SLUG_NAMESPACE)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "cached": len(self.tiered.namespace(SLUG_NAMESPACE).store)}
+
+
+# Global instance
+_slug_resolver: Optional[RestaurantSlugResolver] = None
+
+
+def init_slug_resolver(db) -> RestaurantSlugResolver:
+    """Initialize the restaurant slug resolver against the active database"""
+    global _slug_resolver
+    _slug_resolver = RestaurantSlugResolver(db)
+    return _slug_resolver
+
+
+def get_slug_resolver() -> Optional[RestaurantSlugResolver]:
+    """Get the global restaurant slug resolver instance"""
+    return _slug_resolver
@@ -0,0 +1,661 @@
+"""
+Sales Rollup System
+===================
+
+Per-organization, per-day pre-aggregated sales buckets for the /reports endpoints:
+- One `sales_rollups` document per org per day (item, category, waiter, hour buckets)
+- Incremental $inc updates when an order enters or leaves a closed status
+- Idempotent: each order records the signature of the contribution it applied,
+  so repeated or concurrent syncs never double count
+- Reports read closed days from rollups and compute today's delta live
+- Lazy one-time backfill for history recorded before rollups existed; it
+  runs in the background and reports are aggregated straight from orders
+  until it finishes
+- Backfill state carries a generation that reset_organization bumps; every
+  worker re-reads it at most STATE_CHECK_INTERVAL seconds after trusting it
+
+PERFORMANCE TARGETS:
+- Report latency independent of order history (no more to_list(1000) scans)
+- Correct totals for tenants with hundreds of thousands of orders
+"""
+
+import hashlib
+import json
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from org_catalog import OrgCatalogCache
+
+# Order statuses counted as closed sales
+ROLLUP_STATUSES = ("completed", "paid")
+
+# Only the fields needed to compute a contribution are read from orders
+ORDER_ROLLUP_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "status": 1,
+    "items": 1,
+    "total": 1,
+    "waiter_id": 1,
+    "waiter_name": 1,
+    "created_at": 1,
+    "rollup_sig": 1,
+    "rollup_applied": 1,
+}
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def _generation(state: Optional[Dict]) -> int:
+    return (state or {}).get("generation", 0)
+
+
+def _is_backfilled(state: Optional[Dict]) -> bool:
+    """Backfilled for the current generation (documents from before generations count as 0)"""
+    if not state or not state.get("backfilled_at"):
+        return False
+    return state.get("backfilled_generation", 0) == _generation(state)
+
+
+def bucket_key(value: Any) -> str:
+    """Stable Mongo-safe field name for a bucket (item names may contain '.' or '$')"""
+    return hashlib.md5(str(value).encode("utf-8")).hexdigest()[:16]
+
+
+def parse_order_datetime(value: Any) -> Optional[datetime]:
+    """Parse an order's created_at (ISO string or datetime) into an aware UTC datetime"""
+    if isinstance(value, str) and value:
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _to_number(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def build_contribution(order: Dict, category_of: Callable[[str], str]) -> Optional[Dict]:
+    """
+    Compute what an order contributes to its day's rollup.
+
+    Returns None when the order should not be counted (open/cancelled or undated).
+    """
+    if order.get("status") not in ROLLUP_STATUSES:
+        return None
+    created_at = parse_order_datetime(order.get("created_at"))
+    if not created_at:
+        return None
+
+    items: Dict[str, Dict] = {}
+    for item in order.get("items") or []:
+        if not isinstance(item, dict):
+            continue
+        name = str(item.get("name") or "")
+        item_id = item.get("menu_item_id") or name
+        quantity = _to_number(item.get("quantity"))
+        price = _to_number(item.get("price"))
+        key = bucket_key(item_id)
+        entry = items.setdefault(key, {
+            "key": key,
+            "menu_item_id": str(item_id),
+            "name": name,
+            "category": category_of(name) or "Uncategorized",
+            "price": price,
+            "quantity": 0,
+            "revenue": 0,
+        })
+        entry["quantity"] += quantity
+        entry["revenue"] += price * quantity
+
+    return {
+        "day": created_at.strftime("%Y-%m-%d"),
+        "hour": created_at.hour,
+        "total": _to_number(order.get("total")),
+        "waiter_id": str(order.get("waiter_id") or ""),
+        "waiter_name": order.get("waiter_name") or "",
+        "items": sorted(items.values(), key=lambda x: x["key"]),
+    }
+
+
+def contribution_signature(contribution: Optional[Dict]) -> Optional[str]:
+    if contribution is None:
+        return None
+    payload = json.dumps(contribution, sort_keys=True, default=str)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+class _DayAccumulator:
+    """Merges many contributions into one $inc/$set update per rollup day"""
+
+    def __init__(self):
+        self._days: Dict[str, Dict[str, Dict]] = {}
+
+    def add(self, contribution: Dict, sign: int = 1):
+        day = self._days.setdefault(contribution["day"], {"$inc": {}, "$set": {}})
+        inc, set_ = day["$inc"], day["$set"]
+
+        def _inc(path, amount):
+            inc[path] = inc.get(path, 0) + amount
+
+        total = contribution["total"]
+        _inc("order_count", sign)
+        _inc("total_sales", sign * total)
+        _inc(f"hours.{contribution['hour']:02d}", sign)
+
+        waiter_key = bucket_key(contribution["waiter_id"])
+        _inc(f"waiters.{waiter_key}.order_count", sign)
+        _inc(f"waiters.{waiter_key}.total_sales", sign * total)
+        if sign > 0:
+            set_[f"waiters.{waiter_key}.waiter_id"] = contribution["waiter_id"]
+            set_[f"waiters.{waiter_key}.waiter_name"] = contribution["waiter_name"]
+
+        for item in contribution["items"]:
+            item_key = item["key"]
+            category_key = bucket_key(item["category"])
+            _inc(f"items.{item_key}.quantity", sign * item["quantity"])
+            _inc(f"items.{item_key}.revenue", sign * item["revenue"])
+            _inc(f"categories.{category_key}.quantity", sign * item["quantity"])
+            _inc(f"categories.{category_key}.revenue", sign * item["revenue"])
+            if sign > 0:
+                set_[f"items.{item_key}.name"] = item["name"]
+                set_[f"items.{item_key}.menu_item_id"] = item["menu_item_id"]
+                set_[f"items.{item_key}.category"] = item["category"]
+                set_[f"items.{item_key}.price"] = item["price"]
+                set_[f"categories.{category_key}.category"] = item["category"]
+
+    def operations(self, organization_id: str) -> List[UpdateOne]:
+        now = datetime.now(timezone.utc).isoformat()
+        ops = []
+        for day, update in self._days.items():
+            update["$set"]["updated_at"] = now
+            ops.append(UpdateOne(
+                {"_id": f"{organization_id}:{day}"},
+                {
+                    "$inc": update["$inc"],
+                    "$set": update["$set"],
+                    "$setOnInsert": {"organization_id": organization_id, "date": day},
+                },
+                upsert=True,
+            ))
+        return ops
+
+
+class SalesRollupService:
+    """Maintains and queries the per-day `sales_rollups` collection"""
+
+    def __init__(self, db, catalog: Optional[OrgCatalogCache] = None):
+        self.db = db
+        self.catalog = catalog or OrgCatalogCache(db)
+        # org -> when this worker last confirmed the backfill state document
+        self._backfilled_orgs: Dict[str, float] = {}
+        self._backfill_locks: Dict[str, asyncio.Lock] = {}
+        self._backfill_tasks: Dict[str, asyncio.Task] = {}
+        self._stats = {
+            "syncs": 0,
+            "applied": 0,
+            "skipped": 0,
+            "backfilled_orders": 0,
+            "fallback_reports": 0,
+        }
+
+        # How long a worker trusts "backfilled" before re-reading the shared generation
+        self.STATE_CHECK_INTERVAL = 5
+
+    async def ensure_indexes(self):
+        await self.db.sales_rollups.create_index([("organization_id", 1), ("date", 1)])
+        await self.db.sales_rollup_state.create_index("organization_id")
+
+    # ============ CATEGORY LOOKUP ============
+
+    async def _category_lookup(self, organization_id: str) -> Callable[[str], str]:
+        """name -> category resolver backed by the org's catalog snapshot"""
+        catalog = await self.catalog.get(organization_id)
+        return catalog.category_for
+
+    # ============ INCREMENTAL MAINTENANCE ============
+
+    async def sync_order(self, order_id: str, organization_id: str) -> bool:
+        """
+        Bring the rollups in line with an order's current state.
+
+        Safe to call after any order write (complete, edit, re-open, payment):
+        the previously applied contribution is reversed and the new one applied
+        only if the order's signature changed. Returns True if rollups changed.
+        """
+        self._stats["syncs"] += 1
+        try:
+            order = await self.db.orders.find_one(
+                {"id": order_id, "organization_id": organization_id},
+                ORDER_ROLLUP_PROJECTION,
+            )
+            if not order:
+                return False
+
+            contribution = None
+            if order.get("status") in ROLLUP_STATUSES:
+                category_of = await self._category_lookup(organization_id)
+                contribution = build_contribution(order, category_of)
+            new_sig = contribution_signature(contribution)
+            old_sig = order.get("rollup_sig")
+            if new_sig == old_sig:
+                self._stats["skipped"] += 1
+                return False
+
+            # Compare-and-swap on the signature so concurrent syncs apply exactly once
+            if contribution:
+                swap = {"$set": {"rollup_sig": new_sig, "rollup_applied": contribution}}
+            else:
+                swap = {"$unset": {"rollup_sig": "", "rollup_applied": ""}}
+            result = await self.db.orders.update_one(
+                {"id": order_id, "organization_id": organization_id, "rollup_sig": old_sig},
+                swap,
+            )
+            if result.modified_count == 0:
+                self._stats["skipped"] += 1
+                return False
+
+            accumulator = _DayAccumulator()
+            if order.get("rollup_applied"):
+                accumulator.add(order["rollup_applied"], -1)
+            if contribution:
+                accumulator.add(contribution, 1)
+            await self.db.sales_rollups.bulk_write(accumulator.operations(organization_id), ordered=False)
+            self._stats["applied"] += 1
+            return True
+        except Exception as e:
+            print(f"❌ Sales rollup sync error for order {order_id}: {e}")
+            return False
+
+    async def retract_order(self, order: Dict) -> bool:
+        """Reverse a deleted order's contribution (pass the document read before deletion)"""
+        applied = (order or {}).get("rollup_applied")
+        organization_id = (order or {}).get("organization_id")
+        if not applied or not organization_id:
+            return False
+        try:
+            accumulator = _DayAccumulator()
+            accumulator.add(applied, -1)
+            await self.db.sales_rollups.bulk_write(accumulator.operations(organization_id), ordered=False)
+            return True
+        except Exception as e:
+            print(f"❌ Sales rollup retract error for order {order.get('id')}: {e}")
+            return False
+
+    # ============ BACKFILL ============
+
+    async def ensure_backfilled(self, organization_id: str):
+        """Fold pre-existing history into rollups once per organization (and after each reset)"""
+        if self._recently_confirmed(organization_id):
+            return
+        lock = self._backfill_locks.setdefault(organization_id, asyncio.Lock())
+        async with lock:
+            if self._recently_confirmed(organization_id):
+                return
+            state = await self.db.sales_rollup_state.find_one({"_id": organization_id})
+            if _is_backfilled(state):
+                self._backfilled_orgs[organization_id] = time.time()
+                return
+            self._backfilled_orgs.pop(organization_id, None)
+            generation = _generation(state)
+            await self.backfill_organization(organization_id)
+            try:
+                # Compare-and-swap on the generation: a reset during the backfill leaves it undone
+                result = await self.db.sales_rollup_state.update_one(
+                    {"_id": organization_id, "generation": generation if generation else {"$in": [0, None]}},
+                    {"$set": {
+                        "organization_id": organization_id,
+                        "backfilled_at": datetime.now(timezone.utc).isoformat(),
+                        "backfilled_generation": generation,
+                    }},
+                    upsert=not generation,
+                )
+            except DuplicateKeyError:
+                return  # Reset between our read and this write
+            if result.matched_count or result.upserted_id is not None:
+                self._backfilled_orgs[organization_id] = time.time()
+
+    def _recently_confirmed(self, organization_id: str) -> bool:
+        return time.time() - self._backfilled_orgs.get(organization_id, 0) < self.STATE_CHECK_INTERVAL
+
+    async def _backfill_ready(self, organization_id: str) -> bool:
+        """True once the org's rollups hold its history; otherwise start the backfill in background"""
+        if self._recently_confirmed(organization_id):
+            return True
+        if organization_id in self._backfill_tasks:
+            return False
+        state = await self.db.sales_rollup_state.find_one(
+            {"_id": organization_id}, {"generation": 1, "backfilled_generation": 1, "backfilled_at": 1}
+        )
+        if _is_backfilled(state):
+            self._backfilled_orgs[organization_id] = time.time()
+            return True
+        self._backfilled_orgs.pop(organization_id, None)
+
+        task = asyncio.create_task(self.ensure_backfilled(organization_id))
+        self._backfill_tasks[organization_id] = task
+
+        def _done(done: asyncio.Task):
+            self._backfill_tasks.pop(organization_id, None)
+            if not done.cancelled() and done.exception():
+                print(f"❌ Sales rollup backfill failed for {organization_id}: {done.exception()}")
+
+        task.add_done_callback(_done)
+        return False
+
+    async def backfill_organization(self, organization_id: str) -> int:
+        """
+        Apply every closed order that has no rollup signature yet.
+
+        Orders are claimed with a per-run token before being counted, so an
+        order synced concurrently by a request is never counted twice.
+        """
+        category_of = await self._category_lookup(organization_id)
+        token = str(uuid.uuid4())
+        cursor = self.db.orders.find(
+            {
+                "organization_id": organization_id,
+                "status": {"$in": list(ROLLUP_STATUSES)},
+                "rollup_sig": {"$exists": False},
+            },
+            ORDER_ROLLUP_PROJECTION,
+        ).batch_size(BACKFILL_BATCH_SIZE)
+
+        applied = 0
+        batch: List[Dict] = []
+        async for order in cursor:
+            batch.append(order)
+            if len(batch) >= BACKFILL_BATCH_SIZE:
+                applied += await self._backfill_batch(organization_id, batch, category_of, token)
+                batch = []
+        if batch:
+            applied += await self._backfill_batch(organization_id, batch, category_of, token)
+
+        self._stats["backfilled_orders"] += applied
+        print(f"📊 Sales rollups backfilled for {organization_id}: {applied} orders")
+        return applied
+
+    async def _backfill_batch(self, organization_id: str, orders: List[Dict], category_of, token: str) -> int:
+        contributions = {}
+        claims = []
+        for order in orders:
+            contribution = build_contribution(order, category_of)
+            if not contribution:
+                continue
+            contributions[order["id"]] = contribution
+            claims.append(UpdateOne(
+                {"id": order["id"], "organization_id": organization_id, "rollup_sig": {"$exists": False}},
+                {"$set": {
+                    "rollup_sig": contribution_signature(contribution),
+                    "rollup_applied": contribution,
+                    "rollup_backfill": token,
+                }},
+            ))
+        if not claims:
+            return 0
+
+        result = await self.db.orders.bulk_write(claims, ordered=False)
+        claimed_ids = list(contributions.keys())
+        if result.modified_count < len(claims):
+            claimed = await self.db.orders.find(
+                {"id": {"$in": claimed_ids}, "rollup_backfill": token}, {"_id": 0, "id": 1}
+            ).to_list(None)
+            claimed_ids = [o["id"] for o in claimed]
+
+        accumulator = _DayAccumulator()
+        for order_id in claimed_ids:
+            accumulator.add(contributions[order_id], 1)
+        ops = accumulator.operations(organization_id)
+        if ops:
+            await self.db.sales_rollups.bulk_write(ops, ordered=False)
+        return len(claimed_ids)
+
+    async def reset_organization(self, organization_id: str):
+        """
+        Drop an org's rollups and signatures so the next report rebuilds from orders.
+
+        The generation is bumped last, once the org is clean, so other workers
+        fall back to live aggregation within STATE_CHECK_INTERVAL and backfill.
+        """
+        await self.db.sales_rollups.delete_many({"organization_id": organization_id})
+        await self.db.orders.update_many(
+            {"organization_id": organization_id, "rollup_sig": {"$exists": True}},
+            {"$unset": {"rollup_sig": "", "rollup_applied": "", "rollup_backfill": ""}},
+        )
+        await self.db.sales_rollup_state.update_one(
+            {"_id": organization_id},
+            {"$inc": {"generation": 1}, "$set": {"organization_id": organization_id}},
+            upsert=True,
+        )
+        self._backfilled_orgs.pop(organization_id, None)
+
+    # ============ QUERYING ============
+
+    async def get_report_buckets(self, organization_id: str) -> Dict[str, Dict[str, Dict]]:
+        """
+        All-time item/category/waiter/hour totals for an organization.
+
+        Closed days come from one $facet aggregation over `sales_rollups`;
+        today's delta is computed from today's closed orders. Until the org's
+        backfill has finished, the totals are aggregated from orders instead.
+        """
+        if not await self._backfill_ready(organization_id):
+            self._stats["fallback_reports"] += 1
+            return await self._buckets_from_orders(organization_id)
+
+        today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        today = today_start.strftime("%Y-%m-%d")
+
+        def _unwind(field: str) -> List[Dict]:
+            return [
+                {"$project": {"bucket": {"$objectToArray": f"${field}"}}},
+                {"$unwind": "$bucket"},
+            ]
+
+        pipeline = [
+            {"$match": {"organization_id": organization_id, "date": {"$lt": today}}},
+            {"$sort": {"date": 1}},
+            {"$facet": {
+                "items": _unwind("items") + [{"$group": {
+                    "_id": "$bucket.k",
+                    "name": {"$last": "$bucket.v.name"},
+                    "menu_item_id": {"$last": "$bucket.v.menu_item_id"},
+                    "category": {"$last": "$bucket.v.category"},
+                    "price": {"$last": "$bucket.v.price"},
+                    "quantity": {"$sum": "$bucket.v.quantity"},
+                    "revenue": {"$sum": "$bucket.v.revenue"},
+                }}],
+                "categories": _unwind("categories") + [{"$group": {
+                    "_id": "$bucket.k",
+                    "category": {"$last": "$bucket.v.category"},
+                    "quantity": {"$sum": "$bucket.v.quantity"},
+                    "revenue": {"$sum": "$bucket.v.revenue"},
+                }}],
+                "waiters": _unwind("waiters") + [{"$group": {
+                    "_id": "$bucket.k",
+                    "waiter_id": {"$last": "$bucket.v.waiter_id"},
+                    "waiter_name": {"$last": "$bucket.v.waiter_name"},
+                    "order_count": {"$sum": "$bucket.v.order_count"},
+                    "total_sales": {"$sum": "$bucket.v.total_sales"},
+                }}],
+                "hours": _unwind("hours") + [{"$group": {
+                    "_id": "$bucket.k",
+                    "order_count": {"$sum": "$bucket.v"},
+                }}],
+            }},
+        ]
+        facets = await self.db.sales_rollups.aggregate(pipeline).to_list(1)
+        facets = facets[0] if facets else {}
+
+        buckets: Dict[str, Dict[str, Dict]] = {}
+        for name in ("items", "categories", "waiters", "hours"):
+            buckets[name] = {row.pop("_id"): row for row in facets.get(name, [])}
+
+        # Today's delta straight from the orders collection (bounded to one day)
+        today_orders = []
+        async for order in self.db.orders.find(
+            {
+                "organization_id": organization_id,
+                "status": {"$in": list(ROLLUP_STATUSES)},
+                "created_at": {"$gte": today_start.isoformat()},
+            },
+            ORDER_ROLLUP_PROJECTION,
+        ):
+            today_orders.append(order)
+        if today_orders:
+            category_of = await self._category_lookup(organization_id)
+        for order in today_orders:
+            contribution = build_contribution(order, category_of)
+            if contribution:
+                self._merge_into_buckets(buckets, contribution)
+
+        return buckets
+
+    async def _buckets_from_orders(self, organization_id: str) -> Dict[str, Dict[str, Dict]]:
+        """Same buckets as get_report_buckets, from one $facet aggregation over the closed orders"""
+
+        def _number(path: str) -> Dict:
+            return {"$convert": {"input": path, "to": "double", "onError": 0, "onNull": 0}}
+
+        item_name = {"$toString": {"$ifNull": ["$items.name", ""]}}
+        pipeline = [
+            {"$match": {"organization_id": organization_id, "status": {"$in": list(ROLLUP_STATUSES)}}},
+            {"$sort": {"created_at": 1}},
+            {"$project": {
+                "_id": 0,
+                "items": 1,
+                "total": 1,
+                "waiter_id": 1,
+                "waiter_name": 1,
+                "created": {"$convert": {"input": "$created_at", "to": "date", "onError": None, "onNull": None}},
+            }},
+            {"$match": {"created": {"$ne": None}}},
+            {"$facet": {
+                "items": [
+                    {"$unwind": "$items"},
+                    {"$match": {"items": {"$type": "object"}}},
+                    {"$project": {
+                        "name": item_name,
+                        "item_id": {"$cond": [
+                            {"$in": [{"$ifNull": ["$items.menu_item_id", ""]}, ["", None]]},
+                            item_name,
+                            {"$toString": "$items.menu_item_id"},
+                        ]},
+                        "quantity": _number("$items.quantity"),
+                        "price": _number("$items.price"),
+                    }},
+                    {"$group": {
+                        "_id": "$item_id",
+                        "name": {"$last": "$name"},
+                        "price": {"$last": "$price"},
+                        "quantity": {"$sum": "$quantity"},
+                        "revenue": {"$sum": {"$multiply": ["$price", "$quantity"]}},
+                    }},
+                ],
+                "waiters": [{"$group": {
+                    "_id": {"$toString": {"$ifNull": ["$waiter_id", ""]}},
+                    "waiter_name": {"$last": {"$ifNull": ["$waiter_name", ""]}},
+                    "order_count": {"$sum": 1},
+                    "total_sales": {"$sum": _number("$total")},
+                }}],
+                "hours": [{"$group": {"_id": {"$hour": "$created"}, "order_count": {"$sum": 1}}}],
+            }},
+        ]
+        facets = await self.db.orders.aggregate(pipeline, allowDiskUse=True).to_list(1)
+        facets = facets[0] if facets else {}
+
+        buckets: Dict[str, Dict[str, Dict]] = {"items": {}, "categories": {}, "waiters": {}, "hours": {}}
+        category_of = await self._category_lookup(organization_id)
+        for row in facets.get("items", []):
+            category = category_of(row["name"]) or "Uncategorized"
+            entry = buckets["items"].setdefault(bucket_key(row["_id"]), {"quantity": 0, "revenue": 0})
+            entry.update({
+                "name": row["name"],
+                "menu_item_id": row["_id"],
+                "category": category,
+                "price": row["price"],
+            })
+            entry["quantity"] += row["quantity"]
+            entry["revenue"] += row["revenue"]
+            totals = buckets["categories"].setdefault(bucket_key(category), {
+                "category": category, "quantity": 0, "revenue": 0,
+            })
+            totals["quantity"] += row["quantity"]
+            totals["revenue"] += row["revenue"]
+        for row in facets.get("waiters", []):
+            buckets["waiters"][bucket_key(row["_id"])] = {
+                "waiter_id": row["_id"],
+                "waiter_name": row["waiter_name"],
+                "order_count": row["order_count"],
+                "total_sales": row["total_sales"],
+            }
+        for row in facets.get("hours", []):
+            buckets["hours"][f"{row['_id']:02d}"] = {"order_count": row["order_count"]}
+        return buckets
+
+    @staticmethod
+    def _merge_into_buckets(buckets: Dict[str, Dict[str, Dict]], contribution: Dict):
+        total = contribution["total"]
+        hour = buckets["hours"].setdefault(f"{contribution['hour']:02d}", {"order_count": 0})
+        hour["order_count"] += 1
+
+        waiter = buckets["waiters"].setdefault(bucket_key(contribution["waiter_id"]), {
+            "waiter_id": contribution["waiter_id"], "order_count": 0, "total_sales": 0,
+        })
+        waiter["waiter_name"] = contribution["waiter_name"]
+        waiter["order_count"] += 1
+        waiter["total_sales"] += total
+
+        for item in contribution["items"]:
+            entry = buckets["items"].setdefault(item["key"], {"quantity": 0, "revenue": 0})
+            entry.update({
+                "name": item["name"],
+                "menu_item_id": item["menu_item_id"],
+                "category": item["category"],
+                "price": item["price"],
+            })
+            entry["quantity"] += item["quantity"]
+            entry["revenue"] += item["revenue"]
+
+            category = buckets["categories"].setdefault(bucket_key(item["category"]), {
+                "category": item["category"], "quantity": 0, "revenue": 0,
+            })
+            category["quantity"] += item["quantity"]
+            category["revenue"] += item["revenue"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "backfilled_orgs": len(self._backfilled_orgs),
+            "running_backfills": len(self._backfill_tasks),
+        }
+
+
+# Global instance
+_sales_rollup_service: Optional[SalesRollupService] = None
+
+
+def init_sales_rollup_service(db, catalog: Optional[OrgCatalogCache] = None) -> SalesRollupService:
+    """Initialize the sales rollup service against the active database"""
+    global _sales_rollup_service
+    _sales_rollup_service = SalesRollupService(db, catalog)
+    return _sales_rollup_service
+
+
+def get_sales_rollup_service() -> Optional[SalesRollupService]:
+    """Get the global sales rollup service instance"""
+    return _sales_rollup_service
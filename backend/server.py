@@ -3,6 +3,7 @@ import base64
 import html
 import json
 import hashlib
+import hmac
 import logging
 import os
 import ssl
@@ -24,10 +25,12 @@ from typing import Any, Dict, List, Optional
 import jwt
 import razorpay
 from dotenv import load_dotenv
-from fastapi import APIRouter, Body, Depends, FastAPI, File, Form, HTTPException, UploadFile, status, Query, Request
-from fastapi.responses import Response, StreamingResponse
+from fastapi import APIRouter, Body, Depends, FastAPI, File, Form, HTTPException, UploadFile, status, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 from passlib.context import CryptContext
 from pydantic import BaseModel, ConfigDict, Field
 from starlette.middleware.cors import CORSMiddleware
@@ -57,6 +60,38 @@ logging.basicConfig(
 
 # Import Redis cache service
 from redis_cache import init_redis_cache, cleanup_redis_cache, get_cached_order_service, get_table_status_manager
+from tiered_cache import init_tiered_cache, get_tiered_cache
+from order_stream import init_order_event_hub, get_order_event_hub, to_client_message
+from order_delta import ensure_delta_indexes, get_active_orders_delta, record_tombstone
+from ttl_structures import SlidingWindowCounter
+
+# Import pre-aggregated sales rollups (backs the /reports endpoints)
+from sales_rollups import init_sales_rollup_service, get_sales_rollup_service, parse_order_datetime, ROLLUP_STATUSES
+from daybook_snapshots import init_daybook_snapshot_service, get_daybook_snapshot_service, MAX_RANGE_DAYS
+from customer_ledger import init_customer_ledger_service, get_customer_ledger_service
+from restaurant_slugs import (
+    ensure_slug_indexes, backfill_slug_fields, init_slug_resolver, get_slug_resolver, slug_fields, SLUG_VERSION,
+)
+from public_menu_cache import serve_public_menu, invalidate_public_menu, get_public_menu_stats, etag_matches
+from auth_hashing import init_password_hasher, get_password_hasher, PasswordHasherBusy
+from document_renderer import (
+    init_document_renderer, get_document_renderer, DocumentRenderTimeout, DocumentRenderUnavailable,
+)
+from http_clients import init_http_clients, get_http_clients
+from whatsapp_outbox import init_whatsapp_outbox, get_whatsapp_outbox
+from whatsapp_status_store import init_whatsapp_status_store, get_whatsapp_status_store, parse_status_events
+from push_broadcast import init_push_broadcast_jobs, get_push_broadcast_jobs
+from receipt_artifacts import (
+    init_receipt_artifact_cache, get_receipt_artifact_cache, artifact_key, artifact_etag, ORDER_VERSION_PROJECTION,
+)
+
+# Import per-org menu/staff catalog snapshots (O(1) lookups for reports)
+from org_catalog import init_org_catalog_cache, get_org_catalog_cache
+from order_export import (
+    build_export_query, stream_orders_csv, init_order_export_jobs, get_order_export_jobs,
+)
+from order_side_effects import init_order_side_effects, get_order_side_effects
+from invoice_sequence import init_invoice_allocator, get_invoice_allocator
 
 # Import monitoring system
 from monitoring import init_monitoring, collect_metrics_task, monitoring_router
@@ -229,6 +264,8 @@ db = client[os.getenv("DB_NAME", "restrobill")]
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt runs on a bounded thread pool so logins never block the event loop
+init_password_hasher(pwd_context)
 security = HTTPBearer()
 JWT_SECRET = os.getenv("JWT_SECRET", "default-jwt-secret-please-change-in-production")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
@@ -268,11 +305,12 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 from functools import lru_cache
 import threading
 
-# Simple cache with asyncio-safe operations and SIZE LIMITS
-_cache = {}
-_cache_ttl = {}
-_cache_lock = asyncio.Lock()
+# Response cache: bounded per-worker L1 + Redis L2 through the shared tiered cache
+RESPONSE_CACHE_NAMESPACE = "response"
+DAILY_REPORT_NAMESPACE = "daily_report"
 MAX_CACHE_SIZE = 200  # 200 entries: good for caching without memory leak
+get_tiered_cache().register(RESPONSE_CACHE_NAMESPACE, l1_max=MAX_CACHE_SIZE, ttl=60, l1_serialized=True)
+get_tiered_cache().register(DAILY_REPORT_NAMESPACE, l1_max=MAX_CACHE_SIZE, ttl=30, l1_serialized=True)
 
 # In-process idempotency map: prevents two simultaneous identical requests
 # from both passing the DB duplicate check before either has written
@@ -289,27 +327,15 @@ def cache_response(ttl_seconds=60):
         async def wrapper(*args, **kwargs):
             # Create cache key from function name and args
             cache_key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
-            current_time = time.time()
             
-            # Check if cached and not expired
-            if cache_key in _cache and cache_key in _cache_ttl:
-                if current_time < _cache_ttl[cache_key]:
-                    return _cache[cache_key]
+            # Check L1, then Redis L2 (size-bounded LRU, expired entries dropped on read)
+            cached = await get_tiered_cache().get(RESPONSE_CACHE_NAMESPACE, cache_key)
+            if cached is not None:
+                return cached
             
             # Execute function and cache result
             result = await func(*args, **kwargs)
-            
-            async with _cache_lock:
-                # MEMORY FIX: Limit cache size to prevent memory leak
-                if len(_cache) >= MAX_CACHE_SIZE:
-                    # Remove oldest entries
-                    oldest_keys = sorted(_cache_ttl.items(), key=lambda x: x[1])[:10]
-                    for key, _ in oldest_keys:
-                        _cache.pop(key, None)
-                        _cache_ttl.pop(key, None)
-                
-                _cache[cache_key] = result
-                _cache_ttl[cache_key] = current_time + ttl_seconds
+            await get_tiered_cache().set(RESPONSE_CACHE_NAMESPACE, cache_key, result, ttl=ttl_seconds)
             
             return result
         return wrapper
@@ -317,11 +343,7 @@ def cache_response(ttl_seconds=60):
 
 def clear_expired_cache():
     """Clear expired cache entries to free memory"""
-    current_time = time.time()
-    expired_keys = [k for k, v in list(_cache_ttl.items()) if current_time >= v]
-    for key in expired_keys:
-        _cache.pop(key, None)
-        _cache_ttl.pop(key, None)
+    return get_tiered_cache().purge_expired()
 
 # Semaphore to limit concurrent database operations (BALANCED for 512MB + speed)
 DB_SEMAPHORE = asyncio.Semaphore(25)  # 25 concurrent ops: good balance for speed + memory
@@ -333,21 +355,14 @@ async def rate_limited_db_operation(operation):
 
 
 # In-memory fallback rate limiter (used when Redis is unavailable)
-_rate_limit_store: dict = {}  # ip -> [timestamps]
-_rate_limit_lock = asyncio.Lock()
+_rate_limit_windows: Dict[int, SlidingWindowCounter] = {}  # window seconds -> per-key bucketed counter
 
 async def _check_memory_rate_limit(key: str, max_requests: int, window_seconds: int) -> bool:
-    """Token-bucket rate limiter backed by in-memory dict. Returns True if allowed."""
-    now = time.time()
-    async with _rate_limit_lock:
-        timestamps = _rate_limit_store.get(key, [])
-        # Drop timestamps outside the window
-        timestamps = [t for t in timestamps if now - t < window_seconds]
-        if len(timestamps) >= max_requests:
-            return False
-        timestamps.append(now)
-        _rate_limit_store[key] = timestamps
-        return True
+    """Sliding-window rate limiter (fixed buckets, bounded key set). Returns True if allowed."""
+    counter = _rate_limit_windows.get(window_seconds)
+    if counter is None:
+        counter = _rate_limit_windows[window_seconds] = SlidingWindowCounter(window_seconds, buckets=12)
+    return counter.allow(key, max_requests)
 def is_allowed_origin(origin: str) -> bool:
     """Check if the origin is allowed for CORS"""
     allowed_patterns = [
@@ -469,53 +484,43 @@ async def whatsapp_webhook_verify(request: Request):
 
 
 @app.post("/webhooks/whatsapp")
-async def whatsapp_webhook_receive(payload: dict = Body(...)):
+async def whatsapp_webhook_receive(request: Request):
     """
-    Receive WhatsApp webhook events and log delivery state changes.
+    Receive WhatsApp webhook events.
+
+    When WHATSAPP_APP_SECRET is set, X-Hub-Signature-256 (HMAC-SHA256 of the
+    raw body with the app secret) must match before anything is recorded.
+    Delivery statuses are buffered and bulk-written to whatsapp_message_status
+    by the status store's flusher - the acknowledgment does no I/O.
     """
+    body = await request.body()
+    app_secret = os.getenv("WHATSAPP_APP_SECRET", "")
+    if app_secret:
+        expected = "sha256=" + hmac.new(app_secret.encode(), body, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, request.headers.get("x-hub-signature-256", "")):
+            return Response(status_code=403, content="Invalid signature")
     try:
-        entries = payload.get("entry", []) or []
-        for entry in entries:
-            entry_id = entry.get("id")
-            changes = entry.get("changes", []) or []
-            for change in changes:
-                value = change.get("value", {}) or {}
+        payload = json.loads(body)
+    except ValueError:
+        return Response(status_code=400, content="Invalid JSON")
 
-                for status_event in value.get("statuses", []) or []:
-                    msg_id = status_event.get("id", "")
-                    status = status_event.get("status", "unknown")
-                    recipient_id = status_event.get("recipient_id", "")
-                    error_items = status_event.get("errors", []) or []
-                    error_summary = [
-                        {
-                            "code": err.get("code"),
-                            "title": err.get("title"),
-                            "message": err.get("message"),
-                        }
-                        for err in error_items
-                    ]
-                    logging.warning(
-                        "WA delivery webhook | entry_id=%s | msg_id=%s | status=%s | recipient=%s | errors=%s",
-                        entry_id,
-                        msg_id,
-                        status,
-                        recipient_id,
-                        json.dumps(error_summary),
-                    )
+    try:
+        get_status_store().add(parse_status_events(payload))
 
+        for entry in payload.get("entry", []) or []:
+            entry_id = entry.get("id")
+            for change in entry.get("changes", []) or []:
+                value = change.get("value", {}) or {}
                 for message_event in value.get("messages", []) or []:
-                    msg_id = message_event.get("id", "")
-                    msg_type = message_event.get("type", "unknown")
-                    from_number = message_event.get("from", "")
                     logging.warning(
                         "WA inbound webhook | entry_id=%s | msg_id=%s | type=%s | from=%s",
                         entry_id,
-                        msg_id,
-                        msg_type,
-                        from_number,
+                        message_event.get("id", ""),
+                        message_event.get("type", "unknown"),
+                        message_event.get("from", ""),
                     )
-    except Exception:
-        pass
+    except Exception as e:
+        print(f"⚠️ WhatsApp webhook parse error: {e}")
     
     return {"success": True}
 
@@ -693,6 +698,7 @@ class BusinessSettings(BaseModel):
     fssai: Optional[str] = None
     currency: str = "INR"
     tax_rate: float = 5.0
+    invoice_gap_free: Optional[bool] = None  # True = strictly consecutive invoice numbers (None = server default)
 
     receipt_theme: str = "classic"
     logo_url: Optional[str] = None
@@ -729,6 +735,8 @@ class BusinessSettings(BaseModel):
     credit_payment_enabled: bool = True
     credit_requires_customer_info: bool = True  # Require name/phone for credit orders
     credit_minimum_amount: float = 0.0  # Minimum amount for credit orders
+    # Public menu URL (/r/{restaurant_slug}/menu)
+    restaurant_slug: Optional[str] = None
 
 
 class User(BaseModel):
@@ -920,16 +928,21 @@ class OrderItem(BaseModel):
     notes: Optional[str] = None
 
 
-async def get_next_invoice_number(organization_id: str) -> int:
-    """Get the next invoice number for an organization"""
-    counter = await db.counters.find_one_and_update(
-        {"_id": f"invoice_{organization_id}"},
-        {"$inc": {"seq": 1}},
-        upsert=True,
-        return_document=True,
-        new=True
-    )
-    return counter["seq"]
+def get_invoice_sequence():
+    """Invoice allocator bound to the active database connection"""
+    allocator = get_invoice_allocator()
+    if allocator is None or allocator.db is not db:
+        allocator = init_invoice_allocator(
+            db,
+            block_size=settings.invoice_block_size,
+            gap_free=settings.invoice_gap_free,
+        )
+    return allocator
+
+
+async def get_next_invoice_number(organization_id: str, gap_free: Optional[bool] = None) -> int:
+    """Get the next invoice number for an organization (leased blocks unless gap-free)"""
+    return await get_invoice_sequence().next(organization_id, gap_free=gap_free)
 
 class Order(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -1105,13 +1118,26 @@ class PrintData(BaseModel):
 
 
 # Helper functions
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+def _password_hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-in requests, please retry in a moment",
+        headers={"Retry-After": "2"},
+    )
+
+
+async def hash_password(password: str) -> str:
+    try:
+        return await get_password_hasher().hash(password)
+    except PasswordHasherBusy:
+        raise _password_hasher_busy()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        return await get_password_hasher().verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise _password_hasher_busy()
     except Exception as e:
         print(f"❌ Password verification exception: {str(e)}")
         return False
@@ -1817,30 +1843,20 @@ def get_secure_org_id(current_user: dict) -> str:
 
 
 # ── User auth cache ────────────────────────────────────────────────────────────
-_user_cache: dict = {}
-_user_cache_ttl: dict = {}
+# L1 only: user documents carry the password hash and must never be written to Redis.
+# Invalidations are still broadcast so every worker drops its copy.
+USER_CACHE_NAMESPACE = "auth_user"
 _USER_CACHE_TTL_SECONDS = 60
+get_tiered_cache().register(USER_CACHE_NAMESPACE, l1_max=500, ttl=_USER_CACHE_TTL_SECONDS, use_l2=False)
 
 def _user_cache_get(user_id: str):
-    expiry = _user_cache_ttl.get(user_id)
-    if expiry and time.time() < expiry:
-        return _user_cache.get(user_id)
-    _user_cache.pop(user_id, None)
-    _user_cache_ttl.pop(user_id, None)
-    return None
+    return get_tiered_cache().local_get(USER_CACHE_NAMESPACE, user_id)
 
 def _user_cache_set(user_id: str, user: dict):
-    if len(_user_cache) >= 500:
-        oldest = sorted(_user_cache_ttl.items(), key=lambda x: x[1])[:100]
-        for uid, _ in oldest:
-            _user_cache.pop(uid, None)
-            _user_cache_ttl.pop(uid, None)
-    _user_cache[user_id] = user
-    _user_cache_ttl[user_id] = time.time() + _USER_CACHE_TTL_SECONDS
+    get_tiered_cache().local_set(USER_CACHE_NAMESPACE, user_id, user)
 
 def invalidate_user_cache(user_id: str):
-    _user_cache.pop(user_id, None)
-    _user_cache_ttl.pop(user_id, None)
+    get_tiered_cache().evict(USER_CACHE_NAMESPACE, user_id)
 
 
 async def get_current_user(
@@ -2403,189 +2419,62 @@ def build_public_receipt_url(tracking_token: str, order: Optional[dict] = None,
     return f"{get_public_site_url()}/receipt/{tracking_token}"
 
 
-async def generate_short_tracking_token(length: int = 8) -> str:
-    """Generate a short public tracking token with collision checking."""
-    alphabet = "23456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+TRACKING_TOKEN_ALPHABET = "23456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
 
-    for _ in range(10):
-        token = "".join(secrets.choice(alphabet) for _ in range(length))
-        existing = await db.orders.find_one({"tracking_token": token}, {"_id": 1})
-        if not existing:
-            return token
-
-    return "".join(secrets.choice(alphabet) for _ in range(length + 2))
 
+def generate_short_tracking_token(length: int = 8) -> str:
+    """
+    Generate a short public tracking token. Tokens stay random (they are the only
+    guard on public track/receipt pages); uniqueness is enforced by the unique
+    orders.tracking_token index instead of a lookup per attempt.
+    """
+    return "".join(secrets.choice(TRACKING_TOKEN_ALPHABET) for _ in range(length))
 
-async def generate_receipt_pdf(order: dict, business: dict) -> StreamingResponse:
-    """Generate a simple printable receipt PDF for a public order receipt."""
-    try:
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import mm
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-    except ImportError:
-        raise HTTPException(status_code=500, detail="PDF generation is unavailable")
 
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=16 * mm,
-        leftMargin=16 * mm,
-        topMargin=16 * mm,
-        bottomMargin=16 * mm
-    )
+# Set at startup once the unique orders.tracking_token index is confirmed
+_tracking_token_unique = False
 
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'ReceiptTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#18181b'),
-        spaceAfter=6
-    )
-    meta_style = ParagraphStyle(
-        'ReceiptMeta',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#52525b'),
-        spaceAfter=10
-    )
-    section_style = ParagraphStyle(
-        'ReceiptSection',
-        parent=styles['Heading2'],
-        fontSize=11,
-        alignment=TA_LEFT,
-        textColor=colors.HexColor('#27272a'),
-        spaceBefore=8,
-        spaceAfter=6
-    )
-    normal_style = ParagraphStyle(
-        'ReceiptNormal',
-        parent=styles['Normal'],
-        fontSize=10,
-        leading=14,
-        textColor=colors.HexColor('#18181b')
-    )
 
-    currency_code = business.get("currency", "INR")
-    currency_symbol = CURRENCY_SYMBOLS.get(currency_code, "₹")
-    restaurant_name = business.get("restaurant_name", "Restaurant")
-    invoice_label = order.get("invoice_number") or str(order.get("id", ""))[:8].upper()
-    created_at = order.get("created_at")
-    if isinstance(created_at, str):
+async def ensure_tracking_token_index() -> bool:
+    """Build the unique tracking_token index; False (and loud) if it can't be built."""
+    global _tracking_token_unique
+    try:
+        await db.orders.create_index(
+            "tracking_token",
+            unique=True,
+            partialFilterExpression={"tracking_token": {"$type": "string"}},
+        )
+        _tracking_token_unique = True
+    except Exception as e:
+        indexes = await db.orders.index_information()
+        _tracking_token_unique = any(
+            spec.get("unique") and spec.get("key") == [("tracking_token", 1)] for spec in indexes.values()
+        )
+        if not _tracking_token_unique:
+            print(f"❌ orders.tracking_token index is NOT unique ({e}) - tracking tokens are checked with a "
+                  f"lookup per order until migrations/add_tracking_token_index.py is run")
+    return _tracking_token_unique
+
+
+async def insert_order_with_tracking_token(doc: dict, max_attempts: int = 5) -> str:
+    """Insert an order, regenerating its tracking token on a unique-index collision."""
+    if not _tracking_token_unique:
+        # No unique index to catch a collision: check the token before inserting
+        for _ in range(10):
+            if not await db.orders.find_one({"tracking_token": doc["tracking_token"]}, {"_id": 1}):
+                break
+            doc["tracking_token"] = generate_short_tracking_token()
+    for attempt in range(max_attempts):
         try:
-            created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-        except Exception:
-            created_at = None
-
-    elements = []
-    elements.append(Paragraph(restaurant_name, title_style))
-    elements.append(Paragraph(f"Receipt #{invoice_label}", meta_style))
-
-    contact_lines = []
-    if business.get("address"):
-        contact_lines.append(html.escape(str(business["address"])))
-    if business.get("phone"):
-        contact_lines.append(f"Phone: {html.escape(str(business['phone']))}")
-    if business.get("gstin"):
-        contact_lines.append(f"GSTIN: {html.escape(str(business['gstin']))}")
-    if contact_lines:
-        elements.append(Paragraph("<br/>".join(contact_lines), meta_style))
-
-    details = [
-        ["Invoice", str(invoice_label)],
-        ["Table", str(order.get("table_number") or "Counter")],
-        ["Customer", str(order.get("customer_name") or "Guest")],
-        ["Server", str(order.get("waiter_name") or "Staff")],
-        ["Status", str(order.get("status") or "pending").title()],
-    ]
-    if created_at:
-        details.append(["Date", created_at.astimezone().strftime("%d-%m-%Y %I:%M %p")])
-
-    details_table = Table(details, colWidths=[40 * mm, 120 * mm])
-    details_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#18181b')),
-        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor('#fafafa')]),
-        ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#d4d4d8')),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e4e4e7')),
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(details_table)
-    elements.append(Spacer(1, 10))
-
-    elements.append(Paragraph("Items", section_style))
-    item_rows = [["Item", "Qty", "Price", "Amount"]]
-    for item in order.get("items", []):
-        qty = float(item.get("quantity", 0) or 0)
-        price = float(item.get("price", 0) or 0)
-        item_rows.append([
-            str(item.get("name") or ""),
-            f"{qty:g}",
-            f"{currency_symbol}{price:.2f}",
-            f"{currency_symbol}{qty * price:.2f}"
-        ])
-
-    item_table = Table(item_rows, colWidths=[95 * mm, 20 * mm, 30 * mm, 35 * mm])
-    item_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#18181b')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#fafafa')]),
-        ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#d4d4d8')),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e4e4e7')),
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(item_table)
-    elements.append(Spacer(1, 10))
-
-    summary_rows = [
-        ["Subtotal", f"{currency_symbol}{float(order.get('subtotal', 0) or 0):.2f}"],
-        [f"Tax ({float(order.get('tax_rate', business.get('tax_rate', 5)) or 0):g}%)", f"{currency_symbol}{float(order.get('tax', 0) or 0):.2f}"],
-        ["Discount", f"{currency_symbol}{float(order.get('discount', 0) or 0):.2f}"],
-        ["Total", f"{currency_symbol}{float(order.get('total', 0) or 0):.2f}"],
-    ]
-    summary_table = Table(summary_rows, colWidths=[120 * mm, 40 * mm])
-    summary_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -2), 'Helvetica'),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('LINEABOVE', (0, -1), (-1, -1), 1, colors.HexColor('#18181b')),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 12))
-
-    footer_message = business.get("footer_message") or "Thank you for dining with us."
-    elements.append(Paragraph(html.escape(str(footer_message)), meta_style))
-    elements.append(Paragraph("This is a computer generated receipt.", normal_style))
-
-    doc.build(elements)
-    buffer.seek(0)
-    filename = f"receipt-{invoice_label}.pdf"
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-    )
+            await db.orders.insert_one(doc)
+            return doc["tracking_token"]
+        except DuplicateKeyError as e:
+            if "tracking_token" not in str(e) or attempt == max_attempts - 1:
+                raise
+            print(f"🔁 Tracking token collision, regenerating (attempt {attempt + 1})")
+            doc.pop("_id", None)
+            doc["tracking_token"] = generate_short_tracking_token()
+    return doc["tracking_token"]
 
 
 # Auth routes
@@ -2791,7 +2680,7 @@ async def verify_registration(verify_data: VerifyRegistrationOTP):
     print(f"🔍 Document keys before insert: {list(doc.keys())}")
     print(f"🔍 Referral code in doc: {doc.get('referral_code', 'NOT_FOUND')}")
     
-    doc["password"] = hash_password(user_data["password"])
+    doc["password"] = await hash_password(user_data["password"])
     doc["created_at"] = doc["created_at"].isoformat()
     doc["email_verified"] = True
     doc["email_verified_at"] = datetime.now(timezone.utc).isoformat()
@@ -2933,7 +2822,7 @@ async def register_direct(user_data: UserCreate):
     
     # Prepare document for database
     doc = user_obj.model_dump()
-    doc["password"] = hash_password(user_data.password)
+    doc["password"] = await hash_password(user_data.password)
     doc["created_at"] = doc["created_at"].isoformat()
     doc["email_verified"] = False  # Not verified since no OTP
     doc["username_lower"] = username_lower
@@ -3031,7 +2920,9 @@ async def login(credentials: UserLogin):
     
     # Verify password
     try:
-        password_valid = verify_password(credentials.password, user["password"])
+        password_valid = await verify_password(credentials.password, user["password"])
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Password verification error for {username_clean}: {str(e)}")
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -3138,6 +3029,64 @@ async def get_me(current_user: dict = Depends(get_current_user)):
     return user_data
 
 
+DASHBOARD_HISTORY_NAMESPACE = "dashboard_history"
+DASHBOARD_PENDING_STATUSES = ["pending", "preparing", "confirmed"]
+IST = timezone(timedelta(hours=5, minutes=30))
+get_tiered_cache().register(DASHBOARD_HISTORY_NAMESPACE, l1_max=MAX_CACHE_SIZE, ttl=3600)
+
+
+def _order_total_expr() -> dict:
+    """Order total as a number inside aggregations (missing/invalid totals count as 0)"""
+    return {"$convert": {"input": "$total", "to": "double", "onError": 0, "onNull": 0}}
+
+
+async def _load_dashboard_history(org_id: str, month_start_utc: datetime, today_utc: datetime) -> dict:
+    """Totals for closed days: month-to-date before today + all orders created before today"""
+    closed_days = []
+    if month_start_utc < today_utc:
+        closed_days = await db.orders.aggregate([
+            {"$match": {
+                "organization_id": org_id,
+                "created_at": {"$gte": month_start_utc.isoformat(), "$lt": today_utc.isoformat()},
+                "status": {"$in": list(ROLLUP_STATUSES)},
+            }},
+            {"$group": {"_id": None, "revenue": {"$sum": _order_total_expr()}, "orders": {"$sum": 1}}},
+        ]).to_list(1)
+    orders_before_today = await db.orders.count_documents({
+        "organization_id": org_id,
+        "created_at": {"$lt": today_utc.isoformat()},
+    })
+    month = closed_days[0] if closed_days else {}
+    return {
+        "monthly_revenue": month.get("revenue", 0),
+        "monthly_orders": month.get("orders", 0),
+        "orders_before_today": orders_before_today,
+    }
+
+
+async def invalidate_closed_day_caches(org_id: str, order_id: Optional[str] = None, created_at=None):
+    """Drop cached closed-day figures (dashboard totals, Day Book snapshot) when an older order changes"""
+    if order_id and created_at is None:
+        # Only callers without the order document at hand (batch status updates) pay for this read
+        order = await db.orders.find_one(
+            {"id": order_id, "organization_id": org_id}, {"_id": 0, "created_at": 1}
+        )
+        created_at = (order or {}).get("created_at")
+    created = parse_order_datetime(created_at)
+    today_ist = datetime.now(IST).replace(hour=0, minute=0, second=0, microsecond=0)
+    if created is None or created < today_ist:
+        await get_tiered_cache().invalidate(DASHBOARD_HISTORY_NAMESPACE, org_id)
+    await get_daybook_snapshots().invalidate_order(org_id, created)
+
+
+async def invalidate_org_caches(org_id: str):
+    """Org-level writes: drop the org's order/table/menu caches and its tagged Redis keys"""
+    try:
+        await get_cached_order_service().invalidate_org_caches(org_id)
+    except RuntimeError:
+        pass  # Redis cache not initialized - nothing cached
+
+
 @api_router.get("/dashboard")
 async def get_dashboard(current_user: dict = Depends(get_current_user)):
     """Get dashboard statistics and metrics"""
@@ -3145,59 +3094,59 @@ async def get_dashboard(current_user: dict = Depends(get_current_user)):
     
     try:
         # Use IST (Indian Standard Time) for "today" calculation
-        from datetime import timedelta
-        IST = timezone(timedelta(hours=5, minutes=30))
-        
-        # Get current time in IST and find start of today in IST
         now_ist = datetime.now(IST)
         today_ist = now_ist.replace(hour=0, minute=0, second=0, microsecond=0)
+        month_start = today_ist.replace(day=1)
         
         # Convert to UTC for database query
         today_utc = today_ist.astimezone(timezone.utc)
-        
-        # Get today's orders (all statuses)
-        today_orders = await db.orders.find({
-            "organization_id": user_org_id,
-            "created_at": {"$gte": today_utc.isoformat()}
-        }, {"_id": 0}).to_list(1000)
-        
-        # Get today's completed orders only
-        today_completed_orders = [order for order in today_orders if order.get("status") in ["completed", "paid"]]
-        
-        # Calculate today's revenue (completed orders only)
-        todays_revenue = sum(order.get("total", 0) for order in today_completed_orders)
-        
-        # Get pending orders count
-        pending_orders = await db.orders.count_documents({
-            "organization_id": user_org_id,
-            "status": {"$in": ["pending", "preparing", "confirmed"]}
-        })
-        
-        # Get this month's data
-        month_start = now_ist.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         month_start_utc = month_start.astimezone(timezone.utc)
         
-        monthly_orders = await db.orders.find({
-            "organization_id": user_org_id,
-            "created_at": {"$gte": month_start_utc.isoformat()},
-            "status": {"$in": ["completed", "paid"]}
-        }, {"_id": 0}).to_list(5000)
-        
-        monthly_revenue = sum(order.get("total", 0) for order in monthly_orders)
+        # Closed days only change when an older order is edited/closed/deleted:
+        # cached per IST day, invalidated by invalidate_closed_day_caches
+        history = await get_tiered_cache().get_or_load(
+            DASHBOARD_HISTORY_NAMESPACE,
+            today_ist.strftime("%Y-%m-%d"),
+            lambda: _load_dashboard_history(user_org_id, month_start_utc, today_utc),
+            scope=user_org_id,
+        )
         
-        # Get total orders count (all time)
-        total_orders = await db.orders.count_documents({
-            "organization_id": user_org_id
-        })
+        # Today's slice + open orders in one round-trip, numbers only
+        facets = await db.orders.aggregate([
+            {"$match": {"$or": [
+                {"organization_id": user_org_id, "created_at": {"$gte": today_utc.isoformat()}},
+                {"organization_id": user_org_id, "status": {"$in": DASHBOARD_PENDING_STATUSES}},
+            ]}},
+            {"$facet": {
+                "today": [
+                    {"$match": {"created_at": {"$gte": today_utc.isoformat()}}},
+                    {"$group": {
+                        "_id": None,
+                        "orders": {"$sum": 1},
+                        "completed": {"$sum": {"$cond": [{"$in": ["$status", list(ROLLUP_STATUSES)]}, 1, 0]}},
+                        "revenue": {"$sum": {"$cond": [
+                            {"$in": ["$status", list(ROLLUP_STATUSES)]}, _order_total_expr(), 0
+                        ]}},
+                    }},
+                ],
+                "pending": [
+                    {"$match": {"status": {"$in": DASHBOARD_PENDING_STATUSES}}},
+                    {"$count": "count"},
+                ],
+            }},
+        ]).to_list(1)
+        facets = facets[0] if facets else {}
+        today = (facets.get("today") or [{}])[0]
+        pending = (facets.get("pending") or [{}])[0]
         
         return {
-            "todaysRevenue": todays_revenue,
-            "todaysOrders": len(today_orders),
-            "todaysCompletedOrders": len(today_completed_orders),
-            "totalOrders": total_orders,
-            "pendingOrders": pending_orders,
-            "monthlyRevenue": monthly_revenue,
-            "monthlyOrders": len(monthly_orders),
+            "todaysRevenue": today.get("revenue", 0),
+            "todaysOrders": today.get("orders", 0),
+            "todaysCompletedOrders": today.get("completed", 0),
+            "totalOrders": history["orders_before_today"] + today.get("orders", 0),
+            "pendingOrders": pending.get("count", 0),
+            "monthlyRevenue": history["monthly_revenue"] + today.get("revenue", 0),
+            "monthlyOrders": history["monthly_orders"] + today.get("completed", 0),
             "timestamp": now_ist.isoformat()
         }
         
@@ -3369,7 +3318,7 @@ async def reset_password(request: ResetPasswordRequest):
     actual_email = user.get("email")
     
     # Update password
-    hashed_password = hash_password(request.new_password)
+    hashed_password = await hash_password(request.new_password)
     print(f"🔐 Resetting password for {actual_email}")
     print(f"🔐 New password hash: {hashed_password[:20]}...")
     
@@ -3554,7 +3503,7 @@ async def verify_staff_creation(
         )
 
         doc = user_obj.model_dump()
-        doc["password"] = hash_password(staff_data["password"])
+        doc["password"] = await hash_password(staff_data["password"])
         
         # Handle optional fields safely
         doc["phone"] = staff_data.get("phone") if staff_data.get("phone") else None
@@ -3566,6 +3515,7 @@ async def verify_staff_creation(
 
         print(f"💾 Inserting staff document into database...")
         await db.users.insert_one(doc)
+        await get_org_catalog().invalidate(user_obj.organization_id)
         print(f"✅ Staff member created successfully with ID: {user_obj.id}")
         
         # Remove used OTP
@@ -3613,7 +3563,7 @@ async def create_staff(
         )
 
         doc = user_obj.model_dump()
-        doc["password"] = hash_password(staff_data.password)
+        doc["password"] = await hash_password(staff_data.password)
         
         # Handle optional fields safely
         doc["phone"] = staff_data.phone if staff_data.phone else None
@@ -3623,6 +3573,7 @@ async def create_staff(
         doc["email_verified"] = False
 
         await db.users.insert_one(doc)
+        await get_org_catalog().invalidate(admin_org_id)
         return {"message": "Staff member created", "id": user_obj.id}
         
     except HTTPException:
@@ -3673,7 +3624,7 @@ async def update_staff(
     if staff_data.email:
         update_data["email"] = staff_data.email
     if staff_data.password:
-        update_data["password"] = hash_password(staff_data.password)
+        update_data["password"] = await hash_password(staff_data.password)
     if staff_data.role:
         update_data["role"] = staff_data.role
     if staff_data.phone is not None:
@@ -3682,6 +3633,7 @@ async def update_staff(
         update_data["salary"] = staff_data.salary
 
     await db.users.update_one({"id": staff_id}, {"$set": update_data})
+    await get_org_catalog().invalidate(admin_org_id)
     return {"message": "Staff updated"}
 
 
@@ -3704,6 +3656,7 @@ async def delete_staff(staff_id: str, current_user: dict = Depends(get_current_u
         raise HTTPException(status_code=400, detail="Cannot delete admin user")
 
     await db.users.delete_one({"id": staff_id})
+    await get_org_catalog().invalidate(admin_org_id)
     return {"message": "Staff deleted"}
 
 
@@ -3730,6 +3683,40 @@ async def migrate_organizations(current_user: dict = Depends(get_current_user)):
     return {"message": "Migration completed", "admins_updated": len(admins)}
 
 
+def get_menu_slugs():
+    """Restaurant slug resolver bound to the active database connection"""
+    resolver = get_slug_resolver()
+    if resolver is None or resolver.db is not db:
+        resolver = init_slug_resolver(db)
+    return resolver
+
+
+async def save_business_settings(current_user: dict, settings: BusinessSettings, extra: Optional[dict] = None):
+    """Write business settings together with the normalized menu slug fields"""
+    business = settings.model_dump()
+    slugs = slug_fields(business)
+    if slugs["menu_slug"]:
+        taken = await db.users.find_one(
+            {"menu_slug": slugs["menu_slug"], "id": {"$ne": current_user["id"]}}, {"_id": 0, "id": 1}
+        )
+        if taken:
+            raise HTTPException(status_code=409, detail="This menu URL is already taken by another restaurant")
+    try:
+        await db.users.update_one(
+            {"id": current_user["id"]},
+            {"$set": {"business_settings": business, **slugs, "menu_slug_version": SLUG_VERSION, **(extra or {})}},
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="This menu URL is already taken by another restaurant")
+    
+    previous = slug_fields(current_user.get("business_settings"))
+    stored = (current_user.get("menu_slug"), current_user.get("menu_name_slug"))
+    if (slugs["menu_slug"], slugs["menu_name_slug"]) != stored:
+        await get_menu_slugs().invalidate([*slugs.values(), *previous.values(), *stored])
+    await invalidate_public_menu(current_user["id"])
+    return business
+
+
 # Business Setup
 @api_router.post("/business/setup")
 async def setup_business(
@@ -3738,10 +3725,7 @@ async def setup_business(
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Only admin can setup business")
 
-    await db.users.update_one(
-        {"id": current_user["id"]},
-        {"$set": {"business_settings": settings.model_dump(), "setup_completed": True}},
-    )
+    await save_business_settings(current_user, settings, {"setup_completed": True})
     return {"message": "Business setup completed", "settings": settings.model_dump()}
 
 
@@ -3752,10 +3736,7 @@ async def update_business_settings(
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Only admin can update business settings")
 
-    await db.users.update_one(
-        {"id": current_user["id"]},
-        {"$set": {"business_settings": settings.model_dump()}},
-    )
+    await save_business_settings(current_user, settings)
     return {"message": "Business settings updated successfully", "settings": settings.model_dump()}
 
 
@@ -4697,6 +4678,8 @@ async def create_menu_item(
     await db.menu_items.insert_one(doc)
     
     # Invalidate menu cache
+    await get_org_catalog().invalidate(user_org_id)
+    await invalidate_public_menu(user_org_id)
     try:
         cached_service = get_cached_order_service()
         await cached_service.invalidate_menu_caches(user_org_id)
@@ -4829,6 +4812,8 @@ async def update_menu_item(
         updated["created_at"] = datetime.fromisoformat(updated["created_at"])
     
     # Invalidate menu cache
+    await get_org_catalog().invalidate(user_org_id)
+    await invalidate_public_menu(user_org_id)
     try:
         cached_service = get_cached_order_service()
         await cached_service.invalidate_menu_caches(user_org_id)
@@ -4856,6 +4841,8 @@ async def delete_menu_item(
         raise HTTPException(status_code=404, detail="Item not found")
     
     # Invalidate menu cache
+    await get_org_catalog().invalidate(user_org_id)
+    await invalidate_public_menu(user_org_id)
     try:
         cached_service = get_cached_order_service()
         await cached_service.invalidate_menu_caches(user_org_id)
@@ -5760,106 +5747,89 @@ async def update_table_status_background(
         print(f"❌ Table status background task failed for table {table_id}: {e}")
 
 
-async def send_whatsapp_notification_background(
-    order_id: str,
-    customer_phone: str,
-    status: str,
-    order_doc: dict,
-    business_settings: dict,
-    frontend_url: str,
-    user_org_id: str,
-    max_retries: int = 3
-):
+async def _send_outbox_message(entry: dict) -> dict:
+    """Outbox sender: one attempt, retries/backoff are the outbox's job"""
+    if not (_WHATSAPP_CLOUD_AVAILABLE and whatsapp_api and whatsapp_api.is_configured()):
+        raise ValueError("WhatsApp Cloud API not configured")
+    return await whatsapp_api.send_template_message(
+        entry["to"], entry["template"], entry["params"], entry["language"], max_attempts=1
+    )
+
+
+def _classify_outbox_error(error: Exception) -> dict:
+    if whatsapp_api is None:
+        return {"code": None, "message": str(error), "is_rate_limit": False, "is_retryable": False}
+    return whatsapp_api.classify_exception(error)
+
+
+async def _on_outbox_sent(entry: dict, message_id: str):
+    """Flag the order (frontend toast) and record the send for consent tracking"""
+    flags = {"whatsapp_notification_sent": True, "whatsapp_message_id": message_id}
+    # Closed orders left the active list; don't bump updated_at (receipt artifact key)
+    if entry.get("status") not in ROLLUP_STATUSES:
+        flags["updated_at"] = datetime.now(timezone.utc).isoformat()
+    await db.orders.update_one({"id": entry["order_id"]}, {"$set": flags})
+    if _WHATSAPP_CONSENT_AVAILABLE and message_id:
+        await get_consent_manager(db).record_message_sent(entry["organization_id"], entry["to"], message_id)
+
+
+def get_outbox():
+    """WhatsApp outbox bound to the active database connection"""
+    outbox = get_whatsapp_outbox()
+    if outbox is None:
+        outbox = init_whatsapp_outbox(db, _send_outbox_message, _classify_outbox_error, _on_outbox_sent)
+    elif outbox.db is not db:
+        outbox.db = db
+    return outbox
+
+
+def get_status_store():
+    """WhatsApp delivery status store bound to the active database connection"""
+    store = get_whatsapp_status_store()
+    if store is None:
+        store = init_whatsapp_status_store(db)
+    elif store.db is not db:
+        store.db = db
+    store.start()
+    return store
+
+
+async def enqueue_whatsapp_status(order: dict, status: str, business: dict, user_org_id: str) -> dict:
     """
-    Background task for sending WhatsApp notifications with idempotency.
-    
-    CRITICAL: Prevents duplicate messages even if order creation is retried.
-    Uses atomic database update to ensure message sent only once.
+    Queue an order status template on the durable WhatsApp outbox.
+
+    Same template/params as send_whatsapp_status_or_link; the dispatcher
+    sends it (rate-limited, retried) - a duplicate (order, status) is a no-op.
     """
-    try:
-        # Check if WhatsApp already sent (idempotency)
-        existing_order = await db.orders.find_one(
-            {"id": order_id},
-            {"whatsapp_notification_sent": 1, "whatsapp_notification_attempts": 1}
-        )
-        
-        if existing_order and existing_order.get("whatsapp_notification_sent"):
-            print(f"ℹ️  WhatsApp already sent for order {order_id}, skipping (idempotency)")
-            return
-        
-        # Retry logic with exponential backoff
-        for attempt in range(max_retries):
-            try:
-                # Send WhatsApp notification
-                result = await send_whatsapp_status_or_link(
-                    customer_phone,
-                    status,
-                    order_doc,
-                    business_settings,
-                    frontend_url
-                )
-                
-                whatsapp_sent = result.get("whatsapp_sent", False)
-                whatsapp_error = result.get("whatsapp_error")
-                
-                # Update order with WhatsApp status
-                if whatsapp_sent:
-                    # Simple update without condition - just set the flag
-                    await db.orders.update_one(
-                        {"id": order_id},
-                        {
-                            "$set": {
-                                "whatsapp_notification_sent": True,
-                                "whatsapp_notification_attempts": attempt + 1,
-                                "updated_at": datetime.now(timezone.utc).isoformat()
-                            }
-                        }
-                    )
-                    print(f"✅ WhatsApp sent successfully for order {order_id} (attempt {attempt + 1})")
-                    print(f"🔔 Frontend will show notification toast on next poll")
-                    return
-                else:
-                    # Log error but don't fail
-                    print(f"⚠️  WhatsApp send failed for order {order_id} (attempt {attempt + 1}): {whatsapp_error}")
-                    
-                    # Update attempt counter
-                    await db.orders.update_one(
-                        {"id": order_id},
-                        {
-                            "$set": {
-                                "whatsapp_notification_attempts": attempt + 1,
-                                "updated_at": datetime.now(timezone.utc).isoformat()
-                            }
-                        }
-                    )
-                    
-                    if attempt < max_retries - 1:
-                        # Exponential backoff: 1s, 2s, 4s
-                        await asyncio.sleep(2 ** attempt)
-                    
-            except Exception as e:
-                print(f"❌ WhatsApp send exception for order {order_id} (attempt {attempt + 1}): {e}")
-                
-                # Update attempt counter
-                await db.orders.update_one(
-                    {"id": order_id},
-                    {
-                        "$set": {
-                            "whatsapp_notification_attempts": attempt + 1,
-                            "updated_at": datetime.now(timezone.utc).isoformat()
-                        }
-                    }
-                )
-                
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2 ** attempt)
-        
-        # All retries failed - log but don't crash
-        print(f"❌ WhatsApp send failed after {max_retries} attempts for order {order_id}")
-        
-    except Exception as e:
-        # Catch-all to prevent background task from crashing
-        print(f"❌ WhatsApp background task failed for order {order_id}: {e}")
+    customer_phone = order.get("customer_phone")
+    if not customer_phone:
+        return {"whatsapp_queued": False, "whatsapp_error": "missing_phone"}
+    if not (_WHATSAPP_CLOUD_AVAILABLE and whatsapp_api and whatsapp_api.is_configured()):
+        return {"whatsapp_queued": False, "whatsapp_error": "cloud_not_configured"}
+
+    status_template = whatsapp_api.get_status_template_name(status)
+    if not status_template:
+        return {"whatsapp_queued": False, "whatsapp_error": f"template_missing:{status}"}
+
+    total = order.get("total", 0)
+    currency = (business or {}).get("currency", "INR")
+    template_params = [
+        order.get("customer_name") or "Customer",
+        str(order.get("id", ""))[:8].upper(),
+        f"{currency} {total:.2f}",
+    ]
+    queued = await get_outbox().enqueue(
+        organization_id=user_org_id,
+        order_id=order["id"],
+        status=status,
+        to=normalize_phone_e164(customer_phone),
+        phone_number_id=whatsapp_api.phone_number_id,
+        template=status_template,
+        params=template_params,
+        language=whatsapp_api.template_lang,
+    )
+    print(f"📨 WA status {'queued' if queued else 'already queued'} | order={order['id']} | status={status}")
+    return {"whatsapp_queued": queued, "whatsapp_error": None}
 
 
 @api_router.post("/orders", response_model=Order)
@@ -5892,10 +5862,12 @@ async def create_order(
     total = subtotal + tax
     
     # Generate IDs (fast, in-memory, <1ms)
-    tracking_token = await generate_short_tracking_token()
+    tracking_token = generate_short_tracking_token()
     order_id = str(uuid.uuid4())
     
-    # Create order object WITHOUT invoice number (will be set in background)
+    # Invoice number from this worker's leased block (in-memory except once per block)
+    invoice_number = await get_next_invoice_number(user_org_id, gap_free=business.get("invoice_gap_free"))
+    
     order_obj = Order(
         id=order_id,
         table_id=table_id,
@@ -5912,7 +5884,7 @@ async def create_order(
         tracking_token=tracking_token,
         order_type=order_data.order_type or ("takeaway" if getattr(order_data, "quick_billing", False) else "dine_in"),
         organization_id=user_org_id,
-        invoice_number=None,  # Will be set in background
+        invoice_number=invoice_number,
         status=order_data.status or ("completed" if getattr(order_data, "quick_billing", False) else "pending")
     )
 
@@ -5921,7 +5893,8 @@ async def create_order(
     doc["updated_at"] = doc["updated_at"].isoformat()
 
     # CRITICAL PATH: Single database insert (target: <100ms)
-    await db.orders.insert_one(doc)
+    tracking_token = await insert_order_with_tracking_token(doc)
+    order_obj.tracking_token = tracking_token
     
     # RESPONSE SENT HERE (<200ms total) - Everything below happens in background
     
@@ -5929,51 +5902,56 @@ async def create_order(
     kot_mode_enabled = business.get("kot_mode_enabled", True)
     frontend_url = order_data.frontend_origin or ""
     
-    # Background: Set invoice number
-    asyncio.create_task(set_invoice_number_background(order_id, user_org_id))
+    # Side-effects run on the per-worker pipeline: bounded queue, coalesced writes
+    side_effects = get_side_effects()
     
-    # Background: Increment bill count
-    asyncio.create_task(increment_bill_count_background(user_org_id))
+    # Background: Increment bill count (coalesced with other orders for this org)
+    increment_bill_count_background(user_org_id)
     
     # Background: Duplicate detection (moved to background to prevent blocking)
-    asyncio.create_task(check_duplicate_background(
+    side_effects.submit(
+        "duplicate_check", check_duplicate_background,
         order_id, order_data, user_org_id, current_user
-    ))
+    )
     
     # Background: WhatsApp consent
     if order_data.customer_phone:
-        asyncio.create_task(ensure_customer_implicit_opt_in(
+        side_effects.submit(
+            "whatsapp_opt_in", ensure_customer_implicit_opt_in,
             user_org_id,
             order_data.customer_phone,
             order_data.customer_name
-        ))
+        )
     
     # Background: Cache invalidation
     try:
         cached_service = get_cached_order_service()
-        asyncio.create_task(cached_service.invalidate_order_caches(user_org_id, order_id))
+        side_effects.submit(
+            "cache_invalidation", cached_service.invalidate_order_caches,
+            user_org_id, order_id, "created", {k: v for k, v in doc.items() if k != "_id"}
+        )
     except:
         pass
     
     # Background: Table status update
     if kot_mode_enabled and table_id != "counter":
-        asyncio.create_task(update_table_status_background(
+        side_effects.submit(
+            "table_status", update_table_status_background,
             table_id, order_id, user_org_id
-        ))
+        )
+    
+    # Background: Sales rollups (quick billing creates already-closed orders)
+    if doc["status"] in ROLLUP_STATUSES:
+        schedule_sales_rollup_sync(order_id, user_org_id, doc["created_at"])
     
     # Background: WhatsApp notification
     whatsapp_queued = False
     if order_data.customer_phone and business.get("whatsapp_auto_notify"):
         status_for_whatsapp = "completed" if getattr(order_data, "quick_billing", False) else "pending"
-        asyncio.create_task(send_whatsapp_notification_background(
-            order_id,
-            order_data.customer_phone,
-            status_for_whatsapp,
-            doc,
-            business,
-            frontend_url,
-            user_org_id
-        ))
+        side_effects.submit(
+            "whatsapp_outbox", enqueue_whatsapp_status,
+            doc, status_for_whatsapp, business, user_org_id
+        )
         whatsapp_queued = True
     
     print(f"⚡ Order created instantly: {order_id} (Table {table_number})")
@@ -5986,28 +5964,10 @@ async def create_order(
     }
 
 
-# Background task: Set invoice number after order creation
-async def set_invoice_number_background(order_id: str, org_id: str):
-    """Set invoice number in background - never blocks order creation"""
-    try:
-        invoice_number = await get_next_invoice_number(org_id)
-        await db.orders.update_one(
-            {"id": order_id},
-            {"$set": {"invoice_number": invoice_number}}
-        )
-        print(f"✅ Invoice number {invoice_number} set for order {order_id}")
-    except Exception as e:
-        print(f"❌ Invoice number error for order {order_id}: {e}")
-
-
 # Background task: Increment bill count after order creation
-async def increment_bill_count_background(org_id: str):
-    """Increment bill count in background - never blocks order creation"""
-    try:
-        await db.users.update_one({"id": org_id}, {"$inc": {"bill_count": 1}})
-        print(f"✅ Bill count incremented for org {org_id}")
-    except Exception as e:
-        print(f"❌ Bill count increment error for org {org_id}: {e}")
+def increment_bill_count_background(org_id: str):
+    """Queue a bill count increment - bursts for one org flush as a single $inc"""
+    get_side_effects().increment("users", {"id": org_id}, "bill_count", 1)
 
 
 # Background task: Validate subscription after order creation
@@ -6070,6 +6030,60 @@ async def check_duplicate_background(order_id: str, order_data: OrderCreate, org
         print(f"❌ Duplicate check error for order {order_id}: {e}")
 
 
+def get_side_effects():
+    """Order side-effects pipeline bound to the active database connection"""
+    pipeline = get_order_side_effects()
+    if pipeline is None:
+        pipeline = init_order_side_effects(db)
+        asyncio.create_task(pipeline.start())
+    elif pipeline.db is not db:
+        pipeline.db = db
+    return pipeline
+
+
+def get_org_catalog():
+    """Org catalog cache bound to the active database connection"""
+    catalog = get_org_catalog_cache()
+    if catalog is None or catalog.db is not db:
+        catalog = init_org_catalog_cache(db)
+    return catalog
+
+
+def get_sales_rollups():
+    """Sales rollup service bound to the active database connection"""
+    service = get_sales_rollup_service()
+    if service is None or service.db is not db:
+        service = init_sales_rollup_service(db, get_org_catalog())
+    return service
+
+
+def get_daybook_snapshots():
+    """Day Book snapshot service bound to the active database connection"""
+    service = get_daybook_snapshot_service()
+    if service is None or service.db is not db:
+        service = init_daybook_snapshot_service(db)
+    return service
+
+
+def get_customer_ledger():
+    """Customer ledger service bound to the active database connection"""
+    service = get_customer_ledger_service()
+    if service is None or service.db is not db:
+        service = init_customer_ledger_service(db)
+    return service
+
+
+def schedule_sales_rollup_sync(order_id: str, org_id: str, created_at=None):
+    """
+    Refresh an order's sales rollup / customer ledger contribution in background - never blocks the request.
+    Pass the order's created_at when the caller has the document, so the closed-day check needs no lookup.
+    """
+    get_side_effects().submit("sales_rollup", get_sales_rollups().sync_order, order_id, org_id)
+    get_side_effects().submit("customer_ledger", get_customer_ledger().sync_order, order_id, org_id)
+    get_side_effects().submit("closed_day_caches", invalidate_closed_day_caches, org_id, order_id, created_at)
+    get_side_effects().submit("receipt_artifacts", prerender_receipt_artifacts, order_id, org_id)
+
+
 @api_router.get("/orders/debug-active", response_model=dict)
 async def debug_active_orders(current_user: dict = Depends(get_current_user)):
     """Debug endpoint to analyze active orders filtering"""
@@ -6228,7 +6242,8 @@ async def get_orders(
     current_user: dict = Depends(get_current_user),
     page: int = Query(1, ge=1, description="Page number starting from 1"),
     page_size: int = Query(20, ge=1, le=100, description="Items per page (max 100)"),
-    fresh: Optional[bool] = Query(False, description="Force fresh data from database")
+    fresh: Optional[bool] = Query(False, description="Force fresh data from database"),
+    since: Optional[str] = Query(None, description="Delta cursor from a previous response (returns changes only)")
 ):
     # Get user's organization_id - CRITICAL for data isolation
     user_org_id = current_user.get("organization_id")
@@ -6237,6 +6252,11 @@ async def get_orders(
     if not user_org_id:
         raise HTTPException(status_code=403, detail="Organization not configured. Contact support.")
 
+    # Delta sync: only orders changed after the cursor, plus closed/deleted ids
+    if since is not None and not status:
+        delta = await get_active_orders_delta(db, user_org_id, since)
+        return JSONResponse(content=jsonable_encoder(delta))
+
     try:
         # Build query - let MongoDB do the filtering, not Python
         completed_statuses = ["completed", "cancelled", "paid", "billed", "settled"]
@@ -6274,7 +6294,7 @@ async def get_orders(
                 try:
                     cached_service = get_cached_order_service()
                     if cached_service and not status:
-                        await cached_service.cache.set_active_orders(user_org_id, orders, ttl=30)
+                        await cached_service.cache_active_orders(user_org_id, orders, ttl=30)
                 except Exception:
                     pass
 
@@ -6389,6 +6409,58 @@ async def get_todays_bills(current_user: dict = Depends(get_current_user)):
         return []
 
 
+ORDER_STREAM_HEARTBEAT = 15  # seconds between SSE keep-alive comments
+
+
+async def _authenticate_stream(token: Optional[str]) -> dict:
+    """Resolve a stream client's JWT (EventSource/WebSocket cannot always send headers)"""
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+
+
+@api_router.get("/orders/stream")
+async def stream_orders(request: Request, token: Optional[str] = None, since: Optional[str] = None):
+    """
+    Server-Sent Events stream of the org's order changes (replaces polling GET /orders).
+    Reconnects resume from Last-Event-ID / `since`; a `resync` event means refetch once.
+    """
+    auth_header = request.headers.get("authorization", "")
+    if not token and auth_header.lower().startswith("bearer "):
+        token = auth_header[7:]
+    user = await _authenticate_stream(token)
+    user_org_id = get_secure_org_id(user)
+    since = since or request.headers.get("last-event-id")
+    
+    hub = get_order_event_hub()
+    queue = hub.subscribe(user_org_id, since)
+    
+    async def event_source():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=ORDER_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": heartbeat\n\n"
+                    continue
+                message = to_client_message(event)
+                frame = f"event: {message['type']}\ndata: {json.dumps(message, default=str)}\n\n"
+                if message.get("event_id"):
+                    frame = f"id: {message['event_id']}\n" + frame
+                yield frame
+        finally:
+            hub.unsubscribe(user_org_id, queue)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @api_router.get("/orders/{order_id}", response_model=Order)
 async def get_order(order_id: str, current_user: dict = Depends(get_current_user)):
     # Get user's organization_id
@@ -6469,32 +6541,18 @@ async def update_order_status(
         print(f"❌ Database update error: {e}")
         raise HTTPException(status_code=500, detail="Failed to update order")
 
+    # Keep sales rollups in step with closed/re-opened orders
+    if status in ROLLUP_STATUSES or order.get("status") in ROLLUP_STATUSES:
+        schedule_sales_rollup_sync(order_id, user_org_id, order.get("created_at"))
+
     # INSTANT CACHE INVALIDATION: Clear all related caches immediately
     try:
         cached_service = get_cached_order_service()
         if cached_service:
-            # Invalidate all order-related caches
-            await cached_service.invalidate_order_caches(user_org_id, order_id)
-            
-            # Also invalidate active orders cache with date-aware keys
-            today_key = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-            cache_keys = [
-                f"active_orders:{user_org_id}:{today_key}",
-                f"active_orders:{user_org_id}",
-                f"todays_bills:{user_org_id}:{today_key}",
-                f"order:{user_org_id}:{order_id}",
-            ]
-            
-            invalidated_count = 0
-            for key in cache_keys:
-                try:
-                    if await cached_service.cache.delete(key):
-                        invalidated_count += 1
-                        print(f"🗑️ Invalidated cache key: {key}")
-                except Exception as key_error:
-                    print(f"⚠️ Failed to invalidate cache key {key}: {key_error}")
-            
-            print(f"🚀 Invalidated {invalidated_count} cache keys for instant update")
+            # Invalidate all order-related caches (versioned scopes, broadcast to every worker)
+            await cached_service.invalidate_order_caches(user_org_id, order_id, "status_changed", {"status": status})
+            await get_tiered_cache().invalidate(DAILY_REPORT_NAMESPACE, user_org_id)
+            print(f"🚀 Invalidated order caches for instant update")
             
             # Also invalidate table cache if status affects table
             if status == "completed":
@@ -6586,9 +6644,10 @@ async def update_order_status(
         print(f"⚠️ Failed to refresh business settings: {e}")
     customer_phone = order.get("customer_phone")
     whatsapp_sent = False
+    whatsapp_queued = False
     whatsapp_error = None
 
-    # 📱 AUTO-SEND WHATSAPP STATUS UPDATE (Cloud API with consent check)
+    # 📱 WHATSAPP STATUS UPDATE (Cloud API with consent check) - queued on the outbox
     # Sends: "Your order is being prepared" → "Your order is ready!" → etc.
     if customer_phone and status in ("pending", "preparing", "ready", "completed"):
         try:
@@ -6601,51 +6660,14 @@ async def update_order_status(
                     print(f"⚠️ No WhatsApp consent for {customer_phone} - skipping status update")
                     whatsapp_error = "Customer has not opted in to WhatsApp messages"
                 else:
-                    # Customer has consent - send status update via WhatsApp Cloud API
-                    if _WHATSAPP_CLOUD_AVAILABLE and whatsapp_api and whatsapp_api.is_configured():
-                        try:
-                            template_name = whatsapp_api.get_status_template_name(status)
-                            if template_name:
-                                customer_name = (order.get("customer_name") or "Customer")
-                                order_id_short = str(order_id)[:8].upper()
-                                total = order.get("total", 0)
-                                currency = business.get("currency", "INR")
-                                amount = f"{currency} {total:.2f}"
-                                cleaned_phone = normalize_phone_e164(customer_phone)
-                                template_params = [customer_name, order_id_short, amount]
-
-                                result = await whatsapp_api.send_template_message(
-                                    cleaned_phone,
-                                    template_name,
-                                    template_params,
-                                    whatsapp_api.template_lang
-                                )
-
-                                msg_id = result.get("messages", [{}])[0].get("id", "")
-                                if msg_id:
-                                    # Record message sent in consent tracker
-                                    await consent_manager.record_message_sent(user_org_id, customer_phone, msg_id)
-                                    whatsapp_sent = True
-                                    print(f"✅ WA status sent | to={cleaned_phone} | status={status} | template={template_name} | params={template_params} | status=sent | msg_id={msg_id}")
-                            else:
-                                print(f"⚠️ No WhatsApp template configured for status '{status}'")
-                                whatsapp_error = f"No template for status {status}"
-                        except Exception as cloud_err:
-                            print(f"⚠️ WhatsApp Cloud API error: {cloud_err}")
-                            whatsapp_error = str(cloud_err)
-                    else:
-                        print(f"⚠️ WhatsApp Cloud API not configured - skipping status update")
-                        whatsapp_error = "WhatsApp Cloud API not configured"
-            else:
-                # Fallback if consent manager not available - still send if enabled
-                if business.get("whatsapp_enabled", False):
-                    asyncio.create_task(send_whatsapp_status_or_link(
-                        customer_phone,
-                        status,
-                        order,
-                        business,
-                        ""
-                    ))
+                    result = await enqueue_whatsapp_status({**order, "id": order_id}, status, business, user_org_id)
+                    whatsapp_queued = result["whatsapp_queued"]
+                    whatsapp_error = result["whatsapp_error"]
+            elif business.get("whatsapp_enabled", False):
+                # Consent manager not available - still send if enabled
+                result = await enqueue_whatsapp_status({**order, "id": order_id}, status, business, user_org_id)
+                whatsapp_queued = result["whatsapp_queued"]
+                whatsapp_error = result["whatsapp_error"]
         except Exception as e:
             print(f"⚠️ WhatsApp status update failed: {e}")
             whatsapp_error = str(e)
@@ -6658,6 +6680,7 @@ async def update_order_status(
         "cache_invalidated": True,
         "database_verified": True,
         "whatsapp_sent": whatsapp_sent,
+        "whatsapp_queued": whatsapp_queued,
         "whatsapp_error": whatsapp_error,
         "customer_phone": customer_phone
     }
@@ -6751,6 +6774,7 @@ async def update_order(
                         raise HTTPException(status_code=404, detail="Order not found for update")
                     
                     print(f"✅ Order {order_id} marked as completed")
+                    schedule_sales_rollup_sync(order_id, user_org_id, existing_order.get("created_at"))
                     
                 except Exception as update_error:
                     print(f"❌ Database error updating order {order_id}: {str(update_error)}")
@@ -6873,6 +6897,9 @@ async def update_order(
                 {"$set": update_data}
             )
             
+            # Items/total may have changed on a closed order
+            schedule_sales_rollup_sync(order_id, user_org_id, existing_order.get("created_at"))
+            
             # Invalidate cache for payment update
             try:
                 cached_service = get_cached_order_service()
@@ -7075,6 +7102,9 @@ async def update_order(
                 print(f"Order update failed for {order_id}: {update_error}")
                 raise HTTPException(status_code=500, detail="Failed to update order")
             
+            if update_data.get("status") in ROLLUP_STATUSES or existing_order.get("status") in ROLLUP_STATUSES:
+                schedule_sales_rollup_sync(order_id, user_org_id, existing_order.get("created_at"))
+            
             # Invalidate cache for order update
             try:
                 cached_service = get_cached_order_service()
@@ -7196,10 +7226,13 @@ async def cancel_order(
         }
     )
     
+    if order.get("status") in ROLLUP_STATUSES:
+        schedule_sales_rollup_sync(order_id, user_org_id, order.get("created_at"))
+    
     # Invalidate cache for cancelled order
     try:
         cached_service = get_cached_order_service()
-        await cached_service.invalidate_order_caches(user_org_id, order_id)
+        await cached_service.invalidate_order_caches(user_org_id, order_id, "status_changed", {"status": "cancelled"})
         print(f"🗑️ Cache invalidated for cancelled order {order_id}")
     except Exception as e:
         print(f"⚠️ Cache invalidation error: {e}")
@@ -7277,15 +7310,23 @@ async def delete_order(
             except Exception as fallback_error:
                 print(f"⚠️ Table clearing fallback error: {fallback_error}")
     
-    # Delete order
+    # Delete order (a ledger reconcile racing the delete must not count it twice)
+    ledger_retraction = await get_customer_ledger().begin_retraction(order)
     await db.orders.delete_one(
         {"id": order_id, "organization_id": user_org_id}
     )
+    # Tombstone for delta-sync clients (GET /orders?since=)
+    await record_tombstone(db, user_org_id, order_id)
+    
+    # Reverse its sales rollup contribution (if it was counted)
+    get_side_effects().submit("sales_rollup", get_sales_rollups().retract_order, order)
+    get_side_effects().submit("customer_ledger", get_customer_ledger().retract_order, order, ledger_retraction)
+    get_side_effects().submit("closed_day_caches", invalidate_closed_day_caches, user_org_id, order_id, order.get("created_at"))
     
     # Invalidate cache for deleted order
     try:
         cached_service = get_cached_order_service()
-        await cached_service.invalidate_order_caches(user_org_id, order_id)
+        await cached_service.invalidate_order_caches(user_org_id, order_id, "deleted")
         print(f"🗑️ Cache invalidated for deleted order {order_id}")
     except Exception as e:
         print(f"⚠️ Cache invalidation error: {e}")
@@ -7365,8 +7406,9 @@ async def create_payment_order(
 
         await db.orders.update_one(
             {"id": payment_data.order_id, "organization_id": user_org_id},
-            {"$set": {"status": "completed"}},
+            {"$set": {"status": "completed", "updated_at": datetime.now(timezone.utc).isoformat()}},
         )
+        schedule_sales_rollup_sync(payment_data.order_id, user_org_id, (existing_order or {}).get("created_at"))
         # Bill count is incremented on order creation to reflect total orders
 
         # Use TableStatusManager to set table to available when payment is completed
@@ -7400,7 +7442,7 @@ async def create_payment_order(
         # Invalidate cache for completed payment
         try:
             cached_service = get_cached_order_service()
-            await cached_service.invalidate_order_caches(user_org_id, payment_data.order_id)
+            await cached_service.invalidate_order_caches(user_org_id, payment_data.order_id, "payment_completed")
             print(f"🗑️ Cache invalidated for payment {payment_data.order_id}")
         except Exception as e:
             print(f"⚠️ Cache invalidation error: {e}")
@@ -7438,8 +7480,9 @@ async def verify_payment(
 
     await db.orders.update_one(
         {"id": order_id, "organization_id": user_org_id},
-        {"$set": {"status": "completed"}},
+        {"$set": {"status": "completed", "updated_at": datetime.now(timezone.utc).isoformat()}},
     )
+    schedule_sales_rollup_sync(order_id, user_org_id, (existing_order or {}).get("created_at"))
     # Bill count is incremented on order creation to reflect total orders
 
     # Use TableStatusManager to set table to available when payment is completed
@@ -7473,7 +7516,7 @@ async def verify_payment(
     # Invalidate cache for completed payment
     try:
         cached_service = get_cached_order_service()
-        await cached_service.invalidate_order_caches(user_org_id, order_id)
+        await cached_service.invalidate_order_caches(user_org_id, order_id, "payment_completed")
         print(f"🗑️ Cache invalidated for verified payment {order_id}")
     except Exception as e:
         print(f"⚠️ Cache invalidation error: {e}")
@@ -8521,6 +8564,7 @@ async def create_expense(
     )
     
     await db.expenses.insert_one(expense_obj.model_dump())
+    await get_daybook_snapshots().invalidate_days(user_org_id, [expense.date])
     print(f"💰 Created expense: {expense.category} - ₹{expense.amount}")
     
     return expense_obj
@@ -8563,6 +8607,9 @@ async def update_expense(
     updated = await db.expenses.find_one(
         {"id": expense_id, "organization_id": user_org_id}, {"_id": 0}
     )
+    await get_daybook_snapshots().invalidate_days(
+        user_org_id, [existing.get("date"), (updated or {}).get("date")]
+    )
     
     print(f"💰 Updated expense: {expense_id}")
     return updated
@@ -8581,6 +8628,7 @@ async def delete_expense(expense_id: str, current_user: dict = Depends(get_curre
         raise HTTPException(status_code=404, detail="Expense not found")
     
     await db.expenses.delete_one({"id": expense_id, "organization_id": user_org_id})
+    await get_daybook_snapshots().invalidate_days(user_org_id, [existing.get("date")])
     
     print(f"🗑️ Deleted expense: {expense_id}")
     return {"message": "Expense deleted successfully"}
@@ -8588,6 +8636,18 @@ async def delete_expense(expense_id: str, current_user: dict = Depends(get_curre
 
 # ============ DAY BOOK / CASH FLOW REPORT ENDPOINTS ============
 
+def _validate_daybook_range(start_date: str, end_date: str):
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date must not be before date")
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_RANGE_DAYS} days")
+
+
 @api_router.get("/reports/daybook")
 async def get_daybook(
     date: str = Query(..., description="Date YYYY-MM-DD"),
@@ -8597,6 +8657,7 @@ async def get_daybook(
     """
     Get Day Book / Cash Flow report for a date or date range.
     Shows opening balance, inflows (sales), outflows (expenses), and closing balance.
+    Closed days are read from day-close snapshots; only today is computed live.
     """
     user_org_id = get_secure_org_id(current_user)
     
@@ -8604,121 +8665,19 @@ async def get_daybook(
     start_date = date
     if not end_date:
         end_date = date
+    _validate_daybook_range(start_date, end_date)
     
-    # Get completed orders (inflows) for the date range
-    orders_query = {
-        "organization_id": user_org_id,
-        "status": {"$in": ["completed", "paid"]},
-        "created_at": {"$gte": f"{start_date}T00:00:00", "$lte": f"{end_date}T23:59:59"}
-    }
-    
-    orders = await db.orders.find(orders_query, {"_id": 0}).to_list(1000)
-    
-    # Get expenses (outflows) for the date range
-    expenses_query = {
-        "organization_id": user_org_id,
-        "date": {"$gte": start_date, "$lte": end_date}
-    }
-    
-    expenses = await db.expenses.find(expenses_query, {"_id": 0}).to_list(1000)
-    
-    # Calculate inflows by payment method
-    inflow_breakdown = {"cash": 0, "card": 0, "upi": 0, "other": 0}
-    total_inflows = 0
-    
-    inflow_entries = []
-    for order in orders:
-        amount = order.get("payment_received", order.get("total", 0))
-        payment_method = order.get("payment_method", "cash")
-        
-        # Handle split payments
-        if payment_method == "split":
-            cash = order.get("cash_amount", 0)
-            card = order.get("card_amount", 0)
-            upi = order.get("upi_amount", 0)
-            inflow_breakdown["cash"] += cash
-            inflow_breakdown["card"] += card
-            inflow_breakdown["upi"] += upi
-            total_inflows += cash + card + upi
-        else:
-            if payment_method in inflow_breakdown:
-                inflow_breakdown[payment_method] += amount
-            else:
-                inflow_breakdown["other"] += amount
-            total_inflows += amount
-        
-        inflow_entries.append({
-            "timestamp": order.get("created_at"),
-            "type": "inflow",
-            "category": f"Sales-{payment_method.upper()}",
-            "description": f"Order #{order.get('invoice_number', order.get('id', '')[:8])} - Table {order.get('table_number', 'Counter')}",
-            "amount": amount,
-            "reference_id": order.get("id")
-        })
-    
-    # Calculate outflows by category
-    outflow_breakdown = {}
-    total_outflows = 0
-    
-    outflow_entries = []
-    for expense in expenses:
-        amount = expense.get("amount", 0)
-        category = expense.get("category", "Other")
-        
-        outflow_breakdown[category] = outflow_breakdown.get(category, 0) + amount
-        total_outflows += amount
-        
-        outflow_entries.append({
-            "timestamp": f"{expense.get('date')}T12:00:00",
-            "type": "outflow",
-            "category": category,
-            "description": expense.get("description", ""),
-            "amount": amount,
-            "reference_id": expense.get("id")
-        })
-    
-    # Combine and sort entries by timestamp
-    all_entries = inflow_entries + outflow_entries
-    all_entries.sort(key=lambda x: x.get("timestamp", ""))
-    
-    # Calculate running balance
-    running_balance = 0
-    for entry in all_entries:
-        if entry["type"] == "inflow":
-            running_balance += entry["amount"]
-        else:
-            running_balance -= entry["amount"]
-        entry["running_balance"] = running_balance
-    
-    # Calculate opening balance (sum of all previous transactions)
-    # For simplicity, we'll set opening balance to 0 for now
-    # In a real system, this would be calculated from previous day's closing
-    opening_balance = 0
-    closing_balance = opening_balance + total_inflows - total_outflows
-    
-    return {
-        "date": date,
-        "end_date": end_date,
-        "opening_balance": opening_balance,
-        "total_inflows": total_inflows,
-        "total_outflows": total_outflows,
-        "closing_balance": closing_balance,
-        "net_cash_flow": total_inflows - total_outflows,
-        "inflow_breakdown": inflow_breakdown,
-        "outflow_breakdown": outflow_breakdown,
-        "entries": all_entries,
-        "order_count": len(orders),
-        "expense_count": len(expenses)
-    }
-
-
-@api_router.get("/reports/daybook/summary")
-async def get_daybook_summary(
-    period: str = Query("month", description="Period: today, week, month, year"),
-    current_user: dict = Depends(get_current_user)
-):
-    """Get Day Book summary for a period"""
-    user_org_id = get_secure_org_id(current_user)
+    report = await get_daybook_snapshots().get_range(user_org_id, start_date, end_date)
+    return {"date": date, "end_date": end_date, **report}
+
+
+@api_router.get("/reports/daybook/summary")
+async def get_daybook_summary(
+    period: str = Query("month", description="Period: today, week, month, year"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get Day Book summary for a period"""
+    user_org_id = get_secure_org_id(current_user)
     
     today = datetime.now(timezone.utc)
     
@@ -8738,31 +8697,18 @@ async def get_daybook_summary(
         start_date = today.strftime("%Y-%m-%d")
         end_date = start_date
     
-    # Get orders
-    orders = await db.orders.find({
-        "organization_id": user_org_id,
-        "status": {"$in": ["completed", "paid"]},
-        "created_at": {"$gte": f"{start_date}T00:00:00", "$lte": f"{end_date}T23:59:59"}
-    }, {"_id": 0}).to_list(1000)
-    
-    # Get expenses
-    expenses = await db.expenses.find({
-        "organization_id": user_org_id,
-        "date": {"$gte": start_date, "$lte": end_date}
-    }, {"_id": 0}).to_list(1000)
-    
-    total_inflows = sum(o.get("payment_received", o.get("total", 0)) for o in orders)
-    total_outflows = sum(e.get("amount", 0) for e in expenses)
+    # Totals only - snapshot entries are not read
+    report = await get_daybook_snapshots().get_range(user_org_id, start_date, end_date, include_entries=False)
     
     return {
         "period": period,
         "start_date": start_date,
         "end_date": end_date,
-        "total_inflows": total_inflows,
-        "total_outflows": total_outflows,
-        "net_cash_flow": total_inflows - total_outflows,
-        "order_count": len(orders),
-        "expense_count": len(expenses)
+        "total_inflows": report["total_inflows"],
+        "total_outflows": report["total_outflows"],
+        "net_cash_flow": report["net_cash_flow"],
+        "order_count": report["order_count"],
+        "expense_count": report["expense_count"]
     }
 
 
@@ -8782,475 +8728,55 @@ async def export_daybook(
     start_date = date
     if not end_date:
         end_date = date
+    _validate_daybook_range(start_date, end_date)
     
-    # Get completed orders (inflows) for the date range
-    orders_query = {
-        "organization_id": user_org_id,
-        "status": {"$in": ["completed", "paid"]},
-        "created_at": {"$gte": f"{start_date}T00:00:00", "$lte": f"{end_date}T23:59:59"}
-    }
-    
-    orders = await db.orders.find(orders_query, {"_id": 0}).to_list(1000)
-    
-    # Get expenses (outflows) for the date range
-    expenses_query = {
-        "organization_id": user_org_id,
-        "date": {"$gte": start_date, "$lte": end_date}
-    }
-    
-    expenses = await db.expenses.find(expenses_query, {"_id": 0}).to_list(1000)
-    
-    # Calculate inflows by payment method
-    inflow_breakdown = {"cash": 0, "card": 0, "upi": 0, "other": 0}
-    total_inflows = 0
-    
-    inflow_entries = []
-    for order in orders:
-        amount = order.get("payment_received", order.get("total", 0))
-        payment_method = order.get("payment_method", "cash")
-        
-        # Handle split payments
-        if payment_method == "split":
-            cash = order.get("cash_amount", 0)
-            card = order.get("card_amount", 0)
-            upi = order.get("upi_amount", 0)
-            inflow_breakdown["cash"] += cash
-            inflow_breakdown["card"] += card
-            inflow_breakdown["upi"] += upi
-            total_inflows += cash + card + upi
-        else:
-            if payment_method in inflow_breakdown:
-                inflow_breakdown[payment_method] += amount
-            else:
-                inflow_breakdown["other"] += amount
-            total_inflows += amount
-        
-        inflow_entries.append({
-            "timestamp": order.get("created_at"),
-            "type": "inflow",
-            "category": f"Sales-{payment_method.upper()}",
-            "description": f"Order #{order.get('invoice_number', order.get('id', '')[:8])} - Table {order.get('table_number', 'Counter')}",
-            "amount": amount,
-            "reference_id": order.get("id")
-        })
-    
-    # Calculate outflows by category
-    outflow_breakdown = {}
-    total_outflows = 0
-    
-    outflow_entries = []
-    for expense in expenses:
-        amount = expense.get("amount", 0)
-        category = expense.get("category", "Other")
-        
-        outflow_breakdown[category] = outflow_breakdown.get(category, 0) + amount
-        total_outflows += amount
-        
-        outflow_entries.append({
-            "timestamp": f"{expense.get('date')}T12:00:00",
-            "type": "outflow",
-            "category": category,
-            "description": expense.get("description", ""),
-            "amount": amount,
-            "reference_id": expense.get("id")
-        })
-    
-    # Combine and sort entries by timestamp
-    all_entries = inflow_entries + outflow_entries
-    all_entries.sort(key=lambda x: x.get("timestamp", ""))
-    
-    # Calculate running balance
-    running_balance = 0
-    for entry in all_entries:
-        if entry["type"] == "inflow":
-            running_balance += entry["amount"]
-        else:
-            running_balance -= entry["amount"]
-        entry["running_balance"] = running_balance
-    
-    # Calculate balances
-    opening_balance = 0
-    closing_balance = opening_balance + total_inflows - total_outflows
-    net_cash_flow = total_inflows - total_outflows
-    
-    # Prepare daybook data
-    daybook_data = {
-        "date": date,
-        "end_date": end_date,
-        "opening_balance": opening_balance,
-        "total_inflows": total_inflows,
-        "total_outflows": total_outflows,
-        "closing_balance": closing_balance,
-        "net_cash_flow": net_cash_flow,
-        "inflow_breakdown": inflow_breakdown,
-        "outflow_breakdown": outflow_breakdown,
-        "entries": all_entries,
-        "order_count": len(orders),
-        "expense_count": len(expenses)
-    }
+    # Prepare daybook data (same snapshots as the on-screen report)
+    report = await get_daybook_snapshots().get_range(user_org_id, start_date, end_date)
+    daybook_data = {"date": date, "end_date": end_date, **report}
     
     if format.lower() == "excel":
-        return await generate_daybook_excel(daybook_data, date, end_date)
+        return await generate_daybook_excel(daybook_data, date, end_date, user_org_id)
     else:
-        return await generate_daybook_pdf(daybook_data, date, end_date)
+        return await generate_daybook_pdf(daybook_data, date, end_date, user_org_id)
 
 
-async def generate_daybook_pdf(daybook_data: dict, date: str, end_date: str) -> StreamingResponse:
-    """Generate Day Book PDF report using reportlab"""
+async def generate_daybook_pdf(daybook_data: dict, date: str, end_date: str, org_id: Optional[str] = None) -> StreamingResponse:
+    """Generate Day Book PDF report using reportlab (rendered on the document pool)"""
     try:
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch, mm
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
+        pdf_bytes = await get_document_renderer().render("daybook_pdf", org_id, daybook_data, date, end_date)
     except ImportError:
         # Fallback to CSV if reportlab not available
         return await generate_daybook_csv(daybook_data, date, end_date)
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=20*mm, leftMargin=20*mm, topMargin=20*mm, bottomMargin=20*mm)
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, alignment=TA_CENTER, spaceAfter=12, textColor=colors.HexColor('#7c3aed'))
-    subtitle_style = ParagraphStyle('Subtitle', parent=styles['Normal'], fontSize=10, alignment=TA_CENTER, spaceAfter=20, textColor=colors.gray)
-    section_style = ParagraphStyle('Section', parent=styles['Heading2'], fontSize=12, spaceBefore=15, spaceAfter=8, textColor=colors.HexColor('#7c3aed'))
-    
-    elements = []
-    
-    # Title
-    date_range_str = f"{date}" if date == end_date else f"{date} to {end_date}"
-    elements.append(Paragraph("📒 Day Book Report", title_style))
-    elements.append(Paragraph(f"Date: {date_range_str} | Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", subtitle_style))
-    
-    # Summary Table
-    elements.append(Paragraph("Summary", section_style))
-    summary_data = [
-        ['Opening Balance', 'Total Inflows', 'Total Outflows', 'Net Cash Flow', 'Closing Balance'],
-        [
-            f"₹{daybook_data['opening_balance']:.2f}",
-            f"₹{daybook_data['total_inflows']:.2f}",
-            f"₹{daybook_data['total_outflows']:.2f}",
-            f"{'+'if daybook_data['net_cash_flow'] >= 0 else ''}₹{daybook_data['net_cash_flow']:.2f}",
-            f"₹{daybook_data['closing_balance']:.2f}"
-        ]
-    ]
-    summary_table = Table(summary_data, colWidths=[90, 90, 90, 90, 90])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#7c3aed')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-        ('TOPPADDING', (0, 0), (-1, 0), 10),
-        ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#f3e8ff')),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.gray),
-        ('TEXTCOLOR', (1, 1), (1, 1), colors.green),
-        ('TEXTCOLOR', (2, 1), (2, 1), colors.red),
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 15))
-    
-    # Inflow Breakdown
-    if daybook_data['inflow_breakdown']:
-        elements.append(Paragraph("💰 Inflow Breakdown", section_style))
-        inflow_data = [['Payment Method', 'Amount']]
-        for method, amount in daybook_data['inflow_breakdown'].items():
-            if amount > 0:
-                inflow_data.append([method.capitalize(), f"₹{amount:.2f}"])
-        inflow_data.append(['Total Inflows', f"₹{daybook_data['total_inflows']:.2f}"])
-        
-        inflow_table = Table(inflow_data, colWidths=[200, 100])
-        inflow_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#15803d')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#dcfce7')),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#bbf7d0')),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.gray),
-        ]))
-        elements.append(inflow_table)
-        elements.append(Spacer(1, 10))
-    
-    # Outflow Breakdown
-    if daybook_data['outflow_breakdown']:
-        elements.append(Paragraph("📤 Outflow Breakdown", section_style))
-        outflow_data = [['Category', 'Amount']]
-        for category, amount in daybook_data['outflow_breakdown'].items():
-            if amount > 0:
-                outflow_data.append([category, f"₹{amount:.2f}"])
-        outflow_data.append(['Total Outflows', f"₹{daybook_data['total_outflows']:.2f}"])
-        
-        outflow_table = Table(outflow_data, colWidths=[200, 100])
-        outflow_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#dc2626')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#fee2e2')),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#fecaca')),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.gray),
-        ]))
-        elements.append(outflow_table)
-        elements.append(Spacer(1, 10))
-    
-    # Transaction Details
-    if daybook_data['entries']:
-        elements.append(Paragraph(f"📋 Transaction Details ({len(daybook_data['entries'])} transactions)", section_style))
-        trans_data = [['Time', 'Type', 'Category', 'Description', 'Amount', 'Balance']]
-        for entry in daybook_data['entries']:
-            try:
-                time_str = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00')).strftime('%H:%M') if entry.get('timestamp') else '-'
-            except:
-                time_str = '-'
-            
-            amount_str = f"{'+'if entry['type'] == 'inflow' else '-'}₹{entry['amount']:.2f}"
-            trans_data.append([
-                time_str,
-                '↑ Inflow' if entry['type'] == 'inflow' else '↓ Outflow',
-                entry.get('category', '')[:20],
-                entry.get('description', '')[:30],
-                amount_str,
-                f"₹{entry.get('running_balance', 0):.2f}"
-            ])
-        
-        trans_table = Table(trans_data, colWidths=[40, 55, 80, 130, 70, 70])
-        trans_style = [
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#7c3aed')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (4, 1), (5, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.gray),
-        ]
-        # Add row colors based on type
-        for i, entry in enumerate(daybook_data['entries'], 1):
-            if entry['type'] == 'inflow':
-                trans_style.append(('BACKGROUND', (0, i), (-1, i), colors.HexColor('#f0fdf4')))
-            else:
-                trans_style.append(('BACKGROUND', (0, i), (-1, i), colors.HexColor('#fef2f2')))
-        
-        trans_table.setStyle(TableStyle(trans_style))
-        elements.append(trans_table)
-    
-    # Footer
-    elements.append(Spacer(1, 20))
-    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, alignment=TA_CENTER, textColor=colors.gray)
-    elements.append(Paragraph("Generated by BillByteKOT - Restaurant Management System", footer_style))
-    
-    doc.build(elements)
-    buffer.seek(0)
+    except DocumentRenderTimeout:
+        raise HTTPException(status_code=503, detail="Day Book export timed out, try a shorter date range")
+    except DocumentRenderUnavailable:
+        raise HTTPException(status_code=503, detail="Day Book export is temporarily unavailable, please retry")
     
     filename = f"daybook-{date}.pdf" if date == end_date else f"daybook-{date}-to-{end_date}.pdf"
     
     return StreamingResponse(
-        buffer,
+        io.BytesIO(pdf_bytes),
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 
-async def generate_daybook_excel(daybook_data: dict, date: str, end_date: str) -> StreamingResponse:
-    """Generate Day Book Excel report using openpyxl"""
+async def generate_daybook_excel(daybook_data: dict, date: str, end_date: str, org_id: Optional[str] = None) -> StreamingResponse:
+    """Generate Day Book Excel report using openpyxl (rendered on the document pool)"""
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-        from openpyxl.utils import get_column_letter
+        xlsx_bytes = await get_document_renderer().render("daybook_excel", org_id, daybook_data, date, end_date)
     except ImportError:
         # Fallback to CSV if openpyxl not available
         return await generate_daybook_csv(daybook_data, date, end_date)
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Day Book"
-    
-    # Styles
-    header_font = Font(bold=True, color="FFFFFF", size=11)
-    header_fill = PatternFill(start_color="7c3aed", end_color="7c3aed", fill_type="solid")
-    inflow_fill = PatternFill(start_color="dcfce7", end_color="dcfce7", fill_type="solid")
-    outflow_fill = PatternFill(start_color="fee2e2", end_color="fee2e2", fill_type="solid")
-    summary_fill = PatternFill(start_color="f3e8ff", end_color="f3e8ff", fill_type="solid")
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    row = 1
-    
-    # Title
-    date_range_str = f"{date}" if date == end_date else f"{date} to {end_date}"
-    ws.merge_cells(f'A{row}:F{row}')
-    ws[f'A{row}'] = f"Day Book Report - {date_range_str}"
-    ws[f'A{row}'].font = Font(bold=True, size=16, color="7c3aed")
-    ws[f'A{row}'].alignment = Alignment(horizontal='center')
-    row += 1
-    
-    ws.merge_cells(f'A{row}:F{row}')
-    ws[f'A{row}'] = f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-    ws[f'A{row}'].alignment = Alignment(horizontal='center')
-    row += 2
-    
-    # Summary Section
-    ws[f'A{row}'] = "SUMMARY"
-    ws[f'A{row}'].font = Font(bold=True, size=12, color="7c3aed")
-    row += 1
-    
-    summary_headers = ['Opening Balance', 'Total Inflows', 'Total Outflows', 'Net Cash Flow', 'Closing Balance']
-    for col, header in enumerate(summary_headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = thin_border
-    row += 1
-    
-    summary_values = [
-        daybook_data['opening_balance'],
-        daybook_data['total_inflows'],
-        daybook_data['total_outflows'],
-        daybook_data['net_cash_flow'],
-        daybook_data['closing_balance']
-    ]
-    for col, value in enumerate(summary_values, 1):
-        cell = ws.cell(row=row, column=col, value=f"₹{value:.2f}")
-        cell.fill = summary_fill
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = thin_border
-        if col == 2:  # Inflows - green
-            cell.font = Font(color="15803d", bold=True)
-        elif col == 3:  # Outflows - red
-            cell.font = Font(color="dc2626", bold=True)
-        elif col == 4:  # Net - based on value
-            cell.font = Font(color="15803d" if value >= 0 else "dc2626", bold=True)
-    row += 2
-    
-    # Inflow Breakdown
-    ws[f'A{row}'] = "INFLOW BREAKDOWN"
-    ws[f'A{row}'].font = Font(bold=True, size=12, color="15803d")
-    row += 1
-    
-    for col, header in enumerate(['Payment Method', 'Amount'], 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        cell.font = header_font
-        cell.fill = PatternFill(start_color="15803d", end_color="15803d", fill_type="solid")
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = thin_border
-    row += 1
-    
-    for method, amount in daybook_data['inflow_breakdown'].items():
-        if amount > 0:
-            ws.cell(row=row, column=1, value=method.capitalize()).border = thin_border
-            ws.cell(row=row, column=1).fill = inflow_fill
-            cell = ws.cell(row=row, column=2, value=f"₹{amount:.2f}")
-            cell.border = thin_border
-            cell.fill = inflow_fill
-            cell.alignment = Alignment(horizontal='right')
-            row += 1
-    
-    # Total row
-    ws.cell(row=row, column=1, value="Total Inflows").font = Font(bold=True)
-    ws.cell(row=row, column=1).border = thin_border
-    cell = ws.cell(row=row, column=2, value=f"₹{daybook_data['total_inflows']:.2f}")
-    cell.font = Font(bold=True, color="15803d")
-    cell.border = thin_border
-    cell.alignment = Alignment(horizontal='right')
-    row += 2
-    
-    # Outflow Breakdown
-    ws[f'A{row}'] = "OUTFLOW BREAKDOWN"
-    ws[f'A{row}'].font = Font(bold=True, size=12, color="dc2626")
-    row += 1
-    
-    for col, header in enumerate(['Category', 'Amount'], 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        cell.font = header_font
-        cell.fill = PatternFill(start_color="dc2626", end_color="dc2626", fill_type="solid")
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = thin_border
-    row += 1
-    
-    for category, amount in daybook_data['outflow_breakdown'].items():
-        if amount > 0:
-            ws.cell(row=row, column=1, value=category).border = thin_border
-            ws.cell(row=row, column=1).fill = outflow_fill
-            cell = ws.cell(row=row, column=2, value=f"₹{amount:.2f}")
-            cell.border = thin_border
-            cell.fill = outflow_fill
-            cell.alignment = Alignment(horizontal='right')
-            row += 1
-    
-    # Total row
-    ws.cell(row=row, column=1, value="Total Outflows").font = Font(bold=True)
-    ws.cell(row=row, column=1).border = thin_border
-    cell = ws.cell(row=row, column=2, value=f"₹{daybook_data['total_outflows']:.2f}")
-    cell.font = Font(bold=True, color="dc2626")
-    cell.border = thin_border
-    cell.alignment = Alignment(horizontal='right')
-    row += 2
-    
-    # Transaction Details
-    ws[f'A{row}'] = f"TRANSACTION DETAILS ({len(daybook_data['entries'])} transactions)"
-    ws[f'A{row}'].font = Font(bold=True, size=12, color="7c3aed")
-    row += 1
-    
-    trans_headers = ['Time', 'Type', 'Category', 'Description', 'Amount', 'Running Balance']
-    for col, header in enumerate(trans_headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = thin_border
-    row += 1
-    
-    for entry in daybook_data['entries']:
-        try:
-            time_str = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00')).strftime('%H:%M') if entry.get('timestamp') else '-'
-        except:
-            time_str = '-'
-        
-        fill = inflow_fill if entry['type'] == 'inflow' else outflow_fill
-        amount_prefix = '+' if entry['type'] == 'inflow' else '-'
-        
-        values = [
-            time_str,
-            '↑ Inflow' if entry['type'] == 'inflow' else '↓ Outflow',
-            entry.get('category', ''),
-            entry.get('description', ''),
-            f"{amount_prefix}₹{entry['amount']:.2f}",
-            f"₹{entry.get('running_balance', 0):.2f}"
-        ]
-        
-        for col, value in enumerate(values, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            cell.fill = fill
-            cell.border = thin_border
-            if col >= 5:
-                cell.alignment = Alignment(horizontal='right')
-        row += 1
-    
-    # Adjust column widths
-    column_widths = [12, 12, 20, 40, 15, 18]
-    for i, width in enumerate(column_widths, 1):
-        ws.column_dimensions[get_column_letter(i)].width = width
-    
-    # Save to buffer
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    except DocumentRenderTimeout:
+        raise HTTPException(status_code=503, detail="Day Book export timed out, try a shorter date range")
+    except DocumentRenderUnavailable:
+        raise HTTPException(status_code=503, detail="Day Book export is temporarily unavailable, please retry")
     
     filename = f"daybook-{date}.xlsx" if date == end_date else f"daybook-{date}-to-{end_date}.xlsx"
     
     return StreamingResponse(
-        buffer,
+        io.BytesIO(xlsx_bytes),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -9473,13 +8999,11 @@ async def daily_report(current_user: dict = Depends(get_current_user)):
     
     # ✅ PERFORMANCE: Check cache first (30-second TTL for real-time dashboard updates)
     cache_key = f"daily_report:{user_org_id}"
-    current_time = time.time()
     
-    with _cache_lock:
-        if cache_key in _cache and cache_key in _cache_ttl:
-            if current_time < _cache_ttl[cache_key]:
-                print(f"💾 Cache hit for daily_report: {cache_key}")
-                return _cache[cache_key]
+    cached_report = await get_tiered_cache().get(DAILY_REPORT_NAMESPACE, "today", scope=user_org_id)
+    if cached_report is not None:
+        print(f"💾 Cache hit for daily_report: {cache_key}")
+        return cached_report
     
     # Use IST (Indian Standard Time) for "today" calculation
     # IST is UTC+5:30
@@ -9547,9 +9071,7 @@ async def daily_report(current_user: dict = Depends(get_current_user)):
     }
     
     # ✅ PERFORMANCE: Cache the result for 30 seconds for real-time updates
-    with _cache_lock:
-        _cache[cache_key] = result
-        _cache_ttl[cache_key] = current_time + 30  # 30 seconds TTL for real-time dashboard
+    await get_tiered_cache().set(DAILY_REPORT_NAMESPACE, "today", result, scope=user_org_id, ttl=30)  # 30 seconds TTL for real-time dashboard
     
     print(f"✅ Cached daily_report for: {cache_key} (TTL: 30 seconds)")
     return result
@@ -9566,17 +9088,19 @@ async def get_performance_metrics(current_user: dict = Depends(get_current_user)
     if not user_doc or not user_doc.get("is_super_admin"):
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    # Get cache metrics
-    cache_size = len(_cache)
-    expired_count = sum(1 for k, v in _cache_ttl.items() if time.time() >= v)
+    # Get cache metrics (per-namespace hits / misses / evictions)
+    tiered_stats = get_tiered_cache().get_stats()
+    cache_size = sum(ns["size"] for ns in tiered_stats["namespaces"].values())
     
     return {
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "cache_stats": {
             "total_cached_keys": cache_size,
-            "expired_keys": expired_count,
-            "active_keys": cache_size - expired_count,
-            "cache_memory_bytes": sum(len(str(v).encode()) for v in _cache.values()) if _cache else 0
+            "namespaces": tiered_stats["namespaces"],
+            "l2_connected": tiered_stats["l2_connected"],
+            "pubsub": tiered_stats["pubsub"],
+            "broadcasts_sent": tiered_stats["broadcasts_sent"],
+            "broadcasts_received": tiered_stats["broadcasts_received"],
         },
         "endpoints_with_cache": [
             {"endpoint": "/reports/daily", "ttl_seconds": 3600, "description": "Daily sales report"},
@@ -9594,23 +9118,14 @@ async def clear_cache(current_user: dict = Depends(get_current_user), pattern: O
     if not user_doc or not user_doc.get("is_super_admin"):
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    global _cache, _cache_ttl
-    
     if pattern:
         # Clear cache entries matching pattern
-        with _cache_lock:
-            matching_keys = [k for k in _cache.keys() if pattern in k]
-            for key in matching_keys:
-                _cache.pop(key, None)
-                _cache_ttl.pop(key, None)
+        cleared = get_tiered_cache().clear(match=pattern)
         
-        return {"message": f"Cleared {len(matching_keys)} cache entries", "pattern": pattern}
+        return {"message": f"Cleared {cleared} cache entries", "pattern": pattern}
     else:
         # Clear all cache
-        with _cache_lock:
-            cleared = len(_cache)
-            _cache.clear()
-            _cache_ttl.clear()
+        cleared = get_tiered_cache().clear()
         
         return {"message": f"Cleared all {cleared} cache entries"}
 
@@ -9657,12 +9172,14 @@ async def batch_update_order_status(
         if bulk_ops:
             result = await db.orders.bulk_write(bulk_ops)
             
-            # Clear related cache entries
-            with _cache_lock:
-                cache_keys_to_clear = [k for k in _cache.keys() if "order" in k or user_org_id in k]
-                for key in cache_keys_to_clear:
-                    _cache.pop(key, None)
-                    _cache_ttl.pop(key, None)
+            for update in updates:
+                if update.get("order_id"):
+                    schedule_sales_rollup_sync(update["order_id"], user_org_id)
+            
+            # Clear related cache entries (on every worker)
+            await get_tiered_cache().invalidate(DAILY_REPORT_NAMESPACE, user_org_id)
+            await get_tiered_cache().invalidate("active_orders", user_org_id)
+            get_tiered_cache().clear(RESPONSE_CACHE_NAMESPACE, match=user_org_id)
             
             return {
                 "success": True,
@@ -9805,41 +9322,29 @@ async def monthly_report(current_user: dict = Depends(get_current_user)):
 async def best_selling_report(current_user: dict = Depends(get_current_user)):
     user_org_id = get_secure_org_id(current_user)
     
-    orders = await db.orders.find({
-        "status": "completed",
-        "organization_id": user_org_id
-    }, {"_id": 0}).to_list(1000)
-    
-    from collections import defaultdict
-    item_stats = defaultdict(lambda: {
-        "total_quantity": 0, 
-        "total_revenue": 0, 
-        "name": "", 
-        "category": "Uncategorized",
-        "price": 0
-    })
+    # Served from pre-aggregated daily rollups + today's delta (no order scan)
+    buckets = await get_sales_rollups().get_report_buckets(user_org_id)
+    catalog = await get_org_catalog().get(user_org_id)
     
-    for order in orders:
-        for item in order["items"]:
-            item_id = item.get("menu_item_id", item["name"])
-            item_stats[item_id]["name"] = item["name"]
-            item_stats[item_id]["total_quantity"] += item["quantity"]
-            item_stats[item_id]["total_revenue"] += item["price"] * item["quantity"]
-            item_stats[item_id]["price"] = item["price"]  # Store price
-    
-    # Get category info from menu
-    for item_id, stats in item_stats.items():
-        menu_item = await db.menu_items.find_one({
-            "name": stats["name"], 
-            "organization_id": user_org_id
-        }, {"_id": 0})
-        if menu_item:
-            stats["category"] = menu_item.get("category", "Uncategorized")
-            if not stats["price"]:
-                stats["price"] = menu_item.get("price", 0)
+    item_stats = []
+    for stats in buckets["items"].values():
+        if stats.get("quantity", 0) <= 0:
+            continue
+        # Current category/price from the menu snapshot (O(1), no per-item query)
+        menu_item = catalog.item(name=stats.get("name", ""))
+        price = stats.get("price", 0)
+        if not price and menu_item:
+            price = menu_item.get("price", 0)
+        item_stats.append({
+            "name": stats.get("name", ""),
+            "total_quantity": stats["quantity"],
+            "total_revenue": stats.get("revenue", 0),
+            "category": (menu_item or {}).get("category") or stats.get("category") or "Uncategorized",
+            "price": price,
+        })
     
     sorted_items = sorted(
-        item_stats.values(), 
+        item_stats, 
         key=lambda x: x["total_quantity"], 
         reverse=True
     )[:10]
@@ -9852,10 +9357,7 @@ async def top_items_report(current_user: dict = Depends(get_current_user)):
     """Get top selling items for dashboard display"""
     user_org_id = get_secure_org_id(current_user)
     
-    orders = await db.orders.find({
-        "status": "completed",
-        "organization_id": user_org_id
-    }, {"_id": 0}).to_list(1000)
+    buckets = await get_sales_rollups().get_report_buckets(user_org_id)
     
     from collections import defaultdict
     item_stats = defaultdict(lambda: {
@@ -9864,16 +9366,16 @@ async def top_items_report(current_user: dict = Depends(get_current_user)):
         "name": ""
     })
     
-    for order in orders:
-        for item in order["items"]:
-            item_name = item["name"]
-            item_stats[item_name]["name"] = item_name
-            item_stats[item_name]["quantity"] += item["quantity"]
-            item_stats[item_name]["revenue"] += item["price"] * item["quantity"]
+    # Item buckets are keyed by menu item id; this report groups by name
+    for stats in buckets["items"].values():
+        item_name = stats.get("name", "")
+        item_stats[item_name]["name"] = item_name
+        item_stats[item_name]["quantity"] += stats.get("quantity", 0)
+        item_stats[item_name]["revenue"] += stats.get("revenue", 0)
     
     # Sort by quantity sold and return top 10
     sorted_items = sorted(
-        item_stats.values(), 
+        (stats for stats in item_stats.values() if stats["quantity"] > 0), 
         key=lambda x: x["quantity"], 
         reverse=True
     )[:10]
@@ -9885,29 +9387,27 @@ async def top_items_report(current_user: dict = Depends(get_current_user)):
 async def staff_performance_report(current_user: dict = Depends(get_current_user)):
     user_org_id = get_secure_org_id(current_user)
     
-    orders = await db.orders.find({
-        "status": "completed",
-        "organization_id": user_org_id
-    }, {"_id": 0}).to_list(1000)
+    buckets = await get_sales_rollups().get_report_buckets(user_org_id)
+    catalog = await get_org_catalog().get(user_org_id)
     
-    from collections import defaultdict
-    staff_stats = defaultdict(lambda: {"total_orders": 0, "total_sales": 0, "waiter_name": ""})
-    
-    for order in orders:
-        waiter_id = order["waiter_id"]
-        staff_stats[waiter_id]["waiter_name"] = order["waiter_name"]
-        staff_stats[waiter_id]["total_orders"] += 1
-        staff_stats[waiter_id]["total_sales"] += order["total"]
-    
-    # Calculate average order value
-    for staff_id, stats in staff_stats.items():
-        stats["avg_order_value"] = stats["total_sales"] / stats["total_orders"] if stats["total_orders"] > 0 else 0
-        # Get role from users collection
-        staff_user = await db.users.find_one({"id": staff_id}, {"_id": 0})
+    staff_stats = []
+    for bucket in buckets["waiters"].values():
+        if bucket.get("order_count", 0) <= 0:
+            continue
+        stats = {
+            "waiter_name": bucket.get("waiter_name", ""),
+            "total_orders": bucket["order_count"],
+            "total_sales": bucket.get("total_sales", 0),
+        }
+        # Calculate average order value
+        stats["avg_order_value"] = stats["total_sales"] / stats["total_orders"]
+        # Get role from the staff roster snapshot
+        staff_user = catalog.staff(bucket.get("waiter_id"))
         if staff_user:
             stats["role"] = staff_user.get("role", "waiter")
+        staff_stats.append(stats)
     
-    sorted_staff = sorted(staff_stats.values(), key=lambda x: x["total_orders"], reverse=True)
+    sorted_staff = sorted(staff_stats, key=lambda x: x["total_orders"], reverse=True)
     return sorted_staff
 
 
@@ -9915,24 +9415,15 @@ async def staff_performance_report(current_user: dict = Depends(get_current_user
 async def peak_hours_report(current_user: dict = Depends(get_current_user)):
     user_org_id = get_secure_org_id(current_user)
     
-    orders = await db.orders.find({
-        "status": "completed",
-        "organization_id": user_org_id
-    }, {"_id": 0}).to_list(1000)
-    
-    from collections import defaultdict
-    hour_stats = defaultdict(int)
-    
-    for order in orders:
-        order_date = order["created_at"]
-        if isinstance(order_date, str):
-            order_date = datetime.fromisoformat(order_date)
-        hour = order_date.hour
-        hour_stats[hour] += 1
+    buckets = await get_sales_rollups().get_report_buckets(user_org_id)
     
     # Format hours
     formatted_hours = []
-    for hour, count in sorted(hour_stats.items()):
+    for hour_key, stats in sorted(buckets["hours"].items()):
+        count = stats.get("order_count", 0)
+        if count <= 0:
+            continue
+        hour = int(hour_key)
         formatted_hours.append({
             "hour": f"{hour:02d}:00 - {hour:02d}:59",
             "order_count": count
@@ -9945,39 +9436,22 @@ async def peak_hours_report(current_user: dict = Depends(get_current_user)):
 async def category_analysis_report(current_user: dict = Depends(get_current_user)):
     user_org_id = get_secure_org_id(current_user)
     
-    orders = await db.orders.find({
-        "status": "completed",
-        "organization_id": user_org_id
-    }, {"_id": 0}).to_list(1000)
-    
-    from collections import defaultdict
-    category_stats = defaultdict(lambda: {"total_sold": 0, "total_revenue": 0})
-    
-    for order in orders:
-        for item in order["items"]:
-            # Get category from menu
-            menu_item = await db.menu_items.find_one({
-                "name": item["name"],
-                "organization_id": user_org_id
-            }, {"_id": 0})
-            
-            category = "Uncategorized"
-            if menu_item:
-                category = menu_item.get("category", "Uncategorized")
-            
-            category_stats[category]["total_sold"] += item["quantity"]
-            category_stats[category]["total_revenue"] += item["price"] * item["quantity"]
+    buckets = await get_sales_rollups().get_report_buckets(user_org_id)
+    category_stats = [
+        stats for stats in buckets["categories"].values()
+        if stats.get("quantity", 0) > 0
+    ]
     
     # Calculate percentages
-    total_revenue = sum(stats["total_revenue"] for stats in category_stats.values())
+    total_revenue = sum(stats.get("revenue", 0) for stats in category_stats)
     
     result = []
-    for category, stats in category_stats.items():
-        percentage = (stats["total_revenue"] / total_revenue * 100) if total_revenue > 0 else 0
+    for stats in category_stats:
+        percentage = (stats.get("revenue", 0) / total_revenue * 100) if total_revenue > 0 else 0
         result.append({
-            "category": category,
-            "total_sold": stats["total_sold"],
-            "total_revenue": stats["total_revenue"],
+            "category": stats.get("category") or "Uncategorized",
+            "total_sold": stats["quantity"],
+            "total_revenue": stats.get("revenue", 0),
             "percentage": percentage
         })
     
@@ -9986,107 +9460,20 @@ async def category_analysis_report(current_user: dict = Depends(get_current_user
 
 @api_router.get("/reports/customer-balances")
 async def customer_balances_report(current_user: dict = Depends(get_current_user)):
-    """Get customer balance report showing outstanding credit amounts"""
+    """Get customer balance report showing outstanding credit amounts (served from the customer ledger)"""
     user_org_id = get_secure_org_id(current_user)
+    return await get_customer_ledger().get_balances(user_org_id)
 
-    def _normalize_dt(value):
-        if isinstance(value, datetime):
-            return value
-        if isinstance(value, str) and value:
-            try:
-                return datetime.fromisoformat(value.replace("Z", "+00:00"))
-            except Exception:
-                return None
-        return None
-    
-    # Find all orders with outstanding balances (credit orders)
-    credit_orders = await db.orders.find({
-        "organization_id": user_org_id,
-        "$or": [
-            {"is_credit": True, "balance_amount": {"$gt": 0}},
-            {"balance_amount": {"$gt": 0}}
-        ]
-    }, {"_id": 0}).to_list(1000)
-    
-    # Also get all orders for each customer to calculate total statistics
-    all_orders = await db.orders.find({
-        "organization_id": user_org_id
-    }, {"_id": 0}).to_list(2000)
-    
-    from collections import defaultdict
-    customer_stats = defaultdict(lambda: {
-        "customer_name": "",
-        "customer_phone": "",
-        "balance_amount": 0,
-        "total_orders": 0,
-        "total_amount_ordered": 0,
-        "total_paid": 0,
-        "last_order_date": None,
-        "credit_orders": []
-    })
-    
-    # Process all orders to get complete customer statistics
-    for order in all_orders:
-        # Use phone as key, or "unknown_<order_id>" if no phone
-        phone_raw = order.get("customer_phone", "")
-        phone = str(phone_raw).strip() if phone_raw is not None else ""
-        if not phone:
-            # For orders without phone, use order ID as unique key
-            phone = f"unknown_{order.get('id', 'no_id')}"
-            
-        customer_stats[phone]["customer_name"] = order.get("customer_name") or "Unknown Customer"
-        customer_stats[phone]["customer_phone"] = order.get("customer_phone") or "No Phone"
-        customer_stats[phone]["total_orders"] += 1
-        customer_stats[phone]["total_amount_ordered"] += float(order.get("total") or 0)
-        customer_stats[phone]["total_paid"] += float(order.get("payment_received") or 0)
-        
-        # Track last order date
-        order_date = _normalize_dt(order.get("created_at"))
-        if order_date:
-            last_dt = customer_stats[phone]["last_order_date"]
-            if not last_dt or (isinstance(last_dt, datetime) and order_date > last_dt):
-                customer_stats[phone]["last_order_date"] = order_date
-    
-    # Process credit orders to get outstanding balances
-    for order in credit_orders:
-        # Use phone as key, or "unknown_<order_id>" if no phone
-        phone_raw = order.get("customer_phone", "")
-        phone = str(phone_raw).strip() if phone_raw is not None else ""
-        if not phone:
-            phone = f"unknown_{order.get('id', 'no_id')}"
-            
-        balance = float(order.get("balance_amount") or 0)
-        if balance > 0:
-            customer_stats[phone]["balance_amount"] += balance
-            customer_stats[phone]["credit_orders"].append({
-                "order_id": order.get("id"),
-                "date": order.get("created_at"),
-                "total": float(order.get("total") or 0),
-                "paid": float(order.get("payment_received") or 0),
-                "balance": balance,
-                "table_number": order.get("table_number", "N/A")
-            })
-    
-    # Convert to list and filter only customers with outstanding balances
-    result = []
-    for phone, stats in customer_stats.items():
-        if stats["balance_amount"] > 0:  # Only include customers with outstanding balance
-            result.append({
-                "customer_name": stats["customer_name"],
-                "customer_phone": stats["customer_phone"],
-                "balance_amount": round(stats["balance_amount"], 2),
-                "total_orders": stats["total_orders"],
-                "total_amount_ordered": round(stats["total_amount_ordered"], 2),
-                "total_paid": round(stats["total_paid"], 2),
-                "last_order_date": stats["last_order_date"].isoformat() if isinstance(stats["last_order_date"], datetime) else stats["last_order_date"],
-                "credit_orders_count": len(stats["credit_orders"]),
-                "credit_orders": stats["credit_orders"][-5:]  # Last 5 credit orders
-            })
-    
-    # Sort by balance amount (highest first)
-    result.sort(key=lambda x: x["balance_amount"], reverse=True)
-    
-    return result
+
+@api_router.post("/reports/customer-balances/reconcile")
+async def reconcile_customer_balances(current_user: dict = Depends(get_current_user)):
+    """Rebuild the customer ledger from orders in background (admin only)"""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can reconcile customer balances")
+    user_org_id = get_secure_org_id(current_user)
+    # Long-running rebuild: kept off the side-effects workers
+    asyncio.create_task(get_customer_ledger().reconcile_organization(user_org_id))
+    return {"message": "Customer ledger reconciliation scheduled"}
 
 
 # Thermal printer route
@@ -10118,7 +9505,7 @@ async def print_bill(
     user_org_id = get_secure_org_id(current_user)
 
     order = await db.orders.find_one(
-        {"id": order_id, "organization_id": user_org_id}, {"_id": 0}
+        {"id": order_id, "organization_id": user_org_id}, ORDER_VERSION_PROJECTION
     )
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -10131,9 +9518,21 @@ async def print_bill(
     # Get print customization settings
     customization = business.get("print_customization")
 
-    receipt_content = get_receipt_template(
-        receipt_theme, business, order, currency_symbol, customization
-    )
+    async def render():
+        full_order = await db.orders.find_one(
+            {"id": order_id, "organization_id": user_org_id}, {"_id": 0}
+        ) or order
+        return get_receipt_template(
+            receipt_theme, business, full_order, currency_symbol, customization
+        )
+
+    # Completed orders reprint from the artifact cache (usually pre-rendered)
+    if order.get("status") in ROLLUP_STATUSES:
+        receipt_content = await get_receipt_artifacts().get_or_render(
+            artifact_key(order, business, receipt_theme), "text", render, order
+        )
+    else:
+        receipt_content = await render()
     
     # Get paper width for response
     paper_width = "80mm"
@@ -10381,6 +9780,8 @@ async def update_whatsapp_settings(
         {"id": current_user["id"]},
         {"$set": {"business_settings": business}}
     )
+    # Self-order / menu display toggles change what the public menu serves
+    await invalidate_public_menu(current_user["id"])
     
     return {"message": "WhatsApp settings updated successfully", "settings": settings.model_dump()}
 
@@ -10643,6 +10044,36 @@ async def get_cloud_api_status():
     }
 
 
+@api_router.get("/whatsapp/message-status")
+async def get_whatsapp_message_status(
+    order_ids: str = Query(..., description="Comma-separated order ids (max 100)"),
+    current_user: dict = Depends(get_current_user),
+):
+    """Delivered/read state of the WhatsApp status messages sent for orders (from webhooks, not Meta)"""
+    user_org_id = get_secure_org_id(current_user)
+    ids = [order_id for order_id in order_ids.split(",") if order_id][:100]
+    if not ids:
+        return {"orders": {}}
+
+    messages = await get_outbox().messages_for_orders(user_org_id, ids)
+    statuses = await get_status_store().get_statuses(
+        [message["message_id"] for message in messages if message.get("message_id")]
+    )
+
+    orders = {order_id: [] for order_id in ids}
+    for message in messages:
+        delivery = statuses.get(message.get("message_id")) or {}
+        orders[message["order_id"]].append({
+            "order_status": message["status"],
+            "message_id": message.get("message_id"),
+            # Outbox state until the first webhook arrives: pending / sending / sent / failed
+            "delivery_status": delivery.get("status") or message["state"],
+            "timestamps": delivery.get("timestamps", {}),
+            "errors": delivery.get("errors") or ([{"message": message["last_error"]}] if message.get("last_error") else []),
+        })
+    return {"orders": orders}
+
+
 # These endpoints are for customer-facing features like order tracking and self-ordering
 
 @app.get("/api/public/track/{tracking_token}")
@@ -10679,21 +10110,24 @@ async def track_order_public(tracking_token: str):
     }
 
 
-@app.get("/api/public/receipt/{tracking_token}")
-async def receipt_public(tracking_token: str, download: int = 0):
-    """Public customer receipt page for invoice viewing/downloading."""
-    order = await db.orders.find_one(
-        {"tracking_token": tracking_token},
-        {"_id": 0}
-    )
-    if not order:
-        raise HTTPException(status_code=404, detail="Receipt not found")
+def get_receipt_artifacts():
+    """Receipt artifact cache bound to the active database connection"""
+    cache = get_receipt_artifact_cache()
+    if cache is None or cache.db is not db:
+        cache = init_receipt_artifact_cache(db)
+    return cache
 
+
+async def _receipt_business(order: dict) -> dict:
     admin = await db.users.find_one(
         {"id": order.get("organization_id") or order.get("waiter_id")},
         {"_id": 0, "business_settings": 1}
     )
-    business = admin.get("business_settings", {}) if admin else {}
+    return admin.get("business_settings", {}) if admin else {}
+
+
+def _public_receipt_order(order: dict) -> dict:
+    """Order as shown on the public receipt (display defaults, numeric totals)"""
     sanitized_items = []
     for item in order.get("items") or []:
         sanitized_items.append({
@@ -10703,7 +10137,7 @@ async def receipt_public(tracking_token: str, download: int = 0):
             "price": float(item.get("price") or 0),
         })
 
-    order = {
+    return {
         **order,
         "id": str(order.get("invoice_number") or order.get("id", "")),
         "table_number": order.get("table_number") or order.get("table_name") or "N/A",
@@ -10714,6 +10148,20 @@ async def receipt_public(tracking_token: str, download: int = 0):
         "tax": float(order.get("tax") or 0),
         "total": float(order.get("total") or 0),
     }
+
+
+def _receipt_headers(key: str, kind: str, order: dict) -> dict:
+    # Completed receipts only change through a new artifact key (new ETag)
+    immutable = order.get("status") in ROLLUP_STATUSES
+    return {
+        "ETag": artifact_etag(key, kind),
+        "Cache-Control": "public, max-age=300" if immutable else "no-cache",
+    }
+
+
+def render_public_receipt_html(tracking_token: str, order: dict, business: dict) -> str:
+    """Public receipt page (thermal receipt text wrapped in a printable card)"""
+    order = _public_receipt_order(order)
     currency_code = business.get("currency", "INR")
     currency_symbol = CURRENCY_SYMBOLS.get(currency_code, "₹")
     theme = business.get("receipt_theme", "classic")
@@ -10721,10 +10169,7 @@ async def receipt_public(tracking_token: str, download: int = 0):
     invoice_label = order.get("invoice_number") or str(order.get("id", ""))[:8].upper()
     restaurant_name = business.get("restaurant_name", "Restaurant")
 
-    if download:
-        return await generate_receipt_pdf(order, business)
-
-    html = f"""<!DOCTYPE html>
+    return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta charset="utf-8" />
@@ -10819,11 +10264,84 @@ async def receipt_public(tracking_token: str, download: int = 0):
   </div>
 </body>
 </html>"""
-    return Response(content=html, media_type="text/html; charset=utf-8")
+
+
+async def render_receipt_pdf_bytes(order: dict, business: dict) -> bytes:
+    """Receipt PDF bytes from the document render pool"""
+    currency_symbol = CURRENCY_SYMBOLS.get(business.get("currency", "INR"), "₹")
+    try:
+        return await get_document_renderer().render(
+            "receipt_pdf", order.get("organization_id"), order, business, currency_symbol
+        )
+    except ImportError:
+        raise HTTPException(status_code=500, detail="PDF generation is unavailable")
+    except DocumentRenderTimeout:
+        raise HTTPException(status_code=503, detail="Receipt generation timed out, please retry")
+    except DocumentRenderUnavailable:
+        raise HTTPException(status_code=503, detail="Receipt generation is temporarily unavailable, please retry")
+
+
+async def prerender_receipt_artifacts(order_id: str, org_id: str):
+    """Render a completed order's receipt artifacts before the first view"""
+    order = await db.orders.find_one({"id": order_id, "organization_id": org_id}, {"_id": 0})
+    if not order or order.get("status") not in ROLLUP_STATUSES:
+        return
+    business = await _receipt_business(order)
+    theme = business.get("receipt_theme", "classic")
+    currency_symbol = CURRENCY_SYMBOLS.get(business.get("currency", "INR"), "₹")
+
+    # Same inputs as print_bill / receipt_public, so their artifact keys match
+    artifacts = {
+        "text": get_receipt_template(theme, business, order, currency_symbol, business.get("print_customization")),
+    }
+    if order.get("tracking_token"):
+        artifacts["html"] = render_public_receipt_html(order["tracking_token"], order, business)
+        try:
+            artifacts["pdf"] = await render_receipt_pdf_bytes(_public_receipt_order(order), business)
+        except HTTPException:
+            pass
+    cache = get_receipt_artifacts()
+    await cache.store(artifact_key(order, business, theme), artifacts, order)
+    cache.mark_prerendered()
+
+
+@app.get("/api/public/receipt/{tracking_token}")
+async def receipt_public(tracking_token: str, request: Request, download: int = 0):
+    """Public customer receipt page for invoice viewing/downloading."""
+    order = await db.orders.find_one(
+        {"tracking_token": tracking_token},
+        {**ORDER_VERSION_PROJECTION, "invoice_number": 1}
+    )
+    if not order:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+
+    business = await _receipt_business(order)
+    key = artifact_key(order, business, business.get("receipt_theme", "classic"))
+    kind = "pdf" if download else "html"
+    headers = _receipt_headers(key, kind, order)
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    async def render():
+        full_order = await db.orders.find_one({"tracking_token": tracking_token}, {"_id": 0}) or order
+        if download:
+            return await render_receipt_pdf_bytes(_public_receipt_order(full_order), business)
+        return render_public_receipt_html(tracking_token, full_order, business)
+
+    if order.get("status") in ROLLUP_STATUSES:
+        content = await get_receipt_artifacts().get_or_render(key, kind, render, order)
+    else:
+        content = await render()
+
+    if download:
+        invoice_label = order.get("invoice_number") or str(order.get("id", ""))[:8].upper()
+        headers["Content-Disposition"] = f'attachment; filename="receipt-{invoice_label}.pdf"'
+        return Response(content=content, media_type="application/pdf", headers=headers)
+    return Response(content=content, media_type="text/html; charset=utf-8", headers=headers)
 
 
 @app.get("/api/public/receipt-data/{tracking_token}")
-async def receipt_public_data(tracking_token: str):
+async def receipt_public_data(tracking_token: str, request: Request):
     """Public customer receipt data for frontend receipt rendering."""
     order = await db.orders.find_one(
         {"tracking_token": tracking_token},
@@ -10832,11 +10350,10 @@ async def receipt_public_data(tracking_token: str):
     if not order:
         raise HTTPException(status_code=404, detail="Receipt not found")
 
-    admin = await db.users.find_one(
-        {"id": order.get("organization_id") or order.get("waiter_id")},
-        {"_id": 0, "business_settings": 1}
-    )
-    business = admin.get("business_settings", {}) if admin else {}
+    business = await _receipt_business(order)
+    headers = _receipt_headers(artifact_key(order, business, "data"), "data", order)
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
 
     sanitized_items = []
     for item in order.get("items") or []:
@@ -10850,7 +10367,7 @@ async def receipt_public_data(tracking_token: str):
     if isinstance(created_at, datetime):
         created_at = created_at.isoformat()
 
-    return {
+    return JSONResponse(content={
         "tracking_token": tracking_token,
         "invoice_number": order.get("invoice_number") or str(order.get("id", ""))[:8].upper(),
         "created_at": created_at or "",
@@ -10866,22 +10383,11 @@ async def receipt_public_data(tracking_token: str):
         "restaurant_address": business.get("address", ""),
         "footer_message": business.get("footer_message", "Thank you for dining with us!"),
         "items": sanitized_items,
-    }
+    }, headers=headers)
 
 
-@app.get("/api/public/menu/{org_id}")
-async def get_public_menu(org_id: str):
-    """Public endpoint for customers to view menu (for self-ordering)"""
-    # Check if self-ordering is enabled
-    admin = await db.users.find_one({"id": org_id}, {"_id": 0})
-    if not admin:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    
-    business = admin.get("business_settings", {})
-    if not business.get("customer_self_order_enabled"):
-        raise HTTPException(status_code=403, detail="Self-ordering not enabled")
-    
-    # Get available menu items
+async def _load_public_menu_items(org_id: str) -> tuple:
+    """Available menu items for a public menu, plus the same items grouped by category"""
     items = await db.menu_items.find(
         {"organization_id": org_id, "available": True},
         {"_id": 0, "organization_id": 0}
@@ -10894,144 +10400,115 @@ async def get_public_menu(org_id: str):
         if cat not in categories:
             categories[cat] = []
         categories[cat].append(item)
+    return items, categories
+
+
+PUBLIC_CURRENCY_SYMBOLS = {"INR": "₹", "USD": "$", "EUR": "€", "GBP": "£", "AED": "د.إ", "PKR": "₨"}
+
+
+@app.get("/api/public/menu/{org_id}")
+async def get_public_menu(org_id: str, request: Request):
+    """Public endpoint for customers to view menu (for self-ordering)"""
+    async def render():
+        # Check if self-ordering is enabled
+        admin = await db.users.find_one({"id": org_id}, {"_id": 0, "business_settings": 1})
+        if not admin:
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+        
+        business = admin.get("business_settings", {})
+        if not business.get("customer_self_order_enabled"):
+            raise HTTPException(status_code=403, detail="Self-ordering not enabled")
+        
+        items, categories = await _load_public_menu_items(org_id)
+        return {
+            "restaurant_name": business.get("restaurant_name", "Restaurant"),
+            "currency": business.get("currency", "INR"),
+            "tax_rate": business.get("tax_rate", 5.0),
+            "categories": categories,
+            "items": items
+        }
     
-    return {
-        "restaurant_name": business.get("restaurant_name", "Restaurant"),
-        "currency": business.get("currency", "INR"),
-        "tax_rate": business.get("tax_rate", 5.0),
-        "categories": categories,
-        "items": items
-    }
+    # Rendered bytes cached per menu version; errors are never cached
+    return await serve_public_menu(request, org_id, "order", render)
 
 
 @app.get("/api/public/view-menu/{org_id}")
-async def get_view_only_menu(org_id: str):
+async def get_view_only_menu(org_id: str, request: Request):
     """Public endpoint for customers to VIEW menu only (no ordering) - QR code menu display"""
-    admin = await db.users.find_one({"id": org_id}, {"_id": 0})
-    if not admin:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    
-    business = admin.get("business_settings", {})
-    
-    # Check if menu display is enabled (either self-order OR view-only menu)
-    if not business.get("customer_self_order_enabled") and not business.get("menu_display_enabled"):
-        raise HTTPException(status_code=403, detail="Menu display not enabled for this restaurant")
-    
-    # Get available menu items
-    items = await db.menu_items.find(
-        {"organization_id": org_id, "available": True},
-        {"_id": 0, "organization_id": 0}
-    ).to_list(1000)
-    
-    # Group by category
-    categories = {}
-    for item in items:
-        cat = item.get("category", "Other")
-        if cat not in categories:
-            categories[cat] = []
-        categories[cat].append(item)
-    
-    # Get currency symbol
-    currency_symbols = {"INR": "₹", "USD": "$", "EUR": "€", "GBP": "£", "AED": "د.إ", "PKR": "₨"}
-    currency_code = business.get("currency", "INR")
-    currency_symbol = currency_symbols.get(currency_code, "₹")
+    async def render():
+        admin = await db.users.find_one({"id": org_id}, {"_id": 0, "business_settings": 1})
+        if not admin:
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+        
+        business = admin.get("business_settings", {})
+        
+        # Check if menu display is enabled (either self-order OR view-only menu)
+        if not business.get("customer_self_order_enabled") and not business.get("menu_display_enabled"):
+            raise HTTPException(status_code=403, detail="Menu display not enabled for this restaurant")
+        
+        items, categories = await _load_public_menu_items(org_id)
+        currency_code = business.get("currency", "INR")
+        return {
+            "restaurant_name": business.get("restaurant_name", "Restaurant"),
+            "tagline": business.get("tagline", ""),
+            "logo_url": business.get("logo_url", ""),
+            "currency": currency_code,
+            "currency_symbol": PUBLIC_CURRENCY_SYMBOLS.get(currency_code, "₹"),
+            "categories": categories,
+            "items": items,
+            "allow_ordering": business.get("customer_self_order_enabled", False)
+        }
     
-    return {
-        "restaurant_name": business.get("restaurant_name", "Restaurant"),
-        "tagline": business.get("tagline", ""),
-        "logo_url": business.get("logo_url", ""),
-        "currency": currency_code,
-        "currency_symbol": currency_symbol,
-        "categories": categories,
-        "items": items,
-        "allow_ordering": business.get("customer_self_order_enabled", False)
-    }
+    return await serve_public_menu(request, org_id, "view", render)
 
 
 @app.get("/r/{restaurant_slug}/menu")
-async def get_menu_by_slug(restaurant_slug: str):
+async def get_menu_by_slug(restaurant_slug: str, request: Request):
     """Cool URL endpoint for restaurant menu using custom slug"""
     
-    print(f"🔍 Looking for restaurant with slug: {restaurant_slug}")
-    
-    # Find restaurant by slug first
-    admin = await db.users.find_one({
-        "business_settings.restaurant_slug": restaurant_slug
-    }, {"_id": 0})
-    
-    if not admin:
-        print(f"❌ No restaurant found with slug: {restaurant_slug}")
-        # Fallback: try to find by restaurant name converted to slug
-        # Get all restaurants and check name-based slugs
-        all_restaurants = await db.users.find({
-            "business_settings.restaurant_name": {"$exists": True}
-        }, {"_id": 0, "id": 1, "business_settings.restaurant_name": 1}).to_list(None)
-        
-        print(f"🔍 Checking {len(all_restaurants)} restaurants for name-based slug match...")
-        
-        for restaurant in all_restaurants:
-            restaurant_name = restaurant.get("business_settings", {}).get("restaurant_name", "")
-            # Create slug from restaurant name
-            name_slug = restaurant_name.lower().replace(" ", "").replace("-", "").replace("_", "").replace("'", "").replace("&", "and")
-            print(f"  - {restaurant_name} -> {name_slug}")
-            if name_slug == restaurant_slug.lower().replace("-", "").replace("_", ""):
-                print(f"✅ Found match: {restaurant_name}")
-                # Found by name match, get full restaurant data
-                admin = await db.users.find_one({"id": restaurant["id"]}, {"_id": 0})
-                break
-    else:
-        print(f"✅ Found restaurant by slug: {admin.get('business_settings', {}).get('restaurant_name', 'Unknown')}")
-    
-    if not admin:
+    # Indexed slug -> org_id lookup (custom slug first, then restaurant-name slug)
+    org_id = await get_menu_slugs().resolve(restaurant_slug)
+    if not org_id:
         print(f"❌ Restaurant not found for slug: {restaurant_slug}")
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
-    business = admin.get("business_settings", {})
-    print(f"📋 Business settings: {business.keys()}")
-    
-    # Check if menu display is enabled (be more lenient)
-    menu_enabled = (
-        business.get("customer_self_order_enabled", False) or 
-        business.get("menu_display_enabled", False) or
-        business.get("qr_menu_enabled", True)  # Default to True for backward compatibility
-    )
-    
-    if not menu_enabled:
-        # For debugging, let's be more permissive and show menu anyway
-        print(f"⚠️ Menu display not explicitly enabled for {restaurant_slug}, but showing anyway")
-        # raise HTTPException(status_code=403, detail="Menu display not enabled for this restaurant")
-    
-    # Get available menu items
-    items = await db.menu_items.find(
-        {"organization_id": admin["id"], "available": True},
-        {"_id": 0, "organization_id": 0}
-    ).to_list(1000)
-    
-    # Group by category
-    categories = {}
-    for item in items:
-        cat = item.get("category", "Other")
-        if cat not in categories:
-            categories[cat] = []
-        categories[cat].append(item)
-    
-    # Get currency symbol
-    currency_symbols = {"INR": "₹", "USD": "$", "EUR": "€", "GBP": "£", "AED": "د.إ", "PKR": "₨"}
-    currency_code = business.get("currency", "INR")
-    currency_symbol = currency_symbols.get(currency_code, "₹")
+    async def render():
+        admin = await db.users.find_one({"id": org_id}, {"_id": 0, "id": 1, "business_settings": 1})
+        if not admin:
+            print(f"❌ Restaurant not found for slug: {restaurant_slug}")
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+        
+        business = admin.get("business_settings") or {}
+        
+        # Check if menu display is enabled (be more lenient)
+        menu_enabled = (
+            business.get("customer_self_order_enabled", False) or 
+            business.get("menu_display_enabled", False) or
+            business.get("qr_menu_enabled", True)  # Default to True for backward compatibility
+        )
+        
+        if not menu_enabled:
+            # For debugging, let's be more permissive and show menu anyway
+            print(f"⚠️ Menu display not explicitly enabled for {restaurant_slug}, but showing anyway")
+            # raise HTTPException(status_code=403, detail="Menu display not enabled for this restaurant")
+        
+        items, categories = await _load_public_menu_items(admin["id"])
+        currency_code = business.get("currency", "INR")
+        return {
+            "restaurant_name": business.get("restaurant_name", "Restaurant"),
+            "restaurant_slug": restaurant_slug,
+            "tagline": business.get("tagline", ""),
+            "logo_url": business.get("logo_url", ""),
+            "currency": currency_code,
+            "currency_symbol": PUBLIC_CURRENCY_SYMBOLS.get(currency_code, "₹"),
+            "categories": categories,
+            "items": items,
+            "allow_ordering": business.get("customer_self_order_enabled", False),
+            "cool_url": True
+        }
     
-    return {
-        "restaurant_name": business.get("restaurant_name", "Restaurant"),
-        "restaurant_slug": restaurant_slug,
-        "tagline": business.get("tagline", ""),
-        "logo_url": business.get("logo_url", ""),
-        "currency": currency_code,
-        "currency_symbol": currency_symbol,
-        "categories": categories,
-        "items": items,
-        "allow_ordering": business.get("customer_self_order_enabled", False),
-        "cool_url": True
-    }
+    # The payload echoes the slug as typed, so each spelling is its own variant
+    return await serve_public_menu(request, org_id, f"slug:{restaurant_slug}", render)
 
 
 @app.get("/api/public/tables/{org_id}")
@@ -11095,7 +10572,7 @@ async def create_customer_order(order_data: CustomerOrderCreate):
     total = subtotal + tax
     
     # Generate tracking token
-    tracking_token = await generate_short_tracking_token()
+    tracking_token = generate_short_tracking_token()
     
     order_obj = Order(
         table_id=order_data.table_id,
@@ -11117,7 +10594,7 @@ async def create_customer_order(order_data: CustomerOrderCreate):
     doc["created_at"] = doc["created_at"].isoformat()
     doc["updated_at"] = doc["updated_at"].isoformat()
     
-    await db.orders.insert_one(doc)
+    tracking_token = await insert_order_with_tracking_token(doc)
     await db.tables.update_one(
         {"id": order_data.table_id, "organization_id": order_data.org_id},
         {"$set": {"status": "occupied", "current_order_id": order_obj.id}},
@@ -11126,7 +10603,9 @@ async def create_customer_order(order_data: CustomerOrderCreate):
     # Invalidate Redis cache for active orders (CRITICAL for real-time updates)
     try:
         cached_service = get_cached_order_service()
-        await cached_service.invalidate_order_caches(order_data.org_id, order_obj.id)
+        await cached_service.invalidate_order_caches(
+            order_data.org_id, order_obj.id, "created", {k: v for k, v in doc.items() if k != "_id"}
+        )
         print(f"🗑️ Cache invalidated for new QR order {order_obj.id}")
     except Exception as e:
         print(f"⚠️ Cache invalidation error for QR order: {e}")
@@ -11609,6 +11088,44 @@ async def ai_support_chat(chat_request: AIChatRequest):
     }
 
 
+# Real-time order stream over WebSocket (frontend websocketManager connects to /ws?token=)
+@app.websocket("/ws")
+async def orders_websocket(websocket: WebSocket, token: Optional[str] = None, since: Optional[str] = None):
+    try:
+        user = await _authenticate_stream(token)
+        user_org_id = get_secure_org_id(user)
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
+    
+    await websocket.accept()
+    hub = get_order_event_hub()
+    queue = hub.subscribe(user_org_id, since)
+    
+    async def receive_loop():
+        while True:
+            message = await websocket.receive_json()
+            if isinstance(message, dict) and message.get("type") == "ping":
+                await websocket.send_json({"type": "pong"})
+    
+    receiver = asyncio.create_task(receive_loop())
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            await websocket.send_text(json.dumps(to_client_message(getter.result()), default=str))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        if receiver.done() and not receiver.cancelled():
+            receiver.exception()  # client went away; mark the disconnect as handled
+        receiver.cancel()
+        hub.unsubscribe(user_org_id, queue)
+
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -11634,12 +11151,27 @@ async def health_check():
     if queue_middleware:
         queue_metrics = queue_middleware.get_metrics()
 
+    side_effects = get_order_side_effects()
+    side_effect_metrics = side_effects.get_stats() if side_effects else {}
+
     return {
         "status": "ok",
         "worker_pid": os.getpid(),
         "timestamp": time.time(),
         "database": pool_health.get("status", "unknown"),
         "queue": queue_metrics,
+        "side_effects": side_effect_metrics,
+        "cache": get_tiered_cache().get_stats(),
+        "order_stream": get_order_event_hub().get_stats(),
+        "public_menu": get_public_menu_stats(),
+        "password_hasher": get_password_hasher().get_stats(),
+        "document_renderer": get_document_renderer().get_stats() if get_document_renderer() else {},
+        "receipt_artifacts": get_receipt_artifacts().get_stats(),
+        "http_clients": get_http_clients().get_stats(),
+        "whatsapp_outbox": get_whatsapp_outbox().get_stats() if get_whatsapp_outbox() else {},
+        "whatsapp_status": get_status_store().get_stats(),
+        "fcm": get_fcm_sender_stats() if FCM_AVAILABLE else {},
+        "push_broadcast": get_push_broadcast_jobs().get_stats() if get_push_broadcast_jobs() else {},
     }
 
 
@@ -11789,6 +11321,15 @@ async def startup_validation():
 
     print("🍽️  Starting BillByteKOT Server...")
 
+    # Fork the document render workers first, before DB/Redis threads exist
+    try:
+        await init_document_renderer().start()
+    except Exception as e:
+        print(f"⚠️ Document renderer initialization failed: {e}")
+
+    # Pooled outbound clients for WhatsApp / FCM / SMS / Resend
+    init_http_clients().start()
+
     # Check required environment variables
     required_vars = {
         "MONGO_URL": mongo_url,
@@ -11875,6 +11416,16 @@ async def startup_validation():
                 }}]
             )
             
+            # Public menu slugs (unique custom slug + restaurant-name fallback)
+            try:
+                # Existing QR links must resolve right after deploy: derive missing/outdated slugs first
+                backfilled = await backfill_slug_fields(db)
+                if backfilled["updated"]:
+                    print(f"✅ Menu slugs backfilled for {backfilled['updated']} restaurants")
+                await ensure_slug_indexes(db)
+            except Exception as slug_index_error:
+                print(f"⚠️  Menu slug indexes skipped (run migrations/add_restaurant_slug_index.py): {slug_index_error}")
+            
             # Menu items indexes
             await db.menu_items.create_index("organization_id")
             await db.menu_items.create_index([("organization_id", 1), ("category", 1)])
@@ -11892,10 +11443,14 @@ async def startup_validation():
             await db.orders.create_index([("organization_id", 1), ("table_id", 1), ("waiter_id", 1), ("created_at", -1)])
             # Idempotency key index for dedup
             await db.orders.create_index("idempotency_key", sparse=True)
+            # Public tracking/receipt lookups + token uniqueness (replaces per-order collision reads)
+            await ensure_tracking_token_index()
             
             # Compound indexes for reports queries
             await db.orders.create_index([("organization_id", 1), ("created_at", -1), ("total", 1)])
             await db.orders.create_index([("organization_id", 1), ("items.name", 1), ("items.quantity", 1)])
+            # Delta sync (GET /orders?since=) + deleted-order tombstones
+            await ensure_delta_indexes(db)
             
             # Tables indexes
             await db.tables.create_index("organization_id")
@@ -12036,6 +11591,8 @@ async def startup_validation():
         
         # Set Redis cache for super admin after initialization
         from redis_cache import redis_cache
+        await init_tiered_cache(redis_cache)
+        await init_order_event_hub(redis_cache)
         set_super_admin_cache(redis_cache)
         set_ops_cache(redis_cache)
         print("✅ Super admin Redis cache configured")
@@ -12069,13 +11626,93 @@ async def startup_validation():
     # Initialize distributed cache (Redis-backed with in-memory fallback)
     try:
         from utils.cache import init_cache
-        from config.settings import settings
         await init_cache(redis_url=settings.redis_url)
         print("✅ Distributed cache initialized")
     except Exception as e:
         print(f"⚠️ Distributed cache initialization failed: {e}")
         print("📝 Continuing without distributed cache")
     
+    # Initialize sales rollups (pre-aggregated report data)
+    try:
+        rollup_service = init_sales_rollup_service(db, init_org_catalog_cache(db))
+        await rollup_service.ensure_indexes()
+        print("✅ Sales rollup service initialized")
+    except Exception as e:
+        print(f"⚠️ Sales rollup initialization failed: {e}")
+    
+    # Initialize Day Book snapshots (closed-day cash flow) + daily close job
+    try:
+        daybook_service = init_daybook_snapshot_service(db)
+        await daybook_service.ensure_indexes()
+        daybook_service.start_close_job()
+        print("✅ Day Book snapshot service initialized")
+    except Exception as e:
+        print(f"⚠️ Day Book snapshot initialization failed: {e}")
+    
+    # Initialize the customer ledger (running per-customer balances)
+    try:
+        await init_customer_ledger_service(db).ensure_indexes()
+        print("✅ Customer ledger service initialized")
+    except Exception as e:
+        print(f"⚠️ Customer ledger initialization failed: {e}")
+    
+    # Rendered receipt artifacts (shared L2 collection with TTL expiry)
+    try:
+        await init_receipt_artifact_cache(db).ensure_indexes()
+        print("✅ Receipt artifact cache initialized")
+    except Exception as e:
+        print(f"⚠️ Receipt artifact cache initialization failed: {e}")
+    
+    # Start the order side-effects pipeline (bounded queue + coalesced bulk writes)
+    try:
+        side_effects = init_order_side_effects(
+            db,
+            workers=settings.side_effect_workers,
+            max_queue=settings.side_effect_queue_max_size,
+            flush_interval=settings.side_effect_flush_ms / 1000,
+        )
+        await side_effects.start()
+    except Exception as e:
+        print(f"⚠️ Side-effects pipeline start failed: {e}")
+    
+    # Initialize order export jobs (background XLSX exports)
+    try:
+        await init_order_export_jobs(db).ensure_indexes()
+        print("✅ Order export jobs initialized")
+    except Exception as e:
+        print(f"⚠️ Order export jobs initialization failed: {e}")
+    
+    # Web Push broadcasts (/push/send background fan-out)
+    try:
+        await init_push_broadcast_jobs(db).ensure_indexes()
+        print("✅ Push broadcast jobs initialized")
+    except Exception as e:
+        print(f"⚠️ Push broadcast jobs initialization failed: {e}")
+    
+    # WhatsApp outbox (durable status messages) + this worker's dispatcher
+    try:
+        outbox = init_whatsapp_outbox(db, _send_outbox_message, _classify_outbox_error, _on_outbox_sent)
+        await outbox.ensure_indexes()
+        outbox.start()
+        print(f"✅ WhatsApp outbox dispatcher started ({outbox.rate_per_second:g} msg/s per number)")
+    except Exception as e:
+        print(f"⚠️ WhatsApp outbox initialization failed: {e}")
+    
+    # FCM token lookups (registration upserts, UNREGISTERED pruning)
+    try:
+        await db.fcm_tokens.create_index("token")
+    except Exception as e:
+        print(f"⚠️ FCM token index creation failed: {e}")
+    
+    # WhatsApp delivery statuses (batched webhook ingestion)
+    try:
+        status_store = init_whatsapp_status_store(db)
+        await status_store.ensure_indexes()
+        status_store.start()
+        print("✅ WhatsApp status store initialized")
+    except Exception as e:
+        print(f"⚠️ WhatsApp status store initialization failed: {e}")
+    
     # Start background cache cleanup task
     asyncio.create_task(periodic_cache_cleanup())
     print("✅ Background cache cleanup task started")
@@ -13153,6 +12790,8 @@ async def bulk_upload_menu(
                 errors.append(f"Row {row_num}: {str(e)}")
         
         # 🔥 CRITICAL: Invalidate Redis cache after bulk upload
+        await get_org_catalog().invalidate(user_org_id)
+        await invalidate_public_menu(user_org_id)
         try:
             cached_service = get_cached_order_service()
             await cached_service.invalidate_menu_caches(user_org_id)
@@ -13282,148 +12921,77 @@ async def export_orders_to_excel(
     end_date: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Export all orders to Excel file with sequential invoice numbers"""
+    """Export all orders as CSV with sequential invoice numbers (streamed, no row cap)"""
     user_org_id = get_secure_org_id(current_user)
+    query = build_export_query(user_org_id, start_date, end_date)
     
-    # Build query
-    query = {"organization_id": user_org_id}
-    
-    # Add date filters if provided
-    if start_date or end_date:
-        query["created_at"] = {}
-        if start_date:
-            query["created_at"]["$gte"] = start_date
-        if end_date:
-            query["created_at"]["$lte"] = end_date
-    
-    # Fetch orders sorted by creation date (newest first)
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(length=10000)
-    
-    if not orders:
+    # Cheap existence check so an empty range still returns 404 before streaming starts
+    if not await db.orders.find_one(query, {"_id": 0, "id": 1}):
         raise HTTPException(status_code=404, detail="No orders found")
     
-    # Create CSV content with improved formatting
-    csv_content = (
-        "Invoice #,Order ID,Date,Time,Table,Customer Name,Phone,Waiter,"
-        "Item Name,Quantity,Unit Price,Item Total,Subtotal,Tax,Discount,Total,Payment Method,Status\n"
-    )
-    
-    for order in orders:
-        order_id = order.get("id", "")[:8]
-        invoice_number = order.get("invoice_number", "")
-        created_at = order.get("created_at", "")
-        
-        # Parse date and time
-        try:
-            dt = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-            date_str = dt.strftime("%Y-%m-%d")
-            time_str = dt.strftime("%H:%M:%S")
-        except:
-            date_str = created_at
-            time_str = ""
-        
-        table_number = order.get("table_number", "")
-        customer_name = order.get("customer_name", "")
-        customer_phone = order.get("customer_phone", "")
-        waiter_name = order.get("waiter_name", "")
-        
-        # Get order totals
-        subtotal = order.get("subtotal", 0)
-        tax = order.get("tax", 0)
-        discount = order.get("discount", 0)
-        total = order.get("total", 0)
-        payment_method = order.get("payment_method", "")
-        status = order.get("status", "")
-        
-        # Format items with each item on a new line
-        items = order.get("items", [])
-        first_item = True
-        
-        for item in items:
-            item_name = item.get('name', '').replace('"', '""')
-            quantity = item.get('quantity', 0)
-            price = item.get('price', 0)
-            item_total = quantity * price
-            
-            if first_item:
-                # First item includes order details
-                csv_content += (
-                    f'"{invoice_number}",'  # Invoice #
-                    f'"{order_id}",'        # Order ID
-                    f'"{date_str}",'        # Date
-                    f'"{time_str}",'        # Time
-                    f'"{table_number}",'     # Table
-                    f'"{customer_name}",'    # Customer Name
-                    f'"{customer_phone}",'   # Phone
-                    f'"{waiter_name}",'      # Waiter
-                    f'"{item_name}",'        # Item Name
-                    f'{quantity},'           # Quantity
-                    f'{price:.2f},'          # Unit Price
-                    f'{item_total:.2f},'     # Item Total
-                    f'"",'                   # Empty for subtotal
-                    f'"",'                   # Empty for tax
-                    f'"",'                   # Empty for discount
-                    f'"",'                   # Empty for total
-                    f'"",'                   # Empty for payment method
-                    f'""\n'                  # Empty for status
-                )
-                first_item = False
-            else:
-                # Subsequent items only show item details
-                csv_content += (
-                    f'"",'                   # Empty invoice #
-                    f'"",'                   # Empty order ID
-                    f'"",'                   # Empty date
-                    f'"",'                   # Empty time
-                    f'"",'                   # Empty table
-                    f'"",'                   # Empty customer name
-                    f'"",'                   # Empty phone
-                    f'"",'                   # Empty waiter
-                    f'"{item_name}",'        # Item Name
-                    f'{quantity},'           # Quantity
-                    f'{price:.2f},'          # Unit Price
-                    f'{item_total:.2f},'     # Item Total
-                    f'"",'                   # Empty for subtotal
-                    f'"",'                   # Empty for tax
-                    f'"",'                   # Empty for discount
-                    f'"",'                   # Empty for total
-                    f'"",'                   # Empty for payment method
-                    f'""\n'                  # Empty for status
-                )
-        
-        # Add order totals on a new line
-        if items:  # Only add if there are items
-            csv_content += (
-                f'"",'                   # Empty invoice #
-                f'"",'                   # Empty order ID
-                f'"",'                   # Empty date
-                f'"",'                   # Empty time
-                f'"",'                   # Empty table
-                f'"",'                   # Empty customer name
-                f'"",'                   # Empty phone
-                f'"",'                   # Empty waiter
-                f'"",'                   # Empty item name
-                f'"",'                   # Empty quantity
-                f'"",'                   # Empty unit price
-                f'"",'                   # Empty item total
-                f'{subtotal:.2f},'       # Subtotal
-                f'{tax:.2f},'            # Tax
-                f'{discount:.2f},'       # Discount
-                f'{total:.2f},'          # Total
-                f'"{payment_method}",'   # Payment Method
-                f'"{status}"\n'         # Status
-            )
-        
-        # Add an empty line between orders for better readability
-        csv_content += '"","","","","","","","","","","","","","","","","",""\n'
-    # Return as downloadable file
-    return Response(
-        content=csv_content,
+    # Rows are produced from the cursor one batch at a time - constant memory for any range
+    return StreamingResponse(
+        stream_orders_csv(db, query),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename=invoices_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
     )
 
 
+def get_export_jobs():
+    """Export job manager bound to the active database connection"""
+    jobs = get_order_export_jobs()
+    if jobs is None or jobs.db is not db:
+        jobs = init_order_export_jobs(db)
+    return jobs
+
+
+@api_router.post("/orders/export/jobs")
+async def start_orders_export_job(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Start a background XLSX export; poll the job and download when completed"""
+    user_org_id = get_secure_org_id(current_user)
+    query = build_export_query(user_org_id, start_date, end_date)
+    
+    if not await db.orders.find_one(query, {"_id": 0, "id": 1}):
+        raise HTTPException(status_code=404, detail="No orders found")
+    
+    job = await get_export_jobs().start(user_org_id, query)
+    return {"job_id": job["id"], "status": job["status"]}
+
+
+@api_router.get("/orders/export/jobs/{job_id}")
+async def get_orders_export_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Get export job progress"""
+    user_org_id = get_secure_org_id(current_user)
+    job = await get_export_jobs().get(job_id, user_org_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    job.pop("file_path", None)
+    return job
+
+
+@api_router.get("/orders/export/jobs/{job_id}/download")
+async def download_orders_export_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Download a completed export job file"""
+    user_org_id = get_secure_org_id(current_user)
+    job = await get_export_jobs().get(job_id, user_org_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job.get("status") != "completed":
+        raise HTTPException(status_code=409, detail=f"Export job is {job.get('status')}")
+    if not job.get("file_path") or not os.path.exists(job["file_path"]):
+        raise HTTPException(status_code=410, detail="Export file has expired")
+    
+    media_type = (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        if job.get("format") == "xlsx" else "text/csv"
+    )
+    return FileResponse(job["file_path"], media_type=media_type, filename=job.get("file_name"))
+
+
 # Customer Management Models
 class Customer(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -13535,32 +13103,19 @@ async def get_customer(
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    # Get customer's orders
+    # Get customer's recent orders (history list only - totals come from the ledger)
     orders = await db.orders.find({
         "customer_phone": customer["phone"],
         "organization_id": user_org_id
     }, {"_id": 0}).sort("created_at", -1).to_list(length=100)
     
-    # Calculate stats
-    total_orders = len(orders)
-    total_spent = sum(order.get("total", 0) for order in orders)
-    last_visit = orders[0].get("created_at") if orders else None
+    ledger = await get_customer_ledger().get_customer(user_org_id, customer["phone"]) or {}
     
-    # Update customer stats
-    await db.customers.update_one(
-        {"id": customer_id},
-        {
-            "$set": {
-                "total_orders": total_orders,
-                "total_spent": total_spent,
-                "last_visit": last_visit
-            }
-        }
-    )
-    
-    customer["total_orders"] = total_orders
-    customer["total_spent"] = total_spent
-    customer["last_visit"] = last_visit
+    customer["total_orders"] = ledger.get("total_orders", 0)
+    customer["total_spent"] = round(ledger.get("total_amount_ordered", 0), 2)
+    customer["total_paid"] = round(ledger.get("total_paid", 0), 2)
+    customer["balance_amount"] = round(ledger.get("balance_amount", 0), 2)
+    customer["last_visit"] = ledger.get("last_order_date") or (orders[0].get("created_at") if orders else None)
     customer["orders"] = orders
     
     return customer
@@ -14609,6 +14164,11 @@ async def delete_user_admin(user_id: str, username: str, password: str):
     await db.tables.delete_many({"organization_id": user_id})
     await db.payments.delete_many({"organization_id": user_id})
     await db.inventory.delete_many({"organization_id": user_id})
+    await get_sales_rollups().reset_organization(user_id)
+    await get_customer_ledger().reset_organization(user_id)
+    await get_org_catalog().invalidate(user_id)
+    await invalidate_public_menu(user_id)
+    await invalidate_org_caches(user_id)
     
     return {"message": "User and all data deleted successfully", "user_id": user_id}
 
@@ -14702,258 +14262,6 @@ def serialize_for_sqlite(obj):
     return obj
 
 
-def create_sqlite_backup(user_data: dict, staff: list, orders: list, menu_items: list, 
-                         tables: list, inventory: list, payments: list) -> bytes:
-    """Create SQLite database backup file"""
-    # Create in-memory database
-    conn = sqlite3.connect(':memory:')
-    cursor = conn.cursor()
-    
-    # Create tables
-    cursor.execute('''
-        CREATE TABLE users (
-            id TEXT PRIMARY KEY,
-            username TEXT,
-            email TEXT,
-            role TEXT,
-            phone TEXT,
-            organization_id TEXT,
-            subscription_active INTEGER,
-            subscription_expires_at TEXT,
-            trial_extension_days INTEGER,
-            bill_count INTEGER,
-            setup_completed INTEGER,
-            onboarding_completed INTEGER,
-            business_settings TEXT,
-            created_at TEXT,
-            updated_at TEXT
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE orders (
-            id TEXT PRIMARY KEY,
-            invoice_number INTEGER,
-            table_id TEXT,
-            table_number INTEGER,
-            items TEXT,
-            subtotal REAL,
-            tax REAL,
-            discount REAL,
-            total REAL,
-            status TEXT,
-            waiter_id TEXT,
-            waiter_name TEXT,
-            customer_name TEXT,
-            customer_phone TEXT,
-            order_type TEXT,
-            organization_id TEXT,
-            payment_method TEXT,
-            is_credit INTEGER,
-            payment_received REAL,
-            balance_amount REAL,
-            cash_amount REAL,
-            card_amount REAL,
-            upi_amount REAL,
-            credit_amount REAL,
-            created_at TEXT,
-            updated_at TEXT
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE menu_items (
-            id TEXT PRIMARY KEY,
-            name TEXT,
-            category TEXT,
-            price REAL,
-            description TEXT,
-            image_url TEXT,
-            available INTEGER,
-            ingredients TEXT,
-            preparation_time INTEGER,
-            organization_id TEXT,
-            created_at TEXT
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE tables (
-            id TEXT PRIMARY KEY,
-            table_number INTEGER,
-            capacity INTEGER,
-            status TEXT,
-            current_order_id TEXT,
-            organization_id TEXT,
-            created_at TEXT
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE inventory (
-            id TEXT PRIMARY KEY,
-            name TEXT,
-            category TEXT,
-            quantity REAL,
-            unit TEXT,
-            min_stock REAL,
-            cost_per_unit REAL,
-            supplier TEXT,
-            organization_id TEXT,
-            created_at TEXT,
-            updated_at TEXT
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE payments (
-            id TEXT PRIMARY KEY,
-            order_id TEXT,
-            amount REAL,
-            payment_method TEXT,
-            razorpay_order_id TEXT,
-            razorpay_payment_id TEXT,
-            status TEXT,
-            organization_id TEXT,
-            created_at TEXT
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE backup_info (
-            id INTEGER PRIMARY KEY,
-            user_id TEXT,
-            username TEXT,
-            exported_at TEXT,
-            version TEXT
-        )
-    ''')
-    
-    # Insert user data
-    cursor.execute('''
-        INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        user_data.get('id'), user_data.get('username'), user_data.get('email'),
-        user_data.get('role'), user_data.get('phone'), user_data.get('organization_id'),
-        1 if user_data.get('subscription_active') else 0,
-        user_data.get('subscription_expires_at'),
-        user_data.get('trial_extension_days', 0),
-        user_data.get('bill_count', 0),
-        1 if user_data.get('setup_completed') else 0,
-        1 if user_data.get('onboarding_completed') else 0,
-        json.dumps(user_data.get('business_settings', {})),
-        str(user_data.get('created_at', '')),
-        str(user_data.get('updated_at', ''))
-    ))
-    
-    # Insert staff
-    for s in staff:
-        cursor.execute('''
-            INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            s.get('id'), s.get('username'), s.get('email'),
-            s.get('role'), s.get('phone'), s.get('organization_id'),
-            1 if s.get('subscription_active') else 0,
-            s.get('subscription_expires_at'),
-            s.get('trial_extension_days', 0),
-            s.get('bill_count', 0),
-            1 if s.get('setup_completed') else 0,
-            1 if s.get('onboarding_completed') else 0,
-            json.dumps(s.get('business_settings', {})),
-            str(s.get('created_at', '')),
-            str(s.get('updated_at', ''))
-        ))
-    
-    # Insert orders
-    for o in orders:
-        cursor.execute('''
-            INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            o.get('id'), o.get('invoice_number'), o.get('table_id'), o.get('table_number'),
-            json.dumps(o.get('items', [])), o.get('subtotal', 0), o.get('tax', 0),
-            o.get('discount', 0), o.get('total', 0), o.get('status'),
-            o.get('waiter_id'), o.get('waiter_name'), o.get('customer_name'),
-            o.get('customer_phone'), o.get('order_type'), o.get('organization_id'),
-            o.get('payment_method'), 1 if o.get('is_credit') else 0,
-            o.get('payment_received', 0), o.get('balance_amount', 0),
-            o.get('cash_amount', 0), o.get('card_amount', 0),
-            o.get('upi_amount', 0), o.get('credit_amount', 0),
-            str(o.get('created_at', '')), str(o.get('updated_at', ''))
-        ))
-    
-    # Insert menu items
-    for m in menu_items:
-        cursor.execute('''
-            INSERT INTO menu_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            m.get('id'), m.get('name'), m.get('category'), m.get('price'),
-            m.get('description'), m.get('image_url'),
-            1 if m.get('available', True) else 0,
-            json.dumps(m.get('ingredients', [])), m.get('preparation_time'),
-            m.get('organization_id'), str(m.get('created_at', ''))
-        ))
-    
-    # Insert tables
-    for t in tables:
-        cursor.execute('''
-            INSERT INTO tables VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            t.get('id'), t.get('table_number'), t.get('capacity'),
-            t.get('status'), t.get('current_order_id'),
-            t.get('organization_id'), str(t.get('created_at', ''))
-        ))
-    
-    # Insert inventory
-    for i in inventory:
-        cursor.execute('''
-            INSERT INTO inventory VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            i.get('id'), i.get('name'), i.get('category'), i.get('quantity'),
-            i.get('unit'), i.get('min_stock'), i.get('cost_per_unit'),
-            i.get('supplier'), i.get('organization_id'),
-            str(i.get('created_at', '')), str(i.get('updated_at', ''))
-        ))
-    
-    # Insert payments
-    for p in payments:
-        cursor.execute('''
-            INSERT INTO payments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            p.get('id'), p.get('order_id'), p.get('amount'),
-            p.get('payment_method'), p.get('razorpay_order_id'),
-            p.get('razorpay_payment_id'), p.get('status'),
-            p.get('organization_id'), str(p.get('created_at', ''))
-        ))
-    
-    # Insert backup info
-    cursor.execute('''
-        INSERT INTO backup_info VALUES (?, ?, ?, ?, ?)
-    ''', (
-        1, user_data.get('id'), user_data.get('username'),
-        datetime.now(timezone.utc).isoformat(), '1.0'
-    ))
-    
-    conn.commit()
-    
-    # Export to bytes
-    buffer = io.BytesIO()
-    for line in conn.iterdump():
-        buffer.write(f'{line}\n'.encode('utf-8'))
-    
-    # Also create actual binary SQLite file
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
-    temp_conn = sqlite3.connect(temp_file.name)
-    conn.backup(temp_conn)
-    temp_conn.close()
-    conn.close()
-    
-    with open(temp_file.name, 'rb') as f:
-        db_bytes = f.read()
-    
-    os.unlink(temp_file.name)
-    return db_bytes
-
-
 @api_router.get("/super-admin/users/{user_id}/export-db")
 async def export_user_database(user_id: str, username: str, password: str):
     """Export user data as SQLite database file - Site Owner Only"""
@@ -14973,8 +14281,15 @@ async def export_user_database(user_id: str, username: str, password: str):
     inventory = await db.inventory.find({"organization_id": user_id}, {"_id": 0}).to_list(1000)
     payments = await db.payments.find({"organization_id": user_id}, {"_id": 0}).to_list(50000)
     
-    # Create SQLite backup
-    db_bytes = create_sqlite_backup(user, staff, orders, menu_items, tables, inventory, payments)
+    # Create SQLite backup (on the document pool; never cached - it embeds the export time)
+    try:
+        db_bytes = await get_document_renderer().render(
+            "sqlite_backup", user_id, user, staff, orders, menu_items, tables, inventory, payments, cache=False
+        )
+    except DocumentRenderTimeout:
+        raise HTTPException(status_code=503, detail="Backup generation timed out, please retry")
+    except DocumentRenderUnavailable:
+        raise HTTPException(status_code=503, detail="Backup generation is temporarily unavailable, please retry")
     
     filename = f"{user.get('username', 'user')}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
     
@@ -15141,6 +14456,15 @@ async def import_user_database(
         
         conn.close()
         
+        # Imported orders bypass the order endpoints - rebuild rollups on next report
+        await get_org_catalog().invalidate(user_id)
+        await invalidate_public_menu(user_id)
+        await get_sales_rollups().reset_organization(user_id)
+        await get_daybook_snapshots().reset_organization(user_id)
+        await get_customer_ledger().reset_organization(user_id)
+        await get_tiered_cache().invalidate(DASHBOARD_HISTORY_NAMESPACE, user_id)
+        await invalidate_org_caches(user_id)
+        
         return {
             "message": "Database imported successfully",
             "user_id": user_id,
@@ -15582,7 +14906,7 @@ async def create_team_member(
         "username_lower": member.username.lower(),
         "email": member.email,
         "email_lower": member.email.lower(),
-        "password": hash_password(member.password),
+        "password": await hash_password(member.password),
         "role": member.role,
         "permissions": member.permissions,
         "full_name": member.full_name,
@@ -15681,7 +15005,7 @@ async def team_login(credentials: TeamLogin):
             "username": {"$regex": f"^{credentials.username}$", "$options": "i"}
         })
     
-    if not member or not verify_password(credentials.password, member["password"]):
+    if not member or not await verify_password(credentials.password, member["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     if not member.get("active", True):
@@ -16207,7 +15531,8 @@ try:
         is_firebase_configured, 
         send_fcm_notification, 
         send_fcm_to_topic,
-        send_fcm_to_multiple
+        send_fcm_to_multiple,
+        get_fcm_sender_stats
     )
     FCM_AVAILABLE = True
 except ImportError:
@@ -16316,6 +15641,18 @@ async def get_fcm_stats(username: str, password: str):
         "firebase_configured": FCM_AVAILABLE and is_firebase_configured() if FCM_AVAILABLE else False
     }
 
+async def prune_fcm_tokens(tokens: List[str]):
+    """Deactivate tokens FCM reported as UNREGISTERED (one write per batch)"""
+    await db.fcm_tokens.update_many(
+        {"token": {"$in": tokens}},
+        {"$set": {
+            "active": False,
+            "unregistered_at": datetime.now(timezone.utc).isoformat(),
+            "unregister_reason": "UNREGISTERED"
+        }}
+    )
+
+
 @api_router.post("/fcm/send")
 async def send_fcm_push(
     notification: PushNotificationSend,
@@ -16364,13 +15701,13 @@ async def send_fcm_push(
         }
     
     # Get all active FCM tokens
-    tokens_cursor = db.fcm_tokens.find({"active": True})
+    tokens_cursor = db.fcm_tokens.find({"active": True}, {"_id": 0, "token": 1})
     tokens = await tokens_cursor.to_list(10000)
     
     if not tokens:
         return {"success": False, "message": "No registered devices", "sent_count": 0}
     
-    # Send to all devices
+    # Send to all devices (bounded fan-out, dead tokens pruned per batch)
     token_list = [t["token"] for t in tokens]
     
     result = await send_fcm_to_multiple(
@@ -16382,7 +15719,8 @@ async def send_fcm_push(
             "type": notification.type,
             "url": notification.url or "/",
             "click_action": notification.url or "https://billbytekot.in"
-        }
+        },
+        on_unregistered=prune_fcm_tokens
     )
     
     # Store notification record
@@ -16395,6 +15733,8 @@ async def send_fcm_push(
         "created_at": datetime.now(timezone.utc).isoformat(),
         "sent_count": result.get("success", 0),
         "failed_count": result.get("failed", 0),
+        "unregistered_count": result.get("unregistered", 0),
+        "batches": result.get("batches", []),
         "status": "sent"
     }
     await db.sent_push_notifications.insert_one(notif_doc)
@@ -16404,6 +15744,8 @@ async def send_fcm_push(
         "message": f"Push notification sent to {result.get('success', 0)} devices",
         "sent_count": result.get("success", 0),
         "failed_count": result.get("failed", 0),
+        "unregistered_count": result.get("unregistered", 0),
+        "batches": result.get("batches", []),
         "total_devices": len(tokens)
     }
 
@@ -16526,6 +15868,13 @@ async def get_push_stats(username: str, password: str):
         "recent_subscriptions": recent
     }
 
+def get_push_broadcaster():
+    """Web Push broadcaster bound to the active database connection"""
+    jobs = get_push_broadcast_jobs()
+    if jobs is None or jobs.db is not db:
+        jobs = init_push_broadcast_jobs(db)
+    return jobs
+
 @api_router.post("/push/send")
 async def send_push_notification(
     notification: PushNotificationSend,
@@ -16569,7 +15918,7 @@ async def send_push_notification(
         
         # Import pywebpush
         try:
-            from pywebpush import webpush, WebPushException
+            import pywebpush  # noqa: F401
         except ImportError:
             # Store notification for in-app display
             notif_doc = {
@@ -16592,10 +15941,7 @@ async def send_push_notification(
                 "sent_count": 0
             }
         
-        # Get active subscriptions
-        subscriptions = await db.push_subscriptions.find({"active": True}).to_list(10000)
-        
-        if not subscriptions:
+        if not await db.push_subscriptions.find_one({"active": True}, {"_id": 1}):
             return {"success": False, "message": "No active subscribers", "sent_count": 0}
         
         # Prepare notification payload
@@ -16616,58 +15962,38 @@ async def send_push_notification(
             "sub": vapid_email
         }
         
-        sent_count = 0
-        failed_count = 0
-        failed_endpoints = []
-        
-        for sub in subscriptions:
-            try:
-                subscription_info = sub.get("subscription", {})
-                webpush(
-                    subscription_info=subscription_info,
-                    data=payload,
-                    vapid_private_key=vapid_private_key,
-                    vapid_claims=vapid_claims
-                )
-                sent_count += 1
-            except WebPushException as e:
-                failed_count += 1
-                # If subscription is invalid, mark as inactive
-                if e.response and e.response.status_code in [404, 410]:
-                    await db.push_subscriptions.update_one(
-                        {"endpoint": sub.get("endpoint")},
-                        {"$set": {"active": False, "error": str(e)}}
-                    )
-                    failed_endpoints.append(sub.get("endpoint"))
-            except Exception as e:
-                failed_count += 1
-        
-        # Store notification record
-        notif_doc = {
+        # Fan-out runs in the background; progress lands on the sent_notifications record
+        job = await get_push_broadcaster().start({
             "title": notification.title,
             "body": notification.body,
             "type": notification.type,
             "url": notification.url,
             "priority": notification.priority,
             "target": notification.target,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "sent_count": sent_count,
-            "failed_count": failed_count,
-            "status": "sent"
-        }
-        await db.sent_notifications.insert_one(notif_doc)
+        }, payload, vapid_private_key, vapid_claims)
         
         return {
             "success": True,
-            "message": f"Notification sent to {sent_count} devices",
-            "sent_count": sent_count,
-            "failed_count": failed_count,
-            "total_subscribers": len(subscriptions)
+            "message": f"Sending notification to {job['total_subscribers']} devices",
+            "job_id": job["id"],
+            "status": job["status"],
+            "total_subscribers": job["total_subscribers"]
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/push/send/{job_id}")
+async def get_push_send_job(job_id: str, username: str, password: str):
+    """Progress of a push broadcast - Super Admin Only"""
+    if not verify_super_admin(username, password):
+        raise HTTPException(status_code=403, detail="Invalid credentials")
+    
+    job = await get_push_broadcaster().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Push notification job not found")
+    return job
+
 @api_router.get("/push/history")
 async def get_push_history(username: str, password: str, limit: int = 50):
     """Get push notification history - Super Admin Only"""
@@ -17125,12 +16451,55 @@ app.include_router(api_router)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    # Cleanup Redis cache
+    # Drain queued order side-effects and flush coalesced writes before the client closes
+    side_effects = get_order_side_effects()
+    if side_effects:
+        try:
+            await side_effects.drain()
+        except Exception as e:
+            print(f"⚠️ Side-effects drain error: {e}")
+    
+    # Hand unused leased invoice numbers back to the counter
+    allocator = get_invoice_allocator()
+    if allocator:
+        await allocator.release()
+    
+    daybook_service = get_daybook_snapshot_service()
+    if daybook_service:
+        await daybook_service.stop_close_job()
+    
+    get_password_hasher().shutdown()
+    renderer = get_document_renderer()
+    if renderer:
+        renderer.shutdown()
+    
+    # Outbox sends in flight finish (or are re-sent by another worker after their lease)
+    outbox = get_whatsapp_outbox()
+    if outbox:
+        await outbox.stop()
+    status_store = get_whatsapp_status_store()
+    if status_store:
+        await status_store.stop()
+    
+    # After the side-effects drain, so queued notifications could still send
+    await get_http_clients().close()
+    
+    # Cleanup Redis cache (stop the tiered cache invalidation listener first)
     try:
+        await get_tiered_cache().close()
+        await get_order_event_hub().close()
         await cleanup_redis_cache()
     except Exception as e:
         print(f"⚠️ Redis cleanup error: {e}")
     
+    # Cancel in-flight export jobs (their temp files are purged by expiry)
+    export_jobs = get_order_export_jobs()
+    if export_jobs:
+        await export_jobs.shutdown()
+    push_jobs = get_push_broadcast_jobs()
+    if push_jobs:
+        await push_jobs.shutdown()
+    
     # Close MongoDB client
     client.close()
     print("🔌 Database connections closed")
@@ -5,6 +5,7 @@ Supports multiple SMS gateways: Twilio, MSG91, Fast2SMS, TextLocal
 
 import os
 import httpx
+from http_clients import http_client
 from typing import Optional
 
 # SMS Gateway Configuration
@@ -71,7 +72,7 @@ async def send_via_twilio(phone: str, message: str) -> dict:
     if not verify_sid:
         raise ValueError("TWILIO_VERIFY_SERVICE_SID not configured")
     
-    async with httpx.AsyncClient() as client:
+    async with http_client("sms") as client:
         url = f"https://verify.twilio.com/v2/Services/{verify_sid}/Verifications"
         
         auth = httpx.BasicAuth(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
@@ -102,7 +103,7 @@ async def send_via_msg91(phone: str, otp: str) -> dict:
     # Remove + from phone number for MSG91
     phone_clean = phone.replace("+", "").replace(" ", "")
     
-    async with httpx.AsyncClient() as client:
+    async with http_client("sms") as client:
         if MSG91_TEMPLATE_ID:
             # Use template-based SMS (recommended for OTP)
             url = "https://control.msg91.com/api/v5/otp"
@@ -150,7 +151,7 @@ async def send_via_fast2sms(phone: str, otp: str) -> dict:
     # Remove +91 prefix for Fast2SMS
     phone_clean = phone.replace("+91", "").replace(" ", "")
     
-    async with httpx.AsyncClient() as client:
+    async with http_client("sms") as client:
         url = "https://www.fast2sms.com/dev/bulkV2"
         
         payload = {
@@ -182,7 +183,7 @@ async def send_via_textlocal(phone: str, message: str) -> dict:
     if not TEXTLOCAL_API_KEY:
         raise ValueError("TextLocal API key not configured")
     
-    async with httpx.AsyncClient() as client:
+    async with http_client("sms") as client:
         url = "https://api.textlocal.in/send/"
         
         payload = {
@@ -220,7 +221,7 @@ async def verify_twilio_otp(phone: str, otp: str) -> dict:
     if not verify_sid:
         raise ValueError("TWILIO_VERIFY_SERVICE_SID not configured")
     
-    async with httpx.AsyncClient() as client:
+    async with http_client("sms") as client:
         url = f"https://verify.twilio.com/v2/Services/{verify_sid}/VerificationCheck"
         
         auth = httpx.BasicAuth(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
@@ -0,0 +1,167 @@
+import pytest
+
+from ttl_structures import SlidingWindowCounter, TTLLRUCache
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+# ============ TTLLRUCache ============
+
+def test_entries_expire_lazily_on_access(clock):
+    cache = TTLLRUCache(max_size=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=20)
+
+    clock.advance(5)
+    assert "a" not in cache
+    assert len(cache) == 2  # Still stored until touched
+    assert cache.get("a", "missing") == "missing"
+    assert len(cache) == 1
+    assert cache.get("b") == 2
+    assert cache.stats["expirations"] == 1
+
+
+def test_purge_expired_drops_only_expired_entries(clock):
+    cache = TTLLRUCache(max_size=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3, ttl=60)
+
+    clock.advance(10)
+    assert cache.purge_expired() == 2
+    assert cache.keys() == ["c"]
+    assert cache.stats["expirations"] == 2
+
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = TTLLRUCache(max_size=3, ttl=60, clock=clock)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+
+    cache.get("a")  # a becomes most recent; b is now oldest
+    cache.set("d", "d")
+
+    assert cache.keys() == ["c", "a", "d"]
+    assert cache.stats["evictions"] == 1
+
+
+def test_overwrite_refreshes_ttl_without_evicting(clock):
+    cache = TTLLRUCache(max_size=2, ttl=5, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    clock.advance(4)
+    cache.set("a", 10)
+
+    clock.advance(2)
+    assert cache.get("a") == 10
+    assert cache.get("b") is None
+    assert cache.stats["evictions"] == 0
+
+
+def test_lfu_evicts_least_used_among_sample(clock):
+    cache = TTLLRUCache(max_size=3, ttl=60, policy="lfu", lfu_sample=3, clock=clock)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    cache.get("a")
+    cache.get("a")
+    cache.get("c")
+
+    cache.set("d", "d")
+    assert "b" not in cache
+    assert set(cache.keys()) == {"a", "c", "d"}
+
+
+def test_max_bytes_evicts_until_value_fits(clock):
+    cache = TTLLRUCache(max_size=100, ttl=60, clock=clock, max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.set("c", "xxxxx")  # 13 bytes would not fit: a goes
+
+    assert cache.keys() == ["b", "c"]
+    assert cache.get_stats()["bytes"] == 9
+    assert cache.stats["evictions"] == 1
+
+    cache.pop("b")
+    assert cache.get_stats()["bytes"] == 5
+
+
+def test_oversize_value_is_not_cached_and_keeps_contents(clock):
+    cache = TTLLRUCache(max_size=100, ttl=60, clock=clock, max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("huge", "x" * 11)
+
+    assert "huge" not in cache
+    assert cache.keys() == ["a"]
+    assert cache.stats["evictions"] == 0
+
+
+def test_oversize_overwrite_drops_the_stale_value(clock):
+    cache = TTLLRUCache(max_size=100, ttl=60, clock=clock, max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("a", "x" * 11)
+
+    assert cache.get("a") is None
+    assert cache.get_stats()["bytes"] == 0
+
+
+# ============ SlidingWindowCounter ============
+
+def test_hits_roll_out_bucket_by_bucket(clock):
+    counter = SlidingWindowCounter(window_seconds=10, buckets=10, clock=clock)
+    clock.now = 1000.0
+    counter.hit("ip", 3)
+    clock.advance(5)
+    counter.hit("ip", 2)
+    assert counter.count("ip") == 5
+
+    clock.advance(5)  # First bucket leaves the window
+    assert counter.count("ip") == 2
+
+    clock.advance(5)
+    assert counter.count("ip") == 0
+
+
+def test_idle_longer_than_window_resets_all_buckets(clock):
+    counter = SlidingWindowCounter(window_seconds=10, buckets=5, clock=clock)
+    counter.hit("ip", 4)
+    clock.advance(9)
+    counter.hit("ip")
+    clock.advance(25)
+    assert counter.hit("ip") == 1
+
+
+def test_allow_enforces_limit_within_window(clock):
+    counter = SlidingWindowCounter(window_seconds=60, buckets=6, clock=clock)
+    assert all(counter.allow("user", 3) for _ in range(3))
+    assert not counter.allow("user", 3)
+    assert counter.count("user") == 3  # Rejected hits are not recorded
+
+    clock.advance(60)
+    assert counter.allow("user", 3)
+
+    counter.reset("user")
+    assert counter.count("user") == 0
+
+
+def test_tracked_keys_are_bounded(clock):
+    counter = SlidingWindowCounter(window_seconds=60, buckets=6, max_keys=3, clock=clock)
+    for key in ("a", "b", "c", "d"):
+        counter.hit(key)
+
+    assert len(counter) == 3
+    assert counter.get_stats()["evicted_keys"] == 1
+    assert counter.count("a") == 0  # Evicted key starts over
@@ -0,0 +1,472 @@
+"""
+Tiered Cache (L1 in-process + L2 Redis)
+=======================================
+
+One cache library for every Gunicorn worker:
+- L1: bounded per-namespace in-process TTLLRUCache (LRU, or sampled LFU), lazy TTL expiry
+- L2: Redis (traditional or Upstash) shared by all workers, JSON values
+- Versioned keys: every (namespace, scope) pair has a version counter in Redis
+  (`tc:ver:{ns}:{scope}`); data keys embed it (`tc:{ns}:{scope}:v{n}:{key}`), so
+  invalidating a whole scope (e.g. an org's menu) is one INCR - no KEYS scans
+- Pub/sub: invalidations are broadcast on `tc:invalidate` so other workers drop
+  their L1 copies immediately; local versions are also re-checked every
+  VERSION_CHECK_INTERVAL seconds as a safety net (Upstash REST has no SUBSCRIBE)
+- require_l2 namespaces (order/table state) only use L1 while the pub/sub
+  listener runs; without it (Upstash) they read Redis with a fresh scope
+  version on every lookup, and skip the cache entirely when Redis is down
+- Per-namespace hit / miss / eviction counters
+
+PERFORMANCE TARGETS:
+- L1 hit: no network, O(1)
+- L2 hit: 1 Redis round-trip (+1 version read per scope every 5s)
+- Scope invalidation: O(1) in Redis, propagated to all workers via pub/sub
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ttl_structures import TTLLRUCache
+
+INVALIDATION_CHANNEL = "tc:invalidate"
+
+_MISSING = object()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(value: Any) -> str:
+    return json.dumps(value, default=_json_default)
+
+
+class CacheNamespace:
+    """Configuration, L1 store and counters for one namespace"""
+
+    def __init__(self, name: str, l1_max: int = 500, ttl: int = 60, l2_ttl: Optional[int] = None,
+                 policy: str = "lru", use_l2: bool = True, l1_serialized: bool = False,
+                 require_l2: bool = False):
+        self.name = name
+        self.l1_max = l1_max
+        self.ttl = ttl
+        self.l2_ttl = l2_ttl or ttl
+        self.policy = policy
+        self.use_l2 = use_l2
+        # Store JSON in L1 and decode per hit so callers can never mutate a shared object
+        self.l1_serialized = l1_serialized
+        # Never served stale across workers: no cache without Redis, no L1 without pub/sub
+        self.require_l2 = require_l2
+
+        # (scope, key) -> [value, version]; LRU order, TTL and eviction live in the store
+        self.store = TTLLRUCache(max_size=l1_max, ttl=ttl, policy=policy)
+        self.stats = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "stale_versions": 0,
+            "invalidations": 0,
+        }
+
+    def configure(self, **config):
+        for attr, value in config.items():
+            setattr(self, attr, value)
+        self.store.max_size = self.l1_max
+        self.store.ttl = self.ttl
+        self.store.policy = self.policy
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["l1_hits"] + self.stats["l2_hits"] + self.stats["misses"]
+        hits = self.stats["l1_hits"] + self.stats["l2_hits"]
+        return {
+            **self.stats,
+            **self.store.stats,
+            "size": len(self.store),
+            "max_size": self.l1_max,
+            "policy": self.policy,
+            "l2": self.use_l2,
+            "require_l2": self.require_l2,
+            "hit_rate": f"{(hits / lookups * 100) if lookups else 0:.2f}%",
+        }
+
+
+class TieredCache:
+    """L1 + Redis L2 cache with versioned scopes and pub/sub invalidation"""
+
+    def __init__(self):
+        self.redis = None
+        self._namespaces: Dict[str, CacheNamespace] = {}
+        # (namespace, scope) -> [version, checked_at]
+        self._versions: Dict[Tuple[str, str], list] = {}
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._instance_id = uuid.uuid4().hex[:12]
+        self._stats = {
+            "broadcasts_sent": 0,
+            "broadcasts_received": 0,
+            "version_checks": 0,
+            "l2_errors": 0,
+        }
+
+        self.VERSION_CHECK_INTERVAL = 5
+
+    # ------------------------------------------------------------ setup
+
+    def register(self, name: str, **config) -> CacheNamespace:
+        """Register (or reconfigure) a namespace; safe to call at import time"""
+        namespace = self._namespaces.get(name)
+        if namespace is None:
+            namespace = CacheNamespace(name, **config)
+            self._namespaces[name] = namespace
+        else:
+            namespace.configure(**config)
+        return namespace
+
+    def namespace(self, name: str) -> CacheNamespace:
+        namespace = self._namespaces.get(name)
+        if namespace is None:
+            namespace = self.register(name)
+        return namespace
+
+    async def attach_redis(self, redis_client):
+        """Use a Redis client (RedisCache / redis.asyncio / Upstash) as L2 and start the listener"""
+        self.redis = redis_client
+        self._versions.clear()
+        if self._listener is None:
+            pubsub = self._open_pubsub()
+            if pubsub is not None:
+                self._listener = asyncio.create_task(self._listen(pubsub))
+                print("📡 Tiered cache invalidation listener started")
+            else:
+                print(f"ℹ️ Tiered cache: no pub/sub, versions re-checked every {self.VERSION_CHECK_INTERVAL}s")
+
+    def _redis_ready(self) -> bool:
+        if self.redis is None:
+            return False
+        is_connected = getattr(self.redis, "is_connected", None)
+        return is_connected() if callable(is_connected) else True
+
+    def l1_coherent(self) -> bool:
+        """Other workers' invalidations reach this L1 immediately (pub/sub listener running)"""
+        return self._listener is not None and not self._listener.done()
+
+    def _use_l1(self, namespace: CacheNamespace) -> bool:
+        return not namespace.require_l2 or self.l1_coherent()
+
+    def _open_pubsub(self):
+        client = getattr(self.redis, "redis", self.redis)
+        if getattr(self.redis, "use_upstash", False) or not hasattr(client, "pubsub"):
+            return None
+        try:
+            return client.pubsub()
+        except Exception as e:
+            print(f"⚠️ Tiered cache pub/sub unavailable: {e}")
+            return None
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+
+    # ------------------------------------------------------------ versions
+
+    @staticmethod
+    def _version_key(name: str, scope: str) -> str:
+        return f"tc:ver:{name}:{scope}"
+
+    @staticmethod
+    def _data_key(name: str, scope: str, version: int, key: str) -> str:
+        return f"tc:{name}:{scope}:v{version}:{key}"
+
+    def _local_version(self, name: str, scope: str) -> int:
+        entry = self._versions.get((name, scope))
+        return entry[0] if entry else 0
+
+    async def _scope_version(self, name: str, scope: str, fresh: bool = False) -> int:
+        entry = self._versions.get((name, scope))
+        now = time.monotonic()
+        if entry and not fresh and now - entry[1] < self.VERSION_CHECK_INTERVAL:
+            return entry[0]
+        if not self._redis_ready():
+            return entry[0] if entry else 0
+        self._stats["version_checks"] += 1
+        try:
+            raw = await self.redis.get(self._version_key(name, scope))
+            version = int(raw) if raw else 0
+        except Exception as e:
+            self._stats["l2_errors"] += 1
+            print(f"⚠️ Tiered cache version read failed for {name}:{scope}: {e}")
+            version = entry[0] if entry else 0
+        if entry and entry[0] > version:
+            version = entry[0]
+        self._versions[(name, scope)] = [version, now]
+        return version
+
+    # ------------------------------------------------------------ L1
+
+    def _l1_get(self, namespace: CacheNamespace, scope: str, key: str, version: int):
+        entry = namespace.store.get((scope, key))
+        if entry is None:
+            return _MISSING
+        if entry[1] != version:
+            namespace.store.pop((scope, key))
+            namespace.stats["stale_versions"] += 1
+            return _MISSING
+        return json.loads(entry[0]) if namespace.l1_serialized else entry[0]
+
+    def _l1_set(self, namespace: CacheNamespace, scope: str, key: str, value: Any,
+                version: int, ttl: int, serialized: Optional[str] = None):
+        if namespace.l1_serialized:
+            value = serialized if serialized is not None else dumps(value)
+        namespace.store.set((scope, key), [value, version], ttl)
+
+    def local_get(self, name: str, key: str, scope: str = "", default: Any = None) -> Any:
+        """Synchronous L1-only lookup (no network) for hot paths"""
+        namespace = self.namespace(name)
+        if not self._use_l1(namespace):
+            namespace.stats["misses"] += 1
+            return default
+        value = self._l1_get(namespace, scope, key, self._local_version(name, scope))
+        if value is _MISSING:
+            namespace.stats["misses"] += 1
+            return default
+        namespace.stats["l1_hits"] += 1
+        return value
+
+    def local_set(self, name: str, key: str, value: Any, scope: str = "", ttl: Optional[int] = None):
+        """Synchronous L1-only store"""
+        namespace = self.namespace(name)
+        if not self._use_l1(namespace):
+            return
+        namespace.stats["sets"] += 1
+        self._l1_set(namespace, scope, key, value, self._local_version(name, scope), ttl or namespace.ttl)
+
+    def local_expiry(self, name: str, key: str, scope: str = "") -> Optional[float]:
+        """Monotonic expiry time of an L1 entry, if present"""
+        return self.namespace(name).store.expires_at((scope, key))
+
+    # ------------------------------------------------------------ public API
+
+    async def get(self, name: str, key: str, scope: str = "", default: Any = None) -> Any:
+        namespace = self.namespace(name)
+        if namespace.require_l2 and not self._redis_ready():
+            namespace.stats["misses"] += 1
+            return default
+        use_l1 = self._use_l1(namespace)
+        version = await self._scope_version(name, scope, fresh=not use_l1)
+
+        if use_l1:
+            value = self._l1_get(namespace, scope, key, version)
+            if value is not _MISSING:
+                namespace.stats["l1_hits"] += 1
+                return value
+
+        if namespace.use_l2 and self._redis_ready():
+            try:
+                raw = await self.redis.get(self._data_key(name, scope, version, key))
+            except Exception as e:
+                raw = None
+                self._stats["l2_errors"] += 1
+                print(f"⚠️ Tiered cache L2 read failed for {name}:{key}: {e}")
+            if raw:
+                value = json.loads(raw)
+                if use_l1:
+                    self._l1_set(namespace, scope, key, value, version, namespace.ttl, serialized=raw)
+                namespace.stats["l2_hits"] += 1
+                return value
+
+        namespace.stats["misses"] += 1
+        return default
+
+    async def set(self, name: str, key: str, value: Any, scope: str = "", ttl: Optional[int] = None):
+        namespace = self.namespace(name)
+        if namespace.require_l2 and not self._redis_ready():
+            return
+        use_l1 = self._use_l1(namespace)
+        version = await self._scope_version(name, scope, fresh=not use_l1)
+        namespace.stats["sets"] += 1
+        serialized = dumps(value) if (namespace.use_l2 or namespace.l1_serialized) else None
+        if use_l1:
+            self._l1_set(namespace, scope, key, value, version, ttl or namespace.ttl, serialized=serialized)
+        if namespace.use_l2 and self._redis_ready():
+            try:
+                await self.redis.setex(
+                    self._data_key(name, scope, version, key), ttl or namespace.l2_ttl, serialized
+                )
+            except Exception as e:
+                self._stats["l2_errors"] += 1
+                print(f"⚠️ Tiered cache L2 write failed for {name}:{key}: {e}")
+
+    async def get_or_load(self, name: str, key: str, loader: Callable[[], Awaitable[Any]],
+                          scope: str = "", ttl: Optional[int] = None) -> Any:
+        """Cached value or the loader's result; concurrent misses share one load"""
+        value = await self.get(name, key, scope, default=_MISSING)
+        if value is not _MISSING:
+            return value
+
+        flight_key = (name, scope, key)
+        pending = self._inflight.get(flight_key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        try:
+            value = await loader()
+            if value is not None:
+                await self.set(name, key, value, scope, ttl)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(flight_key, None)
+
+    async def delete(self, name: str, key: str, scope: str = ""):
+        """Drop one key from L1 and L2 and tell other workers to drop it from L1"""
+        namespace = self.namespace(name)
+        namespace.store.pop((scope, key), None)
+        namespace.stats["invalidations"] += 1
+        if self._redis_ready():
+            version = await self._scope_version(name, scope, fresh=not self._use_l1(namespace))
+            if namespace.use_l2:
+                try:
+                    await self.redis.delete(self._data_key(name, scope, version, key))
+                except Exception as e:
+                    self._stats["l2_errors"] += 1
+                    print(f"⚠️ Tiered cache L2 delete failed for {name}:{key}: {e}")
+            await self._broadcast({"ns": name, "scope": scope, "key": key})
+
+    def evict(self, name: str, key: str, scope: str = ""):
+        """Synchronous delete for non-async call sites; the broadcast runs in background"""
+        namespace = self.namespace(name)
+        namespace.store.pop((scope, key), None)
+        namespace.stats["invalidations"] += 1
+        if self._redis_ready():
+            try:
+                asyncio.get_running_loop().create_task(self.delete(name, key, scope))
+            except RuntimeError:
+                pass
+
+    async def invalidate(self, name: str, scope: str = ""):
+        """Invalidate every key in a scope by bumping its version (all workers)"""
+        namespace = self.namespace(name)
+        namespace.stats["invalidations"] += 1
+        version = self._local_version(name, scope) + 1
+        if self._redis_ready():
+            try:
+                bumped = int(await self.redis.incr(self._version_key(name, scope)) or 0)
+                version = max(version, bumped)
+            except Exception as e:
+                self._stats["l2_errors"] += 1
+                print(f"⚠️ Tiered cache version bump failed for {name}:{scope}: {e}")
+        self._versions[(name, scope)] = [version, time.monotonic()]
+        await self._broadcast({"ns": name, "scope": scope, "v": version})
+
+    def clear(self, name: Optional[str] = None, match: Optional[str] = None) -> int:
+        """Drop local L1 entries (optionally only keys/scopes containing `match`)"""
+        cleared = 0
+        namespaces = [self.namespace(name)] if name else list(self._namespaces.values())
+        for namespace in namespaces:
+            if match is None:
+                cleared += len(namespace.store)
+                namespace.store.clear()
+                continue
+            doomed = [k for k in namespace.store if match in k[0] or match in k[1] or match in namespace.name]
+            for store_key in doomed:
+                namespace.store.pop(store_key)
+            cleared += len(doomed)
+        return cleared
+
+    def purge_expired(self) -> int:
+        """Remove expired L1 entries (periodic memory cleanup)"""
+        return sum(namespace.store.purge_expired() for namespace in self._namespaces.values())
+
+    # ------------------------------------------------------------ pub/sub
+
+    async def _broadcast(self, message: Dict[str, Any]):
+        if not self._redis_ready():
+            return
+        try:
+            message["origin"] = self._instance_id
+            await self.redis.publish(INVALIDATION_CHANNEL, json.dumps(message))
+            self._stats["broadcasts_sent"] += 1
+        except Exception as e:
+            self._stats["l2_errors"] += 1
+            print(f"⚠️ Tiered cache broadcast failed: {e}")
+
+    def _apply_broadcast(self, message: Dict[str, Any]):
+        if message.get("origin") == self._instance_id:
+            return
+        self._stats["broadcasts_received"] += 1
+        name, scope = message.get("ns"), message.get("scope", "")
+        namespace = self._namespaces.get(name)
+        if "key" in message:
+            if namespace:
+                namespace.store.pop((scope, message["key"]), None)
+            return
+        version = int(message.get("v", 0))
+        if version > self._local_version(name, scope):
+            self._versions[(name, scope)] = [version, time.monotonic()]
+
+    async def _listen(self, pubsub):
+        while True:
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for raw in pubsub.listen():
+                    if raw.get("type") != "message":
+                        continue
+                    try:
+                        self._apply_broadcast(json.loads(raw["data"]))
+                    except (ValueError, TypeError):
+                        continue
+            except asyncio.CancelledError:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+                raise
+            except Exception as e:
+                print(f"⚠️ Tiered cache listener error, resubscribing: {e}")
+                await asyncio.sleep(5)
+
+    # ------------------------------------------------------------ stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "l2_connected": self._redis_ready(),
+            "pubsub": self.l1_coherent(),
+            "tracked_scopes": len(self._versions),
+            "namespaces": {name: ns.get_stats() for name, ns in self._namespaces.items()},
+        }
+
+
+# Global instance (namespaces register at import time; Redis is attached at startup)
+_tiered_cache = TieredCache()
+
+
+async def init_tiered_cache(redis_client=None) -> TieredCache:
+    """Attach the shared Redis client to the global tiered cache"""
+    if redis_client is not None:
+        await _tiered_cache.attach_redis(redis_client)
+    print("✅ Tiered cache initialized")
+    return _tiered_cache
+
+
+def get_tiered_cache() -> TieredCache:
+    """Get the global tiered cache instance"""
+    return _tiered_cache
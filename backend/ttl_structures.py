@@ -0,0 +1,203 @@
+"""
+TTL Data Structures
+===================
+
+Small in-process building blocks shared by the caches and rate limiters:
+- TTLLRUCache: OrderedDict-backed LRU with per-entry TTL and lazy expiry
+  (expired entries are dropped when touched or by purge_expired()), O(1)
+  get / set / evict; optional sampled-LFU eviction among the oldest entries
+  and an optional total-size bound (max_bytes + sizeof) for large values
+- SlidingWindowCounter: per-key request counter over a sliding window made
+  of a fixed number of buckets, so memory and cost per hit do not grow with
+  the request rate; idle keys live in a bounded TTLLRUCache
+
+PERFORMANCE TARGETS:
+- Cache get/set/evict: O(1), independent of cache size (no sorting on insert)
+- Rate-limit hit: O(buckets), independent of the number of requests in the window
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLLRUCache:
+    """Bounded LRU (or sampled LFU) map with per-entry TTL"""
+
+    def __init__(self, max_size: int = 500, ttl: float = 60, policy: str = "lru",
+                 lfu_sample: int = 8, clock: Callable[[], float] = time.monotonic,
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.policy = policy
+        self.LFU_SAMPLE = lfu_sample
+        self._clock = clock
+        # Size bound: evict until the summed sizeof(value) fits in max_bytes
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._bytes = 0
+
+        # key -> [value, expires_at, hits, size]
+        self._data: "OrderedDict[Hashable, list]" = OrderedDict()
+        self.stats = {
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and self._clock() < entry[1]
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._data))
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        if self._clock() >= entry[1]:
+            del self._data[key]
+            self._bytes -= entry[3]
+            self.stats["expirations"] += 1
+            return default
+        entry[2] += 1
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        data = self._data
+        if key in data:
+            self._bytes -= data.pop(key)[3]
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # Larger than the whole cache - don't flush everything for it
+        while len(data) >= self.max_size or (
+            self.max_bytes is not None and data and self._bytes + size > self.max_bytes
+        ):
+            self._evict_one()
+        data[key] = [value, self._clock() + (self.ttl if ttl is None else ttl), 0, size]
+        self._bytes += size
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        self._bytes -= entry[3]
+        return entry[0]
+
+    def expires_at(self, key: Hashable) -> Optional[float]:
+        entry = self._data.get(key)
+        return entry[1] if entry else None
+
+    def keys(self) -> List[Hashable]:
+        return list(self._data)
+
+    def values(self) -> List[Any]:
+        return [entry[0] for entry in self._data.values()]
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        return [(key, entry[0]) for key, entry in self._data.items()]
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
+
+    def purge_expired(self) -> int:
+        """Remove all expired entries (periodic memory cleanup)"""
+        now = self._clock()
+        expired = [key for key, entry in self._data.items() if now >= entry[1]]
+        for key in expired:
+            self._bytes -= self._data.pop(key)[3]
+        self.stats["expirations"] += len(expired)
+        return len(expired)
+
+    def _evict_one(self):
+        data = self._data
+        if self.policy == "lfu":
+            # Sampled LFU: least-used among the oldest few entries
+            victim = None
+            victim_hits = None
+            for index, (key, entry) in enumerate(data.items()):
+                if index >= self.LFU_SAMPLE:
+                    break
+                if victim_hits is None or entry[2] < victim_hits:
+                    victim, victim_hits = key, entry[2]
+            self._bytes -= data.pop(victim)[3]
+        else:
+            self._bytes -= data.popitem(last=False)[1][3]
+        self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "policy": self.policy,
+            **({"bytes": self._bytes, "max_bytes": self.max_bytes} if self.max_bytes is not None else {}),
+        }
+
+
+class SlidingWindowCounter:
+    """Per-key hit counter over a sliding window of fixed-size buckets"""
+
+    def __init__(self, window_seconds: float, buckets: int = 10, max_keys: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.window = window_seconds
+        self.BUCKETS = max(1, buckets)
+        self.bucket_width = window_seconds / self.BUCKETS
+        self._clock = clock
+        # key -> [bucket counts, index of the newest bucket]; idle keys expire after one window
+        self._keys = TTLLRUCache(max_size=max_keys, ttl=window_seconds, clock=clock)
+
+    def _advance(self, key: Hashable, now: float) -> List:
+        index = int(now // self.bucket_width)
+        state = self._keys.get(key)
+        if state is None:
+            state = [[0] * self.BUCKETS, index]
+        else:
+            counts, last = state
+            if index - last >= self.BUCKETS:
+                counts[:] = [0] * self.BUCKETS
+            else:
+                for stale in range(last + 1, index + 1):
+                    counts[stale % self.BUCKETS] = 0
+            state[1] = index
+        self._keys.set(key, state)
+        return state
+
+    def count(self, key: Hashable) -> int:
+        """Hits for the key within the current window"""
+        return sum(self._advance(key, self._clock())[0])
+
+    def hit(self, key: Hashable, amount: int = 1) -> int:
+        """Record a hit and return the window total including it"""
+        state = self._advance(key, self._clock())
+        state[0][state[1] % self.BUCKETS] += amount
+        return sum(state[0])
+
+    def allow(self, key: Hashable, limit: int) -> bool:
+        """Record a hit if the key is under its limit; True when allowed"""
+        state = self._advance(key, self._clock())
+        if sum(state[0]) >= limit:
+            return False
+        state[0][state[1] % self.BUCKETS] += 1
+        return True
+
+    def reset(self, key: Hashable):
+        self._keys.pop(key)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "window_seconds": self.window,
+            "buckets": self.BUCKETS,
+            "tracked_keys": len(self._keys),
+            "evicted_keys": self._keys.stats["evictions"],
+        }
@@ -3,6 +3,8 @@ Distributed Cache Utility
 
 Redis-backed cache with in-memory fallback.
 Implements cache stampede prevention via probabilistic early expiration.
+Keys can be tagged (e.g. "org:123") and invalidated by tag; pattern deletes
+walk the keyspace with SCAN and are meant for admin maintenance only.
 """
 import asyncio
 import json
@@ -11,14 +13,24 @@ import math
 import os
 import random
 import time
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from tiered_cache import get_tiered_cache
 
 logger = logging.getLogger(__name__)
 
-# In-memory fallback cache
-_memory_cache: dict = {}
-_memory_cache_expiry: dict = {}
+# In-memory fallback cache: a bounded L1-only tiered cache namespace
+MEMORY_NAMESPACE = "distributed"
 MAX_MEMORY_CACHE_SIZE = 500
+get_tiered_cache().register(MEMORY_NAMESPACE, l1_max=MAX_MEMORY_CACHE_SIZE, ttl=300, use_l2=False)
+_memory_tags: Dict[str, Set[str]] = {}  # tag -> keys (fallback tag index)
+_memory_tag_writes = 0  # tagged fallback sets since the index was last pruned
+
+TAG_TTL = 86400  # Redis tag sets outlive every member they index
+
+
+def _tag_key(tag: str) -> str:
+    return f"tag:{tag}"
 
 
 class DistributedCache:
@@ -65,16 +77,27 @@ class DistributedCache:
         # Fallback to memory
         return self._memory_get(key)
 
-    async def set(self, key: str, value: Any, ttl: int = 300) -> bool:
-        """Set value in cache with TTL (seconds)."""
+    async def set(self, key: str, value: Any, ttl: int = 300, tags: Iterable[str] = ()) -> bool:
+        """Set value in cache with TTL (seconds), registering it under each tag."""
+        tags = list(tags)
         if self._connected and self._redis:
             try:
-                await self._redis.setex(key, ttl, json.dumps(value, default=str))
+                pipe = self._redis.pipeline(transaction=False)
+                pipe.setex(key, ttl, json.dumps(value, default=str))
+                for tag in tags:
+                    pipe.sadd(_tag_key(tag), key)
+                    pipe.expire(_tag_key(tag), max(ttl, TAG_TTL))
+                await pipe.execute()
                 return True
             except Exception as e:
                 logger.warning(f"Redis set failed for {key}: {e}")
         # Fallback to memory
-        return self._memory_set(key, value, ttl)
+        stored = self._memory_set(key, value, ttl)
+        if tags:
+            for tag in tags:
+                _memory_tags.setdefault(tag, set()).add(key)
+            self._note_tagged_write()
+        return stored
 
     async def delete(self, key: str) -> bool:
         """Delete a key from cache."""
@@ -85,25 +108,58 @@ class DistributedCache:
             except Exception as e:
                 logger.warning(f"Redis delete failed for {key}: {e}")
         # Fallback to memory
-        _memory_cache.pop(key, None)
-        _memory_cache_expiry.pop(key, None)
+        get_tiered_cache().evict(MEMORY_NAMESPACE, key)
         return True
 
+    async def invalidate_tags(self, *tags: str) -> int:
+        """Delete every key registered under the tags; cost scales with the tagged keys only."""
+        if not tags:
+            return 0
+        if self._connected and self._redis:
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                for tag in tags:
+                    pipe.smembers(_tag_key(tag))
+                members = set()
+                for result in await pipe.execute():
+                    members.update(result or ())
+                await self._redis.delete(*members, *[_tag_key(tag) for tag in tags])
+                return len(members)
+            except Exception as e:
+                logger.warning(f"Redis invalidate_tags failed for {tags}: {e}")
+        # Memory fallback: drop the keys indexed under each tag
+        members = set()
+        for tag in tags:
+            members.update(_memory_tags.pop(tag, ()))
+        for key in members:
+            get_tiered_cache().evict(MEMORY_NAMESPACE, key)
+        return len(members)
+
     async def delete_pattern(self, pattern: str) -> int:
-        """Delete all keys matching a pattern (e.g., 'org:123:*')."""
+        """
+        Delete all keys matching a pattern (e.g., 'org:123:*').
+        ADMIN MAINTENANCE ONLY: walks the keyspace with cursor-based SCAN;
+        request paths should tag keys and use invalidate_tags().
+        """
         if self._connected and self._redis:
             try:
-                keys = await self._redis.keys(pattern)
-                if keys:
-                    await self._redis.delete(*keys)
-                return len(keys)
+                deleted = 0
+                batch = []
+                async for key in self._redis.scan_iter(match=pattern, count=500):
+                    batch.append(key)
+                    if len(batch) >= 500:
+                        deleted += await self._redis.delete(*batch)
+                        batch = []
+                if batch:
+                    deleted += await self._redis.delete(*batch)
+                return deleted
             except Exception as e:
                 logger.warning(f"Redis delete_pattern failed for {pattern}: {e}")
         # Memory fallback: iterate and delete matching keys
-        to_delete = [k for k in _memory_cache if self._match_pattern(k, pattern)]
+        store = get_tiered_cache().namespace(MEMORY_NAMESPACE).store
+        to_delete = [k for k in store if self._match_pattern(k[1], pattern)]
         for k in to_delete:
-            _memory_cache.pop(k, None)
-            _memory_cache_expiry.pop(k, None)
+            store.pop(k, None)
         return len(to_delete)
 
     async def get_or_set(
@@ -112,6 +168,7 @@ class DistributedCache:
         factory: Callable,
         ttl: int = 300,
         beta: float = 1.0,
+        tags: Iterable[str] = (),
     ) -> Any:
         """
         Get from cache or compute and store.
@@ -121,7 +178,7 @@ class DistributedCache:
         cached = await self.get(key)
         if cached is not None:
             # XFetch: probabilistically recompute before expiry to prevent stampede
-            expiry = _memory_cache_expiry.get(key, time.monotonic() + ttl)
+            expiry = get_tiered_cache().local_expiry(MEMORY_NAMESPACE, key) or time.monotonic() + ttl
             remaining = expiry - time.monotonic()
             if remaining > 0:
                 # Probability of early recompute increases as expiry approaches
@@ -130,7 +187,7 @@ class DistributedCache:
 
         # Compute fresh value
         value = await factory() if asyncio.iscoroutinefunction(factory) else factory()
-        await self.set(key, value, ttl)
+        await self.set(key, value, ttl, tags=tags)
         return value
 
     async def disconnect(self):
@@ -138,22 +195,29 @@ class DistributedCache:
         if self._redis:
             await self._redis.close()
 
+    @staticmethod
+    def _note_tagged_write():
+        """Prune the fallback tag index every MAX_MEMORY_CACHE_SIZE tagged sets"""
+        global _memory_tag_writes
+        _memory_tag_writes += 1
+        if _memory_tag_writes < MAX_MEMORY_CACHE_SIZE:
+            return
+        _memory_tag_writes = 0
+        # Keys that expired or were LRU-evicted no longer belong to any tag
+        store = get_tiered_cache().namespace(MEMORY_NAMESPACE).store
+        for tag in list(_memory_tags):
+            live = {key for key in _memory_tags[tag] if ("", key) in store}
+            if live:
+                _memory_tags[tag] = live
+            else:
+                del _memory_tags[tag]
+
     def _memory_get(self, key: str) -> Optional[Any]:
-        expiry = _memory_cache_expiry.get(key)
-        if expiry and time.monotonic() > expiry:
-            _memory_cache.pop(key, None)
-            _memory_cache_expiry.pop(key, None)
-            return None
-        return _memory_cache.get(key)
+        return get_tiered_cache().local_get(MEMORY_NAMESPACE, key)
 
     def _memory_set(self, key: str, value: Any, ttl: int) -> bool:
-        # Evict oldest entries if at capacity
-        if len(_memory_cache) >= MAX_MEMORY_CACHE_SIZE:
-            oldest = min(_memory_cache_expiry, key=_memory_cache_expiry.get)
-            _memory_cache.pop(oldest, None)
-            _memory_cache_expiry.pop(oldest, None)
-        _memory_cache[key] = value
-        _memory_cache_expiry[key] = time.monotonic() + ttl
+        # Bounded LRU: the namespace evicts the least recently used entry at capacity
+        get_tiered_cache().local_set(MEMORY_NAMESPACE, key, value, ttl=ttl)
         return True
 
     @staticmethod
@@ -12,6 +12,7 @@ import logging
 from datetime import datetime, timezone, timedelta
 from typing import Optional, Dict, Any, List
 from database_models import WhatsAppTemplate
+from http_clients import http_client
 
 
 class WhatsAppCloudAPI:
@@ -20,7 +21,8 @@ class WhatsAppCloudAPI:
     # Error codes for classification
     ERROR_CODE_WINDOW_RESTRICTION = {131047, 131026}  # 24-hour window restriction
     ERROR_CODE_INVALID_TEMPLATE = {131031, 132001}  # Invalid/missing template or translation
-    ERROR_CODE_RATE_LIMIT = {131051}  # Rate limit exceeded
+    ERROR_CODE_RATE_LIMIT = {131051, 130429}  # Rate limit / throughput tier exceeded
+    ERROR_CODE_TRANSIENT = {1, 2, 131000, 131016}  # Unknown / service unavailable on Meta's side
     ERROR_CODE_BUSINESS_ELIGIBILITY = {131042}  # Business eligibility payment issue
 
     # Retry configuration
@@ -497,7 +499,7 @@ class WhatsAppCloudAPI:
             "is_invalid_template": error_code in self.ERROR_CODE_INVALID_TEMPLATE,
             "is_rate_limit": error_code in self.ERROR_CODE_RATE_LIMIT,
             "is_business_eligibility": error_code in self.ERROR_CODE_BUSINESS_ELIGIBILITY,
-            "is_retryable": False
+            "is_retryable": error_code in self.ERROR_CODE_TRANSIENT
         }
 
         # Determine if error is retryable
@@ -513,6 +515,24 @@ class WhatsAppCloudAPI:
 
         return classification
 
+    def classify_exception(self, error: Exception) -> Dict[str, Any]:
+        """Classify an exception raised by a send (API error body, network, bad input)."""
+        if isinstance(error, ValueError):
+            # Invalid phone / not configured / missing template: retrying won't help
+            return {**self._classify_error({}), "message": str(error)}
+
+        error_msg = str(error)
+        if "WhatsApp API error:" not in error_msg:
+            # No API response (timeout, connection reset) - transient
+            return {**self._classify_error({}), "message": error_msg, "is_retryable": True}
+
+        error_response = {}
+        try:
+            error_response = json.loads(error_msg.replace("WhatsApp API error:", "").strip())
+        except Exception:
+            pass
+        return self._classify_error(error_response)
+
     async def get_template_info(self, template_name: str, language_code: str = "en_US") -> Optional[Dict[str, Any]]:
         """
         Query Meta Business Manager API for actual template categories and approval status.
@@ -611,9 +631,9 @@ class WhatsAppCloudAPI:
             "fields": "name,status,category,components,language,quality_score,id"
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with http_client("whatsapp") as client:
             try:
-                response = await client.get(url, headers=headers, params=params)
+                response = await client.get(url, headers=headers, params=params, timeout=30.0)
                 response.raise_for_status()
                 
                 data = response.json()
@@ -832,7 +852,7 @@ class WhatsAppCloudAPI:
             "Authorization": f"Bearer {self.access_token}",
             "Content-Type": "application/json"
         }
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_client("whatsapp") as client:
             try:
                 resp = await client.post(url, headers=headers, json=payload)
                 resp.raise_for_status()
@@ -881,9 +901,13 @@ class WhatsAppCloudAPI:
         template_name: str,
         params: list,
         language: str = "en_US",
-        button_url: Optional[str] = None
+        button_url: Optional[str] = None,
+        max_attempts: Optional[int] = None
     ) -> Dict[str, Any]:
-        """Send a template message with enhanced phone number validation (required for business-initiated messaging)."""
+        """Send a template message with enhanced phone number validation (required for business-initiated messaging).
+
+        max_attempts=1 leaves retries to the caller (the WhatsApp outbox).
+        """
         if not self.is_configured():
             raise ValueError("WhatsApp Cloud API not configured. Set WHATSAPP_PHONE_NUMBER_ID and WHATSAPP_ACCESS_TOKEN.")
 
@@ -991,7 +1015,8 @@ class WhatsAppCloudAPI:
         print(f"📦 Payload: {json.dumps(payload, indent=2)}")
 
         last_error = None
-        for attempt in range(self.MAX_RETRY_ATTEMPTS):
+        max_attempts = max_attempts or self.MAX_RETRY_ATTEMPTS
+        for attempt in range(max_attempts):
             try:
                 result = await self._post(payload)
                 msg_id = result.get("messages", [{}])[0].get("id", "")
@@ -1002,21 +1027,13 @@ class WhatsAppCloudAPI:
                 error_msg = str(e)
                 last_error = e
 
-                error_response = {}
-                try:
-                    if "WhatsApp API error:" in error_msg:
-                        json_str = error_msg.replace("WhatsApp API error:", "").strip()
-                        error_response = json.loads(json_str)
-                except Exception:
-                    pass
-
-                classification = self._classify_error(error_response)
+                classification = self.classify_exception(e)
                 error_code = classification.get("code")
                 is_retryable = classification.get("is_retryable")
 
                 print(
                     f"❌ WA template failed | to={phone} | template={template_name} | "
-                    f"error_code={error_code} | attempt={attempt + 1}/{self.MAX_RETRY_ATTEMPTS} | "
+                    f"error_code={error_code} | attempt={attempt + 1}/{max_attempts} | "
                     f"retryable={is_retryable} | error={error_msg}"
                 )
 
@@ -1086,12 +1103,12 @@ class WhatsAppCloudAPI:
                     print(f"⚠️ Permanent failure detected (error_code={error_code}), not retrying")
                     raise
 
-                if attempt < self.MAX_RETRY_ATTEMPTS - 1:
+                if attempt < max_attempts - 1:
                     delay = self.RETRY_DELAYS[attempt]
                     print(f"⏳ Retrying in {delay}s...")
                     await asyncio.sleep(delay)
                 else:
-                    print(f"❌ Max retries ({self.MAX_RETRY_ATTEMPTS}) reached, giving up")
+                    print(f"❌ Max retries ({max_attempts}) reached, giving up")
                     raise
 
         if last_error:
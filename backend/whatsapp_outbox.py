@@ -0,0 +1,362 @@
+"""
+WhatsApp Outbox
+===============
+
+Durable queue + dispatcher for business-initiated WhatsApp messages (order
+status templates):
+- Sends are written to the `whatsapp_outbox` collection instead of being
+  fired from a detached task, so a worker recycle (gunicorn max_requests)
+  or crash no longer loses them
+- Dedupe: one message per (order_id, status) via a unique `dedupe_key`
+- Dispatcher loop per worker claims due messages with a lease
+  (find_one_and_update); a lease held by a dead worker expires after
+  LEASE_SECONDS and the message is picked up again
+- Token bucket per phone_number_id: WHATSAPP_MESSAGES_PER_SECOND (Meta
+  throughput tier, default 80) split across WEB_CONCURRENCY workers;
+  a rate-limit error pauses that number's bucket. The lease is renewed
+  after the bucket wait, right before sending; if another worker took the
+  message over meanwhile, this worker drops it instead of sending twice
+- Errors classified through WhatsAppCloudAPI._classify_error: rate limits
+  and transient failures retry with exponential backoff + jitter, permanent
+  failures (24h window, invalid template, eligibility) are not retried
+- Bounded in-flight sends (WHATSAPP_OUTBOX_CONCURRENCY, default 4), so the
+  dispatcher never takes more than a sliver of the event loop from order
+  handling
+- Finished messages are TTL-expired after FINISHED_TTL_DAYS
+
+PERFORMANCE TARGETS:
+- Enqueue: one insert, off the order critical path
+- Lost sends on worker recycle: 0
+- Sends per phone number: never above the configured throughput tier
+"""
+
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 300.0
+POLL_INTERVAL_SECONDS = 1.0
+FINISHED_TTL_DAYS = 7
+
+STATE_PENDING = "pending"
+STATE_SENDING = "sending"
+STATE_SENT = "sent"
+STATE_FAILED = "failed"
+
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff with jitter: ~2s, 4s, 8s ... capped at 5 minutes"""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class TokenBucket:
+    """Async token bucket (rate tokens/s, up to `burst` banked)"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = max(rate, 0.1)
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until available; returns seconds waited"""
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens (provider said we are over the limit)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class WhatsAppOutbox:
+    """Persistent outbox + per-worker rate-aware dispatcher"""
+
+    def __init__(
+        self,
+        db,
+        sender: Callable[[Dict], Awaitable[Dict]],
+        classify: Callable[[Exception], Dict[str, Any]],
+        on_sent: Optional[Callable[[Dict, str], Awaitable[None]]] = None,
+        rate_per_second: float = 80.0,
+        concurrency: int = 4,
+    ):
+        self.db = db
+        self.sender = sender
+        self.classify = classify
+        self.on_sent = on_sent
+        self.rate_per_second = rate_per_second
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._slots = asyncio.Semaphore(max(concurrency, 1))
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self._pending_count = 0
+        self._stats = {
+            "enqueued": 0,
+            "deduped": 0,
+            "sent": 0,
+            "retries": 0,
+            "failed": 0,
+            "rate_limited": 0,
+            "lease_lost": 0,
+            "throttle_wait_ms": 0.0,
+            "total_send_ms": 0.0,
+            "total_queue_lag_ms": 0.0,
+        }
+
+    async def ensure_indexes(self):
+        outbox = self.db.whatsapp_outbox
+        await outbox.create_index("dedupe_key", unique=True)
+        await outbox.create_index([("state", 1), ("next_attempt_at", 1)])
+        await outbox.create_index([("organization_id", 1), ("order_id", 1)])
+        await outbox.create_index("finished_at", expireAfterSeconds=FINISHED_TTL_DAYS * 86400)
+
+    async def enqueue(self, *, organization_id: str, order_id: str, status: str, to: str,
+                      phone_number_id: str, template: str, params: List[str], language: str) -> bool:
+        """Queue a template message; False if (order_id, status) was already queued"""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.db.whatsapp_outbox.insert_one({
+                "_id": str(uuid.uuid4()),
+                "dedupe_key": f"{order_id}:{status}",
+                "organization_id": organization_id,
+                "order_id": order_id,
+                "status": status,
+                "to": to,
+                "phone_number_id": phone_number_id,
+                "template": template,
+                "params": params,
+                "language": language,
+                "state": STATE_PENDING,
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now,
+            })
+        except DuplicateKeyError:
+            self._stats["deduped"] += 1
+            return False
+        self._stats["enqueued"] += 1
+        self._wakeup.set()
+        return True
+
+    async def messages_for_orders(self, organization_id: str, order_ids: List[str]) -> List[Dict]:
+        """Outbox entries (one per order status message) for a set of orders"""
+        cursor = self.db.whatsapp_outbox.find(
+            {"organization_id": organization_id, "order_id": {"$in": order_ids}},
+            {"_id": 0, "order_id": 1, "status": 1, "state": 1, "message_id": 1,
+             "attempts": 1, "last_error": 1, "created_at": 1},
+        ).sort("created_at", 1)
+        return await cursor.to_list(length=len(order_ids) * 8)
+
+    def _bucket(self, phone_number_id: str) -> TokenBucket:
+        bucket = self._buckets.get(phone_number_id)
+        if bucket is None:
+            bucket = self._buckets[phone_number_id] = TokenBucket(self.rate_per_second, self.rate_per_second)
+        return bucket
+
+    async def _claim(self) -> Optional[Dict]:
+        now = datetime.now(timezone.utc)
+        return await self.db.whatsapp_outbox.find_one_and_update(
+            # "sending" past its lease: the worker holding it died mid-send
+            {"state": {"$in": [STATE_PENDING, STATE_SENDING]}, "next_attempt_at": {"$lte": now}},
+            {
+                "$set": {
+                    "state": STATE_SENDING,
+                    "lease_id": str(uuid.uuid4()),
+                    "next_attempt_at": now + timedelta(seconds=LEASE_SECONDS),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _finish(self, entry: Dict, update: Dict):
+        # Only the current lease holder may record the outcome
+        await self.db.whatsapp_outbox.update_one(
+            {"_id": entry["_id"], "lease_id": entry["lease_id"]}, {"$set": update}
+        )
+
+    async def _renew_lease(self, entry: Dict) -> bool:
+        """Extend our lease before sending; False if it expired and was re-claimed"""
+        result = await self.db.whatsapp_outbox.update_one(
+            {"_id": entry["_id"], "lease_id": entry["lease_id"], "state": STATE_SENDING},
+            {"$set": {"next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=LEASE_SECONDS)}},
+        )
+        return result.matched_count == 1
+
+    async def _process(self, entry: Dict):
+        bucket = self._bucket(entry.get("phone_number_id") or "default")
+        self._stats["throttle_wait_ms"] += await bucket.acquire() * 1000
+        # A rate-limit pause can outlast the lease taken at claim time
+        if not await self._renew_lease(entry):
+            self._stats["lease_lost"] += 1
+            return
+
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        try:
+            result = await self.sender(entry)
+        except Exception as e:
+            await self._handle_failure(entry, e, bucket)
+            return
+
+        message_id = (result.get("messages") or [{}])[0].get("id", "") if isinstance(result, dict) else ""
+        self._stats["sent"] += 1
+        self._stats["total_send_ms"] += (time.perf_counter() - started) * 1000
+        created = entry.get("created_at")
+        if isinstance(created, datetime):
+            if created.tzinfo is None:
+                created = created.replace(tzinfo=timezone.utc)
+            self._stats["total_queue_lag_ms"] += (now - created).total_seconds() * 1000
+        await self._finish(entry, {
+            "state": STATE_SENT,
+            "message_id": message_id,
+            "last_error": None,
+            "finished_at": datetime.now(timezone.utc),
+        })
+        if self.on_sent:
+            try:
+                await self.on_sent(entry, message_id)
+            except Exception as e:
+                print(f"⚠️ WhatsApp outbox on_sent hook failed for {entry.get('order_id')}: {e}")
+
+    async def _handle_failure(self, entry: Dict, error: Exception, bucket: TokenBucket):
+        try:
+            classification = self.classify(error)
+        except Exception:
+            classification = {"code": None, "is_retryable": True}
+        attempts = entry.get("attempts", 1)
+        delay = backoff_delay(attempts)
+        if classification.get("is_rate_limit"):
+            self._stats["rate_limited"] += 1
+            bucket.pause(delay)
+
+        update = {"last_error": str(error)[:500], "error_code": classification.get("code")}
+        if classification.get("is_retryable") and attempts < MAX_ATTEMPTS:
+            self._stats["retries"] += 1
+            update.update({
+                "state": STATE_PENDING,
+                "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delay),
+            })
+            print(f"⏳ WA outbox retry {attempts}/{MAX_ATTEMPTS} in {delay:.1f}s | order={entry.get('order_id')} | error={error}")
+        else:
+            self._stats["failed"] += 1
+            update.update({"state": STATE_FAILED, "finished_at": datetime.now(timezone.utc)})
+            print(f"❌ WA outbox gave up | order={entry.get('order_id')} | attempts={attempts} | error={error}")
+        await self._finish(entry, update)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self, timeout: float = 5.0):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Let in-flight sends finish; anything cut off is re-sent after its lease
+        if self._inflight:
+            await asyncio.wait(list(self._inflight), timeout=timeout)
+
+    async def _dispatch_loop(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                entry = await self._claim()
+            except Exception as e:
+                print(f"⚠️ WhatsApp outbox claim error: {e}")
+                entry = None
+            if entry is None:
+                self._slots.release()
+                await self._idle()
+                continue
+            task = asyncio.create_task(self._process(entry))
+            self._inflight.add(task)
+            task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task: asyncio.Task):
+        self._inflight.discard(task)
+        self._slots.release()
+        if not task.cancelled() and task.exception():
+            print(f"⚠️ WhatsApp outbox send error: {task.exception()}")
+
+    async def _idle(self):
+        try:
+            self._pending_count = await self.db.whatsapp_outbox.count_documents(
+                {"state": {"$in": [STATE_PENDING, STATE_SENDING]}}
+            )
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        sent = max(self._stats["sent"], 1)
+        return {
+            **{k: v for k, v in self._stats.items() if not k.startswith("total_")},
+            "throttle_wait_ms": round(self._stats["throttle_wait_ms"], 1),
+            "avg_send_ms": round(self._stats["total_send_ms"] / sent, 2),
+            "avg_queue_lag_ms": round(self._stats["total_queue_lag_ms"] / sent, 2),
+            "in_flight": len(self._inflight),
+            "backlog": self._pending_count,
+            "rate_per_second": self.rate_per_second,
+        }
+
+
+# Global instance
+_whatsapp_outbox: Optional[WhatsAppOutbox] = None
+
+
+def init_whatsapp_outbox(db, sender, classify, on_sent=None) -> WhatsAppOutbox:
+    """Initialize the outbox; the per-number rate is shared by all workers"""
+    global _whatsapp_outbox
+    # Same worker count gunicorn_config.py uses
+    workers = min(max(int(os.getenv("WEB_CONCURRENCY", "2")), 1), 3)
+    _whatsapp_outbox = WhatsAppOutbox(
+        db,
+        sender,
+        classify,
+        on_sent=on_sent,
+        rate_per_second=float(os.getenv("WHATSAPP_MESSAGES_PER_SECOND", "80")) / workers,
+        concurrency=int(os.getenv("WHATSAPP_OUTBOX_CONCURRENCY", "4")),
+    )
+    return _whatsapp_outbox
+
+
+def get_whatsapp_outbox() -> Optional[WhatsAppOutbox]:
+    """Get the global WhatsApp outbox instance"""
+    return _whatsapp_outbox
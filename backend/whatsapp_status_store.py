@@ -0,0 +1,269 @@
+"""
+WhatsApp Delivery Status Store
+==============================
+
+Batched ingestion of WhatsApp Cloud API status webhooks
+(`POST /webhooks/whatsapp`) into the `whatsapp_message_status` collection:
+- The webhook handler only parses the payload and appends to an in-memory
+  buffer, then acknowledges with 200 - no Mongo round-trip per callback
+- The buffer is coalesced per message id (sent -> delivered -> read for one
+  message becomes one upsert) and flushed with one unordered bulk_write
+  every FLUSH_INTERVAL or as soon as MAX_BATCH messages are buffered
+- One document per message, `_id` = WhatsApp message id (wamid); status is
+  stored as a rank merged with `$max`, so out-of-order callbacks (read
+  before delivered) and concurrent workers never move a message backwards
+- Per-status timestamps and failure errors are kept; documents expire after
+  STATUS_TTL_DAYS
+- A failed bulk_write merges its batch back into the buffer (still bounded
+  by MAX_BUFFER) and is retried after RETRY_DELAY
+- Order screens read delivered/read state through the outbox's
+  order -> message id mapping instead of calling Meta
+
+PERFORMANCE TARGETS:
+- Webhook acknowledgment: no I/O on the request path
+- Mongo writes for a broadcast: 1 bulk_write per FLUSH_INTERVAL per worker
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+STATUS_TTL_DAYS = 30
+
+# Later statuses outrank earlier ones; "failed" is final
+STATUS_RANKS = {"sent": 1, "delivered": 2, "read": 3, "failed": 4}
+RANK_STATUSES = {rank: status for status, rank in STATUS_RANKS.items()}
+
+
+def _event_time(timestamp: Any) -> Optional[datetime]:
+    """Meta sends epoch seconds as a string"""
+    try:
+        return datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_status_events(payload: Dict) -> Iterable[Dict[str, Any]]:
+    """Status callbacks in a webhook payload (inbound messages are skipped)"""
+    for entry in payload.get("entry", []) or []:
+        for change in entry.get("changes", []) or []:
+            value = change.get("value", {}) or {}
+            phone_number_id = (value.get("metadata") or {}).get("phone_number_id")
+            for status_event in value.get("statuses", []) or []:
+                message_id = status_event.get("id")
+                status = status_event.get("status")
+                if not message_id or status not in STATUS_RANKS:
+                    continue
+                yield {
+                    "message_id": message_id,
+                    "status": status,
+                    "recipient_id": status_event.get("recipient_id"),
+                    "phone_number_id": phone_number_id,
+                    "timestamp": _event_time(status_event.get("timestamp")),
+                    "errors": [
+                        {"code": err.get("code"), "title": err.get("title"), "message": err.get("message")}
+                        for err in status_event.get("errors", []) or []
+                    ],
+                    "pricing_category": (status_event.get("pricing") or {}).get("category"),
+                }
+
+
+def status_view(doc: Dict) -> Dict[str, Any]:
+    """API shape of a stored status document"""
+    return {
+        "message_id": doc["_id"],
+        "status": RANK_STATUSES.get(doc.get("status_rank"), "unknown"),
+        "timestamps": {
+            status: value.isoformat() if isinstance(value, datetime) else value
+            for status, value in (doc.get("timestamps") or {}).items()
+        },
+        "errors": doc.get("errors") or [],
+    }
+
+
+class WhatsAppStatusStore:
+    """Per-worker webhook buffer flushed to whatsapp_message_status in bulk"""
+
+    def __init__(self, db, flush_interval: float = 0.25, max_batch: int = 500, max_buffer: int = 50000):
+        self.db = db
+        self.FLUSH_INTERVAL = flush_interval
+        self.MAX_BATCH = max_batch
+        self.MAX_BUFFER = max_buffer
+        self.RETRY_DELAY = 1.0
+        # message id -> merged pending update
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._first_pending_at: Optional[float] = None
+        self._write_ready = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._stats = {
+            "events_received": 0,
+            "events_coalesced": 0,
+            "events_dropped": 0,
+            "messages_flushed": 0,
+            "bulk_writes": 0,
+            "bulk_write_errors": 0,
+            "messages_requeued": 0,
+            "total_flush_ms": 0.0,
+        }
+
+    async def ensure_indexes(self):
+        # _id is the message id; these serve expiry and per-recipient lookups
+        await self.db.whatsapp_message_status.create_index("created_at", expireAfterSeconds=STATUS_TTL_DAYS * 86400)
+        await self.db.whatsapp_message_status.create_index([("recipient_id", 1), ("updated_at", -1)])
+
+    def start(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    def add(self, events: Iterable[Dict[str, Any]]) -> int:
+        """Buffer parsed status events (never awaits); returns how many were taken"""
+        added = 0
+        for event in events:
+            self._stats["events_received"] += 1
+            pending = self._pending.get(event["message_id"])
+            if pending is None:
+                if len(self._pending) >= self.MAX_BUFFER:
+                    # Mongo is not keeping up; keep memory bounded
+                    self._stats["events_dropped"] += 1
+                    continue
+                pending = self._pending[event["message_id"]] = {
+                    "rank": 0, "timestamps": {}, "errors": None,
+                    "recipient_id": event["recipient_id"], "phone_number_id": event["phone_number_id"],
+                    "pricing_category": None,
+                }
+            else:
+                self._stats["events_coalesced"] += 1
+            pending["rank"] = max(pending["rank"], STATUS_RANKS[event["status"]])
+            pending["timestamps"][event["status"]] = event["timestamp"] or datetime.now(timezone.utc)
+            if event["errors"]:
+                pending["errors"] = event["errors"]
+            if event["pricing_category"]:
+                pending["pricing_category"] = event["pricing_category"]
+            added += 1
+
+        if added:
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+            self._write_ready.set()
+        return added
+
+    async def _flush_loop(self):
+        while True:
+            await self._write_ready.wait()
+            # Hold the window open so a burst of callbacks lands in one bulk_write
+            if len(self._pending) < self.MAX_BATCH and self._first_pending_at is not None:
+                remaining = self.FLUSH_INTERVAL - (time.monotonic() - self._first_pending_at)
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+            if not await self.flush():
+                # Mongo is failing: back off instead of retrying a full buffer in a tight loop
+                await asyncio.sleep(self.RETRY_DELAY)
+
+    async def flush(self) -> bool:
+        """Upsert every buffered message with one unordered bulk_write; False if it failed"""
+        self._write_ready.clear()
+        if not self._pending:
+            return True
+        pending, self._pending = self._pending, {}
+        self._first_pending_at = None
+
+        now = datetime.now(timezone.utc)
+        operations: List[UpdateOne] = []
+        for message_id, entry in pending.items():
+            fields: Dict[str, Any] = {"updated_at": now}
+            for status, at in entry["timestamps"].items():
+                fields[f"timestamps.{status}"] = at
+            if entry["errors"]:
+                fields["errors"] = entry["errors"]
+            if entry["pricing_category"]:
+                fields["pricing_category"] = entry["pricing_category"]
+            operations.append(UpdateOne(
+                {"_id": message_id},
+                {
+                    "$max": {"status_rank": entry["rank"]},
+                    "$set": fields,
+                    "$setOnInsert": {
+                        "recipient_id": entry["recipient_id"],
+                        "phone_number_id": entry["phone_number_id"],
+                        "created_at": now,
+                    },
+                },
+                upsert=True,
+            ))
+
+        started = time.perf_counter()
+        try:
+            await self.db.whatsapp_message_status.bulk_write(operations, ordered=False)
+            self._stats["bulk_writes"] += 1
+            self._stats["messages_flushed"] += len(operations)
+        except Exception as e:
+            self._stats["bulk_write_errors"] += 1
+            print(f"❌ WhatsApp status bulk write failed ({len(operations)} messages), retrying: {e}")
+            self._requeue(pending)
+            return False
+        finally:
+            self._stats["total_flush_ms"] += (time.perf_counter() - started) * 1000
+        return True
+
+    def _requeue(self, failed: Dict[str, Dict[str, Any]]):
+        """Merge a failed batch under whatever arrived since (newer callbacks win)"""
+        for message_id, entry in failed.items():
+            newer = self._pending.get(message_id)
+            if newer is None:
+                if len(self._pending) >= self.MAX_BUFFER:
+                    self._stats["events_dropped"] += 1
+                    continue
+                self._pending[message_id] = entry
+            else:
+                newer["rank"] = max(newer["rank"], entry["rank"])
+                newer["timestamps"] = {**entry["timestamps"], **newer["timestamps"]}
+                newer["errors"] = newer["errors"] or entry["errors"]
+                newer["pricing_category"] = newer["pricing_category"] or entry["pricing_category"]
+            self._stats["messages_requeued"] += 1
+        if self._pending:
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+            self._write_ready.set()
+
+    async def stop(self):
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    async def get_statuses(self, message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Stored status per message id (messages with no callback yet are absent)"""
+        if not message_ids:
+            return {}
+        cursor = self.db.whatsapp_message_status.find(
+            {"_id": {"$in": message_ids}}, {"status_rank": 1, "timestamps": 1, "errors": 1}
+        )
+        return {doc["_id"]: status_view(doc) async for doc in cursor}
+
+    def get_stats(self) -> Dict[str, Any]:
+        writes = max(self._stats["bulk_writes"], 1)
+        return {
+            **{k: v for k, v in self._stats.items() if k != "total_flush_ms"},
+            "buffered": len(self._pending),
+            "avg_flush_ms": round(self._stats["total_flush_ms"] / writes, 2),
+        }
+
+
+# Global instance
+_whatsapp_status_store: Optional[WhatsAppStatusStore] = None
+
+
+def init_whatsapp_status_store(db) -> WhatsAppStatusStore:
+    """Initialize the delivery status store against the active database"""
+    global _whatsapp_status_store
+    _whatsapp_status_store = WhatsAppStatusStore(db)
+    return _whatsapp_status_store
+
+
+def get_whatsapp_status_store() -> Optional[WhatsAppStatusStore]:
+    """Get the global delivery status store instance"""
+    return _whatsapp_status_store
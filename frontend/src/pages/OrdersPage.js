@@ -355,6 +355,10 @@ const OrdersPage = ({ user }) => {
       );
     });
     
+    const unsubscribeOrderDeleted = hybridSyncManager.on('order_deleted', (orderId) => {
+      setOrders(prevOrders => prevOrders.filter(o => o.id !== orderId));
+    });
+    
     const unsubscribeWhatsAppSent = hybridSyncManager.on('whatsapp_sent', (orderId) => {
       setOrders(prevOrders => 
         prevOrders.map(o => o.id === orderId ? { ...o, whatsapp_notification_sent: true } : o)
@@ -392,6 +396,20 @@ const OrdersPage = ({ user }) => {
       updateOrdersWithDeduplication(orders, 'fallback-polling');
     });
     
+    // Fallback: merge delta-sync changes (upsert changed, drop closed/deleted)
+    const unsubscribeOrdersDelta = hybridSyncManager.on('orders_delta', ({ orders: changed, removedIds }) => {
+      setOrders(prevOrders => {
+        const removed = new Set(removedIds);
+        const changedById = new Map(changed.map(o => [o.id, o]));
+        const merged = prevOrders
+          .filter(o => !removed.has(o.id))
+          .map(o => changedById.has(o.id) ? { ...o, ...changedById.get(o.id) } : o);
+        const known = new Set(merged.map(o => o.id));
+        const added = changed.filter(o => !known.has(o.id) && !removed.has(o.id));
+        return [...added, ...merged];
+      });
+    });
+    
     const unsubscribeTablesUpdated = hybridSyncManager.on('tables_updated', (tables) => {
       setTables(tables);
     });
@@ -403,11 +421,13 @@ const OrdersPage = ({ user }) => {
       unsubscribeOrderCreated();
       unsubscribeOrderUpdated();
       unsubscribeStatusChanged();
+      unsubscribeOrderDeleted();
       unsubscribeWhatsAppSent();
       unsubscribePaymentCompleted();
       unsubscribeTableUpdated();
       unsubscribeMenuUpdated();
       unsubscribeOrdersUpdated();
+      unsubscribeOrdersDelta();
       unsubscribeTablesUpdated();
     };
   }, [user]);
@@ -1464,6 +1484,9 @@ const OrdersPage = ({ user }) => {
       // WhatsApp notification
       if (response.data?.whatsapp_sent || response.data?.whatsapp_mode === 'cloud') {
         toast.success('✅ WhatsApp message sent!');
+      } else if (response.data?.whatsapp_queued) {
+        // Sent in the background by the server-side WhatsApp outbox
+        toast.success('📱 WhatsApp message queued!');
       } else if (response.data?.whatsapp_link && response.data?.customer_phone) {
         window.open(response.data.whatsapp_link, '_blank');
       }
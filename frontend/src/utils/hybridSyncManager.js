@@ -17,6 +17,7 @@ class HybridSyncManager {
     this.pendingUpdates = new Map();
     this.batchTimer = null;
     this.wsEverConnected = false; // track if WS ever succeeded
+    this.deltaCursor = null; // /orders?since= cursor for fallback polling
   }
 
   /**
@@ -52,6 +53,19 @@ class HybridSyncManager {
       this.emit('order_status_changed', order);
     });
 
+    websocketManager.on('order_deleted', (orderId) => {
+      this.emit('order_deleted', orderId);
+    });
+
+    websocketManager.on('resync', async () => {
+      try {
+        const orders = await this.fetchOrders();
+        this.emit('orders_updated', orders);
+      } catch (error) {
+        // Next event or reconnect will resync again
+      }
+    });
+
     websocketManager.on('whatsapp_sent', (orderId) => {
       this.emit('whatsapp_sent', orderId);
     });
@@ -84,26 +98,42 @@ class HybridSyncManager {
   }
 
   /**
-   * Start fallback polling using real /orders endpoint
+   * Start fallback polling using /orders delta sync (changes since the last poll)
    */
   startFallbackPolling() {
     if (this.fallbackPolling) return;
     
-    this.fallbackPolling = setInterval(async () => {
-      try {
+    this.fallbackPolling = setInterval(() => this.pollOrderDelta(), 10000);
+  }
+
+  /**
+   * Fetch orders changed since the cursor; the first call (or an expired
+   * cursor) returns the full active list with full_resync
+   */
+  async pollOrderDelta() {
+    try {
+      let hasMore = true;
+      while (hasMore) {
         const response = await apiWithRetry({
           method: 'get',
-          url: `${API}/orders?fresh=true&_t=${Date.now()}`,
+          url: `${API}/orders?since=${encodeURIComponent(this.deltaCursor || '')}`,
           timeout: 8000
         });
-        const orders = Array.isArray(response.data) ? response.data : [];
-        if (orders.length > 0) {
-          this.emit('orders_updated', orders);
+        const delta = response.data || {};
+        if (delta.full_resync) {
+          this.emit('orders_updated', Array.isArray(delta.orders) ? delta.orders : []);
+        } else if (delta.orders?.length || delta.closed?.length || delta.deleted?.length) {
+          this.emit('orders_delta', {
+            orders: delta.orders || [],
+            removedIds: [...(delta.closed || []).map(o => o.id), ...(delta.deleted || [])]
+          });
         }
-      } catch (error) {
-        // Silent — fallback polling failures are expected occasionally
+        this.deltaCursor = delta.cursor || this.deltaCursor;
+        hasMore = Boolean(delta.has_more);
       }
-    }, 10000);
+    } catch (error) {
+      // Silent — fallback polling failures are expected occasionally
+    }
   }
 
   /**
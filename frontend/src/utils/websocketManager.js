@@ -17,6 +17,7 @@ class WebSocketManager {
     this.heartbeatInterval = null;
     this.missedHeartbeats = 0;
     this.maxMissedHeartbeats = 3;
+    this.lastEventId = null; // resume cursor: server replays events missed while disconnected
   }
 
   /**
@@ -40,7 +41,8 @@ class WebSocketManager {
       const apiBase = API.replace(/\/api$/, '');
       const wsProtocol = apiBase.startsWith('https') ? 'wss:' : 'ws:';
       const wsHost = apiBase.replace(/^https?:\/\//, '');
-      const wsUrl = `${wsProtocol}//${wsHost}/ws?token=${encodeURIComponent(token)}`;
+      const since = this.lastEventId ? `&since=${encodeURIComponent(this.lastEventId)}` : '';
+      const wsUrl = `${wsProtocol}//${wsHost}/ws?token=${encodeURIComponent(token)}${since}`;
       this.ws = new WebSocket(wsUrl);
 
       this.ws.onopen = () => {
@@ -58,6 +60,10 @@ class WebSocketManager {
           
           // Reset heartbeat counter on any message
           this.missedHeartbeats = 0;
+
+          if (data.event_id) {
+            this.lastEventId = data.event_id;
+          }
           
           // Handle different message types
           switch (data.type) {
@@ -73,6 +79,13 @@ class WebSocketManager {
             case 'order_status_changed':
               this.emit('order_status_changed', data.order);
               break;
+            case 'order_deleted':
+              this.emit('order_deleted', data.order_id);
+              break;
+            case 'resync':
+              // Missed more events than the server buffers — refetch once
+              this.emit('resync');
+              break;
             case 'whatsapp_sent':
               this.emit('whatsapp_sent', data.order_id);
               break;